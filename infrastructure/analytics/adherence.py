@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+PillBuddy Adherence Analytics
+
+Per-prescription adherence statistics computed from slot_state_changed
+history (usually the columnar export written by event_export.py; multi-slot
+slot_states_changed events count as one transition per changed slot):
+
+    - doses: bottle removals, with removals closer together than
+      min_dose_gap_minutes (sensor flaps, a bottle put back and picked up
+      again) merged into one dose
+    - dose time of day: median and spread of the dose clock time
+    - inter-dose intervals: median, mean and longest gap between doses
+    - missed doses: the day is split into doses_per_day cadence windows
+      (e.g. 00:00-12:00 and 12:00-24:00 local for 2 per day); every whole
+      window in the reporting period without a dose is a missed dose
+    - bottle out time: removal to the return that ends the dose
+
+Events are loaded into NumPy arrays once and every step is a vectorized
+pass over the whole batch: the rows are sorted by (device, slot,
+timestamp), state transitions, dose merging, removal/return pairing and
+cadence-window binning are computed with array operations across all
+prescriptions at once. Per-prescription medians and percentiles come from
+one grouped sort, so Python only loops to build the result dictionaries.
+analyze_fleet() splits large fleets into device chunks and runs them on a
+process pool.
+
+Usage:
+    cd infrastructure
+    python analytics/adherence.py --output-dir ./event-history --doses-per-day 2 \\
+        --start-date 2026-09-01 --end-date 2026-09-30 [--processes 8] [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from event_export import LocalDirectorySink, S3Sink, read_columns  # noqa: E402
+from pillbuddy_core.timeutil import DAY_MS, MINUTE_MS  # noqa: E402
+
+DEFAULT_DOSES_PER_DAY = 1
+DEFAULT_MIN_DOSE_GAP_MINUTES = 10
+DEVICES_PER_TASK = 250
+
+
+def to_arrays(columns: Dict[str, List[Any]]) -> Dict[str, np.ndarray]:
+    """
+    Load slot_state_changed events into arrays sorted by device, slot and time
+
+    Args:
+        columns: Column name -> values, as returned by event_export.read_columns()
+
+    Returns:
+        Dictionary with 'device' (int codes into 'device_ids'), 'device_ids',
+        'slot', 'timestamp' and 'in_holder' arrays
+    """
+    event_type = np.asarray(columns['event_type'], dtype=object)
+    slot = np.asarray(columns['slot'], dtype=object)
+    in_holder = np.asarray(columns['in_holder'], dtype=object)
+    keep = (event_type == 'slot_state_changed') & (slot != None) & (in_holder != None)  # noqa: E711
+
+    multi = _expand_slot_states(columns, np.flatnonzero(event_type == 'slot_states_changed'))
+    device_ids, device = np.unique(
+        np.concatenate([np.asarray(columns['device_id'], dtype=object)[keep], multi['device_id']]).astype(str),
+        return_inverse=True)
+    slot = np.concatenate([slot[keep].astype(np.int64), multi['slot']])
+    timestamp = np.concatenate([np.asarray(columns['timestamp'], dtype=object)[keep].astype(np.int64),
+                                multi['timestamp']])
+    in_holder = np.concatenate([in_holder[keep].astype(bool), multi['in_holder']])
+
+    order = np.lexsort((timestamp, slot, device))
+    return {
+        'device_ids': device_ids,
+        'device': device[order].astype(np.int64),
+        'slot': slot[order],
+        'timestamp': timestamp[order],
+        'in_holder': in_holder[order]
+    }
+
+
+def _expand_slot_states(columns: Dict[str, List[Any]], rows: np.ndarray) -> Dict[str, np.ndarray]:
+    """One transition per changed slot of the slot_states_changed rows (masks are in 'attributes')"""
+    expanded: Dict[str, List[Any]] = {'device_id': [], 'slot': [], 'timestamp': [], 'in_holder': []}
+    for row in rows:
+        attributes = json.loads(columns['attributes'][row] or '{}')
+        changed_mask = int(attributes.get('changed_mask', 0))
+        in_holder_mask = int(attributes.get('in_holder_mask', 0))
+        for slot in range(1, changed_mask.bit_length() + 1):
+            if changed_mask >> (slot - 1) & 1:
+                expanded['device_id'].append(columns['device_id'][row])
+                expanded['slot'].append(slot)
+                expanded['timestamp'].append(columns['timestamp'][row])
+                expanded['in_holder'].append(bool(in_holder_mask >> (slot - 1) & 1))
+    return {
+        'device_id': np.asarray(expanded['device_id'], dtype=object),
+        'slot': np.asarray(expanded['slot'], dtype=np.int64),
+        'timestamp': np.asarray(expanded['timestamp'], dtype=np.int64),
+        'in_holder': np.asarray(expanded['in_holder'], dtype=bool),
+    }
+
+
+def load_device_history(sink: Any, device_id: str, start_date: Optional[str] = None,
+                        end_date: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """Load one device's exported history into arrays (see to_arrays)"""
+    return to_arrays(read_columns(sink, start_date, end_date, device_ids=[device_id]))
+
+
+def _group_starts(keys: np.ndarray) -> np.ndarray:
+    """Indices where a run of equal keys begins, for a sorted key array"""
+    if len(keys) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+
+
+def _round(value: float, digits: int = 1) -> Optional[float]:
+    return None if value != value else round(value, digits)
+
+
+def _grouped_stats(values: np.ndarray, groups: np.ndarray, group_count: int) -> Dict[str, np.ndarray]:
+    """
+    Median, 90th percentile, mean, standard deviation and max per group
+
+    One sort orders the values within their groups; every statistic is then
+    an indexed read or a bincount, with NaN for groups without values.
+    Percentiles interpolate linearly, like np.percentile.
+    """
+    count = np.bincount(groups, minlength=group_count)
+    empty = np.full(group_count, np.nan)
+    if len(values) == 0:
+        return {'median': empty, 'p90': empty, 'mean': empty, 'std': empty, 'max': empty}
+
+    values_unsorted = values.astype(np.float64)
+    values = values_unsorted[np.lexsort((values, groups))]
+    start = np.r_[0, np.cumsum(count)[:-1]]
+    present = count > 0
+    last = len(values) - 1
+
+    def quantile(q: float) -> np.ndarray:
+        position = (count - 1) * q
+        low = np.floor(position).astype(np.int64)
+        below = values[np.minimum(start + low, last)]
+        above = values[np.minimum(start + np.ceil(position).astype(np.int64), last)]
+        return np.where(present, below + (above - below) * (position - low), np.nan)
+
+    safe_count = np.maximum(count, 1)
+    mean = np.bincount(groups, weights=values_unsorted, minlength=group_count) / safe_count
+    square_mean = np.bincount(groups, weights=values_unsorted * values_unsorted, minlength=group_count) / safe_count
+    return {
+        'median': quantile(0.5),
+        'p90': quantile(0.9),
+        'mean': np.where(present, mean, np.nan),
+        'std': np.where(present, np.sqrt(np.maximum(square_mean - mean * mean, 0)), np.nan),
+        'max': np.where(present, values[np.minimum(start + count - 1, last)], np.nan)
+    }
+
+
+def prescription_stats(arrays: Dict[str, np.ndarray], doses_per_day: int = DEFAULT_DOSES_PER_DAY,
+                       min_dose_gap_minutes: float = DEFAULT_MIN_DOSE_GAP_MINUTES,
+                       period_start: Optional[int] = None, period_end: Optional[int] = None,
+                       utc_offset_minutes: int = 0) -> List[Dict[str, Any]]:
+    """
+    Compute adherence statistics for every (device, slot) in the arrays
+
+    Args:
+        arrays: Output of to_arrays()
+        doses_per_day: Expected doses per day (cadence windows per day)
+        min_dose_gap_minutes: Removals closer together than this are one dose
+        period_start: Reporting period start in ms (default: each slot's first event)
+        period_end: Reporting period end in ms (default: each slot's last event)
+        utc_offset_minutes: Local time offset for dose times and cadence windows
+
+    Returns:
+        One statistics dictionary per prescription, ordered by device and slot
+    """
+    device, slot, timestamp, in_holder = arrays['device'], arrays['slot'], arrays['timestamp'], arrays['in_holder']
+    if len(timestamp) == 0:
+        return []
+
+    # Prescription group per row; rows are already sorted by group and time
+    group = device * (int(slot.max()) + 1) + slot
+    starts = _group_starts(group)
+    group_keys = group[starts]
+    group_first_ts = timestamp[starts]
+    group_last_ts = np.r_[timestamp[starts[1:] - 1], timestamp[-1]]
+
+    # Transitions, assuming the bottle sat in the holder before the history starts
+    previous = np.r_[True, in_holder[:-1]]
+    previous[starts] = True
+    removed = np.flatnonzero(~in_holder & previous)
+    returned = np.flatnonzero(in_holder & ~previous)
+
+    # Pair every removal with the next return in the same slot; states alternate,
+    # so that return ends this removal. Open removals get NaN.
+    removal_ts = timestamp[removed]
+    removal_group = group[removed]
+    next_return = np.searchsorted(returned, removed)
+    has_return = next_return < len(returned)
+    next_return = np.minimum(next_return, max(len(returned) - 1, 0))
+    if len(returned):
+        has_return &= group[returned[next_return]] == removal_group
+        return_ts = np.where(has_return, timestamp[returned[next_return]], np.nan)
+    else:
+        return_ts = np.full(len(removed), np.nan)
+
+    # Merge removals closer than the gap into doses
+    new_dose = np.r_[True, (removal_group[1:] != removal_group[:-1])
+                     | (np.diff(removal_ts) >= min_dose_gap_minutes * MINUTE_MS)] if len(removed) else np.zeros(0, bool)
+    dose_starts = np.flatnonzero(new_dose)
+    dose_ts = removal_ts[dose_starts]
+    dose_group = removal_group[dose_starts]
+    dose_end = np.maximum.reduceat(return_ts, dose_starts) if len(dose_starts) else np.zeros(0)
+    out_seconds = (dose_end - dose_ts) / 1000.0
+
+    offset_ms = utc_offset_minutes * MINUTE_MS
+    dose_minute = ((dose_ts + offset_ms) % DAY_MS) / MINUTE_MS
+
+    # Intervals between consecutive doses of the same prescription (hours)
+    same_group = dose_group[1:] == dose_group[:-1]
+    interval_hours = np.where(same_group, np.diff(dose_ts) / 3600000.0, np.nan)
+
+    # Cadence windows: whole windows inside the period, and windows with a dose
+    window_ms = DAY_MS // doses_per_day
+    start_ts = np.full(len(group_keys), period_start) if period_start is not None else group_first_ts
+    end_ts = np.full(len(group_keys), period_end) if period_end is not None else group_last_ts
+    first_window = -((-(start_ts + offset_ms)) // window_ms)
+    end_window = (end_ts + offset_ms) // window_ms
+    expected = np.maximum(end_window - first_window, 0)
+
+    group_index = np.searchsorted(group_keys, dose_group)
+    dose_window = (dose_ts + offset_ms) // window_ms
+    in_period = (dose_window >= first_window[group_index]) & (dose_window < end_window[group_index])
+    taken_group, taken_window = group_index[in_period], dose_window[in_period]
+    if len(taken_window):
+        span = int(taken_window.max() - taken_window.min()) + 1
+        taken = np.unique(taken_group * span + (taken_window - taken_window.min())) // span
+    else:
+        taken = taken_group
+    on_schedule = np.bincount(taken, minlength=len(group_keys))
+
+    # Grouped statistics, then one dictionary per prescription
+    group_count = len(group_keys)
+    dose_count = np.bincount(group_index, minlength=group_count)
+    minute_stats = _grouped_stats(dose_minute, group_index, group_count)
+    interval_stats = _grouped_stats(interval_hours[same_group], group_index[:-1][same_group], group_count)
+    closed = ~np.isnan(out_seconds)
+    out_stats = _grouped_stats(out_seconds[closed], group_index[closed], group_count)
+    last_dose_index = np.cumsum(dose_count) - 1
+    bottle_out = np.zeros(group_count, dtype=bool)
+    bottle_out[dose_count > 0] = np.isnan(out_seconds[last_dose_index[dose_count > 0]])
+    first_dose = np.full(group_count, -1, dtype=np.int64)
+    last_dose = np.full(group_count, -1, dtype=np.int64)
+    first_dose[dose_count > 0] = dose_ts[(last_dose_index - dose_count + 1)[dose_count > 0]]
+    last_dose[dose_count > 0] = dose_ts[last_dose_index[dose_count > 0]]
+    adherence = np.divide(on_schedule, expected, out=np.full(group_count, np.nan), where=expected > 0)
+
+    slot_stride = int(slot.max()) + 1
+    columns = zip(
+        group_keys.tolist(), dose_count.tolist(), first_dose.tolist(), last_dose.tolist(),
+        minute_stats['median'].tolist(), minute_stats['std'].tolist(),
+        interval_stats['median'].tolist(), interval_stats['mean'].tolist(), interval_stats['max'].tolist(),
+        expected.tolist(), on_schedule.tolist(), adherence.tolist(),
+        out_stats['median'].tolist(), out_stats['p90'].tolist(), out_stats['max'].tolist(), bottle_out.tolist()
+    )
+    device_ids = arrays['device_ids'].tolist()
+    return [
+        {
+            'device_id': device_ids[key // slot_stride],
+            'slot': key % slot_stride,
+            'doses': doses,
+            'first_dose': first if doses else None,
+            'last_dose': last if doses else None,
+            'median_dose_minute_of_day': _round(minute_median),
+            'dose_time_stddev_minutes': _round(minute_std),
+            'median_interval_hours': _round(interval_median, 2),
+            'mean_interval_hours': _round(interval_mean, 2),
+            'max_interval_hours': _round(interval_max, 2),
+            'expected_doses': expected_doses,
+            'doses_on_schedule': taken,
+            'missed_doses': expected_doses - taken,
+            'adherence': _round(ratio, 3),
+            'median_out_seconds': _round(out_median),
+            'p90_out_seconds': _round(out_p90),
+            'max_out_seconds': _round(out_max),
+            'bottle_out': out_now
+        }
+        for (key, doses, first, last, minute_median, minute_std, interval_median, interval_mean, interval_max,
+             expected_doses, taken, ratio, out_median, out_p90, out_max, out_now) in columns
+    ]
+
+
+def _chunk_stats(chunk: Dict[str, np.ndarray], options: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return prescription_stats(chunk, **options)
+
+
+def analyze_fleet(columns: Dict[str, List[Any]], processes: Optional[int] = None,
+                  devices_per_task: int = DEVICES_PER_TASK, **options: Any) -> List[Dict[str, Any]]:
+    """
+    Compute prescription statistics for a whole fleet, in parallel
+
+    Args:
+        columns: Column name -> values, as returned by event_export.read_columns()
+        processes: Worker processes (default: CPU count; 1 runs in-process)
+        devices_per_task: Devices per worker task
+        **options: Keyword arguments for prescription_stats()
+
+    Returns:
+        One statistics dictionary per prescription, ordered by device and slot
+    """
+    arrays = to_arrays(columns)
+    device_count = len(arrays['device_ids'])
+    if processes == 1 or device_count <= devices_per_task:
+        return prescription_stats(arrays, **options)
+
+    # Rows are sorted by device, so every device range is one contiguous slice
+    bounds = np.searchsorted(arrays['device'], np.arange(0, device_count + devices_per_task, devices_per_task))
+    chunks = []
+    for first_device, low, high in zip(range(0, device_count, devices_per_task), bounds[:-1], bounds[1:]):
+        chunks.append({
+            'device_ids': arrays['device_ids'][first_device:first_device + devices_per_task],
+            'device': arrays['device'][low:high] - first_device,
+            'slot': arrays['slot'][low:high],
+            'timestamp': arrays['timestamp'][low:high],
+            'in_holder': arrays['in_holder'][low:high]
+        })
+
+    results = []
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        for chunk_results in pool.map(_chunk_stats, chunks, [options] * len(chunks)):
+            results.extend(chunk_results)
+    return results
+
+
+def analyze_sink(sink: Any, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                 device_ids: Optional[Iterable[str]] = None, processes: Optional[int] = None,
+                 **options: Any) -> List[Dict[str, Any]]:
+    """
+    Compute prescription statistics from an event history export
+
+    With start_date/end_date the reporting period is those whole UTC days,
+    so missed doses include windows before a slot's first event.
+    """
+    if start_date and 'period_start' not in options:
+        options['period_start'] = _date_ms(start_date)
+    if end_date and 'period_end' not in options:
+        options['period_end'] = _date_ms(end_date) + DAY_MS
+    return analyze_fleet(read_columns(sink, start_date, end_date, device_ids), processes=processes, **options)
+
+
+def _date_ms(date: str) -> int:
+    day = datetime.strptime(date, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+    return int(day.timestamp() * 1000)
+
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    print(f"{'device':<20}{'slot':>5}{'doses':>7}{'missed':>8}{'adherence':>11}"
+          f"{'dose time':>11}{'interval h':>12}{'out s (p50)':>13}")
+    for stats in results:
+        minute = stats['median_dose_minute_of_day']
+        dose_time = str(timedelta(minutes=int(minute)))[:-3] if minute is not None else '-'
+        adherence = f"{stats['adherence']:.0%}" if stats['adherence'] is not None else '-'
+        print(f"{stats['device_id']:<20}{stats['slot']:>5}{stats['doses']:>7}{stats['missed_doses']:>8}"
+              f"{adherence:>11}{dose_time:>11}{stats['median_interval_hours'] or '-':>12}"
+              f"{stats['median_out_seconds'] or '-':>13}")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='PillBuddy adherence report from exported event history')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--output-dir', help='Local export directory written by event_export.py')
+    source.add_argument('--bucket', help='S3 bucket written by event_export.py')
+    parser.add_argument('--prefix', default='', help='Key prefix inside --bucket')
+    parser.add_argument('--start-date', help='First UTC date (YYYY-MM-DD)')
+    parser.add_argument('--end-date', help='Last UTC date (YYYY-MM-DD)')
+    parser.add_argument('--device', action='append', dest='device_ids', help='Limit to a device (repeatable)')
+    parser.add_argument('--doses-per-day', type=int, default=DEFAULT_DOSES_PER_DAY, help='Expected doses per day')
+    parser.add_argument('--min-dose-gap-minutes', type=float, default=DEFAULT_MIN_DOSE_GAP_MINUTES,
+                        help='Removals closer together than this count as one dose')
+    parser.add_argument('--utc-offset-minutes', type=int, default=0, help='Local time offset for dose times')
+    parser.add_argument('--processes', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--json', action='store_true', help='Print the statistics as JSON')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    if args.bucket:
+        from pillbuddy_core.clients import make_client
+        sink = S3Sink(make_client('s3'), args.bucket, args.prefix)
+    else:
+        sink = LocalDirectorySink(args.output_dir)
+
+    results = analyze_sink(
+        sink, args.start_date, args.end_date, args.device_ids, processes=args.processes,
+        doses_per_day=args.doses_per_day, min_dose_gap_minutes=args.min_dose_gap_minutes,
+        utc_offset_minutes=args.utc_offset_minutes
+    )
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == '__main__':
+    main()
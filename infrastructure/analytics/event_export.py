@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+"""
+PillBuddy Event History Export
+
+Copies PillBuddy_Events items into compressed columnar files before the
+table's 30-day TTL deletes them, so adherence reporting over months of
+history reads files instead of table capacity.
+
+Layout (Hive-style partitions, readable by Athena, DuckDB, Spark and
+pyarrow.dataset as well as read_columns() below):
+
+    <root>/date=2026-10-18/device_id=esp32_001/part-<first_ts>-<last_ts>.parquet
+    <root>/_checkpoint.json
+
+Each run enumerates devices from the Devices table (a keys-only Scan) and
+queries every device's event partition for timestamps after its
+checkpoint, so a run reads only events it has not exported yet. Events
+newer than --settle-seconds are left for the next run, which gives
+in-flight events time to land. The checkpoint is saved every
+CHECKPOINT_EVERY devices and at the end of the run; a run interrupted in
+between re-exports at most those devices' events, and readers drop the
+duplicate rows by (device_id, timestamp).
+
+Formats:
+    parquet: zstd-compressed Parquet (requires the optional pyarrow package)
+    json:    gzip-compressed column-oriented JSON ({"column": [values]}),
+             for environments without pyarrow
+
+Schedule the export at least daily - events older than TTL_DAYS are gone
+from the table.
+
+Usage:
+    cd infrastructure
+    python analytics/event_export.py --output-dir ./event-history
+    python analytics/event_export.py --bucket my-bucket --prefix pillbuddy/events
+"""
+
+import argparse
+import gzip
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'layers', 'pillbuddy_core', 'python'))
+
+from pillbuddy_core.ddb_client import FastDynamoDB, DEVICES_KEY_SCHEMA, EVENTS_KEY_SCHEMA  # noqa: E402
+from pillbuddy_core.timeutil import DAY_MS  # noqa: E402
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; the json format works without it
+    pa = None
+    pq = None
+
+# Table names match PillBuddyStack
+DEVICES_TABLE = 'PillBuddy_Devices'
+EVENTS_TABLE = 'PillBuddy_Events'
+
+# Column name -> pyarrow type name; every other attribute except ttl goes into 'attributes' as JSON
+EVENT_COLUMNS = (
+    ('device_id', 'string'),
+    ('timestamp', 'int64'),
+    ('event_type', 'string'),
+    ('slot', 'int32'),
+    ('state', 'string'),
+    ('in_holder', 'bool_'),
+    ('sensor_level', 'int32'),
+    ('sequence', 'int64'),
+    ('attributes', 'string'),
+)
+COLUMN_NAMES = tuple(name for name, _ in EVENT_COLUMNS)
+DROPPED_ATTRIBUTES = ('ttl',)
+
+FORMATS = ('parquet', 'json')
+FILE_EXTENSIONS = {'parquet': '.parquet', 'json': '.json.gz'}
+CHECKPOINT_PATH = '_checkpoint.json'
+CHECKPOINT_EVERY = 100
+DEFAULT_SETTLE_SECONDS = 300
+MAX_ROWS_PER_FILE = 100000
+
+# Query for one device's events in a timestamp range
+EVENTS_RANGE_CONDITION = 'device_id = :device_id AND #ts BETWEEN :since AND :until'
+
+
+def default_format() -> str:
+    """Parquet when pyarrow is installed, otherwise json"""
+    return 'parquet' if pa is not None else 'json'
+
+
+# --------------------------------------------------------------------------
+# Sinks
+# --------------------------------------------------------------------------
+
+class LocalDirectorySink:
+    """
+    Export target in a local directory
+
+    Args:
+        root: Directory that holds the partitions and checkpoint
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def write_bytes(self, path: str, data: bytes) -> None:
+        full_path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        # Write then rename, so readers never see a partial file
+        temp_path = full_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, full_path)
+
+    def read_bytes(self, path: str) -> Optional[bytes]:
+        try:
+            with open(os.path.join(self.root, path), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def list(self, prefix: str = '') -> List[str]:
+        paths = []
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, '/')
+                if path.startswith(prefix):
+                    paths.append(path)
+        return sorted(paths)
+
+
+class S3Sink:
+    """
+    Export target in an S3 bucket (or any client with the same API)
+
+    Args:
+        client: boto3 S3 client
+        bucket: Bucket name
+        prefix: Key prefix for the export root
+    """
+
+    def __init__(self, client: Any, bucket: str, prefix: str = '') -> None:
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+
+    def write_bytes(self, path: str, data: bytes) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + path, Body=data)
+
+    def read_bytes(self, path: str) -> Optional[bytes]:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.prefix + path)
+        except Exception as e:
+            if getattr(e, 'response', {}).get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return None
+            raise
+        return response['Body'].read()
+
+    def list(self, prefix: str = '') -> List[str]:
+        paths = []
+        params = {'Bucket': self.bucket, 'Prefix': self.prefix + prefix}
+        while True:
+            response = self.client.list_objects_v2(**params)
+            paths.extend(entry['Key'][len(self.prefix):] for entry in response.get('Contents', []))
+            if not response.get('IsTruncated'):
+                return paths
+            params['ContinuationToken'] = response['NextContinuationToken']
+
+
+# --------------------------------------------------------------------------
+# Columnar encoding
+# --------------------------------------------------------------------------
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def to_columns(items: Iterable[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """
+    Pivot event items into columns
+
+    Args:
+        items: Decoded Events table items
+
+    Returns:
+        Column name -> list of values (None where an item lacks the attribute)
+    """
+    columns: Dict[str, List[Any]] = {name: [] for name in COLUMN_NAMES}
+    for item in items:
+        extra = {
+            name: value for name, value in item.items()
+            if name not in columns and name not in DROPPED_ATTRIBUTES
+        }
+        for name in COLUMN_NAMES[:-1]:
+            columns[name].append(item.get(name))
+        columns['attributes'].append(json.dumps(extra, sort_keys=True, default=_json_default) if extra else None)
+    return columns
+
+
+def from_columns(columns: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """
+    Rebuild event items from columns, the inverse of to_columns()
+
+    Attributes that were absent from the item are left out again.
+    """
+    items = []
+    for row in zip(*(columns[name] for name in COLUMN_NAMES)):
+        item = {name: value for name, value in zip(COLUMN_NAMES[:-1], row[:-1]) if value is not None}
+        if row[-1]:
+            item.update(json.loads(row[-1]))
+        items.append(item)
+    return items
+
+
+def encode_columns(columns: Dict[str, List[Any]], fmt: str) -> bytes:
+    """
+    Serialize columns as one file in the given format
+
+    Raises:
+        ImportError: For the parquet format without pyarrow installed
+    """
+    if fmt == 'json':
+        return gzip.compress(json.dumps(columns, separators=(',', ':')).encode('utf-8'), mtime=0)
+
+    if pa is None:
+        raise ImportError("The parquet export format requires the 'pyarrow' package")
+    schema = pa.schema([(name, getattr(pa, type_name)()) for name, type_name in EVENT_COLUMNS])
+    buffer = io.BytesIO()
+    pq.write_table(pa.Table.from_pydict(columns, schema=schema), buffer, compression='zstd')
+    return buffer.getvalue()
+
+
+def decode_columns(data: bytes, fmt: str) -> Dict[str, List[Any]]:
+    """
+    Deserialize a file written by encode_columns()
+
+    Raises:
+        ImportError: For the parquet format without pyarrow installed
+    """
+    if fmt == 'json':
+        return json.loads(gzip.decompress(data))
+
+    if pa is None:
+        raise ImportError("Reading parquet exports requires the 'pyarrow' package")
+    return pq.read_table(io.BytesIO(data)).to_pydict()
+
+
+# --------------------------------------------------------------------------
+# Partitions
+# --------------------------------------------------------------------------
+
+def day_of(timestamp: int) -> str:
+    """UTC date of a millisecond timestamp as YYYY-MM-DD"""
+    return datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+def partition_file_path(date: str, device_id: str, first_ts: int, last_ts: int, fmt: str) -> str:
+    """Path of one exported file relative to the export root"""
+    return (f"date={date}/device_id={quote(device_id, safe='')}/"
+            f"part-{first_ts}-{last_ts}{FILE_EXTENSIONS[fmt]}")
+
+
+def parse_partition_path(path: str) -> Optional[Tuple[str, str, str]]:
+    """
+    Split an exported file path into its partition values
+
+    Returns:
+        (date, device_id, format), or None for paths that are not export files
+    """
+    parts = path.split('/')
+    if len(parts) != 3 or not parts[0].startswith('date=') or not parts[1].startswith('device_id='):
+        return None
+    for fmt, extension in FILE_EXTENSIONS.items():
+        if parts[2].endswith(extension):
+            return parts[0][len('date='):], unquote(parts[1][len('device_id='):]), fmt
+    return None
+
+
+# --------------------------------------------------------------------------
+# Export
+# --------------------------------------------------------------------------
+
+class EventExporter:
+    """
+    Incremental export of the Events table into a sink
+
+    Args:
+        dynamodb: FastDynamoDB over the low-level client
+        sink: LocalDirectorySink, S3Sink or compatible
+        fmt: 'parquet' or 'json'
+        settle_seconds: Events newer than this are left for the next run
+        devices_table: Devices table name
+        events_table: Events table name
+    """
+
+    def __init__(self, dynamodb: FastDynamoDB, sink: Any, fmt: Optional[str] = None,
+                 settle_seconds: float = DEFAULT_SETTLE_SECONDS,
+                 devices_table: str = DEVICES_TABLE, events_table: str = EVENTS_TABLE) -> None:
+        fmt = fmt or default_format()
+        if fmt not in FORMATS:
+            raise ValueError(f"Export format must be one of {', '.join(FORMATS)}, got {fmt!r}")
+        if fmt == 'parquet' and pa is None:
+            raise ImportError("The parquet export format requires the 'pyarrow' package")
+        self.sink = sink
+        self.fmt = fmt
+        self.settle_ms = int(settle_seconds * 1000)
+        self.devices_table = dynamodb.table(devices_table, DEVICES_KEY_SCHEMA)
+        self.events_table = dynamodb.table(events_table, EVENTS_KEY_SCHEMA)
+
+    def load_checkpoint(self) -> Dict[str, int]:
+        """Last exported event timestamp per device"""
+        data = self.sink.read_bytes(CHECKPOINT_PATH)
+        return json.loads(data)['devices'] if data else {}
+
+    def save_checkpoint(self, checkpoint: Dict[str, int]) -> None:
+        body = {'devices': checkpoint, 'updated_at': int(time.time() * 1000)}
+        self.sink.write_bytes(CHECKPOINT_PATH, json.dumps(body, sort_keys=True).encode('utf-8'))
+
+    def device_ids(self) -> Iterator[str]:
+        """Every device in the Devices table, keys only"""
+        params = {'ProjectionExpression': 'device_id'}
+        while True:
+            response = self.devices_table.scan(**params)
+            for item in response.get('Items', []):
+                yield item['device_id']
+            if 'LastEvaluatedKey' not in response:
+                return
+            params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def device_events(self, device_id: str, since: int, until: int) -> Iterator[Dict[str, Any]]:
+        """A device's events with since <= timestamp <= until, oldest first"""
+        params = {
+            'KeyConditionExpression': EVENTS_RANGE_CONDITION,
+            'ExpressionAttributeNames': {'#ts': 'timestamp'},
+            'ExpressionAttributeValues': {':device_id': device_id, ':since': since, ':until': until}
+        }
+        while True:
+            response = self.events_table.query(**params)
+            yield from response.get('Items', [])
+            if 'LastEvaluatedKey' not in response:
+                return
+            params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def export_device(self, device_id: str, since: int, until: int) -> Dict[str, int]:
+        """
+        Write a device's events into one file per UTC day
+
+        Returns:
+            Counts of events, files and bytes written, and the last exported timestamp
+        """
+        stats = {'events': 0, 'files': 0, 'bytes': 0, 'last_timestamp': since - 1}
+        batch: List[Dict[str, Any]] = []
+        batch_day = None
+
+        def flush() -> None:
+            if not batch:
+                return
+            first_ts, last_ts = batch[0]['timestamp'], batch[-1]['timestamp']
+            data = encode_columns(to_columns(batch), self.fmt)
+            self.sink.write_bytes(partition_file_path(day_of(first_ts), device_id, first_ts, last_ts, self.fmt), data)
+            stats['events'] += len(batch)
+            stats['files'] += 1
+            stats['bytes'] += len(data)
+            stats['last_timestamp'] = last_ts
+            batch.clear()
+
+        for item in self.device_events(device_id, since, until):
+            day = item['timestamp'] // DAY_MS
+            if day != batch_day or len(batch) >= MAX_ROWS_PER_FILE:
+                flush()
+                batch_day = day
+            batch.append(item)
+        flush()
+        return stats
+
+    def run(self, now_ms: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Export every device's events since the checkpoint
+
+        Args:
+            now_ms: Current time in milliseconds (default: wall clock)
+
+        Returns:
+            Run summary with device, event, file and byte counts
+        """
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        until = now_ms - self.settle_ms
+        checkpoint = self.load_checkpoint()
+        summary = {'devices': 0, 'events': 0, 'files': 0, 'bytes': 0, 'until': until}
+
+        for device_id in self.device_ids():
+            since = checkpoint.get(device_id, -1) + 1
+            if since > until:
+                continue
+            stats = self.export_device(device_id, since, until)
+            summary['devices'] += 1
+            for name in ('events', 'files', 'bytes'):
+                summary[name] += stats[name]
+            if stats['events']:
+                checkpoint[device_id] = stats['last_timestamp']
+            if summary['devices'] % CHECKPOINT_EVERY == 0:
+                self.save_checkpoint(checkpoint)
+
+        self.save_checkpoint(checkpoint)
+        return summary
+
+
+# --------------------------------------------------------------------------
+# Reading
+# --------------------------------------------------------------------------
+
+def read_columns(sink: Any, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                 device_ids: Optional[Iterable[str]] = None) -> Dict[str, List[Any]]:
+    """
+    Read exported events as columns, sorted by device and timestamp
+
+    Partitions outside the date range or device list are skipped without
+    being read. Rows exported twice by an interrupted run are dropped.
+
+    Args:
+        sink: Sink the export was written to
+        start_date: First UTC date to include (YYYY-MM-DD), inclusive
+        end_date: Last UTC date to include (YYYY-MM-DD), inclusive
+        device_ids: Devices to include (default: all)
+
+    Returns:
+        Column name -> list of values
+    """
+    wanted = set(device_ids) if device_ids is not None else None
+    rows: Dict[Tuple[str, int], Tuple] = {}
+    for path in sink.list():
+        partition = parse_partition_path(path)
+        if partition is None:
+            continue
+        date, device_id, fmt = partition
+        if (start_date and date < start_date) or (end_date and date > end_date):
+            continue
+        if wanted is not None and device_id not in wanted:
+            continue
+        columns = decode_columns(sink.read_bytes(path), fmt)
+        for row in zip(*(columns[name] for name in COLUMN_NAMES)):
+            rows[(row[0], row[1])] = row
+
+    ordered = [rows[key] for key in sorted(rows)]
+    return {name: [row[index] for row in ordered] for index, name in enumerate(COLUMN_NAMES)}
+
+
+def read_events(sink: Any, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                device_ids: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+    """Read exported events as items (see read_columns)"""
+    return from_columns(read_columns(sink, start_date, end_date, device_ids))
+
+
+# --------------------------------------------------------------------------
+# CLI
+# --------------------------------------------------------------------------
+
+def make_sink(args: argparse.Namespace, client_factory: Callable[[str], Any]) -> Any:
+    if args.bucket:
+        return S3Sink(client_factory('s3'), args.bucket, args.prefix)
+    return LocalDirectorySink(args.output_dir)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Export PillBuddy event history to columnar files')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--output-dir', help='Local export directory')
+    target.add_argument('--bucket', help='S3 bucket for the export')
+    parser.add_argument('--prefix', default='', help='Key prefix inside --bucket')
+    parser.add_argument('--format', choices=FORMATS, default=None,
+                        help='File format (default: parquet if pyarrow is installed, else json)')
+    parser.add_argument('--settle-seconds', type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help='Leave events newer than this for the next run')
+    parser.add_argument('--devices-table', default=DEVICES_TABLE, help='Devices table name')
+    parser.add_argument('--events-table', default=EVENTS_TABLE, help='Events table name')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from pillbuddy_core.clients import make_client
+
+    args = parse_args(argv)
+    exporter = EventExporter(
+        FastDynamoDB(make_client('dynamodb')),
+        make_sink(args, make_client),
+        fmt=args.format,
+        settle_seconds=args.settle_seconds,
+        devices_table=args.devices_table,
+        events_table=args.events_table
+    )
+    print(json.dumps(exporter.run()))
+
+
+if __name__ == '__main__':
+    main()
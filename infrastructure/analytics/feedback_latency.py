@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+PillBuddy LED Feedback Latency Report
+
+Latency distributions for the time a user waits between returning a bottle
+and the command that turns its LED off, computed from the IoT Event
+Processor's logs. Every traced LED command logs one line (see
+pillbuddy_core.round_trip):
+
+    {"led_round_trip": {"device_to_iot": 180, "iot_to_lambda": 35,
+                        "lambda_to_commit": 12, "commit_to_publish": 20,
+                        "total": 247, "device_id": "esp32_001"}}
+
+Lines may carry a prefix (CloudWatch Logs exports put a timestamp and
+request id in front); everything else in the logs is ignored. For each hop
+the report gives the sample count, mean, p50, p90, p95, p99 and max in
+milliseconds.
+
+Usage:
+    cd infrastructure
+    aws logs filter-log-events --log-group-name /aws/lambda/PillBuddy_IoTEventProcessor \\
+        --filter-pattern led_round_trip --output text > processor.log
+    python analytics/feedback_latency.py processor.log [--device esp32_001] [--json]
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+from typing import Any, Dict, Iterable, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'layers', 'pillbuddy_core', 'python'))
+
+from pillbuddy_core.round_trip import HOPS, LOG_KEY  # noqa: E402
+
+PERCENTILES = (50, 90, 95, 99)
+HOP_NAMES = [hop for hop, _, _ in HOPS]
+MARKER = '{"' + LOG_KEY + '"'
+
+
+def parse_samples(lines: Iterable[str], device_ids: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Round-trip samples logged by the processor
+
+    Args:
+        lines: Log lines, in any order
+        device_ids: Only keep samples of these devices
+
+    Returns:
+        One {hop: milliseconds, 'device_id': ...} dict per LED command
+    """
+    devices = set(device_ids) if device_ids else None
+    samples = []
+    for line in lines:
+        start = line.find(MARKER)
+        if start < 0:
+            continue
+        try:
+            sample = json.JSONDecoder().raw_decode(line, start)[0][LOG_KEY]
+        except (ValueError, KeyError, TypeError):
+            continue
+        if devices is None or sample.get('device_id') in devices:
+            samples.append(sample)
+    return samples
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a sorted list"""
+    return ordered[max(1, math.ceil(len(ordered) * pct / 100.0)) - 1]
+
+
+def latency_distributions(samples: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Distribution of every hop over the samples
+
+    Returns:
+        hop -> {'count', 'mean', 'p50', 'p90', 'p95', 'p99', 'max'}; hops
+        without samples (device_to_iot for devices without a clock) are
+        left out
+    """
+    distributions = {}
+    for hop in HOP_NAMES:
+        values = sorted(sample[hop] for sample in samples if isinstance(sample.get(hop), (int, float)))
+        if not values:
+            continue
+        stats = {'count': len(values), 'mean': round(sum(values) / len(values), 1)}
+        for pct in PERCENTILES:
+            stats[f'p{pct}'] = percentile(values, pct)
+        stats['max'] = values[-1]
+        distributions[hop] = stats
+    return distributions
+
+
+def print_report(distributions: Dict[str, Dict[str, Any]]) -> None:
+    columns = ['count', 'mean'] + [f'p{pct}' for pct in PERCENTILES] + ['max']
+    print(f"{'hop (ms)':<20}" + ''.join(f"{column:>9}" for column in columns))
+    for hop, stats in distributions.items():
+        print(f"{hop:<20}" + ''.join(f"{stats[column]:>9}" for column in columns))
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='PillBuddy LED feedback latency from IoT Event Processor logs')
+    parser.add_argument('logs', nargs='*', help='Log files (default: stdin)')
+    parser.add_argument('--device', action='append', dest='device_ids', help='Limit to a device (repeatable)')
+    parser.add_argument('--json', action='store_true', help='Print the distributions as JSON')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    samples = []
+    for path in args.logs or ['-']:
+        if path == '-':
+            samples.extend(parse_samples(sys.stdin, args.device_ids))
+            continue
+        with open(path) as f:
+            samples.extend(parse_samples(f, args.device_ids))
+
+    distributions = latency_distributions(samples)
+    if args.json:
+        print(json.dumps(distributions, indent=2))
+    elif not samples:
+        print('No led_round_trip samples found')
+    else:
+        print_report(distributions)
+
+
+if __name__ == '__main__':
+    main()
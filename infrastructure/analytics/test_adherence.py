@@ -0,0 +1,185 @@
+"""
+Unit tests for the PillBuddy adherence analytics
+"""
+
+import unittest
+import tempfile
+import sys
+import os
+
+# Add this directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from event_export import LocalDirectorySink, to_columns, encode_columns, partition_file_path
+
+try:
+    import adherence
+    from pillbuddy_core.timeutil import DAY_MS, MINUTE_MS
+except ImportError:  # numpy is not installed
+    adherence = None
+
+# 2026-10-18 00:00:00 UTC
+DAY_START = 1792281600000
+HOUR_MS = 3600000
+
+
+def state(device_id, timestamp, slot, in_holder, event_type='slot_state_changed'):
+    return {
+        'device_id': device_id,
+        'timestamp': timestamp,
+        'event_type': event_type,
+        'slot': slot,
+        'state': 'in_holder' if in_holder else 'not_in_holder',
+        'in_holder': in_holder,
+        'sensor_level': 1 if in_holder else 0,
+        'sequence': 0
+    }
+
+
+def dose(device_id, timestamp, slot=1, out_ms=60000):
+    """Removal followed by a return out_ms later"""
+    return [state(device_id, timestamp, slot, False), state(device_id, timestamp + out_ms, slot, True)]
+
+
+@unittest.skipUnless(adherence, 'numpy not installed')
+class TestPrescriptionStats(unittest.TestCase):
+    """Test cases for per-prescription statistics"""
+
+    def stats(self, events, **options):
+        return adherence.prescription_stats(adherence.to_arrays(to_columns(events)), **options)
+
+    def test_daily_doses(self):
+        """Test dose count, time of day, intervals and out time"""
+        events = []
+        for day in range(3):
+            events += dose('esp32_001', DAY_START + day * DAY_MS + 8 * HOUR_MS, out_ms=30000 + day * 10000)
+
+        [stats] = self.stats(events, period_start=DAY_START, period_end=DAY_START + 3 * DAY_MS)
+
+        self.assertEqual(stats['device_id'], 'esp32_001')
+        self.assertEqual(stats['slot'], 1)
+        self.assertEqual(stats['doses'], 3)
+        self.assertEqual(stats['median_dose_minute_of_day'], 480.0)
+        self.assertEqual(stats['median_interval_hours'], 24.0)
+        self.assertEqual(stats['median_out_seconds'], 40.0)
+        self.assertEqual(stats['max_out_seconds'], 50.0)
+        self.assertEqual(stats['expected_doses'], 3)
+        self.assertEqual(stats['missed_doses'], 0)
+        self.assertEqual(stats['adherence'], 1.0)
+        self.assertFalse(stats['bottle_out'])
+
+    def test_missed_doses_against_cadence(self):
+        """Test that empty cadence windows count as missed doses"""
+        events = dose('esp32_001', DAY_START + 8 * HOUR_MS) + dose('esp32_001', DAY_START + 2 * DAY_MS + 20 * HOUR_MS)
+
+        [stats] = self.stats(events, doses_per_day=2, period_start=DAY_START, period_end=DAY_START + 3 * DAY_MS)
+
+        self.assertEqual(stats['expected_doses'], 6)
+        self.assertEqual(stats['doses_on_schedule'], 2)
+        self.assertEqual(stats['missed_doses'], 4)
+        self.assertEqual(stats['adherence'], 0.333)
+        self.assertEqual(stats['max_interval_hours'], 60.0)
+
+    def test_two_doses_in_one_window_count_once(self):
+        """Test that a double dose does not make up for a missed window"""
+        events = dose('esp32_001', DAY_START + 8 * HOUR_MS) + dose('esp32_001', DAY_START + 9 * HOUR_MS)
+
+        [stats] = self.stats(events, period_start=DAY_START, period_end=DAY_START + 2 * DAY_MS)
+
+        self.assertEqual(stats['doses'], 2)
+        self.assertEqual(stats['missed_doses'], 1)
+
+    def test_flaps_merge_into_one_dose(self):
+        """Test that removals within the dose gap are one dose"""
+        start = DAY_START + 8 * HOUR_MS
+        events = dose('esp32_001', start, out_ms=2000) + dose('esp32_001', start + 5000, out_ms=30000)
+
+        [stats] = self.stats(events, min_dose_gap_minutes=10)
+
+        self.assertEqual(stats['doses'], 1)
+        # Out time runs from the first removal to the final return
+        self.assertEqual(stats['median_out_seconds'], 35.0)
+
+    def test_open_removal_and_repeated_states(self):
+        """Test a bottle still out and duplicate state reports"""
+        events = dose('esp32_001', DAY_START + HOUR_MS) + [
+            state('esp32_001', DAY_START + 2 * HOUR_MS, 1, True),
+            state('esp32_001', DAY_START + 3 * HOUR_MS, 1, False),
+            state('esp32_001', DAY_START + 3 * HOUR_MS + 1000, 1, False),
+        ]
+
+        [stats] = self.stats(events)
+
+        self.assertEqual(stats['doses'], 2)
+        self.assertTrue(stats['bottle_out'])
+        self.assertEqual(stats['median_out_seconds'], 60.0)
+
+    def test_slots_and_devices_are_separate(self):
+        """Test that each (device, slot) gets its own statistics"""
+        events = (dose('esp32_002', DAY_START + HOUR_MS, slot=2)
+                  + dose('esp32_001', DAY_START + HOUR_MS, slot=3)
+                  + dose('esp32_001', DAY_START + 2 * HOUR_MS, slot=1)
+                  + [state('esp32_001', DAY_START, 1, True, event_type='slot_snapshot')])
+
+        results = self.stats(events)
+
+        self.assertEqual([(s['device_id'], s['slot'], s['doses']) for s in results],
+                         [('esp32_001', 1, 1), ('esp32_001', 3, 1), ('esp32_002', 2, 1)])
+        self.assertIsNone(results[0]['median_interval_hours'])
+
+    def test_multi_slot_events_expand_per_slot(self):
+        """Test that a swap of two bottles counts as a dose for each slot"""
+        swap = {'device_id': 'esp32_001', 'event_type': 'slot_states_changed', 'changed_mask': 3, 'sequence': 0}
+        events = [
+            dict(swap, timestamp=DAY_START + HOUR_MS, in_holder_mask=0),
+            dict(swap, timestamp=DAY_START + HOUR_MS + 60000, in_holder_mask=3),
+        ]
+
+        results = self.stats(events)
+
+        self.assertEqual([(s['slot'], s['doses'], s['median_out_seconds']) for s in results],
+                         [(1, 1, 60.0), (2, 1, 60.0)])
+
+    def test_no_events(self):
+        """Test empty history"""
+        self.assertEqual(self.stats([]), [])
+
+
+@unittest.skipUnless(adherence, 'numpy not installed')
+class TestAnalyzeFleet(unittest.TestCase):
+    """Test cases for fleet analysis from an export"""
+
+    def setUp(self):
+        self.events = []
+        for device in range(6):
+            device_id = f"esp32_{device:03d}"
+            for day in range(device % 3 + 1):
+                self.events += dose(device_id, DAY_START + day * DAY_MS + 8 * HOUR_MS, slot=device % 3 + 1)
+
+    def test_process_pool_matches_in_process(self):
+        """Test that chunked parallel results equal the single-process results"""
+        columns = to_columns(self.events)
+
+        serial = adherence.analyze_fleet(columns, processes=1)
+        parallel = adherence.analyze_fleet(columns, processes=2, devices_per_task=2)
+
+        self.assertEqual(len(serial), 6)
+        self.assertEqual(parallel, serial)
+
+    def test_analyze_sink(self):
+        """Test reading an export with a reporting period"""
+        with tempfile.TemporaryDirectory() as root:
+            sink = LocalDirectorySink(root)
+            device_events = [e for e in self.events if e['device_id'] == 'esp32_002']
+            sink.write_bytes(partition_file_path('2026-10-18', 'esp32_002', 0, 0, 'json'),
+                             encode_columns(to_columns(device_events), 'json'))
+
+            [stats] = adherence.analyze_sink(sink, start_date='2026-10-18', end_date='2026-10-21')
+
+        self.assertEqual(stats['doses'], 3)
+        self.assertEqual(stats['expected_doses'], 4)
+        self.assertEqual(stats['missed_doses'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,211 @@
+"""
+Unit tests for the PillBuddy event history export
+"""
+
+import unittest
+import tempfile
+import sys
+import os
+
+# Add this directory and the load-test stand-ins to path for imports
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, '..', 'loadtest'))
+
+from stand_ins import LocalAWS
+from pillbuddy_core.ddb_client import FastDynamoDB
+from pillbuddy_core.timeutil import DAY_MS, MINUTE_MS
+import event_export
+from event_export import (
+    EventExporter, LocalDirectorySink, S3Sink, read_columns, read_events,
+    to_columns, from_columns, partition_file_path, parse_partition_path
+)
+
+# 2026-10-18 00:00:00 UTC
+DAY_START = 1792281600000
+
+
+def event(device_id, timestamp, slot=1, in_holder=False, **extra):
+    item = {
+        'device_id': device_id,
+        'timestamp': timestamp,
+        'event_type': 'slot_state_changed',
+        'slot': slot,
+        'state': 'in_holder' if in_holder else 'not_in_holder',
+        'in_holder': in_holder,
+        'sensor_level': 1 if in_holder else 0,
+        'sequence': 0,
+        'ttl': timestamp // 1000 + 30 * 86400
+    }
+    item.update(extra)
+    return item
+
+
+class ExportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.aws = LocalAWS()
+        self.aws.dynamodb.create_table('PillBuddy_Devices', 'device_id')
+        self.aws.dynamodb.create_table('PillBuddy_Events', 'device_id', 'timestamp')
+        for device_id in ('esp32_001', 'esp32_002'):
+            self.aws.dynamodb.seed('PillBuddy_Devices', {'device_id': device_id, 'online': True})
+
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.sink = LocalDirectorySink(self.temp_dir.name)
+
+    def add_event(self, *args, **kwargs):
+        self.aws.dynamodb.seed('PillBuddy_Events', event(*args, **kwargs))
+
+    def exporter(self, sink=None, fmt='json', **kwargs):
+        return EventExporter(FastDynamoDB(self.aws.dynamodb), sink or self.sink, fmt=fmt, **kwargs)
+
+
+class TestEventExport(ExportTestCase):
+    """Test cases for exporting events into partitions"""
+
+    def test_partitions_by_date_and_device(self):
+        """Test that each device and UTC day gets its own file"""
+        self.add_event('esp32_001', DAY_START + 1000)
+        self.add_event('esp32_001', DAY_START + 2000, in_holder=True)
+        self.add_event('esp32_001', DAY_START + DAY_MS + 1000)
+        self.add_event('esp32_002', DAY_START + 5000, slot=2)
+
+        summary = self.exporter().run(now_ms=DAY_START + 3 * DAY_MS)
+
+        self.assertEqual(summary['events'], 4)
+        self.assertEqual(summary['files'], 3)
+        self.assertEqual(
+            [path for path in self.sink.list() if path.startswith('date=')],
+            [
+                partition_file_path('2026-10-18', 'esp32_001', DAY_START + 1000, DAY_START + 2000, 'json'),
+                partition_file_path('2026-10-18', 'esp32_002', DAY_START + 5000, DAY_START + 5000, 'json'),
+                partition_file_path('2026-10-19', 'esp32_001', DAY_START + DAY_MS + 1000,
+                                    DAY_START + DAY_MS + 1000, 'json'),
+            ]
+        )
+
+    def test_round_trip_drops_ttl(self):
+        """Test that exported events read back unchanged except for ttl"""
+        self.add_event('esp32_001', DAY_START + 1000, note='flap')
+
+        self.exporter().run(now_ms=DAY_START + DAY_MS)
+
+        expected = event('esp32_001', DAY_START + 1000, note='flap')
+        del expected['ttl']
+        self.assertEqual(read_events(self.sink), [expected])
+
+    def test_incremental_runs_read_only_new_events(self):
+        """Test that a second run starts from the checkpoint"""
+        self.add_event('esp32_001', DAY_START + 1000)
+        self.exporter().run(now_ms=DAY_START + DAY_MS)
+        first_read = self.aws.dynamodb.consumed['PillBuddy_Events']['read']
+
+        self.add_event('esp32_001', DAY_START + DAY_MS + 1000)
+        summary = self.exporter().run(now_ms=DAY_START + 2 * DAY_MS)
+
+        self.assertEqual(summary['events'], 1)
+        self.assertEqual(self.exporter().load_checkpoint(), {'esp32_001': DAY_START + DAY_MS + 1000})
+        self.assertEqual(
+            [item['timestamp'] for item in read_events(self.sink)],
+            [DAY_START + 1000, DAY_START + DAY_MS + 1000]
+        )
+        # Only the new event was read, not the whole partition again
+        self.assertEqual(self.aws.dynamodb.consumed['PillBuddy_Events']['read'], first_read * 2)
+
+    def test_settle_window_defers_recent_events(self):
+        """Test that events inside the settle window wait for the next run"""
+        now = DAY_START + 10 * MINUTE_MS
+        self.add_event('esp32_001', now - 10 * MINUTE_MS)
+        self.add_event('esp32_001', now - MINUTE_MS)
+
+        summary = self.exporter(settle_seconds=300).run(now_ms=now)
+        self.assertEqual(summary['events'], 1)
+
+        summary = self.exporter(settle_seconds=300).run(now_ms=now + 10 * MINUTE_MS)
+        self.assertEqual(summary['events'], 1)
+        self.assertEqual(len(read_events(self.sink)), 2)
+
+    def test_interrupted_run_duplicates_are_dropped(self):
+        """Test that rows exported twice are read back once"""
+        self.add_event('esp32_001', DAY_START + 1000)
+        self.add_event('esp32_001', DAY_START + 2000)
+        self.exporter().run(now_ms=DAY_START + DAY_MS)
+
+        # Lose the checkpoint, as if the run died before saving it
+        self.sink.write_bytes(event_export.CHECKPOINT_PATH, b'{"devices": {}}')
+        self.add_event('esp32_001', DAY_START + 3000)
+        self.exporter().run(now_ms=DAY_START + DAY_MS)
+
+        self.assertEqual(
+            [item['timestamp'] for item in read_events(self.sink)],
+            [DAY_START + 1000, DAY_START + 2000, DAY_START + 3000]
+        )
+
+    def test_s3_sink(self):
+        """Test exporting into an object store"""
+        self.add_event('esp32_001', DAY_START + 1000)
+        sink = S3Sink(self.aws.client('s3'), 'history', prefix='pillbuddy/events/')
+
+        self.exporter(sink=sink).run(now_ms=DAY_START + DAY_MS)
+
+        keys = sorted(key for _, key in self.aws.s3.objects)
+        self.assertIn('pillbuddy/events/_checkpoint.json', keys)
+        self.assertEqual(len(read_events(sink)), 1)
+        self.assertEqual(sink.read_bytes('missing.json'), None)
+
+    def test_unknown_format(self):
+        """Test that an unknown format is rejected"""
+        with self.assertRaises(ValueError):
+            self.exporter(fmt='csv')
+
+    @unittest.skipUnless(event_export.pa is not None, 'pyarrow not installed')
+    def test_parquet_round_trip(self):
+        """Test the Parquet format end to end"""
+        self.add_event('esp32_001', DAY_START + 1000, note='flap')
+        self.exporter(fmt='parquet').run(now_ms=DAY_START + DAY_MS)
+
+        self.assertTrue(any(path.endswith('.parquet') for path in self.sink.list()))
+        self.assertEqual(read_events(self.sink)[0]['note'], 'flap')
+
+
+class TestReadColumns(ExportTestCase):
+    """Test cases for reading exported partitions"""
+
+    def setUp(self):
+        super().setUp()
+        for day in range(3):
+            self.add_event('esp32_001', DAY_START + day * DAY_MS + 1000)
+            self.add_event('esp32_002', DAY_START + day * DAY_MS + 1000)
+        self.exporter().run(now_ms=DAY_START + 4 * DAY_MS)
+
+    def test_date_and_device_pruning(self):
+        """Test that only the requested partitions are read"""
+        read = []
+        original = self.sink.read_bytes
+        self.sink.read_bytes = lambda path: read.append(path) or original(path)
+
+        columns = read_columns(self.sink, start_date='2026-10-19', end_date='2026-10-20', device_ids=['esp32_002'])
+
+        self.assertEqual(columns['device_id'], ['esp32_002', 'esp32_002'])
+        self.assertEqual(columns['timestamp'], [DAY_START + DAY_MS + 1000, DAY_START + 2 * DAY_MS + 1000])
+        self.assertEqual(len(read), 2)
+
+    def test_columns_round_trip(self):
+        """Test that to_columns and from_columns are inverses"""
+        items = [event('esp32_001', 1, extra_field=[1, 2]), {'device_id': 'esp32_001', 'timestamp': 2}]
+        for item in items:
+            item.pop('ttl', None)
+
+        self.assertEqual(from_columns(to_columns(items)), items)
+
+    def test_parse_partition_path(self):
+        """Test partition values are parsed back from paths"""
+        path = partition_file_path('2026-10-18', 'esp/32', 1, 2, 'json')
+
+        self.assertEqual(parse_partition_path(path), ('2026-10-18', 'esp/32', 'json'))
+        self.assertIsNone(parse_partition_path('_checkpoint.json'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+"""
+Unit tests for the PillBuddy LED feedback latency report
+"""
+
+import unittest
+import contextlib
+import io
+import json
+import tempfile
+import sys
+import os
+
+# Add this directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import feedback_latency
+from feedback_latency import latency_distributions, parse_samples
+
+
+def log_line(device_id, total, **hops):
+    sample = dict(hops, total=total, device_id=device_id)
+    return f"2026-10-18T08:00:00.000Z\t0f1e2d3c\t{json.dumps({'led_round_trip': sample})}\n"
+
+
+class TestFeedbackLatency(unittest.TestCase):
+    """Test cases for parsing and summarizing round-trip samples"""
+
+    def setUp(self):
+        self.lines = [
+            'START RequestId: 0f1e2d3c Version: $LATEST\n',
+            "Published LED command to esp32_001: {'action': 'turn_off', 'slot': 1}\n",
+            '{"led_round_trip": truncated\n',
+        ] + [log_line('esp32_001', 100 + i, iot_to_lambda=i) for i in range(1, 101)] + [
+            log_line('esp32_002', 1000, device_to_iot=900, iot_to_lambda=100)
+        ]
+
+    def test_parse_samples(self):
+        """Test that prefixed sample lines are kept and everything else skipped"""
+        self.assertEqual(len(parse_samples(self.lines)), 101)
+        self.assertEqual(parse_samples(self.lines, ['esp32_002']),
+                         [{'device_to_iot': 900, 'iot_to_lambda': 100, 'total': 1000, 'device_id': 'esp32_002'}])
+
+    def test_distributions(self):
+        """Test nearest-rank percentiles per hop, with hops missing from some samples"""
+        distributions = latency_distributions(parse_samples(self.lines))
+
+        self.assertEqual(distributions['iot_to_lambda']['count'], 101)
+        self.assertEqual(distributions['iot_to_lambda']['p50'], 51)
+        self.assertEqual(distributions['iot_to_lambda']['p99'], 100)
+        self.assertEqual(distributions['total']['max'], 1000)
+        self.assertEqual(distributions['device_to_iot']['count'], 1)
+        self.assertNotIn('lambda_to_commit', distributions)
+
+    def test_main(self):
+        """Test the JSON report from a log file"""
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'processor.log')
+            with open(path, 'w') as f:
+                f.writelines(self.lines)
+
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                feedback_latency.main([path, '--device', 'esp32_001', '--json'])
+
+        self.assertEqual(json.loads(output.getvalue())['total']['p50'], 150)
+
+
+if __name__ == '__main__':
+    unittest.main()
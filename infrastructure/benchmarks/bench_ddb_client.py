@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: ddb_client fast path vs. boto3 DynamoDB resource layer
+
+Measures per-call CPU time for the DynamoDB operations on the PillBuddy hot
+paths. No network is used: a botocore 'before-send' hook answers every
+request with a canned HTTP response, so both layers pay the same signing,
+serialization and parsing cost in botocore and the difference is the
+resource-layer overhead.
+
+Usage:
+    cd infrastructure
+    python benchmarks/bench_ddb_client.py [--iterations 5000]
+
+Requires boto3 (pip install boto3).
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import boto3
+from botocore.awsrequest import AWSResponse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'layers', 'pillbuddy_core', 'python'))
+
+from pillbuddy_core.ddb_client import FastDynamoDB, PRESCRIPTIONS_KEY_SCHEMA  # noqa: E402
+
+PRESCRIPTION_ITEM = {
+    'device_id': {'S': 'esp32_001'},
+    'slot': {'N': '1'},
+    'prescription_name': {'S': 'Aspirin'},
+    'pill_count': {'N': '30'},
+    'initial_count': {'N': '30'},
+    'has_refills': {'BOOL': True},
+    'created_at': {'N': '1700000000000'},
+    'updated_at': {'N': '1700000000000'},
+    'removal_timestamp': {'NULL': True}
+}
+
+CANNED_RESPONSES = {
+    'DynamoDB_20120810.GetItem': {'Item': PRESCRIPTION_ITEM},
+    'DynamoDB_20120810.PutItem': {},
+    'DynamoDB_20120810.UpdateItem': {},
+    'DynamoDB_20120810.Query': {'Items': [PRESCRIPTION_ITEM] * 3, 'Count': 3, 'ScannedCount': 3},
+}
+
+
+class _RawBody:
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+def _canned_response(request, **kwargs):
+    target = request.headers.get('X-Amz-Target')
+    if isinstance(target, bytes):
+        target = target.decode()
+    body = json.dumps(CANNED_RESPONSES[target]).encode()
+    return AWSResponse(request.url, 200, {'Content-Type': 'application/x-amz-json-1.0'}, _RawBody(body))
+
+
+def _make_session():
+    session = boto3.session.Session(
+        aws_access_key_id='bench', aws_secret_access_key='bench', region_name='us-east-1'
+    )
+    session.events.register('before-send.dynamodb', _canned_response)
+    return session
+
+
+def _operations(table):
+    key = {'device_id': 'esp32_001', 'slot': 1}
+    item = {
+        'device_id': 'esp32_001', 'slot': 1, 'prescription_name': 'Aspirin', 'pill_count': 30,
+        'initial_count': 30, 'has_refills': True, 'created_at': 1700000000000,
+        'updated_at': 1700000000000, 'removal_timestamp': None
+    }
+    return {
+        'get_item': lambda: table.get_item(Key=key),
+        'put_item': lambda: table.put_item(Item=item),
+        'update_item': lambda: table.update_item(
+            Key=key,
+            UpdateExpression='SET pill_count = :count, removal_timestamp = :timestamp, updated_at = :timestamp',
+            ExpressionAttributeValues={':count': 29, ':timestamp': 1700000000000}
+        ),
+        'query': lambda: table.query(
+            KeyConditionExpression='device_id = :device_id',
+            ExpressionAttributeValues={':device_id': 'esp32_001'}
+        ),
+    }
+
+
+def _time_per_call_us(func, iterations):
+    for _ in range(min(100, iterations)):
+        func()
+    start = time.process_time()
+    for _ in range(iterations):
+        func()
+    return (time.process_time() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=5000)
+    args = parser.parse_args()
+
+    import_start = time.process_time()
+    resource_table = _make_session().resource('dynamodb').Table('PillBuddy_Prescriptions')
+    resource_setup_ms = (time.process_time() - import_start) * 1000
+
+    fast_start = time.process_time()
+    fast_table = FastDynamoDB(_make_session().client('dynamodb')).table(
+        'PillBuddy_Prescriptions', PRESCRIPTIONS_KEY_SCHEMA
+    )
+    fast_setup_ms = (time.process_time() - fast_start) * 1000
+
+    print(f"Setup CPU: resource {resource_setup_ms:.1f} ms, fast path {fast_setup_ms:.1f} ms")
+    print(f"{'operation':<12} {'resource us':>12} {'fast us':>10} {'saving':>8}")
+
+    resource_ops = _operations(resource_table)
+    fast_ops = _operations(fast_table)
+    for name in resource_ops:
+        resource_us = _time_per_call_us(resource_ops[name], args.iterations)
+        fast_us = _time_per_call_us(fast_ops[name], args.iterations)
+        saving = (1 - fast_us / resource_us) * 100
+        print(f"{name:<12} {resource_us:>12.1f} {fast_us:>10.1f} {saving:>7.1f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: compact binary device events vs. JSON
+
+Measures per-event CPU time from the bytes a device publishes to the event
+the IoT Event Processor works on. The JSON path parses the payload and
+applies the rule projection (iot_rule_sql.apply_event_rule); the binary
+path decodes the base64 the binary rule forwards and unpacks the struct
+(pillbuddy_core.event_codec). Payload sizes are printed alongside, since
+bytes on the device link are what the binary format saves most.
+
+Usage:
+    cd infrastructure
+    python benchmarks/bench_event_decoding.py [--iterations 100000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, os.path.join(HERE, '..', 'layers', 'pillbuddy_core', 'python'))
+
+from iot_rule_sql import apply_binary_rule, apply_event_rule  # noqa: E402
+from pillbuddy_core.event_codec import decode_forwarded_event, encode_event  # noqa: E402
+
+TOPIC = 'pillbuddy/events/esp32_001'
+RECEIVED_MS = 1792281600000
+
+PAYLOADS = {
+    'state_changed': {'event_type': 'slot_state_changed', 'slot': 2, 'in_holder': False,
+                      'sequence': 41, 'ts_ms': 1792281599000},
+    'states_changed': {'event_type': 'slot_states_changed', 'changed_mask': 3, 'in_holder_mask': 2,
+                       'sequence': 42, 'ts_ms': 1792281599500},
+    'snapshot': {'event_type': 'slot_snapshot', 'in_holder_mask': 7, 'sequence': 1, 'ts_ms': 1792281500000},
+}
+
+
+def _time_per_call_us(func, iterations):
+    for _ in range(min(100, iterations)):
+        func()
+    start = time.process_time()
+    for _ in range(iterations):
+        func()
+    return (time.process_time() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"{'event':<15} {'json B':>7} {'bin B':>6} {'json us':>8} {'bin us':>7} {'saving':>8}")
+    for name, payload in PAYLOADS.items():
+        json_payload = json.dumps(payload, separators=(',', ':')).encode()
+        binary_payload = encode_event(payload)
+        forwarded = apply_binary_rule(binary_payload, TOPIC + '/bin', RECEIVED_MS)
+        assert decode_forwarded_event(forwarded) == apply_event_rule(payload, TOPIC, RECEIVED_MS)
+
+        json_us = _time_per_call_us(
+            lambda: apply_event_rule(json.loads(json_payload), TOPIC, RECEIVED_MS), args.iterations
+        )
+        binary_us = _time_per_call_us(lambda: decode_forwarded_event(forwarded), args.iterations)
+        saving = (1 - binary_us / json_us) * 100
+        print(f"{name:<15} {len(json_payload):>7} {len(binary_payload):>6} "
+              f"{json_us:>8.2f} {binary_us:>7.2f} {saving:>7.1f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Hot-path cases shared by the PillBuddy micro-benchmarks
+
+Loads the three lambdas against the in-memory AWS stand-ins from
+loadtest/ and exposes one zero-argument callable per hot function, so
+the CPU and allocation benchmarks measure exactly the same work.
+"""
+
+import itertools
+import os
+import sys
+from typing import Callable, Dict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'loadtest'))
+
+from stand_ins import LocalAWS  # noqa: E402
+from fleet_harness import load_lambda, seed_fleet, START_MS  # noqa: E402
+
+# Large enough that repeated removals never floor the count at zero
+BENCH_PILL_COUNT = 10 ** 9
+
+# Spacing of benchmarked slot events, longer than the debounce window
+EVENT_INTERVAL_MS = 60 * 1000
+
+COMBINED_SLOTS = {
+    '1': {'slot_number': 1, 'prescription_name': 'Aspirin', 'pill_count': 30, 'in_holder': True},
+    '2': {'slot_number': 2, 'prescription_name': 'Ibuprofen', 'pill_count': 5, 'in_holder': True},
+    '3': {'slot_number': 3, 'prescription_name': None, 'pill_count': 0, 'in_holder': False}
+}
+
+
+def build_cases() -> Dict[str, Callable[[], object]]:
+    """
+    Load the lambdas against fresh stand-ins and build the benchmark cases
+
+    Returns:
+        Case name -> zero-argument callable
+    """
+    aws = LocalAWS()
+    device_id = seed_fleet(aws, 1, 3, BENCH_PILL_COUNT)[0]
+    user_id = f"amzn1.ask.account.{device_id}"
+
+    processor = load_lambda('iot_event_processor', 'bench_iot_event_processor', aws)
+    checker = load_lambda('timeout_checker', 'bench_timeout_checker', aws)
+    alexa = load_lambda('alexa_handler', 'bench_alexa_handler', aws)
+
+    removal_event = {
+        'device_id': device_id,
+        'event_type': 'slot_state_changed',
+        'slot': 1,
+        'in_holder': False
+    }
+    # Every call is a new removal past the debounce window; replaying one
+    # timestamp would only measure the stale-event rejection
+    removal_times = itertools.count(START_MS, EVENT_INTERVAL_MS)
+    prescription = processor.get_prescription(device_id, 2)
+    removed_prescription = dict(prescription, removal_timestamp=START_MS)
+    query_event = {
+        'session': {'user': {'userId': user_id}},
+        'context': {'System': {'device': {'supportedInterfaces': {'Alexa.Presentation.APL': {}}}}},
+        'request': {'type': 'IntentRequest', 'intent': {'name': 'QueryStatusIntent'}}
+    }
+    apl_datasources = alexa.build_apl_datasources(COMBINED_SLOTS)
+
+    return {
+        'handle_slot_state_changed': lambda: processor.handle_slot_state_changed(
+            dict(removal_event, ts_ms=next(removal_times))
+        ),
+        # Each removal decrements the stored count, so pass the current item as
+        # the handler would; a stale one fails the pill_count condition
+        'process_bottle_removal': lambda: processor.process_bottle_removal(
+            device_id, 2, processor.get_prescription(device_id, 2), START_MS
+        ),
+        'check_bottle_return_timeout': lambda: checker.check_bottle_return_timeout(
+            removed_prescription, START_MS + 11 * 60 * 1000
+        ),
+        'build_apl_datasources': lambda: alexa.build_apl_datasources(COMBINED_SLOTS),
+        'build_response': lambda: alexa.build_response(
+            'Slot 1 has Aspirin with 30 pills remaining.',
+            should_end_session=True,
+            apl_document={'type': 'APL', 'version': '1.6'},
+            apl_datasources=apl_datasources
+        ),
+        'handle_query_status_intent': lambda: alexa.handle_query_status_intent(device_id, query_event),
+    }
+
+
+CASE_NAMES = [
+    'handle_slot_state_changed',
+    'process_bottle_removal',
+    'check_bottle_return_timeout',
+    'build_apl_datasources',
+    'build_response',
+    'handle_query_status_intent',
+]
@@ -0,0 +1,91 @@
+"""
+Allocation regression tests for the PillBuddy handler hot functions
+
+Measures peak bytes allocated per call with tracemalloc and fails when a
+function allocates more than ALLOCATION_TOLERANCE times its stored
+baseline (plus a small fixed slack for interpreter noise). Baselines live
+in baselines/allocations.json.
+
+To record new baselines after an intentional change:
+    PILLBUDDY_UPDATE_BASELINES=1 python -m pytest benchmarks/test_hot_path_allocations.py
+"""
+
+import contextlib
+import json
+import os
+import statistics
+import sys
+import tracemalloc
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from hot_paths import build_cases, CASE_NAMES  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'allocations.json')
+UPDATE_BASELINES = os.environ.get('PILLBUDDY_UPDATE_BASELINES') == '1'
+
+ALLOCATION_TOLERANCE = 1.25
+ALLOCATION_SLACK_BYTES = 2048
+WARMUP_CALLS = 20
+MEASURED_CALLS = 15
+
+
+@pytest.fixture(scope='module')
+def cases():
+    return build_cases()
+
+
+@pytest.fixture(scope='module')
+def baselines():
+    stored = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            stored = json.load(f)
+    yield stored
+    if UPDATE_BASELINES:
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+
+def peak_bytes_per_call(func):
+    """
+    Median peak allocation of a single call, in bytes
+    """
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(WARMUP_CALLS):
+            func()
+
+        samples = []
+        tracemalloc.start()
+        try:
+            for _ in range(MEASURED_CALLS):
+                tracemalloc.reset_peak()
+                baseline_current, _ = tracemalloc.get_traced_memory()
+                func()
+                _, peak = tracemalloc.get_traced_memory()
+                samples.append(peak - baseline_current)
+        finally:
+            tracemalloc.stop()
+
+    return int(statistics.median(samples))
+
+
+@pytest.mark.parametrize('case_name', CASE_NAMES)
+def test_allocations_within_baseline(case_name, cases, baselines):
+    """Test that peak allocation per call has not regressed past the tolerance"""
+    measured = peak_bytes_per_call(cases[case_name])
+    
+    if UPDATE_BASELINES:
+        baselines[case_name] = measured
+        return
+    if case_name not in baselines:
+        pytest.skip(f"No allocation baseline for {case_name}")
+    
+    limit = baselines[case_name] * ALLOCATION_TOLERANCE + ALLOCATION_SLACK_BYTES
+    assert measured <= limit, (
+        f"{case_name} allocates {measured} bytes per call, baseline {baselines[case_name]} "
+        f"(limit {int(limit)})"
+    )
@@ -0,0 +1,49 @@
+"""
+CPU-time benchmarks for the PillBuddy handler hot functions
+
+Requires pytest-benchmark (see requirements-dev.txt); the module is skipped
+without it. These runs are for measuring a change by hand, not a gate: CPU
+time on shared runners varies by well over 15% between identical runs, so
+no CPU baseline is committed and nothing here fails on a slowdown.
+Regressions are gated by the deterministic allocation baselines in
+test_hot_path_allocations.py.
+
+To compare a change against the parent commit on one machine:
+    python -m pytest benchmarks/test_hot_path_cpu.py \\
+        --benchmark-timer=time.process_time --benchmark-save=before
+    # apply the change
+    python -m pytest benchmarks/test_hot_path_cpu.py \\
+        --benchmark-timer=time.process_time --benchmark-compare
+"""
+
+import contextlib
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from hot_paths import build_cases, CASE_NAMES  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def cases():
+    return build_cases()
+
+
+@pytest.fixture
+def quiet():
+    # Handlers log every call; keep benchmark output readable
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+@pytest.mark.parametrize('case_name', CASE_NAMES)
+def test_cpu_time(benchmark, case_name, cases, quiet):
+    """Benchmark CPU time per call of a hot function"""
+    benchmark.group = 'hot-paths'
+    benchmark.extra_info['function'] = case_name
+    benchmark(cases[case_name])
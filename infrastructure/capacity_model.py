@@ -0,0 +1,383 @@
+"""
+PillBuddy DynamoDB Capacity Model
+
+Derives read and write capacity for each table from the handlers' access
+patterns and a fleet profile, then plans either target-tracking
+autoscaling or on-demand billing per table. PillBuddyStack reads the
+fleet profile from CDK context, e.g.:
+
+    cdk deploy -c fleet_devices=2000 -c fleet_doses_per_day=2 -c capacity_mode=auto
+
+Access patterns per invocation (items are all under 1 KB, reads are
+eventually consistent):
+
+    Bottle event (IoT Event Processor, removal or return):
+        Events        PutItem                        1 WCU
+        Devices       UpdateItem (slot state, seq)   1 WCU
+        Prescriptions GetItem + UpdateItem           0.5 RCU, 1 WCU
+        DailyDoses    UpdateItem (dose counter)      1 WCU           (removals only)
+
+    Voice query (QueryStatusIntent):
+        UserDevices   GetItem                        0.5 RCU on a resolver cache miss
+        Devices       BatchGetItem (device item)     0.5 RCU
+        Prescriptions BatchGetItem (one per slot)    0.5 RCU each
+
+    Sweep (Timeout Checker):
+        Prescriptions Scan of the whole table        0.5 RCU per 4 KB scanned
+
+Doses are the load peak: the whole fleet removes and returns its bottles
+inside a dose window of a few minutes, so the peak rate is far above the
+daily average. Target tracking reacts over minutes, so when a table's
+peak-to-average ratio is above MAX_AUTOSCALING_PEAK_RATIO (or on-demand
+is cheaper anyway) 'auto' mode picks on-demand billing.
+
+Context keys (all optional):
+    fleet_devices: Number of devices (default 100)
+    fleet_slots_per_device: Slots per device (default 3)
+    fleet_doses_per_day: Doses per slot per day (default 2)
+    fleet_dose_window_minutes: Minutes in which the fleet takes one dose (default 30)
+    fleet_queries_per_device_per_day: Voice status queries (default 2)
+    fleet_sweep_interval_minutes: Timeout Checker interval, 0 if not scheduled (default 5)
+    fleet_flap_rate: Extra removal/return pairs per dose from sensor flaps (default 0)
+    capacity_mode: 'auto', 'provisioned' or 'on_demand' (default auto)
+    autoscaling_target_utilization: Target utilization percent (default 70)
+"""
+
+import math
+from typing import Any, Callable, Dict, Optional
+
+# Table keys used in plans, matching the construct ids in PillBuddyStack
+DEVICES = 'DevicesTable'
+PRESCRIPTIONS = 'PrescriptionsTable'
+EVENTS = 'EventsTable'
+USER_DEVICES = 'UserDevicesTable'
+DAILY_DOSES = 'DailyDosesTable'
+TABLES = (DEVICES, PRESCRIPTIONS, EVENTS, USER_DEVICES, DAILY_DOSES)
+
+# Approximate stored item size per prescription, used for sweep scan cost
+PRESCRIPTION_ITEM_BYTES = 250
+
+# Fraction of voice queries that miss the warm-container user mapping cache
+USER_MAPPING_MISS_RATIO = 0.2
+
+# Voice queries arrive during waking hours only
+WAKING_HOURS = 15
+
+CAPACITY_MODES = ('auto', 'provisioned', 'on_demand')
+
+# Above this peak-to-average ratio target tracking cannot scale out before
+# the dose window is over, so 'auto' mode switches the table to on-demand
+MAX_AUTOSCALING_PEAK_RATIO = 8.0
+
+# us-east-1 list prices, used only to compare billing modes
+PROVISIONED_RCU_HOUR_USD = 0.00013
+PROVISIONED_WCU_HOUR_USD = 0.00065
+ON_DEMAND_READ_MILLION_USD = 0.125
+ON_DEMAND_WRITE_MILLION_USD = 0.625
+
+SECONDS_PER_DAY = 86400
+DAYS_PER_MONTH = 30
+
+
+class FleetProfile:
+    """
+    Fleet size and usage assumptions driving the capacity model
+
+    Args:
+        devices: Number of PillBuddy devices
+        slots_per_device: Slots in use per device
+        doses_per_day: Doses per slot per day
+        dose_window_minutes: Minutes in which the whole fleet takes one dose
+        queries_per_device_per_day: Voice status queries per device per day
+        sweep_interval_minutes: Timeout Checker interval, 0 if not scheduled
+        flap_rate: Extra removal/return pairs per dose caused by sensor flaps
+    """
+
+    def __init__(self,
+                 devices: int = 100,
+                 slots_per_device: int = 3,
+                 doses_per_day: int = 2,
+                 dose_window_minutes: float = 30,
+                 queries_per_device_per_day: float = 2,
+                 sweep_interval_minutes: float = 5,
+                 flap_rate: float = 0.0) -> None:
+        if devices < 0 or slots_per_device < 1 or doses_per_day < 0:
+            raise ValueError("Fleet profile needs devices >= 0, slots_per_device >= 1 and doses_per_day >= 0")
+        if dose_window_minutes <= 0:
+            raise ValueError("dose_window_minutes must be positive")
+
+        self.devices = devices
+        self.slots_per_device = slots_per_device
+        self.doses_per_day = doses_per_day
+        self.dose_window_minutes = dose_window_minutes
+        self.queries_per_device_per_day = queries_per_device_per_day
+        self.sweep_interval_minutes = sweep_interval_minutes
+        self.flap_rate = flap_rate
+
+    @classmethod
+    def from_context(cls, get_context: Callable[[str], Any]) -> 'FleetProfile':
+        """
+        Build a profile from CDK context values
+
+        Args:
+            get_context: Context lookup, typically stack.node.try_get_context
+
+        Returns:
+            FleetProfile with defaults for missing keys
+        """
+        def number(key: str, default: float, convert: Callable[[Any], Any] = float) -> Any:
+            value = get_context(key)
+            return default if value is None else convert(value)
+
+        return cls(
+            devices=number('fleet_devices', 100, int),
+            slots_per_device=number('fleet_slots_per_device', 3, int),
+            doses_per_day=number('fleet_doses_per_day', 2, int),
+            dose_window_minutes=number('fleet_dose_window_minutes', 30),
+            queries_per_device_per_day=number('fleet_queries_per_device_per_day', 2),
+            sweep_interval_minutes=number('fleet_sweep_interval_minutes', 5),
+            flap_rate=number('fleet_flap_rate', 0.0)
+        )
+
+
+def _units(**tables: tuple) -> Dict[str, Dict[str, float]]:
+    return {table: {'read': float(read), 'write': float(write)} for table, (read, write) in tables.items()}
+
+
+def bottle_event_units(profile: FleetProfile) -> Dict[str, Dict[str, float]]:
+    """
+    Capacity units consumed by one bottle removal or return event
+
+    Sequence numbers cost nothing extra: duplicates and gaps are caught by
+    the slot state update's condition, not a separate read.
+
+    Returns:
+        Table key -> {'read': RCU, 'write': WCU}
+    """
+    return _units(**{
+        EVENTS: (0, 1),
+        DEVICES: (0, 1),
+        PRESCRIPTIONS: (0.5, 1),
+        # Half of the events are removals, which bump the day's dose counter
+        DAILY_DOSES: (0, 0.5)
+    })
+
+
+def bounce_event_units(profile: FleetProfile) -> Dict[str, Dict[str, float]]:
+    """
+    Capacity units consumed by one debounced sensor bounce (see debounce.py)
+
+    The event is logged and the slot state written, and the bounced
+    removal sets the prescription's removal_timestamp, all without a read;
+    the dose is not counted. This is the in-memory case - a bounce caught by
+    the conditional device update also pays for that failed write.
+
+    Returns:
+        Table key -> {'read': RCU, 'write': WCU}
+    """
+    return _units(**{EVENTS: (0, 1), DEVICES: (0, 1), PRESCRIPTIONS: (0, 1)})
+
+
+def voice_query_units(profile: FleetProfile) -> Dict[str, Dict[str, float]]:
+    """
+    Capacity units consumed by one QueryStatusIntent
+
+    Returns:
+        Table key -> {'read': RCU, 'write': WCU}
+    """
+    return _units(**{
+        USER_DEVICES: (0.5 * USER_MAPPING_MISS_RATIO, 0),
+        DEVICES: (0.5, 0),
+        PRESCRIPTIONS: (0.5 * profile.slots_per_device, 0)
+    })
+
+
+def sweep_units(profile: FleetProfile) -> Dict[str, Dict[str, float]]:
+    """
+    Capacity units consumed by one Timeout Checker sweep
+
+    A Scan is charged on the bytes read, not the items returned, so the
+    cost grows with the whole Prescriptions table.
+
+    Returns:
+        Table key -> {'read': RCU, 'write': WCU}
+    """
+    scanned_bytes = profile.devices * profile.slots_per_device * PRESCRIPTION_ITEM_BYTES
+    return _units(**{PRESCRIPTIONS: (0.5 * max(1, math.ceil(scanned_bytes / 4096)), 0)})
+
+
+def estimate_load(profile: FleetProfile) -> Dict[str, Dict[str, float]]:
+    """
+    Average and dose-peak capacity units per second for each table
+
+    Args:
+        profile: Fleet profile
+
+    Returns:
+        Table key -> {'read_avg', 'read_peak', 'write_avg', 'write_peak'}
+    """
+    load = {table: {'read_avg': 0.0, 'read_peak': 0.0, 'write_avg': 0.0, 'write_peak': 0.0} for table in TABLES}
+
+    def add(units: Dict[str, Dict[str, float]], avg_rate: float, peak_rate: float) -> None:
+        for table, table_units in units.items():
+            for kind in ('read', 'write'):
+                load[table][f'{kind}_avg'] += table_units[kind] * avg_rate
+                load[table][f'{kind}_peak'] += table_units[kind] * peak_rate
+
+    # Each dose is a removal and a return per slot. A flap adds a return,
+    # applied in full, and a re-removal that is debounced
+    def add_per_dose(units: Dict[str, Dict[str, float]], events_per_dose: float) -> None:
+        add(units,
+            events_per_dose * profile.doses_per_day / SECONDS_PER_DAY,
+            events_per_dose / (profile.dose_window_minutes * 60) if profile.doses_per_day else 0.0)
+
+    slots = profile.devices * profile.slots_per_device
+    add_per_dose(bottle_event_units(profile), slots * (2 + profile.flap_rate))
+    add_per_dose(bounce_event_units(profile), slots * profile.flap_rate)
+
+    queries_per_day = profile.devices * profile.queries_per_device_per_day
+    add(voice_query_units(profile),
+        queries_per_day / SECONDS_PER_DAY,
+        queries_per_day / (WAKING_HOURS * 3600))
+
+    if profile.sweep_interval_minutes > 0:
+        sweep_rate = 1 / (profile.sweep_interval_minutes * 60)
+        add(sweep_units(profile), sweep_rate, sweep_rate)
+
+    return load
+
+
+def _monthly_cost(table_load: Dict[str, float], profile: FleetProfile,
+                  read_capacity: Optional[tuple], write_capacity: Optional[tuple]) -> float:
+    if read_capacity is None:
+        reads = table_load['read_avg'] * SECONDS_PER_DAY * DAYS_PER_MONTH
+        writes = table_load['write_avg'] * SECONDS_PER_DAY * DAYS_PER_MONTH
+        # On-demand bills whole request units: round half-RCU reads up
+        return (math.ceil(reads) * ON_DEMAND_READ_MILLION_USD + writes * ON_DEMAND_WRITE_MILLION_USD) / 1e6
+
+    # Autoscaled capacity sits at the maximum through dose windows, minimum otherwise
+    peak_hours = min(24.0, profile.doses_per_day * profile.dose_window_minutes / 60)
+    read_hours = peak_hours * read_capacity[1] + (24 - peak_hours) * read_capacity[0]
+    write_hours = peak_hours * write_capacity[1] + (24 - peak_hours) * write_capacity[0]
+    return (read_hours * PROVISIONED_RCU_HOUR_USD + write_hours * PROVISIONED_WCU_HOUR_USD) * DAYS_PER_MONTH
+
+
+def _capacity_range(avg: float, peak: float, target: float) -> tuple:
+    minimum = max(1, math.ceil(avg / target))
+    return minimum, max(minimum, math.ceil(peak / target))
+
+
+def plan_capacity(profile: FleetProfile,
+                  mode: str = 'auto',
+                  target_utilization: float = 70) -> Dict[str, Dict[str, Any]]:
+    """
+    Plan billing mode and autoscaling bounds for every table
+
+    Args:
+        profile: Fleet profile
+        mode: 'auto' picks per table, 'provisioned' or 'on_demand' force a mode
+        target_utilization: Target-tracking utilization percent (20-90)
+
+    Returns:
+        Table key -> plan. On-demand plans are {'billing': 'on_demand', ...};
+        provisioned plans add 'read_capacity' and 'write_capacity' as
+        (min, max) tuples and 'target_utilization'. Every plan carries the
+        load estimate, estimated monthly costs and a 'reason'.
+
+    Raises:
+        ValueError: For an unknown mode or out-of-range utilization
+    """
+    if mode not in CAPACITY_MODES:
+        raise ValueError(f"capacity_mode must be one of {', '.join(CAPACITY_MODES)}, got {mode!r}")
+    if not 20 <= target_utilization <= 90:
+        raise ValueError("autoscaling_target_utilization must be between 20 and 90")
+
+    target = target_utilization / 100.0
+    plans = {}
+
+    for table, table_load in estimate_load(profile).items():
+        read_capacity = _capacity_range(table_load['read_avg'], table_load['read_peak'], target)
+        write_capacity = _capacity_range(table_load['write_avg'], table_load['write_peak'], target)
+
+        peak_ratio = max(
+            table_load['read_peak'] / table_load['read_avg'] if table_load['read_avg'] else 1.0,
+            table_load['write_peak'] / table_load['write_avg'] if table_load['write_avg'] else 1.0
+        )
+        provisioned_cost = _monthly_cost(table_load, profile, read_capacity, write_capacity)
+        on_demand_cost = _monthly_cost(table_load, profile, None, None)
+
+        if mode == 'auto':
+            if peak_ratio > MAX_AUTOSCALING_PEAK_RATIO and max(read_capacity[1], write_capacity[1]) > 1:
+                billing = 'on_demand'
+                reason = f"peak is {peak_ratio:.0f}x average, too spiky for target tracking"
+            elif on_demand_cost < provisioned_cost:
+                billing = 'on_demand'
+                reason = "on-demand is cheaper for this load"
+            else:
+                billing = 'provisioned'
+                reason = "steady enough for target tracking"
+        else:
+            billing = mode
+            reason = "set by capacity_mode"
+
+        plan = {
+            'billing': billing,
+            'reason': reason,
+            'load': {key: round(value, 4) for key, value in table_load.items()},
+            'peak_ratio': round(peak_ratio, 1),
+            'monthly_cost_usd': {
+                'provisioned': round(provisioned_cost, 2),
+                'on_demand': round(on_demand_cost, 2)
+            }
+        }
+        if billing == 'provisioned':
+            plan['read_capacity'] = read_capacity
+            plan['write_capacity'] = write_capacity
+            plan['target_utilization'] = target_utilization
+        plans[table] = plan
+
+    return plans
+
+
+def plan_from_context(get_context: Callable[[str], Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Plan table capacity from CDK context
+
+    Args:
+        get_context: Context lookup, typically stack.node.try_get_context
+
+    Returns:
+        Table key -> plan, as returned by plan_capacity()
+    """
+    mode = get_context('capacity_mode') or 'auto'
+    target = get_context('autoscaling_target_utilization')
+    return plan_capacity(
+        FleetProfile.from_context(get_context),
+        mode=str(mode).lower().replace('-', '_'),
+        target_utilization=70 if target is None else float(target)
+    )
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Print the PillBuddy DynamoDB capacity plan')
+    parser.add_argument('--devices', type=int, default=100)
+    parser.add_argument('--slots', type=int, default=3)
+    parser.add_argument('--doses-per-day', type=int, default=2)
+    parser.add_argument('--dose-window-minutes', type=float, default=30)
+    parser.add_argument('--queries-per-day', type=float, default=2)
+    parser.add_argument('--sweep-interval-minutes', type=float, default=5)
+    parser.add_argument('--mode', choices=CAPACITY_MODES, default='auto')
+    args = parser.parse_args()
+
+    fleet = FleetProfile(
+        devices=args.devices,
+        slots_per_device=args.slots,
+        doses_per_day=args.doses_per_day,
+        dose_window_minutes=args.dose_window_minutes,
+        queries_per_device_per_day=args.queries_per_day,
+        sweep_interval_minutes=args.sweep_interval_minutes
+    )
+    print(json.dumps(plan_capacity(fleet, mode=args.mode), indent=2))
@@ -6,26 +6,64 @@ The rule will be integrated into the main stack when the Lambda function is crea
 
 IoT Rule Specification:
 - Rule Name: PillBuddyEventRule
-- SQL: SELECT * FROM 'pillbuddy/events/+'
+- SQL: iot_rule_sql.event_rule_sql() - projects device_id (topic(3)), a
+  server timestamp and the normalized event fields, and filters out unknown
+  event types, invalid slots and malformed payloads at the broker
+- Slot Mask Rule: PillBuddySlotMaskRule, iot_rule_sql.mask_rule_sql() -
+  the all-slot state a device reports on boot and multi-slot transitions,
+  with the same action
+- Binary Event Rule: PillBuddyBinaryEventRule, iot_rule_sql.binary_rule_sql() -
+  compact binary events from pillbuddy/events/+/bin, forwarded base64-encoded
+  with device_id and received_ms and decoded by the Lambda, with the same action
 - Action: Forward to IoT Event Processor Lambda
 - Description: Forward ESP32 device events to Lambda for processing
+
+Ingestion modes (CDK context `event_ingestion`):
+- direct (default): the rule invokes the Lambda once per message
+- sqs: the rule sends to the PillBuddy_Events queue; the Lambda consumes it
+  in batches and reports failed events back for redelivery, so DynamoDB
+  throttling delays events instead of dropping them. Events that still fail
+  after 5 receives go to PillBuddy_EventDeadLetters
+- kinesis: the rule puts to the PillBuddy_Events stream partitioned by
+  device_id, which keeps each device's events in order; failed batches are
+  retried from the first failed record, then sent to the dead-letter queue
+
+Batches are tuned with `event_batch_size` (default 25) and
+`event_batch_window_seconds` (default 1), the longest an event waits for a
+batch to fill.
 """
 
 from aws_cdk import (
+    Duration,
     aws_iot as iot,
+    aws_kinesis as kinesis,
     aws_lambda as lambda_,
+    aws_lambda_event_sources as lambda_event_sources,
     aws_iam as iam,
+    aws_sqs as sqs,
 )
 from constructs import Construct
+from typing import List
+
+from iot_rule_sql import binary_rule_sql, event_rule_sql, mask_rule_sql
+
+INGESTION_MODES = ('direct', 'sqs', 'kinesis')
+
+# Six times the processor timeout, as recommended for SQS event sources
+EVENT_QUEUE_VISIBILITY_TIMEOUT = Duration.seconds(180)
+EVENT_MAX_RECEIVE_COUNT = 5
 
 
-def create_iot_event_rule(
+def create_iot_event_rules(
     scope: Construct,
     iot_event_processor_lambda: lambda_.Function,
-    iot_rule_role: iam.Role
-) -> iot.CfnTopicRule:
+    iot_rule_role: iam.Role,
+    ingestion: str = 'direct',
+    batch_size: int = 25,
+    batch_window_seconds: int = 1
+) -> List[iot.CfnTopicRule]:
     """
-    Create IoT Rule to forward device events to Lambda
+    Create IoT Rules to forward device events to Lambda
     
     This function should be called from the main stack after the
     IoT Event Processor Lambda is created (task 5).
@@ -34,44 +72,154 @@ def create_iot_event_rule(
         scope: CDK construct scope
         iot_event_processor_lambda: Lambda function to invoke
         iot_rule_role: IAM role for IoT Rule
+        ingestion: 'direct', 'sqs' or 'kinesis' (see module docstring)
+        batch_size: Events per Lambda invocation for queued ingestion
+        batch_window_seconds: Longest an event waits for a batch to fill
         
     Returns:
-        IoT Topic Rule construct
+        IoT Topic Rule constructs (slot events, slot mask events, binary events)
     """
+    if ingestion not in INGESTION_MODES:
+        raise ValueError(f"event_ingestion must be one of {INGESTION_MODES}, got {ingestion!r}")
     
-    # Grant IoT Rule permission to invoke Lambda
-    iot_rule_role.add_to_policy(
-        iam.PolicyStatement(
-            actions=["lambda:InvokeFunction"],
-            resources=[iot_event_processor_lambda.function_arn]
+    if ingestion == 'sqs':
+        action = _create_queue_ingestion(
+            scope, iot_event_processor_lambda, iot_rule_role, batch_size, batch_window_seconds
+        )
+    elif ingestion == 'kinesis':
+        action = _create_stream_ingestion(
+            scope, iot_event_processor_lambda, iot_rule_role, batch_size, batch_window_seconds
+        )
+    else:
+        # Grant IoT Rule permission to invoke Lambda
+        iot_rule_role.add_to_policy(
+            iam.PolicyStatement(
+                actions=["lambda:InvokeFunction"],
+                resources=[iot_event_processor_lambda.function_arn]
+            )
+        )
+        action = iot.CfnTopicRule.ActionProperty(
+            lambda_=iot.CfnTopicRule.LambdaActionProperty(
+                function_arn=iot_event_processor_lambda.function_arn
+            )
         )
-    )
     
-    # Create IoT Rule
-    iot_rule = iot.CfnTopicRule(
+    # Create IoT Rules - one per event shape, sharing the action
+    rules = [
+        ("PillBuddyEventRule", "AllowIoTInvoke", event_rule_sql(),
+         "Validate ESP32 device events and forward them to Lambda for processing"),
+        ("PillBuddySlotMaskRule", "AllowIoTSlotMaskInvoke", mask_rule_sql(),
+         "Forward ESP32 slot snapshots and multi-slot changes to Lambda for processing"),
+        ("PillBuddyBinaryEventRule", "AllowIoTBinaryInvoke", binary_rule_sql(),
+         "Forward compact binary ESP32 device events to Lambda for decoding and processing"),
+    ]
+    iot_rules = []
+    for rule_name, permission_id, sql, description in rules:
+        iot_rule = iot.CfnTopicRule(
+            scope,
+            rule_name,
+            rule_name=rule_name,
+            topic_rule_payload=iot.CfnTopicRule.TopicRulePayloadProperty(
+                sql=sql,
+                description=description,
+                actions=[action],
+                aws_iot_sql_version="2016-03-23",
+                rule_disabled=False
+            )
+        )
+        
+        if ingestion == 'direct':
+            # Grant IoT service permission to invoke the Lambda
+            iot_event_processor_lambda.add_permission(
+                permission_id,
+                principal=iam.ServicePrincipal("iot.amazonaws.com"),
+                source_arn=iot_rule.attr_arn
+            )
+        iot_rules.append(iot_rule)
+    
+    return iot_rules
+
+
+def _create_dead_letter_queue(scope: Construct) -> sqs.Queue:
+    return sqs.Queue(
         scope,
-        "PillBuddyEventRule",
-        rule_name="PillBuddyEventRule",
-        topic_rule_payload=iot.CfnTopicRule.TopicRulePayloadProperty(
-            sql="SELECT * FROM 'pillbuddy/events/+'",
-            description="Forward ESP32 device events to Lambda for processing",
-            actions=[
-                iot.CfnTopicRule.ActionProperty(
-                    lambda_=iot.CfnTopicRule.LambdaActionProperty(
-                        function_arn=iot_event_processor_lambda.function_arn
-                    )
-                )
-            ],
-            aws_iot_sql_version="2016-03-23",
-            rule_disabled=False
+        "PillBuddyEventDeadLetterQueue",
+        queue_name="PillBuddy_EventDeadLetters",
+        retention_period=Duration.days(14)
+    )
+
+
+def _create_queue_ingestion(
+    scope: Construct,
+    iot_event_processor_lambda: lambda_.Function,
+    iot_rule_role: iam.Role,
+    batch_size: int,
+    batch_window_seconds: int
+) -> iot.CfnTopicRule.ActionProperty:
+    """SQS queue between the rule and the Lambda; returns the rule action"""
+    queue = sqs.Queue(
+        scope,
+        "PillBuddyEventQueue",
+        queue_name="PillBuddy_Events",
+        visibility_timeout=EVENT_QUEUE_VISIBILITY_TIMEOUT,
+        dead_letter_queue=sqs.DeadLetterQueue(
+            max_receive_count=EVENT_MAX_RECEIVE_COUNT,
+            queue=_create_dead_letter_queue(scope)
         )
     )
+    queue.grant_send_messages(iot_rule_role)
     
-    # Grant IoT service permission to invoke the Lambda
-    iot_event_processor_lambda.add_permission(
-        "AllowIoTInvoke",
-        principal=iam.ServicePrincipal("iot.amazonaws.com"),
-        source_arn=iot_rule.attr_arn
+    iot_event_processor_lambda.add_event_source(
+        lambda_event_sources.SqsEventSource(
+            queue,
+            batch_size=batch_size,
+            max_batching_window=Duration.seconds(batch_window_seconds),
+            report_batch_item_failures=True
+        )
     )
     
-    return iot_rule
+    return iot.CfnTopicRule.ActionProperty(
+        sqs=iot.CfnTopicRule.SqsActionProperty(
+            queue_url=queue.queue_url,
+            role_arn=iot_rule_role.role_arn,
+            use_base64=False
+        )
+    )
+
+
+def _create_stream_ingestion(
+    scope: Construct,
+    iot_event_processor_lambda: lambda_.Function,
+    iot_rule_role: iam.Role,
+    batch_size: int,
+    batch_window_seconds: int
+) -> iot.CfnTopicRule.ActionProperty:
+    """Kinesis stream between the rule and the Lambda; returns the rule action"""
+    stream = kinesis.Stream(
+        scope,
+        "PillBuddyEventStream",
+        stream_name="PillBuddy_Events",
+        stream_mode=kinesis.StreamMode.ON_DEMAND
+    )
+    stream.grant_write(iot_rule_role)
+    
+    iot_event_processor_lambda.add_event_source(
+        lambda_event_sources.KinesisEventSource(
+            stream,
+            starting_position=lambda_.StartingPosition.LATEST,
+            batch_size=batch_size,
+            max_batching_window=Duration.seconds(batch_window_seconds),
+            report_batch_item_failures=True,
+            retry_attempts=EVENT_MAX_RECEIVE_COUNT,
+            on_failure=lambda_event_sources.SqsDlq(_create_dead_letter_queue(scope))
+        )
+    )
+    
+    return iot.CfnTopicRule.ActionProperty(
+        kinesis=iot.CfnTopicRule.KinesisActionProperty(
+            stream_name=stream.stream_name,
+            role_arn=iot_rule_role.role_arn,
+            # One device's events share a shard and arrive in order
+            partition_key="${topic(3)}"
+        )
+    )
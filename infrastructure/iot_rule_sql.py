@@ -0,0 +1,227 @@
+"""
+IoT Rule SQL for PillBuddy device events
+
+The ESP32 publishes a bare payload to pillbuddy/events/{device_id}:
+
+    {"event_type": "slot_state_changed", "slot": 2, "in_holder": false}
+
+The rule turns that into the event the IoT Event Processor works on, and
+drops anything else at the broker so junk never costs a Lambda invocation:
+
+    - device_id is taken from the topic (topic(3))
+    - slot is cast to an integer; state and sensor_level are derived from
+      in_holder
+    - ts_ms is the device's own epoch timestamp when it sends a plausible one,
+      otherwise the broker's receive time; received_ms is always the broker's
+    - sequence defaults to 0 (no deduplication)
+    - Unknown event types, slots outside 1-3, a non-boolean in_holder and
+      payloads that are not JSON objects do not match the WHERE clause
+
+On boot the firmware reports every slot at once instead:
+
+    {"event_type": "slot_snapshot", "in_holder_mask": 5}
+
+Bit N-1 of in_holder_mask is set when slot N holds its bottle. Several
+transitions seen together (a user swapping two bottles) arrive as one
+message in the same format, with changed_mask marking the slots that moved:
+
+    {"event_type": "slot_states_changed", "changed_mask": 3, "in_holder_mask": 2}
+
+Both mask events go through a second rule (mask_rule_sql) with the same
+device_id, sequence and timestamp projection and mask range checks.
+
+Devices on a constrained link can publish the same events as a fixed
+15-byte struct to pillbuddy/events/{device_id}/bin instead (layout in
+pillbuddy_core.event_codec). IoT SQL cannot read fields out of a binary
+payload, so the binary rule (binary_rule_sql) only adds device_id and
+received_ms and forwards the payload base64-encoded; the processor decodes
+it into the event above and applies the same checks.
+
+apply_event_rule() and apply_binary_rule() are the same projections and
+filters in Python, for the load-test harness and tests that feed raw
+fixtures to the handlers.
+"""
+
+import base64
+from typing import Any, Dict, Optional
+
+EVENT_TOPIC_FILTER = 'pillbuddy/events/+'
+BINARY_TOPIC_FILTER = 'pillbuddy/events/+/bin'
+STATE_CHANGED = 'slot_state_changed'
+SNAPSHOT = 'slot_snapshot'
+STATES_CHANGED = 'slot_states_changed'
+VALID_SLOTS = (1, 2, 3)
+MAX_IN_HOLDER_MASK = (1 << len(VALID_SLOTS)) - 1
+
+# Device timestamps below this (2020-09-13) are uptime counters, not epoch ms
+MIN_DEVICE_TS_MS = 1600000000000
+
+TIMESTAMP_PROJECTION = (
+    f"CASE ts_ms > {MIN_DEVICE_TS_MS} WHEN true THEN cast(ts_ms AS Int) ELSE timestamp() END AS ts_ms",
+    "timestamp() AS received_ms",
+)
+
+SEQUENCE_PROJECTION = "CASE isUndefined(sequence) WHEN true THEN 0 ELSE cast(sequence AS Int) END AS sequence"
+
+EVENT_PROJECTION = (
+    "topic(3) AS device_id",
+    "event_type",
+    "cast(slot AS Int) AS slot",
+    "in_holder",
+    "CASE in_holder WHEN true THEN 'in_holder' ELSE 'not_in_holder' END AS state",
+    "CASE in_holder WHEN true THEN 1 ELSE 0 END AS sensor_level",
+    SEQUENCE_PROJECTION,
+) + TIMESTAMP_PROJECTION
+
+MASK_PROJECTION = (
+    "topic(3) AS device_id",
+    "event_type",
+    "cast(changed_mask AS Int) AS changed_mask",
+    "cast(in_holder_mask AS Int) AS in_holder_mask",
+    SEQUENCE_PROJECTION,
+) + TIMESTAMP_PROJECTION
+
+
+def _any_of(field: str, values) -> str:
+    return '(' + ' OR '.join(f"{field} = {value}" for value in values) + ')'
+
+
+def _select(projection, where: str) -> str:
+    return f"SELECT {', '.join(projection)} FROM '{EVENT_TOPIC_FILTER}' WHERE {where}"
+
+
+def event_filter() -> str:
+    """WHERE clause accepting only well-formed slot state changes"""
+    return ' AND '.join([
+        f"event_type = '{STATE_CHANGED}'",
+        _any_of('slot', VALID_SLOTS),
+        _any_of('in_holder', ['true', 'false']),
+    ])
+
+
+def _in_range(field: str, low: int, high: int) -> str:
+    return f"{field} >= {low} AND {field} <= {high}"
+
+
+def snapshot_filter() -> str:
+    """WHERE clause accepting only well-formed slot snapshots"""
+    return f"event_type = '{SNAPSHOT}' AND {_in_range('in_holder_mask', 0, MAX_IN_HOLDER_MASK)}"
+
+
+def states_changed_filter() -> str:
+    """WHERE clause accepting only well-formed multi-slot transitions"""
+    return ' AND '.join([
+        f"event_type = '{STATES_CHANGED}'",
+        _in_range('changed_mask', 1, MAX_IN_HOLDER_MASK),
+        _in_range('in_holder_mask', 0, MAX_IN_HOLDER_MASK),
+    ])
+
+
+def event_rule_sql() -> str:
+    """Full SQL statement for the device event rule (SQL version 2016-03-23)"""
+    return _select(EVENT_PROJECTION, event_filter())
+
+
+def mask_rule_sql() -> str:
+    """Full SQL statement for the slot snapshot and multi-slot rule (SQL version 2016-03-23)"""
+    return _select(MASK_PROJECTION, f"({snapshot_filter()}) OR ({states_changed_filter()})")
+
+
+def binary_rule_sql() -> str:
+    """Full SQL statement for the binary event rule (SQL version 2016-03-23)"""
+    return (f"SELECT topic(3) AS device_id, encode(*, 'base64') AS payload_b64, "
+            f"timestamp() AS received_ms FROM '{BINARY_TOPIC_FILTER}'")
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def apply_event_rule(payload: Any, topic: str, received_ms: int) -> Optional[Dict[str, Any]]:
+    """
+    Apply the rules to one MQTT message, as IoT Core would
+
+    Args:
+        payload: Decoded JSON payload
+        topic: Topic the message was published to
+        received_ms: Broker receive time in milliseconds (timestamp())
+
+    Returns:
+        Event passed to the Lambda, or None if the rules filter it out
+    """
+    if not isinstance(payload, dict):
+        return None
+    if payload.get('event_type') in (SNAPSHOT, STATES_CHANGED):
+        return _apply_mask_rule(payload, topic, received_ms)
+    slot = payload.get('slot')
+    in_holder = payload.get('in_holder')
+    if (payload.get('event_type') != STATE_CHANGED
+            or not _is_number(slot) or slot not in VALID_SLOTS
+            or not isinstance(in_holder, bool)):
+        return None
+
+    event = {
+        'device_id': topic.split('/')[2],
+        'event_type': payload['event_type'],
+        'slot': int(slot),
+        'in_holder': in_holder,
+        'state': 'in_holder' if in_holder else 'not_in_holder',
+        'sensor_level': 1 if in_holder else 0,
+    }
+
+    event.update(_sequence(payload))
+    event.update(_timestamps(payload, received_ms))
+    return event
+
+
+def apply_binary_rule(payload: bytes, topic: str, received_ms: int) -> Dict[str, Any]:
+    """
+    Apply the binary rule to one MQTT message, as IoT Core would
+
+    Args:
+        payload: Raw message bytes
+        topic: Topic the message was published to
+        received_ms: Broker receive time in milliseconds (timestamp())
+
+    Returns:
+        Event passed to the Lambda (decoded there, see pillbuddy_core.event_codec)
+    """
+    return {
+        'device_id': topic.split('/')[2],
+        'payload_b64': base64.b64encode(payload).decode('ascii'),
+        'received_ms': received_ms,
+    }
+
+
+def _apply_mask_rule(payload: Dict[str, Any], topic: str, received_ms: int) -> Optional[Dict[str, Any]]:
+    masks = {'in_holder_mask': payload.get('in_holder_mask')}
+    if payload['event_type'] == STATES_CHANGED:
+        masks['changed_mask'] = payload.get('changed_mask')
+        if not _is_number(masks['changed_mask']) or not 1 <= masks['changed_mask'] <= MAX_IN_HOLDER_MASK:
+            return None
+    if not _is_number(masks['in_holder_mask']) or not 0 <= masks['in_holder_mask'] <= MAX_IN_HOLDER_MASK:
+        return None
+    event = {
+        'device_id': topic.split('/')[2],
+        'event_type': payload['event_type'],
+    }
+    event.update({name: int(mask) for name, mask in masks.items()})
+    event.update(_sequence(payload))
+    event.update(_timestamps(payload, received_ms))
+    return event
+
+
+def _sequence(payload: Dict[str, Any]) -> Dict[str, int]:
+    # cast() of a value that is not numeric leaves the field out
+    sequence = payload.get('sequence', 0)
+    if _is_number(sequence) or (isinstance(sequence, str) and sequence.isdigit()):
+        return {'sequence': int(sequence)}
+    return {}
+
+
+def _timestamps(payload: Dict[str, Any], received_ms: int) -> Dict[str, int]:
+    ts_ms = payload.get('ts_ms')
+    return {
+        'ts_ms': int(ts_ms) if _is_number(ts_ms) and ts_ms > MIN_DEVICE_TS_MS else received_ms,
+        'received_ms': received_ms,
+    }
@@ -14,28 +14,69 @@ Environment Variables:
     DEVICES_TABLE: DynamoDB table name for devices (PillBuddy_Devices)
     PRESCRIPTIONS_TABLE: DynamoDB table name for prescriptions (PillBuddy_Prescriptions)
     IOT_ENDPOINT: AWS IoT Core endpoint URL
+    USER_DEVICES_TABLE: Optional DynamoDB table mapping Alexa userId to device_ids
+                        (PillBuddy_UserDevices). If unset, the userId is used as device_id.
+    DAILY_DOSES_TABLE: Optional DynamoDB table of per-day dose counters (PillBuddy_DailyDoses)
+                       maintained by the IoT Event Processor. Needed for DoseTodayIntent.
+    DOSE_DAY_UTC_OFFSET_MINUTES: Offset of the local day for DoseTodayIntent (default 0)
     AWS_REGION: AWS region (e.g., us-east-1)
+
+Latency Metrics:
+    Requests are routed through the INTENT_HANDLERS / REQUEST_HANDLERS dispatch
+    tables. Each dispatch is timed end-to-end, along with the time spent in
+    DynamoDB, IoT and response rendering, and flushed as p50/p95/p99 metrics
+    (see instrumentation.py).
 """
 
 import os
 import json
+import random
 import time
-import boto3
-from typing import Dict, Any, Optional
-
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
-iot_client = boto3.client('iot-data')
+from typing import Dict, Any, List, Optional, Tuple
+
+from pillbuddy_core.cache import CachedTable, cache_from_env, cache_ttl_from_env, dynamodb_client_from_env
+from pillbuddy_core.clients import make_client
+from pillbuddy_core.instrumentation import track_request, timed, flush_metrics
+from pillbuddy_core.device_resolver import DeviceResolver
+from pillbuddy_core.daily_doses import day_key, dosed_slots, utc_offset_from_env
+from pillbuddy_core.ddb_client import (
+    FastDynamoDB, DEVICES_KEY_SCHEMA, PRESCRIPTIONS_KEY_SCHEMA, USER_DEVICES_KEY_SCHEMA, DAILY_DOSES_KEY_SCHEMA
+)
+from pillbuddy_core.errors import log_error
+from pillbuddy_core.iot import publish_slot_command
+from pillbuddy_core.timeutil import now_ms
+
+# Initialize AWS clients (shared configuration from the PillBuddyCore layer)
+dynamodb = FastDynamoDB(dynamodb_client_from_env())
+iot_client = make_client('iot-data')
 
 # Environment variables
 DEVICES_TABLE = os.environ['DEVICES_TABLE']
 PRESCRIPTIONS_TABLE = os.environ['PRESCRIPTIONS_TABLE']
 IOT_ENDPOINT = os.environ['IOT_ENDPOINT']
+USER_DEVICES_TABLE = os.environ.get('USER_DEVICES_TABLE', '')
+DAILY_DOSES_TABLE = os.environ.get('DAILY_DOSES_TABLE', '')
+DOSE_DAY_UTC_OFFSET_MINUTES = utc_offset_from_env()
 # AWS_REGION is automatically available in Lambda environment
 
-# DynamoDB table references
-devices_table = dynamodb.Table(DEVICES_TABLE)
-prescriptions_table = dynamodb.Table(PRESCRIPTIONS_TABLE)
+# DynamoDB table references - Devices and Prescriptions are read through the cache tier
+cache = cache_from_env()
+devices_table = CachedTable(dynamodb.table(DEVICES_TABLE, DEVICES_KEY_SCHEMA), cache, cache_ttl_from_env())
+prescriptions_table = CachedTable(dynamodb.table(PRESCRIPTIONS_TABLE, PRESCRIPTIONS_KEY_SCHEMA), cache, cache_ttl_from_env())
+user_devices_table = dynamodb.table(USER_DEVICES_TABLE, USER_DEVICES_KEY_SCHEMA) if USER_DEVICES_TABLE else None
+daily_doses_table = dynamodb.table(DAILY_DOSES_TABLE, DAILY_DOSES_KEY_SCHEMA) if DAILY_DOSES_TABLE else None
+
+# Warm-container cache of userId -> device_id mappings
+device_resolver = DeviceResolver(user_devices_table)
+
+# Device used when the request carries no userId (hackathon default)
+DEFAULT_DEVICE_ID = 'esp32_001'
+
+# BatchGetItem limits and retry policy for unprocessed keys
+MAX_BATCH_GET_KEYS = 100
+BATCH_GET_MAX_RETRIES = 5
+BATCH_GET_BASE_DELAY_SECONDS = 0.025
+BATCH_GET_MAX_DELAY_SECONDS = 0.5
 
 
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
@@ -51,46 +92,63 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     request_type = event['request']['type']
     
-    # Extract device_id from session or use default for hackathon
-    # In production, this would come from account linking
-    device_id = event.get('session', {}).get('user', {}).get('userId', 'esp32_001')
-    
     try:
-        if request_type == 'LaunchRequest':
-            return handle_launch_request(device_id, event)
-        elif request_type == 'IntentRequest':
-            intent_name = event['request']['intent']['name']
+        # Label used for dispatch and latency metrics: intent name or request type
+        if request_type == 'IntentRequest':
+            label = event['request']['intent']['name']
+            handler = INTENT_HANDLERS.get(label)
+        else:
+            label = request_type
+            handler = REQUEST_HANDLERS.get(label)
+        
+        with track_request(label):
+            device_id = resolve_device_id(event)
             
-            if intent_name == 'SetupSlotIntent':
-                return handle_setup_slot_intent(device_id, event)
-            elif intent_name == 'QueryStatusIntent':
-                return handle_query_status_intent(device_id, event)
-            elif intent_name == 'StartSetupIntent':
-                return handle_launch_request(device_id, event)
-            elif intent_name == 'AMAZON.HelpIntent':
-                return handle_help_intent()
-            elif intent_name == 'AMAZON.StopIntent':
-                return handle_stop_intent()
-            elif intent_name == 'AMAZON.CancelIntent':
-                return handle_cancel_intent()
-            else:
+            if handler is not None:
+                return handler(device_id, event)
+            elif request_type == 'IntentRequest':
                 return build_response(
                     "Sorry, I don't understand that command.",
                     should_end_session=True
                 )
-        elif request_type == 'SessionEndedRequest':
-            return build_response("", should_end_session=True)
-        else:
-            return build_response(
-                "Sorry, I don't understand that request.",
-                should_end_session=True
-            )
+            else:
+                return build_response(
+                    "Sorry, I don't understand that request.",
+                    should_end_session=True
+                )
     except Exception as e:
-        print(f"Error processing request: {str(e)}")
+        log_error('processing request', e)
         return build_response(
             "Sorry, I encountered an error. Please try again.",
             should_end_session=True
         )
+    finally:
+        flush_metrics('AlexaHandler')
+
+
+def resolve_device_id(event: Dict[str, Any]) -> str:
+    """
+    Resolve the device for the requesting Alexa user
+    
+    Uses the userId -> device_id mapping table when one is configured, falling
+    back to the userId itself when the user has no linked device or the lookup
+    fails. Mappings are cached in the warm container (see device_resolver.py).
+    
+    Args:
+        event: Alexa request event
+    
+    Returns:
+        Device identifier
+    """
+    user_id = event.get('session', {}).get('user', {}).get('userId')
+    if not user_id:
+        return DEFAULT_DEVICE_ID
+    
+    try:
+        return device_resolver.resolve_device_id(user_id, default=user_id)
+    except Exception as e:
+        log_error('resolving device, falling back to userId', e)
+        return user_id
 
 
 def build_response(speech_text: str, 
@@ -185,7 +243,8 @@ def fetch_device_slots(device_id: str) -> Dict[str, Any]:
         Returns empty dict {} on failure
     """
     try:
-        response = devices_table.get_item(Key={'device_id': device_id})
+        with timed('dynamodb'):
+            response = devices_table.get_item(Key={'device_id': device_id})
         
         if 'Item' in response and 'slots' in response['Item']:
             return response['Item']['slots']
@@ -193,7 +252,7 @@ def fetch_device_slots(device_id: str) -> Dict[str, Any]:
             # Device not found or no slots data - return empty dict
             return {}
     except Exception as e:
-        print(f"Error fetching device slots: {str(e)}")
+        log_error('fetching device slots', e)
         return {}
 
 
@@ -283,10 +342,10 @@ def load_apl_document() -> Optional[Dict[str, Any]]:
         print(f"APL template file not found at {template_path}")
         return None
     except json.JSONDecodeError as e:
-        print(f"Error parsing APL template JSON: {str(e)}")
+        log_error('parsing APL template JSON', e)
         return None
     except Exception as e:
-        print(f"Error loading APL document: {str(e)}")
+        log_error('loading APL document', e)
         return None
 
 
@@ -304,22 +363,24 @@ def handle_launch_request(device_id: str, event: Dict[str, Any]) -> Dict[str, An
     """
     try:
         # Check if device exists, create if not
-        response = devices_table.get_item(Key={'device_id': device_id})
+        with timed('dynamodb'):
+            response = devices_table.get_item(Key={'device_id': device_id})
         
         if 'Item' not in response:
             # Device not found - create initial device record
-            current_time = int(time.time() * 1000)
-            devices_table.put_item(Item={
-                'device_id': device_id,
-                'online': False,
-                'last_seen': current_time,
-                'created_at': current_time,
-                'slots': {
-                    '1': {'in_holder': False, 'last_state_change': current_time},
-                    '2': {'in_holder': False, 'last_state_change': current_time},
-                    '3': {'in_holder': False, 'last_state_change': current_time}
-                }
-            })
+            current_time = now_ms()
+            with timed('dynamodb'):
+                devices_table.put_item(Item={
+                    'device_id': device_id,
+                    'online': False,
+                    'last_seen': current_time,
+                    'created_at': current_time,
+                    'slots': {
+                        '1': {'in_holder': False, 'last_state_change': current_time},
+                        '2': {'in_holder': False, 'last_state_change': current_time},
+                        '3': {'in_holder': False, 'last_state_change': current_time}
+                    }
+                })
         
         # Start setup flow (no online check - MQTT can be intermittent)
         session_attributes = {
@@ -341,7 +402,7 @@ def handle_launch_request(device_id: str, event: Dict[str, Any]) -> Dict[str, An
         )
         
     except Exception as e:
-        print(f"Error in handle_launch_request: {str(e)}")
+        log_error('in handle_launch_request', e)
         return build_response(
             "Sorry, I'm having trouble starting the setup. Please try again.",
             should_end_session=True
@@ -419,7 +480,7 @@ def handle_setup_slot_intent(device_id: str, event: Dict[str, Any]) -> Dict[str,
         current_slot = setup_state.get('current_slot', 1)
         
         # Store prescription in DynamoDB
-        current_time = int(time.time() * 1000)
+        current_time = now_ms()
         prescription_item = {
             'device_id': device_id,
             'slot': current_slot,
@@ -433,7 +494,8 @@ def handle_setup_slot_intent(device_id: str, event: Dict[str, Any]) -> Dict[str,
         }
         
         try:
-            prescriptions_table.put_item(Item=prescription_item)
+            with timed('dynamodb'):
+                prescriptions_table.put_item(Item=prescription_item)
         except Exception as e:
             print(f"DynamoDB write error: {str(e)}")
             return build_response(
@@ -444,7 +506,8 @@ def handle_setup_slot_intent(device_id: str, event: Dict[str, Any]) -> Dict[str,
         
         # Publish LED turn_on command to IoT Core
         try:
-            publish_iot_command(device_id, 'turn_on', current_slot)
+            with timed('iot'):
+                publish_iot_command(device_id, 'turn_on', current_slot)
         except Exception as e:
             print(f"IoT publish error: {str(e)}")
             # Continue even if LED command fails (non-critical)
@@ -475,7 +538,7 @@ def handle_setup_slot_intent(device_id: str, event: Dict[str, Any]) -> Dict[str,
         )
         
     except Exception as e:
-        print(f"Error in handle_setup_slot_intent: {str(e)}")
+        log_error('in handle_setup_slot_intent', e)
         return build_response(
             "Sorry, I encountered an error setting up that slot. Please try again.",
             should_end_session=True
@@ -491,26 +554,173 @@ def publish_iot_command(device_id: str, action: str, slot: int) -> None:
         action: Command action ('turn_on' or 'turn_off')
         slot: Slot number (1, 2, or 3)
     """
-    topic = f"pillbuddy/cmd/{device_id}"
-    payload = {
-        'action': action,
-        'slot': slot
-    }
+    publish_slot_command(iot_client, device_id, slot, action)
+
+
+
+def batch_get_status_items(device_ids: List[str]) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, Dict[str, Any]]]:
+    """
+    Fetch prescriptions and device records for several devices with BatchGetItem
     
-    iot_client.publish(
-        topic=topic,
-        qos=1,
-        payload=json.dumps(payload)
-    )
+    Every device has at most three prescriptions (slots 1-3), so all keys are
+    known up front and one BatchGetItem per 100 keys replaces a Query plus a
+    GetItem per device. Items already in the cache tier are not requested.
+    Unprocessed keys (throttling, 16 MB response limit) are retried with
+    capped exponential backoff and jitter.
+    
+    Args:
+        device_ids: Device identifiers to fetch
+    
+    Returns:
+        Tuple of (prescriptions by device_id, device item by device_id)
+    
+    Raises:
+        RuntimeError: If keys are still unprocessed after all retries
+    """
+    prescriptions_by_device = {device_id: [] for device_id in device_ids}
+    devices_by_id = {}
+    
+    # Serve what we can from the cache tier; only misses go to BatchGetItem
+    keys = []
+    for device_id in device_ids:
+        device_key = {'device_id': device_id}
+        device_item = devices_table.lookup(device_key)
+        if device_item is None:
+            keys.append((DEVICES_TABLE, device_key))
+        else:
+            devices_by_id[device_id] = device_item
+        for slot_num in [1, 2, 3]:
+            prescription_key = {'device_id': device_id, 'slot': slot_num}
+            prescription = prescriptions_table.lookup(prescription_key)
+            if prescription is None:
+                keys.append((PRESCRIPTIONS_TABLE, prescription_key))
+            else:
+                prescriptions_by_device[device_id].append(prescription)
+    
+    for chunk_start in range(0, len(keys), MAX_BATCH_GET_KEYS):
+        request_items = {}
+        for table_name, key in keys[chunk_start:chunk_start + MAX_BATCH_GET_KEYS]:
+            request_items.setdefault(table_name, {'Keys': []})['Keys'].append(key)
+        
+        attempt = 0
+        while request_items:
+            with timed('dynamodb'):
+                response = dynamodb.batch_get_item(RequestItems=request_items)
+            
+            for item in response.get('Responses', {}).get(PRESCRIPTIONS_TABLE, []):
+                prescriptions_by_device.setdefault(item['device_id'], []).append(item)
+                prescriptions_table.store(item)
+            for item in response.get('Responses', {}).get(DEVICES_TABLE, []):
+                devices_by_id[item['device_id']] = item
+                devices_table.store(item)
+            
+            request_items = response.get('UnprocessedKeys') or {}
+            if request_items:
+                attempt += 1
+                if attempt > BATCH_GET_MAX_RETRIES:
+                    raise RuntimeError("BatchGetItem left unprocessed keys after retries")
+                delay = min(BATCH_GET_MAX_DELAY_SECONDS, BATCH_GET_BASE_DELAY_SECONDS * (2 ** attempt))
+                time.sleep(random.uniform(0, delay))
+    
+    return prescriptions_by_device, devices_by_id
 
 
+def build_combined_slots(prescriptions: List[Dict[str, Any]], device_slots: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Combine prescriptions and device slot status into one structure
+    
+    Args:
+        prescriptions: Prescription items for one device
+        device_slots: Device 'slots' map (in_holder status)
+    
+    Returns:
+        Dictionary keyed by slot ('1'-'3') with slot_number, prescription_name,
+        pill_count and in_holder, ensuring all three slots are represented
+    """
+    combined_slots = {}
+    for slot_num in [1, 2, 3]:
+        slot_key = str(slot_num)
+        combined_slots[slot_key] = {
+            'slot_number': slot_num,
+            'prescription_name': None,
+            'pill_count': 0,
+            'in_holder': device_slots.get(slot_key, {}).get('in_holder', False)
+        }
+    
+    # Populate prescription data into combined structure
+    for prescription in prescriptions:
+        slot_key = str(prescription['slot'])
+        if slot_key in combined_slots:
+            combined_slots[slot_key]['prescription_name'] = prescription['prescription_name']
+            combined_slots[slot_key]['pill_count'] = prescription['pill_count']
+    
+    return combined_slots
+
+
+def build_status_parts(combined_slots: Dict[str, Any], device_label: Optional[str] = None) -> List[str]:
+    """
+    Build spoken status phrases for slots that have prescriptions
+    
+    Args:
+        combined_slots: Output of build_combined_slots()
+        device_label: Spoken device name, prefixed when the user has several devices
+    
+    Returns:
+        List of phrases such as "Slot 1 has Aspirin with 30 pills remaining"
+    """
+    status_parts = []
+    for slot_num in [1, 2, 3]:
+        slot_data = combined_slots[str(slot_num)]
+        if slot_data['prescription_name']:
+            name = slot_data['prescription_name']
+            count = slot_data['pill_count']
+            slot_text = f"{device_label} slot {slot_num}" if device_label else f"Slot {slot_num}"
+            
+            if count == 1:
+                status_parts.append(f"{slot_text} has {name} with {count} pill remaining")
+            else:
+                status_parts.append(f"{slot_text} has {name} with {count} pills remaining")
+    
+    return status_parts
+
+
+def build_multi_device_apl_datasources(device_slots: List[Tuple[str, str, Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Build one APL datasource covering several devices
+    
+    The top-level 'slots' array holds the primary device so the existing
+    three-slot template renders unchanged; 'devices' lists every device.
+    
+    Args:
+        device_slots: List of (device_id, device_label, combined_slots), primary first
+    
+    Returns:
+        Dictionary with 'slots' and 'devices' keys
+    """
+    devices = []
+    for device_id, device_label, combined_slots in device_slots:
+        devices.append({
+            'device_id': device_id,
+            'device_label': device_label,
+            'slots': build_apl_datasources(combined_slots)['slots']
+        })
+    
+    return {
+        'slots': devices[0]['slots'] if devices else build_apl_datasources({})['slots'],
+        'devices': devices
+    }
+
 
 def handle_query_status_intent(device_id: str, event: Dict[str, Any]) -> Dict[str, Any]:
     """
     Handle QueryStatusIntent - return current status of all slots
     
+    Covers every device linked to the user (see device_resolver.py). All
+    prescriptions and slot states are fetched with BatchGetItem and merged
+    into one spoken summary and one APL datasource.
+    
     Args:
-        device_id: Device identifier
+        device_id: Device identifier (primary device)
         event: Alexa request event
     
     Returns:
@@ -520,50 +730,29 @@ def handle_query_status_intent(device_id: str, event: Dict[str, Any]) -> Dict[st
         # Check if device supports APL for visual display
         device_supports_apl = supports_apl(event)
         
-        # Query all prescriptions for this device
-        response = prescriptions_table.query(
-            KeyConditionExpression='device_id = :device_id',
-            ExpressionAttributeValues={
-                ':device_id': device_id
-            }
-        )
-        
-        prescriptions = response.get('Items', [])
-        
-        # Fetch device slot data (in_holder status)
-        device_slots = fetch_device_slots(device_id)
-        
-        # Build combined slot data structure ensuring all three slots are represented
-        combined_slots = {}
-        for slot_num in [1, 2, 3]:
-            slot_key = str(slot_num)
-            combined_slots[slot_key] = {
-                'slot_number': slot_num,
-                'prescription_name': None,
-                'pill_count': 0,
-                'in_holder': device_slots.get(slot_key, {}).get('in_holder', False)
-            }
+        # Primary device first, then any other linked devices
+        device_ids = [device_id]
+        user_id = event.get('session', {}).get('user', {}).get('userId')
+        try:
+            for linked_device_id in device_resolver.resolve_device_ids(user_id):
+                if linked_device_id not in device_ids:
+                    device_ids.append(linked_device_id)
+        except Exception as e:
+            log_error('resolving linked devices, using primary only', e)
         
-        # Populate prescription data into combined structure
-        for prescription in prescriptions:
-            slot_key = str(prescription['slot'])
-            if slot_key in combined_slots:
-                combined_slots[slot_key]['prescription_name'] = prescription['prescription_name']
-                combined_slots[slot_key]['pill_count'] = prescription['pill_count']
+        prescriptions_by_device, devices_by_id = batch_get_status_items(device_ids)
         
-        # Build status message for voice response (only for slots with prescriptions)
+        multi_device = len(device_ids) > 1
         status_parts = []
-        for slot_num in [1, 2, 3]:
-            slot_key = str(slot_num)
-            slot_data = combined_slots[slot_key]
-            if slot_data['prescription_name']:
-                name = slot_data['prescription_name']
-                count = slot_data['pill_count']
-                
-                if count == 1:
-                    status_parts.append(f"Slot {slot_num} has {name} with {count} pill remaining")
-                else:
-                    status_parts.append(f"Slot {slot_num} has {name} with {count} pills remaining")
+        device_slots = []
+        for index, status_device_id in enumerate(device_ids):
+            device_label = f"PillBuddy {index + 1}" if multi_device else None
+            combined_slots = build_combined_slots(
+                prescriptions_by_device.get(status_device_id, []),
+                devices_by_id.get(status_device_id, {}).get('slots', {})
+            )
+            status_parts.extend(build_status_parts(combined_slots, device_label))
+            device_slots.append((status_device_id, device_label or 'PillBuddy', combined_slots))
         
         if not status_parts:
             return build_response(
@@ -571,49 +760,126 @@ def handle_query_status_intent(device_id: str, event: Dict[str, Any]) -> Dict[st
                 should_end_session=True
             )
         
-        if len(status_parts) == 1:
-            speech_text = status_parts[0] + "."
-        elif len(status_parts) == 2:
-            speech_text = status_parts[0] + ", and " + status_parts[1] + "."
-        else:
-            speech_text = ", ".join(status_parts[:-1]) + ", and " + status_parts[-1] + "."
+        speech_text = join_spoken_list(status_parts) + "."
         
         # Add APL visual display if device supports it
         apl_document = None
         apl_datasources = None
         
-        if device_supports_apl:
-            try:
-                # Load APL document template
-                apl_document = load_apl_document()
-                
-                if apl_document:
-                    # Build datasources from combined slot data
-                    apl_datasources = build_apl_datasources(combined_slots)
-                else:
-                    print("APL document could not be loaded, skipping visual display")
-            except Exception as e:
-                # Log error but don't fail the request - voice response should always work
-                print(f"Error preparing APL response: {str(e)}")
-                apl_document = None
-                apl_datasources = None
+        with timed('render'):
+            if device_supports_apl:
+                try:
+                    # Load APL document template
+                    apl_document = load_apl_document()
+                    
+                    if apl_document:
+                        # Build datasources from combined slot data
+                        if multi_device:
+                            apl_datasources = build_multi_device_apl_datasources(device_slots)
+                        else:
+                            apl_datasources = build_apl_datasources(device_slots[0][2])
+                    else:
+                        print("APL document could not be loaded, skipping visual display")
+                except Exception as e:
+                    # Log error but don't fail the request - voice response should always work
+                    log_error('preparing APL response', e)
+                    apl_document = None
+                    apl_datasources = None
+            
+            return build_response(
+                speech_text, 
+                should_end_session=True,
+                apl_document=apl_document,
+                apl_datasources=apl_datasources
+            )
+        
+    except Exception as e:
+        log_error('in handle_query_status_intent', e)
+        return build_response(
+            "Sorry, I'm having trouble retrieving your prescription status. Please try again.",
+            should_end_session=True
+        )
+
+
+
+def join_spoken_list(parts: List[str]) -> str:
+    """
+    Join phrases for speech: "a", "a, and b", "a, b, and c"
+    
+    Args:
+        parts: Phrases to join (at least one)
+    
+    Returns:
+        Joined phrase without final punctuation
+    """
+    if len(parts) == 1:
+        return parts[0]
+    return ", ".join(parts[:-1]) + ", and " + parts[-1]
+
+
+def format_time_of_day(timestamp: int) -> str:
+    """
+    Spoken local clock time of a millisecond timestamp (e.g. "8:05 AM")
+    
+    Args:
+        timestamp: Unix timestamp in milliseconds
+    """
+    minutes = (timestamp // 60000 + DOSE_DAY_UTC_OFFSET_MINUTES) % (24 * 60)
+    hour, minute = divmod(minutes, 60)
+    return f"{(hour - 1) % 12 + 1}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
+
+
+def handle_dose_today_intent(device_id: str, event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Handle DoseTodayIntent - "did I take my pills today"
+    
+    Answered from the device's DailyDoses item for today (see
+    daily_doses.py): a single GetItem however many events the day had.
+    
+    Args:
+        device_id: Device identifier
+        event: Alexa request event
+    
+    Returns:
+        Alexa response listing today's doses per prescription
+    """
+    if daily_doses_table is None:
+        return build_response(
+            "Sorry, daily dose tracking isn't set up for your PillBuddy yet.",
+            should_end_session=True
+        )
+    
+    try:
+        today = day_key(now_ms(), DOSE_DAY_UTC_OFFSET_MINUTES)
+        with timed('dynamodb'):
+            item = daily_doses_table.get_item(Key={'device_id': device_id, 'day': today}).get('Item')
+        
+        slots = dosed_slots(item)
+        if not slots:
+            return build_response(
+                "You haven't taken any pills from your PillBuddy today.",
+                should_end_session=True
+            )
+        
+        dose_parts = []
+        for slot, counters in slots:
+            name = counters['name'] or f"slot {slot}"
+            times = {1: 'once', 2: 'twice'}.get(counters['doses'], f"{counters['doses']} times")
+            dose_parts.append(f"{name} {times}, last at {format_time_of_day(counters['last_removal'])}")
         
         return build_response(
-            speech_text, 
-            should_end_session=True,
-            apl_document=apl_document,
-            apl_datasources=apl_datasources
+            "Today you took " + join_spoken_list(dose_parts) + ".",
+            should_end_session=True
         )
         
     except Exception as e:
-        print(f"Error in handle_query_status_intent: {str(e)}")
+        log_error('in handle_dose_today_intent', e)
         return build_response(
-            "Sorry, I'm having trouble retrieving your prescription status. Please try again.",
+            "Sorry, I'm having trouble checking today's doses. Please try again.",
             should_end_session=True
         )
 
 
-
 def handle_help_intent() -> Dict[str, Any]:
     """
     Handle AMAZON.HelpIntent
@@ -649,3 +915,30 @@ def handle_cancel_intent() -> Dict[str, Any]:
         Alexa response to cancel and end session
     """
     return build_response("Okay, cancelled.", should_end_session=True)
+
+
+def handle_session_ended_request(device_id: str, event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Handle SessionEndedRequest
+    
+    Returns:
+        Empty Alexa response that ends the session
+    """
+    return build_response("", should_end_session=True)
+
+
+# Dispatch tables: request type / intent name -> handler(device_id, event)
+REQUEST_HANDLERS = {
+    'LaunchRequest': handle_launch_request,
+    'SessionEndedRequest': handle_session_ended_request,
+}
+
+INTENT_HANDLERS = {
+    'SetupSlotIntent': handle_setup_slot_intent,
+    'QueryStatusIntent': handle_query_status_intent,
+    'DoseTodayIntent': handle_dose_today_intent,
+    'StartSetupIntent': handle_launch_request,
+    'AMAZON.HelpIntent': lambda device_id, event: handle_help_intent(),
+    'AMAZON.StopIntent': lambda device_id, event: handle_stop_intent(),
+    'AMAZON.CancelIntent': lambda device_id, event: handle_cancel_intent(),
+}
@@ -15,9 +15,11 @@ sys.modules['boto3'] = MagicMock()
 os.environ['DEVICES_TABLE'] = 'test_devices_table'
 os.environ['PRESCRIPTIONS_TABLE'] = 'test_prescriptions_table'
 os.environ['IOT_ENDPOINT'] = 'test_iot_endpoint'
+os.environ['CACHE_BACKEND'] = 'none'
 
-# Add parent directory to path for imports
+# Add parent directory and the PillBuddyCore layer to path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'layers', 'pillbuddy_core', 'python'))
 
 from lambda_function import supports_apl, fetch_device_slots, build_apl_datasources
 
@@ -674,3 +676,301 @@ class TestBuildResponse(unittest.TestCase):
         self.assertEqual(directive['document'], apl_doc)
         self.assertEqual(directive['datasources'], apl_data)
         self.assertEqual(len(directive['datasources']['slots']), 3)
+
+
+class TestLambdaHandlerDispatch(unittest.TestCase):
+    """Test cases for lambda_handler() dispatch tables"""
+    
+    def _intent_event(self, intent_name):
+        return {
+            'request': {'type': 'IntentRequest', 'intent': {'name': intent_name}},
+            'session': {'user': {'userId': 'esp32_001'}}
+        }
+    
+    def test_dispatches_registered_intent(self):
+        """Test that a registered intent is routed through INTENT_HANDLERS"""
+        import lambda_function
+        
+        handler = MagicMock(return_value={'dispatched': True})
+        with patch.dict(lambda_function.INTENT_HANDLERS, {'QueryStatusIntent': handler}):
+            result = lambda_function.lambda_handler(self._intent_event('QueryStatusIntent'), None)
+        
+        self.assertEqual(result, {'dispatched': True})
+        handler.assert_called_once()
+        self.assertEqual(handler.call_args[0][0], 'esp32_001')
+    
+    def test_unknown_intent(self):
+        """Test that unregistered intents get the fallback response"""
+        from lambda_function import lambda_handler
+        
+        result = lambda_handler(self._intent_event('UnknownIntent'), None)
+        
+        self.assertEqual(result['response']['outputSpeech']['text'], "Sorry, I don't understand that command.")
+        self.assertTrue(result['response']['shouldEndSession'])
+    
+    def test_session_ended_request(self):
+        """Test that SessionEndedRequest is routed through REQUEST_HANDLERS"""
+        from lambda_function import lambda_handler
+        
+        result = lambda_handler({'request': {'type': 'SessionEndedRequest'}}, None)
+        
+        self.assertEqual(result['response']['outputSpeech']['text'], '')
+        self.assertTrue(result['response']['shouldEndSession'])
+    
+    def test_dispatch_records_intent_latency(self):
+        """Test that each dispatch records end-to-end latency for its intent"""
+        from pillbuddy_core import instrumentation
+        from lambda_function import lambda_handler
+        
+        instrumentation._histograms.clear()
+        with patch('lambda_function.flush_metrics'):
+            lambda_handler(self._intent_event('AMAZON.HelpIntent'), None)
+        
+        self.assertEqual(instrumentation.get_histogram('AMAZON.HelpIntent', 'total').count, 1)
+
+
+class TestQueryStatusIntentBatch(unittest.TestCase):
+    """Test cases for the BatchGetItem-based status query"""
+    
+    def _event(self):
+        return {
+            'request': {'type': 'IntentRequest', 'intent': {'name': 'QueryStatusIntent'}},
+            'session': {'user': {'userId': 'amzn1.user'}}
+        }
+    
+    def _responses(self, prescriptions, devices):
+        return {
+            'Responses': {
+                'test_prescriptions_table': prescriptions,
+                'test_devices_table': devices
+            }
+        }
+    
+    @patch('lambda_function.dynamodb')
+    def test_single_device_uses_one_batch_call(self, mock_dynamodb):
+        """Test that a single device's status is fetched with one BatchGetItem"""
+        from lambda_function import handle_query_status_intent
+        
+        mock_dynamodb.batch_get_item.return_value = self._responses(
+            [{'device_id': 'esp32_001', 'slot': 1, 'prescription_name': 'Aspirin', 'pill_count': 30}],
+            [{'device_id': 'esp32_001', 'slots': {'1': {'in_holder': True}}}]
+        )
+        
+        result = handle_query_status_intent('esp32_001', self._event())
+        
+        self.assertEqual(result['response']['outputSpeech']['text'], 'Slot 1 has Aspirin with 30 pills remaining.')
+        mock_dynamodb.batch_get_item.assert_called_once()
+        request_items = mock_dynamodb.batch_get_item.call_args[1]['RequestItems']
+        self.assertEqual(len(request_items['test_prescriptions_table']['Keys']), 3)
+        self.assertEqual(request_items['test_devices_table']['Keys'], [{'device_id': 'esp32_001'}])
+    
+    @patch('lambda_function.dynamodb')
+    def test_cached_items_skip_batch_get(self, mock_dynamodb):
+        """Test that items in the cache tier are not requested, and fetched items are cached"""
+        from pillbuddy_core.cache import CachedTable, MemoryCache
+        from pillbuddy_core.ddb_client import FastTable, DEVICES_KEY_SCHEMA, PRESCRIPTIONS_KEY_SCHEMA
+        from lambda_function import batch_get_status_items
+        
+        cache = MemoryCache()
+        devices = CachedTable(FastTable(MagicMock(), 'test_devices_table', DEVICES_KEY_SCHEMA), cache)
+        prescriptions = CachedTable(FastTable(MagicMock(), 'test_prescriptions_table', PRESCRIPTIONS_KEY_SCHEMA), cache)
+        devices.store({'device_id': 'esp32_001', 'slots': {'1': {'in_holder': True}}})
+        prescriptions.store({'device_id': 'esp32_001', 'slot': 1, 'prescription_name': 'Aspirin', 'pill_count': 30})
+        mock_dynamodb.batch_get_item.return_value = self._responses(
+            [{'device_id': 'esp32_001', 'slot': 2, 'prescription_name': 'Ibuprofen', 'pill_count': 12}], []
+        )
+        
+        with patch('lambda_function.devices_table', devices), patch('lambda_function.prescriptions_table', prescriptions):
+            prescriptions_by_device, devices_by_id = batch_get_status_items(['esp32_001'])
+        
+        request_items = mock_dynamodb.batch_get_item.call_args[1]['RequestItems']
+        self.assertNotIn('test_devices_table', request_items)
+        self.assertEqual(request_items['test_prescriptions_table']['Keys'],
+                         [{'device_id': 'esp32_001', 'slot': 2}, {'device_id': 'esp32_001', 'slot': 3}])
+        self.assertEqual(sorted(p['slot'] for p in prescriptions_by_device['esp32_001']), [1, 2])
+        self.assertIn('esp32_001', devices_by_id)
+        self.assertEqual(prescriptions.lookup({'device_id': 'esp32_001', 'slot': 2})['pill_count'], 12)
+    
+    @patch('lambda_function.time.sleep')
+    @patch('lambda_function.dynamodb')
+    def test_unprocessed_keys_are_retried(self, mock_dynamodb, mock_sleep):
+        """Test that UnprocessedKeys are re-requested until drained"""
+        from lambda_function import batch_get_status_items
+        
+        unprocessed = {'test_prescriptions_table': {'Keys': [{'device_id': 'esp32_001', 'slot': 2}]}}
+        first = self._responses([], [{'device_id': 'esp32_001', 'slots': {}}])
+        first['UnprocessedKeys'] = unprocessed
+        second = self._responses(
+            [{'device_id': 'esp32_001', 'slot': 2, 'prescription_name': 'Ibuprofen', 'pill_count': 4}], []
+        )
+        mock_dynamodb.batch_get_item.side_effect = [first, second]
+        
+        prescriptions, devices = batch_get_status_items(['esp32_001'])
+        
+        self.assertEqual(mock_dynamodb.batch_get_item.call_count, 2)
+        self.assertEqual(mock_dynamodb.batch_get_item.call_args[1]['RequestItems'], unprocessed)
+        self.assertEqual(prescriptions['esp32_001'][0]['prescription_name'], 'Ibuprofen')
+        self.assertIn('esp32_001', devices)
+        mock_sleep.assert_called_once()
+    
+    @patch('lambda_function.time.sleep')
+    @patch('lambda_function.dynamodb')
+    def test_unprocessed_keys_give_up_after_retries(self, mock_dynamodb, mock_sleep):
+        """Test that persistent UnprocessedKeys raise instead of returning partial status"""
+        from lambda_function import batch_get_status_items, BATCH_GET_MAX_RETRIES
+        
+        response = self._responses([], [])
+        response['UnprocessedKeys'] = {'test_devices_table': {'Keys': [{'device_id': 'esp32_001'}]}}
+        mock_dynamodb.batch_get_item.return_value = response
+        
+        with self.assertRaises(RuntimeError):
+            batch_get_status_items(['esp32_001'])
+        self.assertEqual(mock_dynamodb.batch_get_item.call_count, BATCH_GET_MAX_RETRIES + 1)
+    
+    @patch('lambda_function.dynamodb')
+    @patch('lambda_function.device_resolver')
+    def test_multiple_devices_merged(self, mock_resolver, mock_dynamodb):
+        """Test that linked devices are merged into one summary and datasource"""
+        from lambda_function import handle_query_status_intent
+        
+        mock_resolver.resolve_device_ids.return_value = ['esp32_001', 'esp32_002']
+        mock_dynamodb.batch_get_item.return_value = self._responses(
+            [
+                {'device_id': 'esp32_001', 'slot': 1, 'prescription_name': 'Aspirin', 'pill_count': 30},
+                {'device_id': 'esp32_002', 'slot': 3, 'prescription_name': 'Vitamin D', 'pill_count': 1}
+            ],
+            [
+                {'device_id': 'esp32_001', 'slots': {'1': {'in_holder': True}}},
+                {'device_id': 'esp32_002', 'slots': {'3': {'in_holder': True}}}
+            ]
+        )
+        event = self._event()
+        event['context'] = {'System': {'device': {'supportedInterfaces': {'Alexa.Presentation.APL': {}}}}}
+        
+        with patch('lambda_function.load_apl_document', return_value={'type': 'APL'}):
+            result = handle_query_status_intent('esp32_001', event)
+        
+        self.assertEqual(
+            result['response']['outputSpeech']['text'],
+            'PillBuddy 1 slot 1 has Aspirin with 30 pills remaining, '
+            'and PillBuddy 2 slot 3 has Vitamin D with 1 pill remaining.'
+        )
+        mock_dynamodb.batch_get_item.assert_called_once()
+        datasources = result['response']['directives'][0]['datasources']
+        self.assertEqual(len(datasources['devices']), 2)
+        self.assertEqual(datasources['slots'][0]['prescription_name'], 'Aspirin')
+        self.assertEqual(datasources['devices'][1]['slots'][2]['prescription_name'], 'Vitamin D')
+
+
+class TestDoseTodayIntent(unittest.TestCase):
+    """Test cases for the daily dose aggregate query"""
+    
+    # 2026-10-18 12:00:00 UTC
+    NOW_MS = 1792324800000
+    
+    @patch('lambda_function.now_ms', return_value=NOW_MS)
+    @patch('lambda_function.daily_doses_table')
+    def test_reads_one_item_for_today(self, mock_table, mock_now):
+        """Test that today's doses come from a single GetItem"""
+        from lambda_function import handle_dose_today_intent
+        
+        mock_table.get_item.return_value = {'Item': {
+            'device_id': 'esp32_001',
+            'day': '2026-10-18',
+            'slot_1_doses': 2,
+            'slot_1_first_removal': self.NOW_MS - 4 * 3600000,
+            'slot_1_last_removal': self.NOW_MS - 3600000 + 5 * 60000,
+            'slot_1_name': 'Aspirin',
+            'slot_3_doses': 1,
+            'slot_3_last_removal': self.NOW_MS + 30 * 60000,
+            'slot_3_name': None
+        }}
+        
+        result = handle_dose_today_intent('esp32_001', {})
+        
+        mock_table.get_item.assert_called_once_with(Key={'device_id': 'esp32_001', 'day': '2026-10-18'})
+        self.assertEqual(
+            result['response']['outputSpeech']['text'],
+            "Today you took Aspirin twice, last at 11:05 AM, and slot 3 once, last at 12:30 PM."
+        )
+    
+    @patch('lambda_function.now_ms', return_value=NOW_MS)
+    @patch('lambda_function.daily_doses_table')
+    def test_no_doses_today(self, mock_table, mock_now):
+        """Test the reply when today's item does not exist yet"""
+        from lambda_function import handle_dose_today_intent
+        
+        mock_table.get_item.return_value = {}
+        
+        result = handle_dose_today_intent('esp32_001', {})
+        
+        self.assertIn("haven't taken any pills", result['response']['outputSpeech']['text'])
+    
+    @patch('lambda_function.daily_doses_table', None)
+    def test_table_not_configured(self):
+        """Test the reply when DAILY_DOSES_TABLE is not set"""
+        from lambda_function import handle_dose_today_intent
+        
+        result = handle_dose_today_intent('esp32_001', {})
+        
+        self.assertIn("isn't set up", result['response']['outputSpeech']['text'])
+
+
+class TestSetupIoTPublish(unittest.TestCase):
+    """Test cases for the LED publish in the setup flow"""
+    
+    def _setup_event(self):
+        return {
+            'request': {
+                'type': 'IntentRequest',
+                'intent': {
+                    'name': 'SetupSlotIntent',
+                    'slots': {
+                        'prescriptionName': {'value': 'Aspirin'},
+                        'pillCount': {'value': '30'},
+                        'hasRefills': {'value': 'yes'}
+                    }
+                }
+            },
+            'session': {'user': {'userId': 'esp32_001'}, 'attributes': {}}
+        }
+    
+    @patch('lambda_function.prescriptions_table')
+    @patch('lambda_function.iot_client')
+    def test_publish_after_write(self, mock_iot, mock_table):
+        """Test that the LED command is published once the prescription is saved"""
+        from lambda_function import lambda_handler
+        
+        result = lambda_handler(self._setup_event(), None)
+        
+        self.assertIn('Great!', result['response']['outputSpeech']['text'])
+        mock_table.put_item.assert_called_once()
+        mock_iot.publish.assert_called_once()
+        self.assertEqual(json.loads(mock_iot.publish.call_args[1]['payload']), {'action': 'turn_on', 'slot': 1})
+    
+    @patch('lambda_function.prescriptions_table')
+    @patch('lambda_function.iot_client')
+    def test_publish_timed_under_intent(self, mock_iot, mock_table):
+        """Test that the publish is recorded as the setup intent's 'iot' stage"""
+        from pillbuddy_core import instrumentation
+        from lambda_function import lambda_handler
+        
+        instrumentation._histograms.clear()
+        with patch('lambda_function.flush_metrics'):
+            lambda_handler(self._setup_event(), None)
+        
+        self.assertEqual(instrumentation.get_histogram('SetupSlotIntent', 'total').count, 1)
+        self.assertEqual(instrumentation.get_histogram('SetupSlotIntent', 'iot').count, 1)
+    
+    @patch('lambda_function.prescriptions_table')
+    @patch('lambda_function.iot_client')
+    def test_publish_failure_does_not_change_reply(self, mock_iot, mock_table):
+        """Test that a failed publish is logged and the reply still succeeds"""
+        from lambda_function import lambda_handler
+        
+        mock_iot.publish.side_effect = Exception('IoT unavailable')
+        
+        result = lambda_handler(self._setup_event(), None)
+        
+        self.assertIn('Great!', result['response']['outputSpeech']['text'])
+        self.assertFalse(result['response']['shouldEndSession'])
@@ -11,21 +11,51 @@ Environment Variables:
     IOT_ENDPOINT: AWS IoT Core endpoint URL
     ALEXA_SKILL_ID: Alexa skill ID for notifications
     CALL_USER_LAMBDA_ARN: ARN of the callUser Lambda function to trigger phone calls
+    DAILY_DOSES_TABLE: Optional DynamoDB table for per-day dose counters (PillBuddy_DailyDoses)
+    CALL_LIMITS_TABLE: Optional DynamoDB table shared by containers for phone call limits (PillBuddy_CallLimits)
+    CALL_COOLDOWN_MS: Shortest time between phone calls about one slot (default 900000)
+    CALL_BUCKET_SIZE, CALL_TOKEN_INTERVAL_MS: Phone calls a device can place back to back, and the
+        time to earn one back (default 3, 1200000)
+    MAX_OUTSTANDING_CALLS, CALL_LEASE_MS: Phone calls in progress across the fleet, and how long
+        each counts as in progress (default 10, 180000)
+    DOSE_DAY_UTC_OFFSET_MINUTES: Offset of the local day used for daily dose counters (default 0)
+    DEBOUNCE_WINDOW_MS: Sensor debounce window per slot (default 2000, 0 disables)
+    REORDER_WINDOW_MS: Longest a queued event waits for earlier sequences of its device (default 2000, 0 disables)
     AWS_REGION: AWS region
 """
 
+import base64
 import json
 import os
-import time
-from decimal import Decimal
-import boto3
 from botocore.exceptions import ClientError
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
-iot_client = boto3.client('iot-data')
-events_client = boto3.client('events')
-lambda_client = boto3.client('lambda')
+from pillbuddy_core.cache import CachedTable, cache_from_env, cache_ttl_from_env, dynamodb_client_from_env
+from pillbuddy_core.call_limits import call_limiter_from_env
+from pillbuddy_core.clients import make_client
+from pillbuddy_core.daily_doses import record_dose, undo_dose, utc_offset_from_env
+from pillbuddy_core.debounce import SlotDebouncer, debounce_condition, debounce_window_from_env, is_bounce
+from pillbuddy_core.ddb_client import (
+    FastDynamoDB, decode_item, DEVICES_KEY_SCHEMA, PRESCRIPTIONS_KEY_SCHEMA, EVENTS_KEY_SCHEMA, DAILY_DOSES_KEY_SCHEMA,
+    CALL_LIMITS_KEY_SCHEMA
+)
+from pillbuddy_core.errors import log_error, error_response
+from pillbuddy_core.event_codec import decode_forwarded_event, is_forwarded_binary
+from pillbuddy_core.instrumentation import flush_metrics
+from pillbuddy_core.iot import LedCommandBuffer, publish_command
+from pillbuddy_core.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy, is_retryable
+from pillbuddy_core.round_trip import record_round_trip, start_trace
+from pillbuddy_core.sequencing import (
+    NEXT, GAP, LATE, DUPLICATE, ReorderBuffer, classify_sequence, reorder_window_from_env, sequence_metrics,
+    sequence_update
+)
+from pillbuddy_core.timeutil import now_ms
+
+# Initialize AWS clients (shared configuration from the PillBuddyCore layer)
+dynamodb = FastDynamoDB(dynamodb_client_from_env())
+# LED commands and phone calls are retried by outbound_retry instead of botocore
+iot_client = make_client('iot-data', max_attempts=1)
+events_client = make_client('events')
+lambda_client = make_client('lambda', max_attempts=1)
 
 # Environment variables
 DEVICES_TABLE = os.environ['DEVICES_TABLE']
@@ -34,63 +64,231 @@ EVENTS_TABLE = os.environ['EVENTS_TABLE']
 IOT_ENDPOINT = os.environ['IOT_ENDPOINT']
 ALEXA_SKILL_ID = os.environ.get('ALEXA_SKILL_ID', '')
 CALL_USER_LAMBDA_ARN = os.environ.get('CALL_USER_LAMBDA_ARN', '')
+DAILY_DOSES_TABLE = os.environ.get('DAILY_DOSES_TABLE', '')
+CALL_LIMITS_TABLE = os.environ.get('CALL_LIMITS_TABLE', '')
+DOSE_DAY_UTC_OFFSET_MINUTES = utc_offset_from_env()
 # AWS_REGION is automatically available in Lambda environment
 
-# DynamoDB tables
-devices_table = dynamodb.Table(DEVICES_TABLE)
-prescriptions_table = dynamodb.Table(PRESCRIPTIONS_TABLE)
-events_table = dynamodb.Table(EVENTS_TABLE)
+# DynamoDB tables - Devices and Prescriptions are read through the cache tier
+cache = cache_from_env()
+devices_table = CachedTable(dynamodb.table(DEVICES_TABLE, DEVICES_KEY_SCHEMA), cache, cache_ttl_from_env())
+prescriptions_table = CachedTable(dynamodb.table(PRESCRIPTIONS_TABLE, PRESCRIPTIONS_KEY_SCHEMA), cache, cache_ttl_from_env())
+events_table = dynamodb.table(EVENTS_TABLE, EVENTS_KEY_SCHEMA)
+debouncer = SlotDebouncer(debounce_window_from_env())
+led_commands = LedCommandBuffer()
+outbound_retry = RetryPolicy()
+iot_breaker = CircuitBreaker('iot-data')
+lambda_breaker = CircuitBreaker('lambda')
+daily_doses_table = dynamodb.table(DAILY_DOSES_TABLE, DAILY_DOSES_KEY_SCHEMA) if DAILY_DOSES_TABLE else None
+call_limiter = call_limiter_from_env(
+    dynamodb.table(CALL_LIMITS_TABLE, CALL_LIMITS_KEY_SCHEMA) if CALL_LIMITS_TABLE else None
+)
 
 # Constants
 REFILL_THRESHOLD = 5
 TIMEOUT_MINUTES = 10
 TTL_DAYS = 30
+SLOTS = (1, 2, 3)
+STATE_UPDATE_ATTEMPTS = 5
+REORDER_WINDOW_MS = reorder_window_from_env()
+
+# A transition stored by an earlier delivery of the same event. Its side
+# effects may not have finished (the delivery failed after the state update),
+# so they are run again; each of them is safe to repeat
+REDELIVERED = 'redelivered'
+
+# A transition the stored state has moved past - redelivered after a later
+# event for the slot was processed, or delivered out of order - whose side
+# effects are still owed: a removal the bottle's return overtook still counts
+# its dose, and a return still refunds the removal it shows was a wobble
+OVERTAKEN = 'overtaken'
+
+# Why a transition was not applied -> response message
+SKIPPED_MESSAGES = {
+    'duplicate': 'Event already processed',
+    'stale': 'Newer slot state already stored, event not applied',
+    'debounced': 'Sensor bounce ignored',
+}
 
 
 def lambda_handler(event, context):
     """
     Main entry point for IoT Core events
     
+    Invoked either directly by the IoT Rule with one event, or by an SQS or
+    Kinesis event source mapping with a batch of queued events (see
+    infrastructure/iot_rule_config.py).
+    
     Args:
-        event: IoT message from pillbuddy/events/{device_id}
-               Can be either:
-               1. Raw ESP32 format (3 fields): event_type, slot, in_holder
-               2. IoT Rule transformed format (with device_id, ts_ms, etc.)
+        event: IoT message from pillbuddy/events/{device_id}, as projected
+               by the IoT Rule (infrastructure/iot_rule_sql.py): the ESP32's
+               event_type, slot and in_holder plus device_id, ts_ms,
+               received_ms, sequence, state and sensor_level. The rule drops
+               invalid messages; the checks here cover direct invocations.
+               Or a multi-slot slot_states_changed (see
+               handle_slot_states_changed), a startup slot_snapshot (see
+               handle_slot_snapshot), or a compact binary event forwarded
+               by the binary rule as {device_id, payload_b64, received_ms}
+               (see pillbuddy_core.event_codec), or an event source batch:
+               {'Records': [...]}
         context: Lambda context object
         
     Returns:
-        dict: Processing status
+        dict: Processing status, or a partial batch response for batches
+    """
+    try:
+        if 'Records' in event:
+            return handle_record_batch(event['Records'])
+        return process_event(event)
+    
+    finally:
+        flush_led_commands()
+        flush_metrics('IoTEventProcessor')
+
+
+def process_event(event):
+    """
+    Validate and process a single device event
+    
+    Args:
+        event: Device event as projected by the IoT Rule
+        
+    Returns:
+        dict: Processing status - 4xx for events that can never succeed,
+              503 for failures worth retrying (throttling, timeouts, an
+              open circuit) and 500 for other errors, which a retry would
+              only repeat
     """
     try:
         print(f"Received event: {json.dumps(event)}")
         
-        # Extract or derive required fields
-        # IoT Rule adds these fields, but handle raw ESP32 format too
+        if is_forwarded_binary(event):
+            try:
+                event = decode_forwarded_event(event)
+            except (ValueError, KeyError) as e:
+                print(f"Invalid binary event: {e}")
+                return error_response(400, f'Invalid binary event: {e}')
+        
+        # Processor receive time, for the LED round-trip trace (see round_trip.py)
+        event = dict(event, lambda_ms=now_ms())
+        
+        # IoT Rule adds device_id from the topic
         device_id = event.get('device_id')
         event_type = event.get('event_type')
         
         if not device_id:
             print("Error: device_id not found in event")
-            return {
-                'statusCode': 400,
-                'body': json.dumps({'error': 'device_id required'})
-            }
+            return error_response(400, 'device_id required')
         
         if event_type == 'slot_state_changed':
             return handle_slot_state_changed(event)
+        elif event_type == 'slot_states_changed':
+            return handle_slot_states_changed(event)
+        elif event_type == 'slot_snapshot':
+            return handle_slot_snapshot(event)
         else:
             print(f"Unknown event type: {event_type}")
-            return {
-                'statusCode': 400,
-                'body': json.dumps({'error': f'Unknown event type: {event_type}'})
-            }
+            return error_response(400, f'Unknown event type: {event_type}')
             
     except Exception as e:
-        print(f"Error processing event: {str(e)}")
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': str(e)})
-        }
+        log_error('processing event', e)
+        if is_retryable(e) or isinstance(e, CircuitOpenError):
+            return error_response(503, str(e))
+        return error_response(500, str(e))
+
+
+def decode_record(record):
+    """
+    Device event carried by an SQS message or Kinesis record
+    
+    Binary events are decoded here, before reordering, since their sequence
+    is inside the payload.
+    
+    Raises:
+        ValueError: If the payload is not JSON or not a valid binary event
+    """
+    if record.get('eventSource') == 'aws:kinesis':
+        event = json.loads(base64.b64decode(record['kinesis']['data']))
+    else:
+        event = json.loads(record['body'])
+    if isinstance(event, dict) and is_forwarded_binary(event):
+        return decode_forwarded_event(event)
+    return event
+
+
+def handle_record_batch(records):
+    """
+    Process a batch of queued device events with partial batch failure reporting
+    
+    Each device's sequenced events are first put back in sequence order by a
+    bounded reorder buffer (see sequencing.ReorderBuffer), so events overtaken
+    in the queue are applied in order.
+    
+    Events that fail with a retryable error (throttling, timeouts; a 503
+    from process_event) are reported back so the event source redelivers
+    them; everything else in the batch is acknowledged, including events
+    that fail permanently (a missing field, a ValidationException), since
+    redelivering them would only repeat the failure. Once an event fails, the device's later events in
+    the batch are reported too so they are retried after it, in order. For
+    Kinesis, which resumes the shard from the reported record, processing
+    stops at the first failure and the earliest unprocessed record is
+    reported.
+    
+    Args:
+        records: SQS or Kinesis event source records
+        
+    Returns:
+        dict: {'batchItemFailures': [{'itemIdentifier': ...}]}
+    """
+    buffer = ReorderBuffer(REORDER_WINDOW_MS)
+    ordered = []
+    
+    for position, record in enumerate(records):
+        try:
+            event = decode_record(record)
+        except (ValueError, KeyError, TypeError) as e:
+            # Redelivery cannot fix a malformed payload
+            log_error('decoding queued event', e)
+            continue
+        if not isinstance(event, dict):
+            print(f"Skipping queued event that is not an object: {event!r}")
+            continue
+        
+        sequence = event.get('sequence')
+        ordered.extend(buffer.add(
+            event.get('device_id'), sequence if isinstance(sequence, int) else 0,
+            event.get('received_ms', 0), (position, event)
+        ))
+    ordered.extend(buffer.flush())
+    sequence_metrics.reordered += buffer.reordered
+    
+    kinesis = bool(records) and records[0].get('eventSource') == 'aws:kinesis'
+    failed = []
+    failed_devices = set()
+    for index, (position, event) in enumerate(ordered):
+        device_id = event.get('device_id')
+        if device_id in failed_devices:
+            failed.append(position)
+            continue
+        
+        result = process_event(event)
+        if result['statusCode'] == 503:
+            failed.append(position)
+            failed_devices.add(device_id)
+            if kinesis:
+                failed = [min(position for position, _ in ordered[index:])]
+                break
+    
+    if failed:
+        print(f"Returning {len(failed)} of {len(records)} records for retry")
+    return {'batchItemFailures': [{'itemIdentifier': item_identifier(records[position])} for position in failed]}
+
+
+def item_identifier(record):
+    """Identifier of an event source record for batchItemFailures"""
+    if record.get('eventSource') == 'aws:kinesis':
+        return record['kinesis']['sequenceNumber']
+    return record['messageId']
 
 
 def handle_slot_state_changed(event):
@@ -99,14 +297,17 @@ def handle_slot_state_changed(event):
     
     Implements Algorithm 2 from design document:
     1. Log event to Events table with TTL
-    2. Update device slot state and last_seen
+    2. Update device slot state and last_seen - skipped for duplicate and
+       out-of-order (stale) events, written without side effects for
+       bounced ones (see update_device_states)
     3. Get prescription for the slot
     4. If bottle removed: decrement pill count, set removal_timestamp, check refill reminder
     5. If bottle returned: clear removal_timestamp, turn off LED
     
     Args:
-        event: IoT event with required fields: event_type, slot, in_holder
-               Optional fields added by IoT Rule: device_id, ts_ms, sequence, state, sensor_level
+        event: IoT event with required fields: device_id, event_type, slot, in_holder
+               Fields added by IoT Rule (defaulted here for direct invocations):
+               ts_ms, sequence, state, sensor_level
         
     Returns:
         dict: Processing status
@@ -117,7 +318,7 @@ def handle_slot_state_changed(event):
     in_holder = event['in_holder']
     
     # Optional fields - use defaults if not provided by IoT Rule
-    timestamp = event.get('ts_ms', int(time.time() * 1000))
+    timestamp = event.get('ts_ms', now_ms())
     sequence = event.get('sequence', 0)
     state = event.get('state', 'in_holder' if in_holder else 'not_in_holder')
     sensor_level = event.get('sensor_level', 1 if in_holder else 0)
@@ -125,27 +326,75 @@ def handle_slot_state_changed(event):
     # Validate slot number
     if slot not in [1, 2, 3]:
         print(f"Invalid slot number: {slot}")
+        return error_response(400, 'Invalid slot number')
+    
+    # 1. Log event to Events table with TTL (events that are not applied too,
+    # so the history shows everything the device sent)
+    log_event(device_id, timestamp, slot, state, in_holder, sensor_level, sequence)
+    
+    # 2. Update device slot state and last_seen, unless the event is older
+    # than the stored state or a sequence already processed. A sensor bounce
+    # (see debounce.py) is written too, so the slot shows where the bottle
+    # is, but skips the side effects; bounces this container can tell from
+    # memory skip the conditional check that would catch them
+    bounced = [slot] if debouncer.is_bounce(device_id, slot, in_holder, timestamp) else []
+    reason = update_device_states(device_id, [(slot, in_holder)], timestamp, sequence, bounced)[1].get(slot)
+    if reason == 'debounced':
+        apply_bounce_side_effects(device_id, slot, in_holder, timestamp)
+        debouncer.accept(device_id, slot, in_holder, timestamp)
+    if reason == OVERTAKEN:
+        message = apply_overtaken_side_effects(device_id, slot, in_holder, timestamp)
+        if message:
+            return {
+                'statusCode': 200,
+                'body': json.dumps({'status': 'success', 'message': message})
+            }
+        reason = 'stale'
+    if reason:
+        if reason == 'debounced':
+            debouncer.debounced += 1
+        print(f"Skipped {state} for device {device_id}, slot {slot}: {reason}")
         return {
-            'statusCode': 400,
-            'body': json.dumps({'error': 'Invalid slot number'})
+            'statusCode': 200,
+            'body': json.dumps({'status': reason, 'message': SKIPPED_MESSAGES[reason]})
         }
     
-    # Check for duplicate events (deduplication)
-    # Skip deduplication if sequence is 0 (ESP32 doesn't provide sequence numbers)
-    if sequence > 0 and is_duplicate_event(device_id, sequence):
-        print(f"Duplicate event detected for device {device_id}, sequence {sequence}")
+    # 3-4. Prescription side effects for this slot. A redelivered event whose
+    # state is already stored gets here too, so side effects that failed the
+    # first time are finished; the debouncer only remembers the transition
+    # once they have succeeded
+    message = apply_slot_side_effects(device_id, slot, in_holder, timestamp, start_trace(event))
+    debouncer.accept(device_id, slot, in_holder, timestamp)
+    if message:
         return {
             'statusCode': 200,
-            'body': json.dumps({'status': 'duplicate', 'message': 'Event already processed'})
+            'body': json.dumps({'status': 'success', 'message': message})
         }
     
-    # 1. Log event to Events table with TTL
-    log_event(device_id, timestamp, slot, state, in_holder, sensor_level, sequence)
+    return {
+        'statusCode': 200,
+        'body': json.dumps({'status': 'success', 'message': 'Event processed'})
+    }
+
+
+def apply_slot_side_effects(device_id, slot, in_holder, timestamp, trace=None):
+    """
+    Run the side effects of one accepted slot transition
     
-    # 2. Update device slot state and last_seen
-    update_device_state(device_id, slot, in_holder, timestamp)
+    3. Get prescription for the slot
+    4. If bottle removed: decrement pill count, set removal_timestamp, check refill reminder
+       If bottle returned: clear removal_timestamp, turn off LED
     
-    # 3. Get prescription for this slot
+    Args:
+        device_id: Device identifier
+        slot: Slot number (1-3)
+        in_holder: Boolean state
+        timestamp: Unix timestamp in milliseconds
+        trace: Round-trip stamps of the event (round_trip.start_trace), or None
+        
+    Returns:
+        str: Outcome message for a slot without a prescription, else None
+    """
     prescription = get_prescription(device_id, slot)
     
     if not prescription:
@@ -155,80 +404,240 @@ def handle_slot_state_changed(event):
         # This prevents calling on device startup or when bottle is removed
         if in_holder:
             print(f"Bottle inserted into empty slot {slot}, triggering phone call")
-            trigger_phone_call_for_empty_slot(device_id, slot)
-            return {
-                'statusCode': 200,
-                'body': json.dumps({'status': 'success', 'message': 'Bottle inserted into empty slot, phone call triggered'})
-            }
+            if not trigger_phone_call_for_empty_slot(device_id, slot):
+                return 'Bottle inserted into empty slot, phone call skipped'
+            return 'Bottle inserted into empty slot, phone call triggered'
         else:
             print(f"Bottle removed from empty slot {slot}, no action needed")
-            return {
-                'statusCode': 200,
-                'body': json.dumps({'status': 'success', 'message': 'No prescription configured, no action needed'})
-            }
+            return 'No prescription configured, no action needed'
     
-    # 4. Process bottle removal or return
     if not in_holder:
         # Bottle removed - decrement pill count
         process_bottle_removal(device_id, slot, prescription, timestamp)
     else:
         # Bottle returned - clear removal timestamp and turn off LED
-        process_bottle_return(device_id, slot, prescription, timestamp)
+        process_bottle_return(device_id, slot, prescription, timestamp, trace)
+    return None
+
+
+def apply_bounce_side_effects(device_id, slot, in_holder, timestamp):
+    """
+    Record a bounced transition on the prescription without counting it
     
-    # Update last processed sequence (only if sequence > 0)
-    if sequence > 0:
-        update_last_sequence(device_id, sequence)
+    A removal that bounces off the bottle's return (picked up again right
+    after it was put back) is not another dose, but the bottle is out, so
+    removal_timestamp is set and the timeout reminder still fires. A bounced
+    return repeats the stored state and needs nothing.
     
-    return {
-        'statusCode': 200,
-        'body': json.dumps({'status': 'success', 'message': 'Event processed'})
-    }
+    Args:
+        device_id: Device identifier
+        slot: Slot number (1-3)
+        in_holder: Boolean state
+        timestamp: Unix timestamp in milliseconds
+    """
+    if in_holder:
+        return
+    try:
+        prescriptions_table.update_item(
+            Key={
+                'device_id': device_id,
+                'slot': slot
+            },
+            UpdateExpression='SET removal_timestamp = :timestamp, updated_at = :timestamp',
+            ConditionExpression='attribute_exists(pill_count)',
+            ExpressionAttributeValues={':timestamp': timestamp}
+        )
+        print(f"Bounced removal at {timestamp} marks the bottle out for device {device_id}, slot {slot}")
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            log_error('recording bounced removal', e)
+            raise
+        # No prescription for the slot
 
 
-def is_duplicate_event(device_id, sequence):
+def apply_overtaken_side_effects(device_id, slot, in_holder, timestamp):
     """
-    Check if event has already been processed based on sequence number
+    Run what is still owed for a transition the slot has moved past (OVERTAKEN)
+    
+    The later event already set the slot's LED and removal_timestamp, so
+    neither is touched: an overtaken removal only counts its dose, and an
+    overtaken return only refunds a wobble.
     
     Args:
         device_id: Device identifier
-        sequence: Event sequence number
+        slot: Slot number (1-3)
+        in_holder: Boolean state
+        timestamp: Unix timestamp in milliseconds
         
     Returns:
-        bool: True if duplicate, False otherwise
+        str: Outcome message, or None if nothing was owed
     """
-    try:
-        response = devices_table.get_item(
-            Key={'device_id': device_id},
-            ProjectionExpression='last_sequence'
-        )
-        
-        if 'Item' in response:
-            last_sequence = response['Item'].get('last_sequence', -1)
-            return sequence <= last_sequence
-        
-        return False
+    prescription = get_prescription(device_id, slot)
+    if not prescription:
+        return None
+    
+    if not in_holder:
+        if prescription.get('last_removal', 0) >= timestamp:
+            return None
+        print(f"Removal at {timestamp} overtaken by its return for device {device_id}, slot {slot}")
+        process_bottle_removal(device_id, slot, prescription, timestamp, returned=True)
+        return 'Removal counted after its return'
+    
+    if debouncer.is_wobble(prescription.get('last_removal'), timestamp) and \
+            refund_wobble(device_id, slot, prescription, timestamp):
+        return 'Wobble refunded after a later event'
+    return None
+
+
+def handle_slot_states_changed(event):
+    """
+    Process several slot transitions reported in one message
+    
+    A user swapping two bottles moves both slots at once; the device reports
+    that as one slot_states_changed event instead of one message per slot.
+    The event is logged once and every slot is updated in a single UpdateItem,
+    then each applied transition runs the same side effects as a
+    slot_state_changed event for that slot.
+    
+    Args:
+        event: IoT event with device_id, changed_mask (bit N-1 set when slot N
+               changed) and in_holder_mask (bit N-1 set when slot N holds its
+               bottle); ts_ms and sequence added by IoT Rule
         
-    except ClientError as e:
-        print(f"Error checking duplicate: {str(e)}")
-        return False
+    Returns:
+        dict: Processing status
+    """
+    device_id = event['device_id']
+    changed_mask = event.get('changed_mask')
+    in_holder_mask = event.get('in_holder_mask')
+    timestamp = event.get('ts_ms', now_ms())
+    sequence = event.get('sequence', 0)
+    
+    all_slots = (1 << len(SLOTS)) - 1
+    for name, mask, lowest in (('changed_mask', changed_mask, 1), ('in_holder_mask', in_holder_mask, 0)):
+        if not isinstance(mask, int) or isinstance(mask, bool) or not lowest <= mask <= all_slots:
+            print(f"Invalid {name}: {mask}")
+            return error_response(400, f'Invalid {name}')
+    
+    log_slot_states_event(device_id, timestamp, changed_mask, in_holder_mask, sequence)
+    
+    transitions = [
+        (slot, bool(in_holder_mask >> (slot - 1) & 1))
+        for slot in SLOTS if changed_mask >> (slot - 1) & 1
+    ]
+    bounced = [
+        slot for slot, in_holder in transitions
+        if debouncer.is_bounce(device_id, slot, in_holder, timestamp)
+    ]
+    applied, rejected = update_device_states(device_id, transitions, timestamp, sequence, bounced)
+    debouncer.debounced += list(rejected.values()).count('debounced')
+    
+    if transitions and set(rejected.values()) == {'duplicate'}:
+        print(f"Duplicate event detected for device {device_id}, sequence {sequence}")
+        return {
+            'statusCode': 200,
+            'body': json.dumps({'status': 'duplicate', 'message': SKIPPED_MESSAGES['duplicate']})
+        }
+    
+    for slot, in_holder in applied:
+        apply_slot_side_effects(device_id, slot, in_holder, timestamp, start_trace(event))
+        debouncer.accept(device_id, slot, in_holder, timestamp)
+    for slot, reason in rejected.items():
+        if reason == 'debounced':
+            apply_bounce_side_effects(device_id, slot, dict(transitions)[slot], timestamp)
+            debouncer.accept(device_id, slot, dict(transitions)[slot], timestamp)
+        elif reason == OVERTAKEN:
+            apply_overtaken_side_effects(device_id, slot, dict(transitions)[slot], timestamp)
+    
+    print(f"Applied {len(applied)} of {len(transitions)} slot transitions for device {device_id}")
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'status': 'success',
+            'message': f'{len(applied)} of {len(transitions)} slot transitions processed'
+        })
+    }
 
 
-def update_last_sequence(device_id, sequence):
+def handle_slot_snapshot(event):
     """
-    Update the last processed sequence number for a device
+    Process the all-slot state a device reports on boot
+    
+    Brings the device's slot states in line with the sensors in a single
+    UpdateItem. A snapshot is not a state change, so there are no doses,
+    notifications, LED commands or phone calls, and last_state_change is
+    left alone.
+    
+    Like update_device_states, each slot is only written if its stored
+    last_state_change is older than the snapshot, so a snapshot delivered
+    late never overwrites a newer transition. When the condition fails the
+    stored item shows which slots to drop, and the rest are retried.
     
     Args:
-        device_id: Device identifier
-        sequence: Event sequence number
+        event: IoT event with device_id and in_holder_mask (bit N-1 set when
+               slot N holds its bottle); ts_ms added by IoT Rule
+        
+    Returns:
+        dict: Processing status
     """
-    try:
-        devices_table.update_item(
-            Key={'device_id': device_id},
-            UpdateExpression='SET last_sequence = :seq',
-            ExpressionAttributeValues={':seq': sequence}
-        )
-    except ClientError as e:
-        print(f"Error updating last sequence: {str(e)}")
+    device_id = event['device_id']
+    mask = event.get('in_holder_mask')
+    timestamp = event.get('ts_ms', now_ms())
+    
+    if not isinstance(mask, int) or isinstance(mask, bool) or not 0 <= mask < (1 << len(SLOTS)):
+        print(f"Invalid in_holder_mask: {mask}")
+        return error_response(400, 'Invalid in_holder_mask')
+    
+    slots = list(SLOTS)
+    for _ in range(STATE_UPDATE_ATTEMPTS):
+        if not slots:
+            break
+        try:
+            devices_table.update_item(**slot_snapshot_update(device_id, mask, slots, timestamp))
+            break
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                log_error('applying slot snapshot', e)
+                raise
+            stored = decode_item(e.response.get('Item', {})).get('slots', {})
+            slots = [
+                slot for slot in slots
+                if stored.get(str(slot), {}).get('last_state_change', timestamp - 1) < timestamp
+            ]
+    else:
+        raise RuntimeError(f"Slot snapshot for {device_id} failed its condition {STATE_UPDATE_ATTEMPTS} times")
+    
+    print(f"Slot snapshot applied for device {device_id}: mask {mask:03b}, slots {slots}")
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'status': 'success',
+            'message': f'Slot snapshot applied to {len(slots)} of {len(SLOTS)} slots'
+        })
+    }
+
+
+def slot_snapshot_update(device_id, mask, slots, timestamp):
+    """UpdateItem arguments for handle_slot_snapshot"""
+    assignments = ['last_seen = :timestamp']
+    names = {}
+    values = {':timestamp': timestamp}
+    conditions = []
+    for slot in slots:
+        assignments.append(f'slots.#slot{slot}.in_holder = :in_holder{slot}')
+        names[f'#slot{slot}'] = str(slot)
+        values[f':in_holder{slot}'] = bool(mask >> (slot - 1) & 1)
+        conditions.append(f'(attribute_not_exists(slots.#slot{slot}.last_state_change) '
+                          f'OR slots.#slot{slot}.last_state_change < :timestamp)')
+    
+    return {
+        'Key': {'device_id': device_id},
+        'UpdateExpression': 'SET ' + ', '.join(assignments),
+        'ConditionExpression': ' AND '.join(conditions),
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': values,
+        'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'
+    }
 
 
 def log_event(device_id, timestamp, slot, state, in_holder, sensor_level, sequence):
@@ -264,41 +673,202 @@ def log_event(device_id, timestamp, slot, state, in_holder, sensor_level, sequen
         print(f"Event logged for device {device_id}, slot {slot}")
         
     except ClientError as e:
-        print(f"Error logging event: {str(e)}")
+        log_error('logging event', e)
         raise
 
 
-def update_device_state(device_id, slot, in_holder, timestamp):
+def log_slot_states_event(device_id, timestamp, changed_mask, in_holder_mask, sequence):
     """
-    Update device slot state and last_seen timestamp
+    Log a multi-slot event to Events table as one item, with the same TTL
     
     Args:
         device_id: Device identifier
-        slot: Slot number (1-3)
-        in_holder: Boolean state
         timestamp: Unix timestamp in milliseconds
+        changed_mask: Bit N-1 set when slot N changed
+        in_holder_mask: Bit N-1 set when slot N holds its bottle
+        sequence: Event sequence number
     """
     try:
-        devices_table.update_item(
-            Key={'device_id': device_id},
-            UpdateExpression='SET slots.#slot.in_holder = :in_holder, '
-                           'slots.#slot.last_state_change = :timestamp, '
-                           'last_seen = :timestamp',
-            ExpressionAttributeNames={
-                '#slot': str(slot)
-            },
-            ExpressionAttributeValues={
-                ':in_holder': in_holder,
-                ':timestamp': timestamp
+        ttl = int(timestamp / 1000) + (TTL_DAYS * 24 * 60 * 60)
+        
+        events_table.put_item(
+            Item={
+                'device_id': device_id,
+                'timestamp': timestamp,
+                'event_type': 'slot_states_changed',
+                'changed_mask': changed_mask,
+                'in_holder_mask': in_holder_mask,
+                'sequence': sequence,
+                'ttl': ttl
             }
         )
-        print(f"Device state updated for {device_id}, slot {slot}")
+        print(f"Event logged for device {device_id}, slots {changed_mask:03b}")
         
     except ClientError as e:
-        print(f"Error updating device state: {str(e)}")
+        log_error('logging event', e)
         raise
 
 
+def update_device_states(device_id, transitions, timestamp, sequence=0, bounced=()):
+    """
+    Update slot states and last_seen in a single conditional UpdateItem
+    
+    A slot is only updated by an event newer than its stored
+    last_state_change, so a delayed QoS1 redelivery or a retried batch never
+    overwrites newer state. Nor is it updated to the state it already holds:
+    IoT Core stamps events that carry no ts_ms with its own timestamp(), so
+    a repeated message passes the time check, and would count its removal
+    again; it is rejected as a DUPLICATE. A sensor bounce (see
+    debounce.debounce_condition) fails the condition too, and is written
+    again without it: the slot shows the bottle out, but the bounce is
+    returned as 'debounced', not applied, so its removal is not counted. Events with a sequence number are
+    conditioned on being the device's next sequence, and the same update
+    advances it (see sequencing.py), so duplicates and gaps are caught
+    without a separate read.
+    
+    When the condition fails, DynamoDB returns the stored item, which tells
+    which slots were rejected and why and where the sequence falls; the
+    update is retried for the remaining slots. A sequenced event is recorded
+    even when none of its slots apply, so it is never mistaken for a gap.
+    
+    A slot whose stored state is exactly this transition (same state and
+    last_state_change) was written by an earlier delivery of the event,
+    which may have failed before its side effects finished. It is returned
+    as applied so the caller runs them again. A slot rejected as OVERTAKEN
+    still owes side effects the later event did not cover.
+    
+    Args:
+        device_id: Device identifier
+        transitions: (slot, in_holder) pairs
+        timestamp: Unix timestamp in milliseconds
+        sequence: Event sequence number (0 when the device sends none)
+        bounced: Slots already known to bounce, written without the check
+        
+    Returns:
+        tuple: (applied (slot, in_holder) pairs, including redelivered ones,
+                {slot: DUPLICATE | OVERTAKEN | 'stale' | 'debounced'} for the rest)
+    """
+    rejected = {}
+    redelivered = []
+    bounced = set(bounced)
+    stored = {}
+    kind = NEXT
+    for _ in range(STATE_UPDATE_ATTEMPTS):
+        if not transitions and sequence <= 0:
+            return redelivered, rejected
+        try:
+            devices_table.update_item(**device_state_update(device_id, transitions, timestamp, sequence, kind, stored,
+                                                            bounced))
+            
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                log_error('updating device state', e)
+                raise
+            stored = decode_item(e.response.get('Item', {}))
+            kind = classify_sequence(stored, sequence) if sequence > 0 else NEXT
+            reasons = {
+                slot: rejection_reason(stored, slot, in_holder, timestamp, slot not in bounced)
+                for slot, in_holder in transitions
+            }
+            redelivered.extend((slot, in_holder) for slot, in_holder in transitions if reasons[slot] == REDELIVERED)
+            if kind == DUPLICATE:
+                rejected.update((slot, OVERTAKEN if reasons[slot] == OVERTAKEN else DUPLICATE)
+                                for slot, _ in transitions if reasons[slot] != REDELIVERED)
+                return redelivered, rejected
+            rejected.update((slot, reason) for slot, reason in reasons.items()
+                            if reason and reason not in (REDELIVERED, 'debounced'))
+            bounced.update(slot for slot, reason in reasons.items() if reason == 'debounced')
+            transitions = [(slot, in_holder) for slot, in_holder in transitions
+                           if reasons[slot] in (None, 'debounced')]
+            continue
+        
+        missing = sequence_metrics.record(kind, stored, sequence) if sequence > 0 else 0
+        if missing:
+            print(f"Sequence gap for device {device_id}: {missing} events missing before {sequence}")
+        elif kind == LATE:
+            print(f"Late event for device {device_id}, sequence {sequence}")
+        if transitions:
+            print(f"Device state updated for {device_id}, slots {[slot for slot, _ in transitions]}")
+        rejected.update((slot, 'debounced') for slot, _ in transitions if slot in bounced)
+        return [(slot, in_holder) for slot, in_holder in transitions if slot not in bounced] + redelivered, rejected
+    
+    raise RuntimeError(f"Device state update for {device_id} failed its condition {STATE_UPDATE_ATTEMPTS} times")
+
+
+def device_state_update(device_id, transitions, timestamp, sequence, kind, stored, bounced=()):
+    """UpdateItem arguments for update_device_states; bounced slots skip the debounce condition"""
+    assignments = ['last_seen = :timestamp']
+    names = {}
+    values = {':timestamp': timestamp}
+    conditions = []
+    for slot, in_holder in transitions:
+        assignments.append(f'slots.#slot{slot}.in_holder = :in_holder{slot}')
+        assignments.append(f'slots.#slot{slot}.last_state_change = :timestamp')
+        names[f'#slot{slot}'] = str(slot)
+        values[f':in_holder{slot}'] = in_holder
+        conditions.append(f'(attribute_not_exists(slots.#slot{slot}.last_state_change) '
+                          f'OR slots.#slot{slot}.last_state_change < :timestamp)')
+        conditions.append(f'(attribute_not_exists(slots.#slot{slot}.in_holder) '
+                          f'OR slots.#slot{slot}.in_holder <> :in_holder{slot})')
+        debounce_values = debouncer.condition_values(in_holder, timestamp, str(slot))
+        if debounce_values and slot not in bounced:
+            conditions.append(f'({debounce_condition(in_holder, str(slot))})')
+            values.update(debounce_values)
+    
+    if sequence > 0:
+        sequence_assignments, sequence_conditions, sequence_values = sequence_update(kind, sequence, stored)
+        assignments.extend(sequence_assignments)
+        conditions.extend(sequence_conditions)
+        values.update(sequence_values)
+    
+    update = {
+        'Key': {'device_id': device_id},
+        'UpdateExpression': 'SET ' + ', '.join(assignments),
+        'ExpressionAttributeValues': values,
+        'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'
+    }
+    if names:
+        update['ExpressionAttributeNames'] = names
+    if conditions:
+        update['ConditionExpression'] = ' AND '.join(conditions)
+    return update
+
+
+def rejection_reason(stored, slot, in_holder, timestamp, debounce=True):
+    """
+    Which part of the slot's update condition failed, if any
+    
+    Args:
+        stored: Devices item as it was when the update failed
+        slot, in_holder, timestamp: The rejected transition
+        debounce: Whether the update included the slot's debounce condition
+        
+    Returns:
+        str: REDELIVERED if the stored state is this transition, OVERTAKEN,
+             'stale', DUPLICATE (the slot already holds this state) or
+             'debounced', or None if the slot passed
+    """
+    state = stored.get('slots', {}).get(str(slot), {})
+    last_state_change = state.get('last_state_change')
+    if last_state_change is None:
+        return DUPLICATE if state.get('in_holder') == in_holder else None
+    if last_state_change == timestamp and state.get('in_holder') == in_holder:
+        return REDELIVERED
+    if last_state_change >= timestamp:
+        if in_holder:
+            # A return may still owe a wobble refund
+            return OVERTAKEN if debouncer.enabled else 'stale'
+        if state.get('in_holder') and not debouncer.is_wobble(timestamp, last_state_change):
+            return OVERTAKEN
+        return 'stale'
+    if state.get('in_holder') == in_holder:
+        return DUPLICATE
+    if debounce and debouncer.enabled and is_bounce(state.get('in_holder'), last_state_change, in_holder,
+                                       timestamp, debouncer.window_ms):
+        return 'debounced'
+    return None
+
+
 def get_prescription(device_id, slot):
     """
     Get prescription for a specific device and slot
@@ -321,48 +891,89 @@ def get_prescription(device_id, slot):
         return response.get('Item')
         
     except ClientError as e:
-        print(f"Error getting prescription: {str(e)}")
+        log_error('getting prescription', e)
         return None
 
 
-def process_bottle_removal(device_id, slot, prescription, timestamp):
+def process_bottle_removal(device_id, slot, prescription, timestamp, returned=False):
     """
     Process bottle removal event:
-    - Decrement pill count (floor at 0)
-    - Set removal_timestamp
+    - Decrement pill count (floor at 0) and set last_removal
+    - Set removal_timestamp, and removal_decrement to the pills taken
+    - Count the dose in the daily aggregate
     - Check refill reminder threshold
     
     Implements Property 2 (Pill Count Non-Negativity) and
     Property 5 (Refill Reminder Threshold)
     
+    Safe to repeat for a redelivered event: last_removal is the newest
+    removal decremented, so the count only goes down once per removal, and
+    the daily aggregate ignores a removal it has recorded.
+    
     Args:
         device_id: Device identifier
         slot: Slot number (1-3)
         prescription: Prescription data
         timestamp: Unix timestamp in milliseconds
+        returned: The bottle's return was already processed (OVERTAKEN), so
+                  the bottle is not marked out and a removal already counted
+                  is left alone
     """
     try:
-        # Decrement pill count, floor at 0
-        current_count = prescription.get('pill_count', 0)
-        new_count = max(0, current_count - 1)
+        key = {
+            'device_id': device_id,
+            'slot': slot
+        }
         
-        # Update prescription with new count and removal timestamp
-        prescriptions_table.update_item(
-            Key={
-                'device_id': device_id,
-                'slot': slot
-            },
-            UpdateExpression='SET pill_count = :count, '
-                           'removal_timestamp = :timestamp, '
-                           'updated_at = :timestamp',
-            ExpressionAttributeValues={
+        for attempt in range(2):
+            # Decrement pill count, floor at 0
+            current_count = prescription.get('pill_count', 0)
+            new_count = max(0, current_count - 1)
+            
+            last_removal = prescription.get('last_removal', 0)
+            if last_removal > timestamp or (returned and last_removal == timestamp):
+                print(f"Removal at {timestamp} already counted for device {device_id}, slot {slot}")
+                return
+            if last_removal == timestamp:
+                # An earlier delivery of this event already decremented it
+                new_count = current_count
+                print(f"Removal at {timestamp} already applied for device {device_id}, slot {slot}")
+                break
+            
+            # Update prescription with new count and removal timestamp. The
+            # prescription may come from the cache, so only write if the count
+            # is still the one we decremented from and no removal this recent
+            # has been applied yet
+            update = 'SET pill_count = :count, last_removal = :timestamp, updated_at = :timestamp'
+            values = {
                 ':count': new_count,
+                ':expected': current_count,
                 ':timestamp': timestamp
             }
-        )
+            if not returned:
+                update += ', removal_timestamp = :timestamp, removal_decrement = :decrement'
+                values[':decrement'] = current_count - new_count
+            try:
+                prescriptions_table.update_item(
+                    Key=key,
+                    UpdateExpression=update,
+                    ConditionExpression='(attribute_not_exists(pill_count) OR pill_count = :expected) '
+                                        'AND (attribute_not_exists(last_removal) OR last_removal < :timestamp)',
+                    ExpressionAttributeValues=values
+                )
+                break
+            except ClientError as e:
+                if attempt or e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                # Stale cached prescription or an applied removal - re-read the
+                # table and retry once
+                print(f"Pill count changed for device {device_id}, slot {slot}; re-reading prescription")
+                prescription = prescriptions_table.get_item(Key=key, ConsistentRead=True).get('Item', {})
         
         print(f"Pill count decremented to {new_count} for device {device_id}, slot {slot}")
         
+        record_daily_dose(device_id, slot, prescription, timestamp)
+        
         # Send congratulations notification for taking pill
         send_congratulations(device_id, prescription)
         
@@ -375,14 +986,41 @@ def process_bottle_removal(device_id, slot, prescription, timestamp):
         # that runs every 5 minutes via EventBridge
         
     except ClientError as e:
-        print(f"Error processing bottle removal: {str(e)}")
+        log_error('processing bottle removal', e)
         raise
 
 
-def process_bottle_return(device_id, slot, prescription, timestamp):
+def record_daily_dose(device_id, slot, prescription, timestamp):
+    """
+    Count a removal in the device's daily dose aggregate (see daily_doses.py)
+    
+    The pill count is already written, so failures are logged rather than
+    raised - a retried event would decrement the count a second time.
+    
+    Args:
+        device_id: Device identifier
+        slot: Slot number (1-3)
+        prescription: Prescription data
+        timestamp: Unix timestamp in milliseconds
+    """
+    if daily_doses_table is None:
+        return
+    
+    try:
+        counted = record_dose(daily_doses_table, device_id, slot, timestamp,
+                              prescription.get('prescription_name'), DOSE_DAY_UTC_OFFSET_MINUTES)
+        if not counted:
+            print(f"Dose at {timestamp} already counted for device {device_id}, slot {slot}")
+    except ClientError as e:
+        log_error('recording daily dose', e)
+
+
+def process_bottle_return(device_id, slot, prescription, timestamp, trace=None):
     """
     Process bottle return event:
     - Clear removal_timestamp
+    - If the bottle was only wobbled - returned within the debounce window of
+      its removal - refund the pill and the daily dose the removal counted
     - Turn off LED
     
     Implements Property 4 (Removal Timestamp Invariant)
@@ -392,31 +1030,90 @@ def process_bottle_return(device_id, slot, prescription, timestamp):
         slot: Slot number (1-3)
         prescription: Prescription data
         timestamp: Unix timestamp in milliseconds
+        trace: Round-trip stamps of the event; completed with the commit time
+               and carried in the LED command
     """
     try:
-        # Clear removal timestamp
+        key = {
+            'device_id': device_id,
+            'slot': slot
+        }
+        removed_at = prescription.get('last_removal')
+        
+        if not (debouncer.is_wobble(removed_at, timestamp) and refund_wobble(device_id, slot, prescription, timestamp)):
+            # Clear removal timestamp
+            prescriptions_table.update_item(
+                Key=key,
+                UpdateExpression='SET removal_timestamp = :null, updated_at = :timestamp',
+                ExpressionAttributeValues={
+                    ':null': None,
+                    ':timestamp': timestamp
+                }
+            )
+            
+            print(f"Removal timestamp cleared for device {device_id}, slot {slot}")
+        
+        # Turn off LED
+        if trace is not None:
+            trace = trace + [now_ms()]
+        publish_led_command(device_id, slot, 'turn_off', trace)
+        
+    except ClientError as e:
+        log_error('processing bottle return', e)
+        raise
+
+
+def refund_wobble(device_id, slot, prescription, timestamp):
+    """
+    Undo a removal that the bottle's return shows was a wobble
+    
+    Gives back the pills the removal took and clears removal_timestamp in one
+    update, conditioned on the removal still being the slot's last_removal
+    and not refunded yet (removal_decrement is zeroed), so only the removal
+    the bottle came back from is refunded, and only once. That holds for a
+    return processed after a later event too, which has already cleared
+    removal_timestamp. Removals stored before last_removal existed are not
+    refunded.
+    
+    Args:
+        device_id: Device identifier
+        slot: Slot number (1-3)
+        prescription: Prescription data, with the removal's last_removal
+        timestamp: Return time in milliseconds
+        
+    Returns:
+        bool: True if refunded, False if the stored removal has changed
+    """
+    removed_at = prescription['last_removal']
+    try:
         prescriptions_table.update_item(
             Key={
                 'device_id': device_id,
                 'slot': slot
             },
-            UpdateExpression='SET removal_timestamp = :null, updated_at = :timestamp',
+            UpdateExpression='SET pill_count = pill_count + removal_decrement, '
+                           'removal_timestamp = :null, removal_decrement = :zero, updated_at = :timestamp',
+            ConditionExpression='last_removal = :removed_at AND removal_decrement > :zero',
             ExpressionAttributeValues={
+                ':removed_at': removed_at,
                 ':null': None,
+                ':zero': 0,
                 ':timestamp': timestamp
             }
         )
-        
-        print(f"Removal timestamp cleared for device {device_id}, slot {slot}")
-        
-        # Turn off LED
-        publish_led_command(device_id, slot, 'turn_off')
-        
     except ClientError as e:
-        print(f"Error processing bottle return: {str(e)}")
-        raise
-
-
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return False
+    
+    print(f"Bottle returned {timestamp - removed_at} ms after removal for device {device_id}, slot {slot}; "
+          f"refunded as a wobble")
+    if daily_doses_table is not None:
+        try:
+            undo_dose(daily_doses_table, device_id, slot, removed_at, DOSE_DAY_UTC_OFFSET_MINUTES)
+        except ClientError as e:
+            log_error('undoing daily dose', e)
+    return True
 
 
 def send_congratulations(device_id, prescription):
@@ -429,7 +1126,7 @@ def send_congratulations(device_id, prescription):
     """
     try:
         prescription_name = prescription.get('prescription_name', 'medication')
-        pill_count = int(prescription.get('pill_count', 0))  # Convert Decimal to int
+        pill_count = int(prescription.get('pill_count', 0))
         
         # Vary the message for engagement
         messages = [
@@ -452,7 +1149,7 @@ def send_congratulations(device_id, prescription):
         # In production, this would send via Alexa Proactive Events API
         
     except Exception as e:
-        print(f"Error sending congratulations: {str(e)}")
+        log_error('sending congratulations', e)
 
 
 def send_refill_reminder(device_id, prescription, pill_count):
@@ -488,36 +1185,66 @@ def send_refill_reminder(device_id, prescription, pill_count):
         # In production, this would send via Alexa Proactive Events API
         
     except Exception as e:
-        print(f"Error sending refill reminder: {str(e)}")
+        log_error('sending refill reminder', e)
 
 
-def publish_led_command(device_id, slot, action):
+def publish_led_command(device_id, slot, action, trace=None):
     """
-    Publish LED control command to IoT Core
+    Queue an LED control command for the end of the invocation
+    
+    Commands are sent by flush_led_commands(), merged into one message per
+    device, so a batch or multi-slot event that changes several LEDs of a
+    device wakes it once.
     
     Args:
         device_id: Device identifier
         slot: Slot number (1-3)
         action: "turn_on" or "turn_off"
+        trace: Round-trip stamps carried in the command (see round_trip.py)
     """
-    try:
-        topic = f"pillbuddy/cmd/{device_id}"
-        payload = {
-            'action': action,
-            'slot': slot
-        }
-        
-        iot_client.publish(
-            topic=topic,
-            qos=1,
-            payload=json.dumps(payload)
-        )
-        
-        print(f"Published LED command to {topic}: {payload}")
-        
-    except ClientError as e:
-        print(f"Error publishing LED command: {str(e)}")
-        # Non-critical error, continue processing
+    led_commands.add(device_id, slot, action, trace)
+
+
+def flush_led_commands():
+    """
+    Publish the queued LED commands to IoT Core, one message per device
+    
+    Commands carrying a trace record the round-trip latency per hop once
+    published.
+    
+    Publishes are retried with jittered backoff (outbound_retry). A command
+    that still fails with a retryable error, or is not sent because the IoT
+    circuit breaker is open, is put back in the buffer and goes out with the
+    next invocation's commands, so an IoT brownout costs each event at most
+    a few short retries instead of the LED change. Only for a few seconds
+    (see LedCommandBuffer): a change held longer could overwrite an LED
+    state another container or the setup flow has set since.
+    """
+    merged = led_commands.merged
+    commands = led_commands.drain()
+    if led_commands.expired:
+        print(f"Dropped {led_commands.expired} requeued LED changes that are too old to send")
+    requeued = 0
+    for device_id, payload, queued_ms in commands:
+        try:
+            outbound_retry.call(publish_command, iot_client, device_id, payload, breaker=iot_breaker)
+            published_ms = now_ms()
+            print(f"Published LED command to {device_id}: {payload}")
+            if 'trace' in payload:
+                record_round_trip(device_id, payload['trace'], published_ms)
+        except Exception as e:
+            if not isinstance(e, CircuitOpenError):
+                log_error('publishing LED command', e)
+            # Non-critical error, continue with the other devices
+            retry_later = isinstance(e, CircuitOpenError) or is_retryable(e)
+            if retry_later and led_commands.requeue(device_id, payload, queued_ms):
+                requeued += 1
+            else:
+                print(f"Dropped LED command to {device_id}: {payload}")
+    if merged:
+        print(f"Merged {merged} LED changes into {len(commands)} commands")
+    if requeued:
+        print(f"Requeued {requeued} LED commands for the next invocation")
 
 
 def is_database_empty():
@@ -541,7 +1268,7 @@ def is_database_empty():
         return is_empty
         
     except ClientError as e:
-        print(f"Error checking if database is empty: {str(e)}")
+        log_error('checking if database is empty', e)
         # On error, assume database is not empty to avoid unnecessary calls
         return False
 
@@ -553,14 +1280,28 @@ def trigger_phone_call_for_empty_slot(device_id, slot):
     This is called when a slot has no prescription configured.
     The callUser Lambda will call the user via ElevenLabs + Twilio.
     
+    Calls are rate limited (see pillbuddy_core.call_limits): at most one
+    per slot per cooldown, a token bucket per device and a cap on calls in
+    progress across the fleet. A call that is refused is dropped, not
+    queued; the bottle is still in the slot when the limit lifts, and the
+    next insertion calls again.
+    
     Args:
         device_id: Device identifier
         slot: Slot number (1-3) that is empty
+        
+    Returns:
+        bool: True if callUser was invoked
     """
     try:
         if not CALL_USER_LAMBDA_ARN:
             print("Warning: CALL_USER_LAMBDA_ARN not configured, skipping phone call")
-            return
+            return False
+        
+        reason = call_limiter.acquire(device_id, slot)
+        if reason:
+            print(f"Skipping phone call for device {device_id}, slot {slot}: {reason}")
+            return False
         
         print(f"Invoking callUser Lambda for device {device_id}, slot {slot}: {CALL_USER_LAMBDA_ARN}")
         
@@ -572,19 +1313,28 @@ def trigger_phone_call_for_empty_slot(device_id, slot):
             'event_type': 'slot_empty'
         }
         
-        # Invoke Lambda asynchronously (Event invocation type)
-        response = lambda_client.invoke(
+        # Invoke Lambda asynchronously (Event invocation type), retried with
+        # jittered backoff and skipped while the Lambda circuit breaker is open
+        response = outbound_retry.call(
+            lambda_client.invoke,
             FunctionName=CALL_USER_LAMBDA_ARN,
             InvocationType='Event',  # Async invocation
-            Payload=json.dumps(payload)
+            Payload=json.dumps(payload),
+            breaker=lambda_breaker
         )
         
         print(f"callUser Lambda invoked successfully for slot {slot}. Status: {response['StatusCode']}")
+        return True
         
+    except CircuitOpenError as e:
+        print(f"Skipping phone call for device {device_id}, slot {slot}: {e}")
     except ClientError as e:
-        print(f"Error invoking callUser Lambda: {str(e)}")
+        log_error('invoking callUser Lambda', e)
         # Non-critical error, continue processing
     except Exception as e:
         print(f"Unexpected error invoking callUser Lambda: {str(e)}")
         # Non-critical error, continue processing
+    # No call was placed; its lease, token and cooldown go back
+    call_limiter.release(device_id, slot)
+    return False
 
@@ -0,0 +1,569 @@
+"""
+Unit tests for PillBuddy IoT Event Processor Lambda Function
+
+The processor is loaded against the in-memory AWS stand-ins of the load-test
+harness (infrastructure/loadtest/stand_ins.py), so every test runs the real
+handler code against conditional writes, capacity and failures that behave
+like DynamoDB, IoT Core and Lambda.
+"""
+
+import unittest
+from unittest.mock import patch
+import contextlib
+import io
+import itertools
+import json
+import sys
+import os
+
+# Add the load-test harness (stand-ins, seeding, lambda loading) to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'loadtest'))
+
+import fleet_harness  # noqa: E402
+import stand_ins  # noqa: E402
+from iot_rule_sql import apply_binary_rule  # noqa: E402
+from pillbuddy_core.ddb_client import encode_item, decode_item  # noqa: E402
+from pillbuddy_core.event_codec import encode_event  # noqa: E402
+from pillbuddy_core.instrumentation import flush_metrics  # noqa: E402
+
+START_MS = fleet_harness.START_MS + 60000
+
+# Every load needs its own module name
+_module_names = (f'test_iot_event_processor_{index}' for index in itertools.count())
+
+
+class ProcessorTestCase(unittest.TestCase):
+    """
+    A seeded fleet on fresh stand-ins and one processor container
+    
+    Devices hold all three bottles; slots 1..slots have a prescription with
+    30 pills, the rest are empty slots.
+    """
+    
+    devices = 1
+    slots = 1
+    environment = None
+    
+    def setUp(self):
+        self.seed(self.devices, self.slots)
+        self.processor = self.load_processor(self.environment)
+        # Counters and histograms are per process; leave none behind for other tests
+        self.addCleanup(self.discard_metrics)
+    
+    @staticmethod
+    def discard_metrics():
+        with contextlib.redirect_stdout(io.StringIO()):
+            flush_metrics('IoTEventProcessor', force=True)
+    
+    def seed(self, devices, slots):
+        self.aws = stand_ins.LocalAWS()
+        self.device_ids = fleet_harness.seed_fleet(self.aws, devices, slots, 30)
+        self.device_id = self.device_ids[0]
+    
+    def load_processor(self, environment=None):
+        """Another container of the processor, sharing the stand-ins"""
+        return fleet_harness.load_lambda('iot_event_processor', next(_module_names), self.aws, environment)
+    
+    def slot_event(self, in_holder, offset_ms=0, slot=1, **fields):
+        """slot_state_changed event offset_ms after START_MS"""
+        event = {'device_id': self.device_id, 'event_type': 'slot_state_changed', 'slot': slot,
+                 'in_holder': in_holder, 'ts_ms': START_MS + offset_ms}
+        event.update(fields)
+        return event
+    
+    def handle(self, event, processor=None):
+        """Invoke a processor container with its output silenced"""
+        with contextlib.redirect_stdout(io.StringIO()):
+            return (processor or self.processor).lambda_handler(event, None)
+    
+    def status(self, event, processor=None):
+        return json.loads(self.handle(event, processor)['body'])['status']
+    
+    def stored(self, table, key):
+        response = self.aws.dynamodb.get_item(TableName=table, Key=encode_item(key))
+        return decode_item(response['Item']) if 'Item' in response else None
+    
+    def device(self, device_id=None):
+        return self.stored('PillBuddy_Devices', {'device_id': device_id or self.device_id})
+    
+    def pill_count(self, slot=1, device_id=None):
+        return self.stored('PillBuddy_Prescriptions',
+                           {'device_id': device_id or self.device_id, 'slot': slot})['pill_count']
+    
+    @staticmethod
+    def queued(events, source='aws:sqs'):
+        """SQS records m0, m1, ... carrying events"""
+        return [{'messageId': f'm{index}', 'eventSource': source, 'body': json.dumps(event)}
+                for index, event in enumerate(events)]
+
+
+class TestProcessorCache(ProcessorTestCase):
+    """The processor's cached prescriptions must never roll back a pill count"""
+    
+    environment = {'CACHE_BACKEND': 'memory'}
+    
+    def test_stale_cached_count_is_reread(self):
+        """Test that a removal against a stale cached prescription re-reads and decrements the stored count"""
+        with contextlib.redirect_stdout(io.StringIO()):
+            cached = self.processor.get_prescription(self.device_id, 1)
+            # Another container re-runs setup with a fresh bottle
+            self.aws.dynamodb.seed('PillBuddy_Prescriptions', dict(cached, pill_count=90))
+            self.assertEqual(self.processor.get_prescription(self.device_id, 1)['pill_count'], 30)
+            
+            self.processor.process_bottle_removal(self.device_id, 1, cached, fleet_harness.START_MS)
+        
+        self.assertEqual(self.pill_count(), 89)
+        self.assertEqual(self.processor.get_prescription(self.device_id, 1)['pill_count'], 89)
+
+
+class TestDailyDoses(ProcessorTestCase):
+    """Daily dose counters maintained by the processor"""
+    
+    slots = 2
+    
+    def test_removals_counted_once(self):
+        """Test that removals are counted per slot and a redelivered event is not"""
+        with contextlib.redirect_stdout(io.StringIO()):
+            for slot, offset_ms in ((1, 0), (1, 3600000), (2, 60000)):
+                prescription = self.processor.get_prescription(self.device_id, slot)
+                self.processor.process_bottle_removal(self.device_id, slot, prescription,
+                                                      fleet_harness.START_MS + offset_ms)
+            # IoT Core redelivers the last removal of slot 1
+            prescription = self.processor.get_prescription(self.device_id, 1)
+            self.processor.process_bottle_removal(self.device_id, 1, prescription, fleet_harness.START_MS + 3600000)
+        
+        [item] = self.aws.dynamodb.tables['PillBuddy_DailyDoses'].items()
+        self.assertEqual(item['slot_1_doses'], 2)
+        self.assertEqual(item['slot_1_first_removal'], fleet_harness.START_MS)
+        self.assertEqual(item['slot_1_last_removal'], fleet_harness.START_MS + 3600000)
+        self.assertEqual(item['slot_2_doses'], 1)
+
+
+class TestDebounce(ProcessorTestCase):
+    """Sensor flaps must not drain pill counts"""
+    
+    def test_wobble_is_no_dose_across_containers(self):
+        """Test that a wobble is refunded and a re-removal inside the window is a no-op on any container"""
+        second = self.load_processor()
+        
+        statuses = [
+            self.status(self.slot_event(False, 0)),
+            self.status(self.slot_event(True, 600)),
+            self.status(self.slot_event(False, 900)),
+            self.status(self.slot_event(False, 1200), second),
+            self.status(self.slot_event(True, 45000), second),
+        ]
+        
+        # The bounce at 900 is stored, so the second container sees 1200 repeat it
+        self.assertEqual(statuses, ['success', 'success', 'debounced', 'duplicate', 'success'])
+        self.assertEqual(self.processor.debouncer.debounced, 1)
+        self.assertEqual(self.pill_count(), 30)
+        [doses] = self.aws.dynamodb.tables['PillBuddy_DailyDoses'].items()
+        self.assertEqual(doses['slot_1_doses'], 0)
+        self.assertNotIn('slot_1_first_removal', doses)
+        self.assertNotIn('slot_1_last_removal', doses)
+        self.assertEqual(len(self.aws.dynamodb.tables['PillBuddy_Events']), 5)
+    
+    def test_pickup_right_after_return_marks_bottle_out(self):
+        """Test that a removal bouncing off a return is stored without counting a second dose"""
+        statuses = [
+            self.status(self.slot_event(False, 0)),
+            self.status(self.slot_event(True, 60000)),
+            self.status(self.slot_event(False, 61000)),
+        ]
+        
+        self.assertEqual(statuses, ['success', 'success', 'debounced'])
+        self.assertFalse(self.device()['slots']['1']['in_holder'])
+        prescription = self.stored('PillBuddy_Prescriptions', {'device_id': self.device_id, 'slot': 1})
+        self.assertEqual(prescription['removal_timestamp'], START_MS + 61000)
+        self.assertEqual(prescription['pill_count'], 29)
+        [doses] = self.aws.dynamodb.tables['PillBuddy_DailyDoses'].items()
+        self.assertEqual(doses['slot_1_doses'], 1)
+
+
+class TestEventOrdering(ProcessorTestCase):
+    """Late and repeated events must not overwrite newer slot state"""
+    
+    def test_stale_event_logged_not_applied(self):
+        """Test that an event older than the stored state change is logged but changes nothing"""
+        statuses = [self.status(self.slot_event(False, 120000)), self.status(self.slot_event(True, 60000))]
+        
+        self.assertEqual(statuses, ['success', 'stale'])
+        slot = self.device()['slots']['1']
+        self.assertFalse(slot['in_holder'])
+        self.assertEqual(slot['last_state_change'], START_MS + 120000)
+        self.assertEqual(len(self.aws.dynamodb.tables['PillBuddy_Events']), 2)
+        self.assertEqual(self.aws.iot_data.published, [])
+    
+    def test_duplicate_sequence_without_extra_read(self):
+        """Test that a redelivered sequence is rejected by the state update itself"""
+        statuses = [self.status(self.slot_event(False, 0, sequence=5)),
+                    self.status(self.slot_event(False, 30000, sequence=5))]
+        
+        self.assertEqual(statuses, ['success', 'duplicate'])
+        # One prescription read for the applied event, none for deduplication
+        self.assertEqual(self.aws.dynamodb.calls['GetItem'], 1)
+        self.assertEqual(self.device()['last_sequence'], 5)
+        self.assertEqual(self.pill_count(), 29)
+    
+    def test_repeat_stamped_by_broker_counts_once(self):
+        """Test that a removal published twice, each stamped on arrival, decrements once"""
+        statuses = [self.status(self.slot_event(False, 0)), self.status(self.slot_event(False, 10000))]
+        
+        self.assertEqual(statuses, ['success', 'duplicate'])
+        self.assertEqual(self.device()['slots']['1']['last_state_change'], START_MS)
+        self.assertEqual(self.pill_count(), 29)
+        [doses] = self.aws.dynamodb.tables['PillBuddy_DailyDoses'].items()
+        self.assertEqual(doses['slot_1_doses'], 1)
+    
+    def test_redelivery_finishes_failed_side_effects(self):
+        """Test that a redelivered event whose state was stored re-runs its side effects exactly once"""
+        removal = self.slot_event(False, 0, sequence=5)
+        throttled = stand_ins.client_error('ProvisionedThroughputExceededException', 'Throttled', 'UpdateItem')
+        
+        with patch.object(self.processor.prescriptions_table, 'update_item', side_effect=throttled):
+            self.assertEqual(self.handle(removal)['statusCode'], 503)
+        self.assertFalse(self.device()['slots']['1']['in_holder'])
+        self.assertEqual(self.pill_count(), 30)
+        
+        statuses = [self.status(removal), self.status(removal, self.load_processor())]
+        
+        self.assertEqual(statuses, ['success', 'success'])
+        self.assertEqual(self.pill_count(), 29)
+        [doses] = self.aws.dynamodb.tables['PillBuddy_DailyDoses'].items()
+        self.assertEqual(doses['slot_1_doses'], 1)
+    
+    def test_removal_overtaken_by_its_return_is_counted(self):
+        """Test that a removal redelivered after its return counts the dose without marking the bottle out"""
+        removal = self.slot_event(False, 0, sequence=5)
+        throttled = stand_ins.client_error('ProvisionedThroughputExceededException', 'Throttled', 'UpdateItem')
+        
+        with patch.object(self.processor.prescriptions_table, 'update_item', side_effect=throttled):
+            self.assertEqual(self.handle(removal)['statusCode'], 503)
+        statuses = [self.status(self.slot_event(True, 60000, sequence=6)), self.status(removal), self.status(removal)]
+        
+        self.assertEqual(statuses, ['success', 'success', 'stale'])
+        self.assertTrue(self.device()['slots']['1']['in_holder'])
+        prescription = self.stored('PillBuddy_Prescriptions', {'device_id': self.device_id, 'slot': 1})
+        self.assertEqual(prescription['pill_count'], 29)
+        self.assertIsNone(prescription['removal_timestamp'])
+        [doses] = self.aws.dynamodb.tables['PillBuddy_DailyDoses'].items()
+        self.assertEqual(doses['slot_1_doses'], 1)
+    
+    def test_overtaken_wobble_return_still_refunds(self):
+        """Test that a wobble return redelivered after the bottle's next return still refunds the removal"""
+        wobble = self.slot_event(True, 600)
+        throttled = stand_ins.client_error('ProvisionedThroughputExceededException', 'Throttled', 'UpdateItem')
+        
+        self.assertEqual(self.status(self.slot_event(False, 0)), 'success')
+        with patch.object(self.processor.prescriptions_table, 'update_item', side_effect=throttled):
+            self.assertEqual(self.handle(wobble)['statusCode'], 503)
+        statuses = [
+            self.status(self.slot_event(False, 900)),
+            self.status(self.slot_event(True, 60000)),
+            self.status(wobble),
+            self.status(wobble),
+        ]
+        
+        self.assertEqual(statuses, ['debounced', 'success', 'success', 'stale'])
+        self.assertEqual(self.pill_count(), 30)
+        [doses] = self.aws.dynamodb.tables['PillBuddy_DailyDoses'].items()
+        self.assertEqual(doses['slot_1_doses'], 0)
+
+
+class TestSequencing(ProcessorTestCase):
+    """Sequence gaps are recorded and overtaken events are reordered"""
+    
+    def setUp(self):
+        super().setUp()
+        self.processor.sequence_metrics.reset()
+    
+    def event(self, sequence, in_holder, offset_ms):
+        return self.slot_event(in_holder, offset_ms, sequence=sequence, received_ms=START_MS + offset_ms)
+    
+    def test_gap_and_late_event(self):
+        """Test that a skipped sequence is recorded as missing and a late arrival closes the gap"""
+        statuses = [
+            self.status(event)
+            for event in (self.event(1, False, 0), self.event(4, True, 120000), self.event(2, True, 60000))
+        ]
+        
+        # The late return is older than the applied one, so it is not applied again
+        self.assertEqual(statuses, ['success', 'success', 'stale'])
+        device = self.device()
+        self.assertEqual(device['last_sequence'], 4)
+        self.assertEqual(device['sequence_gaps'], 1)
+        self.assertEqual(device['missing_sequences'], [3])
+        metrics = self.processor.sequence_metrics
+        self.assertEqual((metrics.gaps, metrics.missing, metrics.late), (1, 2, 1))
+    
+    def test_batch_reordered_before_processing(self):
+        """Test that an overtaken event in a queued batch is applied in order, with no gap"""
+        events = [self.event(1, False, 0), self.event(3, False, 120000), self.event(2, True, 60000)]
+        
+        result = self.handle({'Records': self.queued(events)})
+        
+        self.assertEqual(result, {'batchItemFailures': []})
+        device = self.device()
+        self.assertEqual(device['last_sequence'], 3)
+        self.assertNotIn('sequence_gaps', device)
+        self.assertEqual(self.processor.sequence_metrics.reordered, 1)
+        self.assertEqual(self.pill_count(), 28)
+
+
+class TestSlotSnapshot(ProcessorTestCase):
+    """Startup snapshots sync slot states without side effects"""
+    
+    def test_snapshot_is_one_update(self):
+        """Test that a snapshot costs one UpdateItem and never calls or publishes"""
+        # Slots 2 and 3 have no prescription, which would trigger a phone call per inserted bottle
+        event = {'device_id': self.device_id, 'event_type': 'slot_snapshot', 'in_holder_mask': 0b110,
+                 'ts_ms': START_MS}
+        
+        result = self.handle(event)
+        
+        self.assertEqual(result['statusCode'], 200)
+        self.assertEqual(dict(self.aws.dynamodb.calls), {'UpdateItem': 1})
+        self.assertEqual(self.aws.iot_data.published, [])
+        self.assertEqual(self.aws.lambda_.invocations, [])
+        device = self.device()
+        self.assertEqual({slot: state['in_holder'] for slot, state in device['slots'].items()},
+                         {'1': False, '2': True, '3': True})
+        self.assertEqual(device['slots']['1']['last_state_change'], fleet_harness.START_MS)
+        self.assertEqual(device['last_seen'], START_MS)
+    
+    def test_late_snapshot_keeps_newer_slot_state(self):
+        """Test that a snapshot older than a slot's last transition only updates the other slots"""
+        self.assertEqual(self.status(self.slot_event(False, 60000)), 'success')
+        self.aws.dynamodb.calls.clear()
+        event = {'device_id': self.device_id, 'event_type': 'slot_snapshot', 'in_holder_mask': 0b001,
+                 'ts_ms': START_MS}
+        
+        self.assertEqual(self.status(event), 'success')
+        
+        self.assertEqual(dict(self.aws.dynamodb.calls), {'UpdateItem': 2})
+        device = self.device()
+        self.assertEqual({slot: state['in_holder'] for slot, state in device['slots'].items()},
+                         {'1': False, '2': False, '3': False})
+        self.assertEqual(device['slots']['1']['last_state_change'], START_MS + 60000)
+
+
+class TestMultiSlotEvent(ProcessorTestCase):
+    """A multi-slot event does the work of one event per slot in fewer writes"""
+    
+    slots = 2
+    
+    def run_events(self, events):
+        """Run events on fresh stand-ins; returns (aws, results, slot 1 and 2 pill counts)"""
+        self.seed(1, self.slots)
+        processor = self.load_processor()
+        results = [self.handle(dict(event, device_id=self.device_id), processor) for event in events]
+        return self.aws, results, [self.pill_count(slot) for slot in (1, 2)]
+    
+    def test_swap_matches_single_events(self):
+        """Test that swapping two bottles saves one event-log write and one device update"""
+        single_aws, _, single_counts = self.run_events([
+            {'event_type': 'slot_state_changed', 'slot': 1, 'in_holder': False, 'ts_ms': START_MS},
+            {'event_type': 'slot_state_changed', 'slot': 2, 'in_holder': False, 'ts_ms': START_MS},
+        ])
+        multi_aws, [result], multi_counts = self.run_events([
+            {'event_type': 'slot_states_changed', 'changed_mask': 0b011, 'in_holder_mask': 0, 'ts_ms': START_MS},
+        ])
+        
+        self.assertEqual(json.loads(result['body'])['message'], '2 of 2 slot transitions processed')
+        self.assertEqual(multi_counts, single_counts)
+        self.assertEqual(multi_counts, [29, 29])
+        self.assertEqual(len(multi_aws.dynamodb.tables['PillBuddy_Events']), 1)
+        self.assertEqual(multi_aws.dynamodb.calls['PutItem'], single_aws.dynamodb.calls['PutItem'] - 1)
+        self.assertEqual(multi_aws.dynamodb.calls['UpdateItem'], single_aws.dynamodb.calls['UpdateItem'] - 1)
+        self.assertEqual(len(multi_aws.iot_data.published), len(single_aws.iot_data.published))
+    
+    def test_returns_send_one_led_command(self):
+        """Test that returning two bottles turns both LEDs off in one command"""
+        aws, _, _ = self.run_events([
+            {'event_type': 'slot_states_changed', 'changed_mask': 0b011, 'in_holder_mask': 0, 'ts_ms': START_MS},
+            {'event_type': 'slot_states_changed', 'changed_mask': 0b011, 'in_holder_mask': 0b011,
+             'ts_ms': START_MS + 60000},
+        ])
+        
+        self.assertEqual([json.loads(message['payload']) for message in aws.iot_data.published],
+                         [{'action': 'set_leds', 'on_mask': 0, 'off_mask': 0b011}])
+    
+    def test_invalid_masks_rejected(self):
+        """Test that an empty or out-of-range change mask is a client error"""
+        _, results, counts = self.run_events([
+            {'event_type': 'slot_states_changed', 'changed_mask': 0, 'in_holder_mask': 0, 'ts_ms': START_MS},
+            {'event_type': 'slot_states_changed', 'changed_mask': 0b011, 'in_holder_mask': 8, 'ts_ms': START_MS},
+        ])
+        
+        self.assertEqual([result['statusCode'] for result in results], [400, 400])
+        self.assertEqual(counts, [30, 30])
+
+
+class TestBinaryEvents(ProcessorTestCase):
+    """Compact binary events are processed like their JSON equivalents"""
+    
+    def forwarded(self, in_holder, sequence):
+        ts = START_MS + sequence * 60000
+        payload = encode_event({'event_type': 'slot_state_changed', 'slot': 1, 'in_holder': in_holder,
+                                'sequence': sequence, 'ts_ms': ts})
+        return apply_binary_rule(payload, f"pillbuddy/events/{self.device_id}/bin", ts)
+    
+    def test_direct_and_queued(self):
+        """Test binary events on the direct path and in a queued batch"""
+        batch = self.queued([self.forwarded(sequence % 2 == 0, sequence) for sequence in (3, 2)])
+        batch.append({'messageId': 'junk', 'body': json.dumps(dict(self.forwarded(True, 4), payload_b64='AAAA')),
+                      'eventSource': 'aws:sqs'})
+        direct = self.handle(self.forwarded(False, 1))
+        invalid = self.handle(dict(self.forwarded(False, 4), payload_b64='AAAA'))
+        queued = self.handle({'Records': batch})
+        
+        self.assertEqual(direct['statusCode'], 200)
+        self.assertEqual(invalid['statusCode'], 400)
+        self.assertEqual(queued, {'batchItemFailures': []})
+        device = self.device()
+        self.assertEqual(device['last_sequence'], 3)
+        self.assertEqual(device['slots']['1']['in_holder'], False)
+        self.assertEqual(self.pill_count(), 28)
+
+
+class TestFeedbackLatency(ProcessorTestCase):
+    """Bottle return to LED command round-trip trace"""
+    
+    def test_return_carries_trace(self):
+        """Test that the LED command carries the event's stamps and the hops are logged"""
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            for offset, in_holder in ((0, False), (60000, True)):
+                self.processor.lambda_handler(
+                    self.slot_event(in_holder, offset, received_ms=START_MS + offset + 150), None
+                )
+        
+        [message] = self.aws.iot_data.published
+        payload = json.loads(message['payload'])
+        self.assertEqual(payload['trace'][:2], [START_MS + 60000, START_MS + 60150])
+        self.assertEqual(len(payload['trace']), 4)
+        [sample] = [json.loads(line)['led_round_trip'] for line in output.getvalue().splitlines()
+                    if line.startswith('{"led_round_trip"')]
+        self.assertEqual(sample['device_to_iot'], 150)
+        self.assertEqual(sample['device_id'], self.device_id)
+
+
+class TestOutboundResilience(ProcessorTestCase):
+    """LED commands survive an IoT brownout without slowing every event"""
+    
+    devices = 2
+    
+    def test_brownout_requeues_led_commands(self):
+        """Test that failed LED commands are retried, short-circuited and sent once IoT recovers"""
+        self.processor.outbound_retry.sleep = lambda seconds: None
+        
+        self.aws.iot_data.fail_next = 100
+        for offset, device_id in enumerate(self.device_ids):
+            for in_holder in (False, True):
+                self.handle(self.slot_event(in_holder, offset * 120000 + (60000 if in_holder else 0),
+                                            device_id=device_id))
+        # Five failed publishes in a row open the breaker; the rest fail fast without a call
+        self.assertEqual(100 - self.aws.iot_data.fail_next, 5)
+        self.assertEqual(self.processor.iot_breaker.state, 'open')
+        self.assertEqual(self.aws.iot_data.published, [])
+        
+        self.aws.iot_data.fail_next = 0
+        self.processor.iot_breaker.opened_at -= self.processor.iot_breaker.reset_timeout_ms
+        self.handle({'Records': []})
+        
+        self.assertEqual(sorted(message['topic'] for message in self.aws.iot_data.published),
+                         [f"pillbuddy/cmd/{device_id}" for device_id in sorted(self.device_ids)])
+        self.assertEqual(self.processor.iot_breaker.state, 'closed')
+
+
+class TestPhoneCallLimits(ProcessorTestCase):
+    """Empty-slot phone calls are limited across containers"""
+    
+    def test_cooldown_holds_across_containers(self):
+        """Test that reinserting a bottle through another container does not call again"""
+        # Slot 2 has no prescription
+        containers = [self.processor, self.load_processor()]
+        
+        results = []
+        for index, processor in enumerate(containers):
+            for in_holder in (False, True):
+                results.append(self.handle(
+                    self.slot_event(in_holder, index * 120000 + (60000 if in_holder else 0), slot=2), processor
+                ))
+        
+        self.assertEqual(len(self.aws.lambda_.invocations), 1)
+        self.assertIn('phone call triggered', results[1]['body'])
+        self.assertIn('phone call skipped', results[3]['body'])
+        limits = self.aws.dynamodb.tables['PillBuddy_CallLimits']
+        device = limits.get({'limit_key': f'device#{self.device_id}'})
+        self.assertEqual(device['tokens'], 2)
+        self.assertIn('slot_2_last_call', device)
+        # The refused call gave its lease back
+        self.assertEqual(sum(1 for item in limits.items() if item['limit_key'].startswith('lease#')), 1)
+    
+    def test_failed_invoke_does_not_hold_up_the_next_call(self):
+        """Test that a call whose invocation fails is refunded and the next insertion calls"""
+        failure = stand_ins.client_error('ServiceException', 'Lambda unavailable', 'Invoke')
+        
+        self.handle(self.slot_event(False, 0, slot=2))
+        with patch.object(self.aws.lambda_, 'invoke', side_effect=failure), patch('builtins.print'):
+            first = self.handle(self.slot_event(True, 30000, slot=2))
+        self.handle(self.slot_event(False, 60000, slot=2))
+        second = self.handle(self.slot_event(True, 90000, slot=2))
+        
+        self.assertNotIn('phone call triggered', first['body'])
+        self.assertIn('phone call triggered', second['body'])
+        self.assertEqual(len(self.aws.lambda_.invocations), 1)
+        limits = self.aws.dynamodb.tables['PillBuddy_CallLimits']
+        self.assertEqual(limits.get({'limit_key': f'device#{self.device_id}'})['tokens'], 2)
+
+
+class TestQueueIngestion(ProcessorTestCase):
+    """Batched ingestion from the event queue"""
+    
+    devices = 2
+    
+    def test_partial_batch_failure(self):
+        """Test that only throttled events and the same device's later events are returned for retry"""
+        def record(message_id, device_id, in_holder):
+            event = self.slot_event(in_holder, device_id=device_id, ts_ms=fleet_harness.START_MS)
+            return {'messageId': message_id, 'body': json.dumps(event), 'eventSource': 'aws:sqs'}
+        
+        records = [
+            {'messageId': 'junk', 'body': 'not json', 'eventSource': 'aws:sqs'},
+            record('a1', self.device_ids[0], False),
+            record('a2', self.device_ids[0], True),
+            record('b1', self.device_ids[1], False),
+        ]
+        throttled = stand_ins.client_error('ProvisionedThroughputExceededException', 'Throttled', 'PutItem')
+        
+        with patch.object(self.processor, 'log_event', side_effect=[throttled, None]) as log_event:
+            result = self.handle({'Records': records})
+        
+        self.assertEqual(result, {'batchItemFailures': [{'itemIdentifier': 'a1'}, {'itemIdentifier': 'a2'}]})
+        self.assertEqual(log_event.call_count, 2)
+    
+    def test_permanent_failures_are_acknowledged(self):
+        """Test that decodable events that can never succeed are not returned for retry"""
+        missing_slot = self.slot_event(False)
+        del missing_slot['slot']
+        later = self.slot_event(False, offset_ms=5000)
+        
+        result = self.handle({'Records': self.queued([missing_slot, later])})
+        
+        self.assertEqual(result, {'batchItemFailures': []})
+        self.assertEqual(self.pill_count(), 29)
+    
+    def test_non_retryable_client_error_is_acknowledged(self):
+        """Test that a ValidationException fails the event without redelivery"""
+        invalid = stand_ins.client_error('ValidationException', 'Invalid UpdateExpression', 'UpdateItem')
+        
+        with patch.object(self.processor, 'log_event', side_effect=invalid):
+            result = self.handle({'Records': self.queued([self.slot_event(False)])})
+        
+        self.assertEqual(result, {'batchItemFailures': []})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -13,19 +13,22 @@ Environment Variables:
 
 import json
 import os
-import time
-import boto3
 from botocore.exceptions import ClientError
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
+from pillbuddy_core.clients import make_client
+from pillbuddy_core.ddb_client import FastDynamoDB, PRESCRIPTIONS_KEY_SCHEMA
+from pillbuddy_core.errors import log_error, error_response
+from pillbuddy_core.timeutil import now_ms
+
+# Initialize AWS clients (shared configuration from the PillBuddyCore layer)
+dynamodb = FastDynamoDB(make_client('dynamodb'))
 
 # Environment variables
 PRESCRIPTIONS_TABLE = os.environ['PRESCRIPTIONS_TABLE']
 ALEXA_SKILL_ID = os.environ.get('ALEXA_SKILL_ID', '')
 
 # DynamoDB table
-prescriptions_table = dynamodb.Table(PRESCRIPTIONS_TABLE)
+prescriptions_table = dynamodb.table(PRESCRIPTIONS_TABLE, PRESCRIPTIONS_KEY_SCHEMA)
 
 # Constants
 TIMEOUT_THRESHOLD_MS = 10 * 60 * 1000  # 10 minutes in milliseconds
@@ -49,7 +52,7 @@ def lambda_handler(event, context):
         print("Starting timeout check...")
         
         # Get current timestamp
-        current_time = int(time.time() * 1000)
+        current_time = now_ms()
         
         # Scan prescriptions table for bottles that are out
         prescriptions = scan_removed_prescriptions()
@@ -82,11 +85,8 @@ def lambda_handler(event, context):
         }
         
     except Exception as e:
-        print(f"Error in timeout checker: {str(e)}")
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': str(e)})
-        }
+        log_error('in timeout checker', e)
+        return error_response(500, str(e))
 
 
 def scan_removed_prescriptions():
@@ -121,7 +121,7 @@ def scan_removed_prescriptions():
         return prescriptions
         
     except ClientError as e:
-        print(f"Error scanning prescriptions: {str(e)}")
+        log_error('scanning prescriptions', e)
         return []
 
 
@@ -188,7 +188,7 @@ def check_bottle_return_timeout(prescription, current_time):
             }
         
     except Exception as e:
-        print(f"Error checking timeout for prescription: {str(e)}")
+        log_error('checking timeout for prescription', e)
         return {
             'status': 'error',
             'error': str(e)
@@ -226,5 +226,5 @@ def send_alexa_notification(device_id, message):
         # or use requests library to call Alexa Events API directly
         
     except Exception as e:
-        print(f"Error sending Alexa notification: {str(e)}")
+        log_error('sending Alexa notification', e)
         # Non-critical error, don't raise
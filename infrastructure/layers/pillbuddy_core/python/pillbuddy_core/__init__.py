@@ -0,0 +1,24 @@
+"""
+PillBuddy Core
+
+Code shared by every PillBuddy Lambda function, deployed as the
+PillBuddyCore Lambda layer (see PillBuddyStack). Lambda puts the layer's
+python/ directory on sys.path, so handlers import it as pillbuddy_core.
+
+Modules:
+    cache: Read-through/write-through cache tier for DynamoDB tables
+    call_limits: Rate limits and dedupe for empty-slot phone calls
+    clients: boto3 clients with tuned timeouts, retries and keep-alive
+    daily_doses: Per-day dose counters behind DoseTodayIntent
+    ddb_client: Low-level DynamoDB data-access layer
+    debounce: Server-side debounce for flapping slot sensors
+    device_resolver: Cached Alexa userId -> device_id resolution
+    event_codec: Compact binary encoding for device events
+    instrumentation: Latency histograms flushed as CloudWatch EMF
+    iot: Device command publishing
+    resilience: Retry policy with jitter and per-dependency circuit breakers
+    round_trip: Bottle return to LED command round-trip latency
+    sequencing: Sequence gap tracking and per-device event reordering
+    errors: Error logging and HTTP-style error responses
+    timeutil: Millisecond timestamps
+"""
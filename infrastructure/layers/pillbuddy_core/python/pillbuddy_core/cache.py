@@ -0,0 +1,351 @@
+"""
+Read-through / write-through cache tier for DynamoDB tables
+
+CachedTable wraps a FastTable with the same resource-style interface, so
+handlers swap it in at table setup:
+
+    cache = cache_from_env()
+    prescriptions_table = CachedTable(dynamodb.table(...), cache)
+
+Reads (get_item without ConsistentRead or ProjectionExpression) are served
+from the cache and filled on a miss. Writes go to DynamoDB first and then
+refresh the cached item: put_item stores the written item, update_item
+asks for ALL_NEW and stores the result, delete_item drops the key. A
+failed write leaves the cache untouched. Query and Scan pass straight
+through.
+
+Backends (CACHE_BACKEND):
+    memory: Per-container LRU (default). Writes from other containers are
+            only seen once the entry expires, so keep CACHE_TTL_SECONDS short.
+    redis:  Any Redis-protocol server (ElastiCache, Valkey, or a local
+            redis-server for testing) at CACHE_REDIS_URL. Shared by all
+            containers, so write-through keeps every handler coherent.
+    dax:    DynamoDB Accelerator. DAX is itself a read-through/write-through
+            item cache behind a DynamoDB-compatible client, so the handler's
+            DynamoDB client is replaced with a DAX client (DAX_ENDPOINT) and
+            no client-side cache is layered on top. DAX reports its own hit
+            ratio in CloudWatch (ItemCacheHits / ItemCacheMisses).
+    none:   No caching.
+
+Missing items are not cached: a slot set up through another container must
+be visible to the next bottle event.
+
+The memory backend holds the decoded items themselves, so a read costs no
+copy or parse. Items returned by get_item and lookup may be shared with the
+cache and must be treated as read-only; build a new dict to change one.
+The redis backend serializes items as DynamoDB-typed JSON.
+
+Hit ratios per table are emitted as EMF records alongside the latency
+metrics (see instrumentation.register_metric_source).
+
+Environment Variables:
+    CACHE_BACKEND: memory, redis, dax or none (default memory)
+    CACHE_TTL_SECONDS: Entry lifetime for memory and redis (default 30)
+    CACHE_REDIS_URL: redis:// URL for the redis backend
+    DAX_ENDPOINT: Cluster endpoint for the dax backend
+"""
+
+import json
+import os
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import timeutil
+from .ddb_client import FastTable, encode_item, decode_item
+from .errors import log_error
+from .instrumentation import METRICS_NAMESPACE, register_metric_source
+
+CACHE_BACKENDS = ('memory', 'redis', 'dax', 'none')
+DEFAULT_CACHE_TTL_SECONDS = 30
+DEFAULT_MAX_ENTRIES = 4096
+
+
+class MemoryCache:
+    """
+    In-container LRU cache with per-entry expiry
+
+    Values are kept as given, without serialization.
+
+    Args:
+        max_entries: Maximum number of cached keys
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self.max_entries = max_entries
+        # key -> (expires_at_ms, value)
+        self._entries: 'OrderedDict[str, Tuple[int, Any]]' = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= timeutil.now_ms():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        self._entries[key] = (timeutil.now_ms() + int(ttl_seconds * 1000), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class RedisCache:
+    """
+    Redis-protocol backend
+
+    Items are stored as DynamoDB-typed JSON so Decimals and sets survive
+    the round trip.
+
+    Args:
+        client: redis-py compatible client (get, set with px=, delete)
+    """
+
+    def __init__(self, client: Any) -> None:
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url: str) -> 'RedisCache':
+        """
+        Connect to a Redis-protocol server
+
+        Raises:
+            ImportError: If the optional redis package is not installed
+        """
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("CACHE_BACKEND=redis requires the 'redis' package in the layer") from e
+        return cls(redis.Redis.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.2))
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self.client.get(key)
+        if value is None:
+            return None
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        return decode_item(json.loads(value))
+
+    def set(self, key: str, value: Dict[str, Any], ttl_seconds: float) -> None:
+        self.client.set(key, json.dumps(encode_item(value)), px=max(1, int(ttl_seconds * 1000)))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(key)
+
+
+class CachedTable:
+    """
+    Read-through / write-through cache in front of a FastTable
+
+    Cache backend errors are logged and treated as misses, so an unhealthy
+    cache degrades to plain DynamoDB calls instead of failing the request.
+
+    Args:
+        table: FastTable to wrap
+        cache: MemoryCache, RedisCache, or None to disable caching
+        ttl_seconds: Entry lifetime
+    """
+
+    def __init__(self, table: FastTable, cache: Any, ttl_seconds: float = DEFAULT_CACHE_TTL_SECONDS) -> None:
+        self.table = table
+        self.cache = cache
+        self.ttl_seconds = ttl_seconds
+        self.table_name = table.table_name
+        self.key_fields = tuple(name for name, _ in table.key_template.fields)
+        self.hits = 0
+        self.misses = 0
+        _cached_tables.add(self)
+
+    def cache_key(self, key: Dict[str, Any]) -> str:
+        """Build the cache key for a DynamoDB key"""
+        return '|'.join([self.table_name] + [str(key[name]) for name in self.key_fields])
+
+    def lookup(self, key: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Get a cached item without falling through to DynamoDB
+
+        Returns:
+            The cached item, or None on a miss
+        """
+        if self.cache is None:
+            return None
+        try:
+            value = self.cache.get(self.cache_key(key))
+        except Exception as e:
+            log_error('reading cache', e)
+            value = None
+
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def store(self, item: Dict[str, Any]) -> None:
+        """Write an item read or written elsewhere into the cache"""
+        if self.cache is None:
+            return
+        try:
+            self.cache.set(self.cache_key(item), item, self.ttl_seconds)
+        except Exception as e:
+            log_error('writing cache', e)
+
+    def invalidate(self, key: Dict[str, Any]) -> None:
+        """Drop a cached item"""
+        if self.cache is None:
+            return
+        try:
+            self.cache.delete(self.cache_key(key))
+        except Exception as e:
+            log_error('invalidating cache', e)
+
+    def get_item(self, **kwargs) -> Dict[str, Any]:
+        if self.cache is None or kwargs.get('ConsistentRead') or 'ProjectionExpression' in kwargs:
+            return self.table.get_item(**kwargs)
+
+        item = self.lookup(kwargs['Key'])
+        if item is not None:
+            return {'Item': item}
+
+        response = self.table.get_item(**kwargs)
+        if 'Item' in response:
+            self.store(response['Item'])
+        return response
+
+    def put_item(self, **kwargs) -> Dict[str, Any]:
+        response = self.table.put_item(**kwargs)
+        self.store(kwargs['Item'])
+        return response
+
+    def update_item(self, **kwargs) -> Dict[str, Any]:
+        if self.cache is None:
+            return self.table.update_item(**kwargs)
+
+        return_values = kwargs.get('ReturnValues', 'NONE')
+        if return_values in ('NONE', 'ALL_NEW'):
+            # ALL_NEW costs no extra capacity and refreshes the cached item
+            response = self.table.update_item(**dict(kwargs, ReturnValues='ALL_NEW'))
+            self.store(response['Attributes'])
+            if return_values == 'NONE':
+                del response['Attributes']
+            return response
+
+        response = self.table.update_item(**kwargs)
+        self.invalidate(kwargs['Key'])
+        return response
+
+    def delete_item(self, **kwargs) -> Dict[str, Any]:
+        response = self.table.delete_item(**kwargs)
+        self.invalidate(kwargs['Key'])
+        return response
+
+    def query(self, **kwargs) -> Dict[str, Any]:
+        return self.table.query(**kwargs)
+
+    def scan(self, **kwargs) -> Dict[str, Any]:
+        return self.table.scan(**kwargs)
+
+    @property
+    def hit_ratio(self) -> Optional[float]:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else None
+
+
+# Every live CachedTable in this container, for hit-ratio reporting
+_cached_tables: 'weakref.WeakSet[CachedTable]' = weakref.WeakSet()
+
+
+def cache_from_env() -> Any:
+    """
+    Create the cache backend selected by CACHE_BACKEND
+
+    Returns:
+        MemoryCache, RedisCache, or None for the dax and none backends
+
+    Raises:
+        ValueError: For an unknown backend name
+    """
+    backend = os.environ.get('CACHE_BACKEND', 'memory')
+    if backend not in CACHE_BACKENDS:
+        raise ValueError(f"CACHE_BACKEND must be one of {', '.join(CACHE_BACKENDS)}, got {backend!r}")
+    if backend == 'memory':
+        return MemoryCache()
+    if backend == 'redis':
+        return RedisCache.from_url(os.environ['CACHE_REDIS_URL'])
+    return None
+
+
+def cache_ttl_from_env() -> float:
+    """Entry lifetime from CACHE_TTL_SECONDS"""
+    return float(os.environ.get('CACHE_TTL_SECONDS', DEFAULT_CACHE_TTL_SECONDS))
+
+
+def dynamodb_client_from_env() -> Any:
+    """
+    Create the DynamoDB client for this handler
+
+    Returns a DAX client when CACHE_BACKEND=dax, otherwise the tuned
+    low-level DynamoDB client. Both expose the same low-level API.
+
+    Raises:
+        ImportError: If CACHE_BACKEND=dax and amazondax is not installed
+    """
+    from .clients import make_client, client_config
+
+    if os.environ.get('CACHE_BACKEND') != 'dax':
+        return make_client('dynamodb')
+
+    try:
+        from amazondax import AmazonDaxClient
+    except ImportError as e:
+        raise ImportError("CACHE_BACKEND=dax requires the 'amazon-dax-client' package in the layer") from e
+    return AmazonDaxClient(endpoint_url=os.environ['DAX_ENDPOINT'], config=client_config())
+
+
+def build_cache_metric_records(service: str, timestamp: int) -> List[Dict[str, Any]]:
+    """
+    Build one EMF record per cached table with hits, misses and hit ratio
+
+    Counters are reset after each build so every record covers one flush
+    interval.
+    """
+    records = []
+    for table in sorted(_cached_tables, key=lambda t: t.table_name):
+        lookups = table.hits + table.misses
+        if lookups == 0:
+            continue
+        records.append({
+            '_aws': {
+                'Timestamp': timestamp,
+                'CloudWatchMetrics': [{
+                    'Namespace': METRICS_NAMESPACE,
+                    'Dimensions': [['Service', 'Table']],
+                    'Metrics': [
+                        {'Name': 'cache_hits', 'Unit': 'Count'},
+                        {'Name': 'cache_misses', 'Unit': 'Count'},
+                        {'Name': 'cache_hit_ratio', 'Unit': 'None'}
+                    ]
+                }]
+            },
+            'Service': service,
+            'Table': table.table_name,
+            'cache_hits': table.hits,
+            'cache_misses': table.misses,
+            'cache_hit_ratio': round(table.hits / lookups, 4)
+        })
+        table.hits = 0
+        table.misses = 0
+    return records
+
+
+register_metric_source(build_cache_metric_records)
@@ -0,0 +1,368 @@
+"""
+Rate limits for empty-slot phone calls
+
+A bottle put into a slot without a prescription makes the IoT Event
+Processor invoke the callUser Lambda, which phones the user. Repeated
+insertions, or a fleet coming back from a reboot, must not turn into a
+storm of invocations and calls. Before every call CallLimiter checks:
+
+    - a cooldown ledger keyed by (device_id, slot): one call per slot per
+      cooldown_ms
+    - a token bucket per device: bucket_size calls at once, refilled with
+      one token every token_interval_ms
+    - a fleet-wide cap of max_outstanding calls in progress. Calls are
+      invoked asynchronously and never report back, so each one holds a
+      lease for lease_ms, about the length of a call
+
+Each container keeps what it has seen in memory, and anything that memory
+already rules out is refused without a DynamoDB request. Containers only
+see their own calls, so the CallLimits table is the authority:
+
+    {'limit_key': 'device#esp32_001', 'tokens': 2, 'refilled_ms': ...,
+     'slot_2_last_call': ..., 'ttl': ...}
+    {'limit_key': 'lease#4', 'expires_ms': ..., 'holder': 'esp32_001#2', 'ttl': ...}
+
+The device item is updated conditionally on the bucket this container last
+saw and on the slot being out of its cooldown. When the condition fails the
+stored item comes back with the failure (ReturnValuesOnConditionCheckFailure)
+and the check is redone against it, as for sequenced device updates. Lease
+items 0..max_outstanding-1 form a semaphore: a call takes the first lease
+that is free or expired, starting at a slot picked from the device id so
+containers do not all contend for lease 0.
+
+The lease is taken before the device is charged and given back if the
+device is refused. If the invocation fails the call is released whole: the
+lease, the device's token and the slot's cooldown, so the next insertion
+can call again. Without a table (or while
+it cannot be reached) the in-memory checks alone decide, which still
+bounds calls per container. Placed and refused calls are counted per
+container and emitted as EMF records on every flush.
+"""
+
+import os
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .ddb_client import decode_item
+from .instrumentation import METRICS_NAMESPACE, register_metric_source
+from .timeutil import MINUTE_MS, now_ms
+
+COOLDOWN = 'cooldown'
+RATE_LIMITED = 'rate_limited'
+CONCURRENCY = 'concurrency'
+
+DEFAULT_BUCKET_SIZE = 3
+DEFAULT_TOKEN_INTERVAL_MS = 20 * MINUTE_MS
+DEFAULT_COOLDOWN_MS = 15 * MINUTE_MS
+DEFAULT_MAX_OUTSTANDING = 10
+DEFAULT_LEASE_MS = 3 * MINUTE_MS
+DEFAULT_MAX_DEVICES = 4096
+DEVICE_UPDATE_ATTEMPTS = 3
+TTL_SLACK_SECONDS = 3600
+
+DEVICE_UPDATE = 'SET #tokens = :tokens, #refilled = :refilled, #last_call = :now, #ttl = :ttl'
+DEVICE_REFUND = 'SET #tokens = #tokens + :one REMOVE #last_call'
+LEASE_UPDATE = 'SET #expires = :expires, #holder = :holder, #ttl = :ttl'
+LEASE_CONDITION = 'attribute_not_exists(#expires) OR #expires <= :now'
+
+
+def call_limiter_from_env(table: Any = None) -> 'CallLimiter':
+    """
+    CallLimiter configured from CALL_BUCKET_SIZE, CALL_TOKEN_INTERVAL_MS,
+    CALL_COOLDOWN_MS, MAX_OUTSTANDING_CALLS and CALL_LEASE_MS
+    """
+    def setting(name: str, default: int) -> int:
+        return int(os.environ.get(name, str(default)))
+
+    return CallLimiter(
+        table,
+        bucket_size=setting('CALL_BUCKET_SIZE', DEFAULT_BUCKET_SIZE),
+        token_interval_ms=setting('CALL_TOKEN_INTERVAL_MS', DEFAULT_TOKEN_INTERVAL_MS),
+        cooldown_ms=setting('CALL_COOLDOWN_MS', DEFAULT_COOLDOWN_MS),
+        max_outstanding=setting('MAX_OUTSTANDING_CALLS', DEFAULT_MAX_OUTSTANDING),
+        lease_ms=setting('CALL_LEASE_MS', DEFAULT_LEASE_MS)
+    )
+
+
+def refill(tokens: int, refilled_ms: int, now: int, bucket_size: int, token_interval_ms: int) -> Tuple[int, int]:
+    """
+    Token bucket level at now
+
+    Tokens are whole; refilled_ms only advances by whole intervals, so time
+    towards the next token is not lost between checks.
+
+    Returns:
+        (tokens, refilled_ms)
+    """
+    earned = max(0, now - refilled_ms) // token_interval_ms
+    if tokens + earned >= bucket_size:
+        return bucket_size, now
+    return tokens + earned, refilled_ms + earned * token_interval_ms
+
+
+def _condition_failed(error: BaseException) -> bool:
+    response = getattr(error, 'response', None)
+    return isinstance(response, dict) and response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException'
+
+
+class CallMetrics:
+    """Placed and refused phone calls since the last flush"""
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.placed = 0
+        self.refused = {COOLDOWN: 0, RATE_LIMITED: 0, CONCURRENCY: 0}
+
+
+call_metrics = CallMetrics()
+
+
+def build_call_metric_records(service: str, timestamp: int) -> List[Dict[str, Any]]:
+    """One EMF record with the phone call counts, reset after each build"""
+    counts = {
+        'phone_calls': call_metrics.placed,
+        'calls_in_cooldown': call_metrics.refused[COOLDOWN],
+        'calls_rate_limited': call_metrics.refused[RATE_LIMITED],
+        'calls_over_concurrency': call_metrics.refused[CONCURRENCY]
+    }
+    call_metrics.reset()
+    if not any(counts.values()):
+        return []
+    record = {
+        '_aws': {
+            'Timestamp': timestamp,
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [['Service']],
+                'Metrics': [{'Name': name, 'Unit': 'Count'} for name in counts]
+            }]
+        },
+        'Service': service
+    }
+    record.update(counts)
+    return [record]
+
+
+register_metric_source(build_call_metric_records)
+
+
+class CallLimiter:
+    """
+    Cooldown ledger, per-device token buckets and a fleet-wide call cap
+
+    Args:
+        table: CallLimits table (FastTable), or None for in-memory limits only
+        bucket_size: Calls a device can place back to back
+        token_interval_ms: Time for a device to earn back one call
+        cooldown_ms: Shortest time between calls for one slot
+        max_outstanding: Calls in progress across the fleet
+        lease_ms: How long a call counts as in progress
+        max_devices: Devices remembered before the least recently used are dropped
+    """
+
+    def __init__(self, table: Any = None, bucket_size: int = DEFAULT_BUCKET_SIZE,
+                 token_interval_ms: int = DEFAULT_TOKEN_INTERVAL_MS, cooldown_ms: int = DEFAULT_COOLDOWN_MS,
+                 max_outstanding: int = DEFAULT_MAX_OUTSTANDING, lease_ms: int = DEFAULT_LEASE_MS,
+                 max_devices: int = DEFAULT_MAX_DEVICES) -> None:
+        self.table = table
+        self.bucket_size = bucket_size
+        self.token_interval_ms = token_interval_ms
+        self.cooldown_ms = cooldown_ms
+        self.max_outstanding = max_outstanding
+        self.lease_ms = lease_ms
+        self.max_devices = max_devices
+        # device_id -> (tokens, refilled_ms) as last written or read
+        self._buckets: 'OrderedDict[str, Tuple[int, int]]' = OrderedDict()
+        # (device_id, slot) -> last call
+        self._ledger: 'OrderedDict[Tuple[str, int], int]' = OrderedDict()
+        # lease number -> expiry, for leases known to be taken
+        self._leases: Dict[int, int] = {}
+        # (device_id, slot) -> lease number held by a call this container placed
+        self._held: Dict[Tuple[str, int], int] = {}
+        # (device_id, slot) -> when the device was charged for a call still in progress
+        self._charged: Dict[Tuple[str, int], int] = {}
+
+    def acquire(self, device_id: str, slot: int) -> Optional[str]:
+        """
+        Check and charge the limits for a call about a slot
+
+        Returns:
+            None if the call may be placed, otherwise why not (COOLDOWN,
+            RATE_LIMITED or CONCURRENCY)
+        """
+        now = now_ms()
+        self._held = {call: lease for call, lease in self._held.items() if self._leases.get(lease, 0) > now}
+        self._charged = {call: at for call, at in self._charged.items() if now - at < self.lease_ms}
+        reason = self._local_reason(device_id, slot, now)
+        if reason is None:
+            reason = self._acquire_lease(device_id, slot, now)
+        if reason is None:
+            reason = self._charge_device(device_id, slot, now)
+            if reason is not None:
+                self._release_lease(device_id, slot)
+        if reason is None:
+            self._charged[(device_id, slot)] = now
+            call_metrics.placed += 1
+        else:
+            call_metrics.refused[reason] += 1
+        return reason
+
+    def release(self, device_id: str, slot: int) -> None:
+        """Give back the lease, token and cooldown of a call that was not placed"""
+        self._release_lease(device_id, slot)
+        charged_at = self._charged.pop((device_id, slot), None)
+        if charged_at is None:
+            return
+        call_metrics.placed = max(0, call_metrics.placed - 1)
+        bucket = self._buckets.get(device_id)
+        if bucket is not None:
+            self._buckets[device_id] = (min(bucket[0] + 1, self.bucket_size), bucket[1])
+        if self._ledger.get((device_id, slot)) == charged_at:
+            del self._ledger[(device_id, slot)]
+        if self.table is None:
+            return
+        try:
+            # Stored tokens are below bucket_size after any charge, so +1 cannot overfill
+            self.table.update_item(
+                Key={'limit_key': f'device#{device_id}'},
+                UpdateExpression=DEVICE_REFUND,
+                ConditionExpression='#last_call = :last_call',
+                ExpressionAttributeNames={'#tokens': 'tokens', '#last_call': f'slot_{slot}_last_call'},
+                ExpressionAttributeValues={':one': 1, ':last_call': charged_at}
+            )
+        except Exception as e:
+            # Another call for the slot has been charged since, or unreachable
+            if not _condition_failed(e):
+                print(f"Could not refund call for {device_id} slot {slot}: {e}")
+
+    def _release_lease(self, device_id: str, slot: int) -> None:
+        lease = self._held.pop((device_id, slot), None)
+        if lease is None:
+            return
+        self._leases.pop(lease, None)
+        if self.table is None:
+            return
+        try:
+            self.table.delete_item(
+                Key={'limit_key': f'lease#{lease}'},
+                ConditionExpression='#holder = :holder',
+                ExpressionAttributeNames={'#holder': 'holder'},
+                ExpressionAttributeValues={':holder': f'{device_id}#{slot}'}
+            )
+        except Exception as e:
+            # Already expired and taken by another call, or unreachable; it expires anyway
+            if not _condition_failed(e):
+                print(f"Could not release call lease {lease}: {e}")
+
+    def _remember(self, cache: 'OrderedDict', key: Any, value: Any) -> None:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > self.max_devices:
+            cache.popitem(last=False)
+
+    def _local_reason(self, device_id: str, slot: int, now: int) -> Optional[str]:
+        last_call = self._ledger.get((device_id, slot))
+        if last_call is not None and now - last_call < self.cooldown_ms:
+            return COOLDOWN
+        bucket = self._buckets.get(device_id)
+        if bucket is not None and refill(*bucket, now, self.bucket_size, self.token_interval_ms)[0] < 1:
+            return RATE_LIMITED
+        if sum(1 for expires in self._leases.values() if expires > now) >= self.max_outstanding:
+            return CONCURRENCY
+        return None
+
+    def _acquire_lease(self, device_id: str, slot: int, now: int) -> Optional[str]:
+        start = zlib.crc32(device_id.encode()) % self.max_outstanding
+        for offset in range(self.max_outstanding):
+            lease = (start + offset) % self.max_outstanding
+            if self._leases.get(lease, 0) > now:
+                continue
+            expires = now + self.lease_ms
+            if self.table is not None:
+                try:
+                    self.table.update_item(**self._lease_update(lease, device_id, slot, now, expires))
+                except Exception as e:
+                    if _condition_failed(e):
+                        # Taken by another container; remember until when
+                        self._leases[lease] = decode_item(e.response.get('Item', {})).get('expires_ms', expires)
+                        continue
+                    print(f"Call lease check failed, using in-memory limits: {e}")
+            self._leases[lease] = expires
+            self._held[(device_id, slot)] = lease
+            return None
+        return CONCURRENCY
+
+    def _lease_update(self, lease: int, device_id: str, slot: int, now: int, expires: int) -> Dict[str, Any]:
+        return {
+            'Key': {'limit_key': f'lease#{lease}'},
+            'UpdateExpression': LEASE_UPDATE,
+            'ConditionExpression': LEASE_CONDITION,
+            'ExpressionAttributeNames': {'#expires': 'expires_ms', '#holder': 'holder', '#ttl': 'ttl'},
+            'ExpressionAttributeValues': {
+                ':expires': expires,
+                ':holder': f'{device_id}#{slot}',
+                ':now': now,
+                ':ttl': expires // 1000 + TTL_SLACK_SECONDS
+            },
+            'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'
+        }
+
+    def _charge_device(self, device_id: str, slot: int, now: int) -> Optional[str]:
+        seen = self._buckets.get(device_id)
+        for _ in range(DEVICE_UPDATE_ATTEMPTS):
+            tokens, refilled_ms = (refill(*seen, now, self.bucket_size, self.token_interval_ms)
+                                   if seen is not None else (self.bucket_size, now))
+            if tokens < 1:
+                return RATE_LIMITED
+            if self.table is not None:
+                try:
+                    self.table.update_item(**self._device_update(device_id, slot, now, seen, tokens - 1, refilled_ms))
+                except Exception as e:
+                    if not _condition_failed(e):
+                        print(f"Call limit check for {device_id} failed, using in-memory limits: {e}")
+                    else:
+                        stored = decode_item(e.response.get('Item', {}))
+                        last_call = stored.get(f'slot_{slot}_last_call')
+                        if last_call is not None and now - last_call < self.cooldown_ms:
+                            self._remember(self._ledger, (device_id, slot), last_call)
+                            return COOLDOWN
+                        seen = (stored['tokens'], stored['refilled_ms']) if 'refilled_ms' in stored else None
+                        continue
+            self._remember(self._buckets, device_id, (tokens - 1, refilled_ms))
+            self._remember(self._ledger, (device_id, slot), now)
+            return None
+        # Other containers kept changing the bucket; refuse rather than overspend
+        return RATE_LIMITED
+
+    def _device_update(self, device_id: str, slot: int, now: int, seen: Optional[Tuple[int, int]],
+                       tokens: int, refilled_ms: int) -> Dict[str, Any]:
+        values = {
+            ':tokens': tokens,
+            ':refilled': refilled_ms,
+            ':now': now,
+            ':cooldown_before': now - self.cooldown_ms,
+            ':ttl': (now + max(self.cooldown_ms, self.bucket_size * self.token_interval_ms)) // 1000
+            + TTL_SLACK_SECONDS
+        }
+        if seen is None:
+            bucket_condition = 'attribute_not_exists(#refilled)'
+        else:
+            bucket_condition = '#tokens = :seen_tokens AND #refilled = :seen_refilled'
+            values.update({':seen_tokens': seen[0], ':seen_refilled': seen[1]})
+        return {
+            'Key': {'limit_key': f'device#{device_id}'},
+            'UpdateExpression': DEVICE_UPDATE,
+            'ConditionExpression': (f'{bucket_condition} AND '
+                                    '(attribute_not_exists(#last_call) OR #last_call <= :cooldown_before)'),
+            'ExpressionAttributeNames': {
+                '#tokens': 'tokens',
+                '#refilled': 'refilled_ms',
+                '#last_call': f'slot_{slot}_last_call',
+                '#ttl': 'ttl'
+            },
+            'ExpressionAttributeValues': values,
+            'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'
+        }
@@ -0,0 +1,55 @@
+"""
+Tuned boto3 clients
+
+Every PillBuddy handler creates its clients at import time with the same
+configuration, so a connection or retry fix applies to all of them:
+    - Short connect/read timeouts, so a stalled call fails inside the
+      Alexa 8 second response budget instead of hanging the invocation
+    - Standard retry mode (adaptive backoff, retries on throttling)
+    - TCP keep-alive, so warm containers reuse connections between turns
+
+Clients for non-critical side effects are created with max_attempts=1 and
+retried by resilience.RetryPolicy, which adds jitter and a circuit breaker.
+"""
+
+from typing import Any
+
+CONNECT_TIMEOUT_SECONDS = 1
+READ_TIMEOUT_SECONDS = 3
+MAX_ATTEMPTS = 3
+MAX_POOL_CONNECTIONS = 16
+
+
+def client_config(max_attempts: int = MAX_ATTEMPTS) -> Any:
+    """
+    Build the shared botocore client configuration
+
+    Args:
+        max_attempts: botocore attempts per call, including the first
+    """
+    import boto3
+    return boto3.session.Config(
+        connect_timeout=CONNECT_TIMEOUT_SECONDS,
+        read_timeout=READ_TIMEOUT_SECONDS,
+        retries={'mode': 'standard', 'max_attempts': max_attempts},
+        tcp_keepalive=True,
+        max_pool_connections=MAX_POOL_CONNECTIONS
+    )
+
+
+def make_client(service_name: str, max_attempts: int = MAX_ATTEMPTS) -> Any:
+    """
+    Create a boto3 low-level client with the shared configuration
+
+    boto3 is looked up at call time, so tests can swap it in sys.modules
+    before importing a handler.
+
+    Args:
+        service_name: AWS service name (e.g. 'dynamodb', 'iot-data')
+        max_attempts: botocore attempts per call (1 when the caller retries)
+
+    Returns:
+        boto3 client
+    """
+    import boto3
+    return boto3.client(service_name, config=client_config(max_attempts))
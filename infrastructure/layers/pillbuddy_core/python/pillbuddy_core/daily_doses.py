@@ -0,0 +1,177 @@
+"""
+Daily dose aggregates
+
+One item per device per local day in the DailyDoses table, kept up to date
+by the IoT Event Processor on every bottle removal:
+
+    {
+        'device_id': 'esp32_001',
+        'day': '2026-10-18',
+        'slot_1_doses': 2,
+        'slot_1_first_removal': 1792310400000,
+        'slot_1_last_removal': 1792353600000,
+        'slot_1_name': 'Lipitor',
+        'ttl': 1826928000
+    }
+
+"Did I take my pill today" is then a single GetItem on (device_id, today)
+instead of a range query and a count over the Events table.
+
+Slot counters are flat attributes rather than a nested map so one
+UpdateItem creates the item and any slot's counters (SET on a nested path
+fails while the parent map is missing). The update is conditioned on the
+removal being newer than the slot's last recorded one, so an event
+redelivered by IoT Core is not counted twice. A removal that turns out to
+be a wobble (see debounce.py) is taken back out with undo_dose(), along
+with the slot's removal times when it was the day's only dose.
+
+Days are local to DOSE_DAY_UTC_OFFSET_MINUTES (default 0, UTC); both
+handlers must use the same offset.
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from .timeutil import DAY_MS, MINUTE_MS
+
+DAILY_DOSES_TTL_DAYS = 400
+
+RECORD_DOSE_UPDATE = ('ADD #doses :one '
+                      'SET #first = if_not_exists(#first, :timestamp), #last = :timestamp, '
+                      '#name = :name, #ttl = if_not_exists(#ttl, :ttl)')
+RECORD_DOSE_CONDITION = 'attribute_not_exists(#last) OR #last < :timestamp'
+UNDO_DOSE_UPDATE = 'ADD #doses :minus_one'
+UNDO_DOSE_CONDITION = '#last = :timestamp AND #doses > :one'
+UNDO_ONLY_DOSE_UPDATE = 'ADD #doses :minus_one REMOVE #first, #last'
+UNDO_ONLY_DOSE_CONDITION = '#last = :timestamp AND #doses = :one'
+
+
+def utc_offset_from_env() -> int:
+    """Local day offset from DOSE_DAY_UTC_OFFSET_MINUTES"""
+    return int(os.environ.get('DOSE_DAY_UTC_OFFSET_MINUTES', '0'))
+
+
+def day_key(timestamp: int, utc_offset_minutes: int = 0) -> str:
+    """
+    Local calendar day of a millisecond timestamp
+
+    Returns:
+        'YYYY-MM-DD'
+    """
+    local = datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc) + timedelta(minutes=utc_offset_minutes)
+    return local.strftime('%Y-%m-%d')
+
+
+def slot_attribute_names(slot: int) -> Dict[str, str]:
+    """ExpressionAttributeNames for one slot's counters"""
+    return {
+        '#doses': f'slot_{slot}_doses',
+        '#first': f'slot_{slot}_first_removal',
+        '#last': f'slot_{slot}_last_removal',
+        '#name': f'slot_{slot}_name',
+        '#ttl': 'ttl'
+    }
+
+
+def record_dose(table: Any, device_id: str, slot: int, timestamp: int,
+                prescription_name: Optional[str] = None, utc_offset_minutes: int = 0) -> bool:
+    """
+    Count a bottle removal in the device's daily aggregate
+
+    Args:
+        table: DailyDoses table (FastTable)
+        device_id: Device identifier
+        slot: Slot number (1-3)
+        timestamp: Removal time in milliseconds
+        prescription_name: Name to report the dose under
+        utc_offset_minutes: Local day offset
+
+    Returns:
+        True if counted, False if the removal was already recorded
+
+    Raises:
+        ClientError: For failures other than the duplicate check
+    """
+    offset_ms = utc_offset_minutes * MINUTE_MS
+    day_end_ms = (timestamp + offset_ms) // DAY_MS * DAY_MS + DAY_MS - offset_ms
+    try:
+        table.update_item(
+            Key={'device_id': device_id, 'day': day_key(timestamp, utc_offset_minutes)},
+            UpdateExpression=RECORD_DOSE_UPDATE,
+            ConditionExpression=RECORD_DOSE_CONDITION,
+            ExpressionAttributeNames=slot_attribute_names(slot),
+            ExpressionAttributeValues={
+                ':one': 1,
+                ':timestamp': timestamp,
+                ':name': prescription_name,
+                ':ttl': day_end_ms // 1000 + DAILY_DOSES_TTL_DAYS * 24 * 60 * 60
+            }
+        )
+    except Exception as e:
+        if getattr(e, 'response', {}).get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+            return False
+        raise
+    return True
+
+
+def undo_dose(table: Any, device_id: str, slot: int, timestamp: int, utc_offset_minutes: int = 0) -> bool:
+    """
+    Take a removal back out of the device's daily aggregate
+
+    Only the slot's last recorded removal can be undone. If it was the
+    slot's only dose of the day, slot_N_first_removal and
+    slot_N_last_removal go with it, so the day shows no dose time for the
+    slot. Otherwise they stay: last_removal still recognises a redelivery of
+    the removal as already recorded, and the earlier times are not known.
+
+    Args:
+        table: DailyDoses table (FastTable)
+        device_id: Device identifier
+        slot: Slot number (1-3)
+        timestamp: Time of the removal to undo, in milliseconds
+        utc_offset_minutes: Local day offset
+
+    Returns:
+        True if undone, False if the removal is not the slot's last recorded one
+
+    Raises:
+        ClientError: For failures other than the condition check
+    """
+    names = slot_attribute_names(slot)
+    for update, condition in ((UNDO_ONLY_DOSE_UPDATE, UNDO_ONLY_DOSE_CONDITION),
+                              (UNDO_DOSE_UPDATE, UNDO_DOSE_CONDITION)):
+        try:
+            table.update_item(
+                Key={'device_id': device_id, 'day': day_key(timestamp, utc_offset_minutes)},
+                UpdateExpression=update,
+                ConditionExpression=condition,
+                ExpressionAttributeNames={name: names[name] for name in ('#doses', '#first', '#last')
+                                          if name in update + condition},
+                ExpressionAttributeValues={':minus_one': -1, ':timestamp': timestamp, ':one': 1}
+            )
+            return True
+        except Exception as e:
+            if getattr(e, 'response', {}).get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                raise
+    return False
+
+
+def dosed_slots(item: Optional[Dict[str, Any]]) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    Slots with at least one dose in a daily aggregate item
+
+    Returns:
+        (slot, {'doses', 'first_removal', 'last_removal', 'name'}) sorted by slot
+    """
+    slots = []
+    for name, value in (item or {}).items():
+        if name.startswith('slot_') and name.endswith('_doses') and value:
+            slot = int(name[len('slot_'):-len('_doses')])
+            slots.append((slot, {
+                'doses': value,
+                'first_removal': item.get(f'slot_{slot}_first_removal'),
+                'last_removal': item.get(f'slot_{slot}_last_removal'),
+                'name': item.get(f'slot_{slot}_name')
+            }))
+    return sorted(slots)
@@ -0,0 +1,271 @@
+"""
+PillBuddy DynamoDB Fast Path
+
+Thin data-access layer on the low-level DynamoDB client. It replaces
+boto3.resource('dynamodb').Table, which builds resource objects at import
+time and runs every request and response through the generic
+TypeSerializer/TypeDeserializer transformation handlers.
+
+Call sites keep the resource-style interface (Key=, Item=,
+ExpressionAttributeValues=, responses with plain Python 'Item'/'Items'),
+so switching a handler over is a one-line change at table setup.
+
+What makes it cheaper:
+    - Keys are encoded from a precompiled key schema template, with no
+      per-call type inference
+    - Values use a minimal codec covering only the types PillBuddy stores:
+      str, int, bool, None, Decimal/float, dict and list
+    - Expression strings are module constants passed through verbatim
+    - No resource model is loaded, which shortens cold-start import time
+
+Numbers decode to int when integral and Decimal otherwise, so items can be
+passed to json.dumps() without Decimal conversion in the common case.
+"""
+
+from decimal import Decimal
+from typing import Any, Dict, Optional
+
+# Key schemas for PillBuddy tables: attribute name -> DynamoDB key type
+DEVICES_KEY_SCHEMA = {'device_id': 'S'}
+PRESCRIPTIONS_KEY_SCHEMA = {'device_id': 'S', 'slot': 'N'}
+EVENTS_KEY_SCHEMA = {'device_id': 'S', 'timestamp': 'N'}
+USER_DEVICES_KEY_SCHEMA = {'user_id': 'S'}
+DAILY_DOSES_KEY_SCHEMA = {'device_id': 'S', 'day': 'S'}
+CALL_LIMITS_KEY_SCHEMA = {'limit_key': 'S'}
+
+# Request parameters holding attribute maps that need encoding
+_ENCODED_MAP_PARAMS = ('Item', 'ExpressionAttributeValues', 'ExclusiveStartKey')
+
+
+def encode_value(value: Any) -> Dict[str, Any]:
+    """
+    Encode a Python value as a DynamoDB AttributeValue
+
+    Args:
+        value: str, int, bool, None, Decimal, float, dict or list
+
+    Returns:
+        AttributeValue dictionary (e.g. {'S': 'esp32_001'})
+
+    Raises:
+        TypeError: For types PillBuddy does not store
+    """
+    value_type = type(value)
+    if value_type is str:
+        return {'S': value}
+    if value_type is bool:
+        # bool must be checked before int - bool is a subclass of int
+        return {'BOOL': value}
+    if value_type is int:
+        return {'N': str(value)}
+    if value is None:
+        return {'NULL': True}
+    if value_type is dict:
+        return {'M': {k: encode_value(v) for k, v in value.items()}}
+    if value_type is list or value_type is tuple:
+        return {'L': [encode_value(v) for v in value]}
+    if isinstance(value, Decimal):
+        return {'N': str(value)}
+    if value_type is float:
+        return {'N': repr(value)}
+    raise TypeError(f"Unsupported DynamoDB attribute type: {value_type.__name__}")
+
+
+def decode_value(attribute: Dict[str, Any]) -> Any:
+    """
+    Decode a DynamoDB AttributeValue into a Python value
+
+    Args:
+        attribute: AttributeValue dictionary
+
+    Returns:
+        Python value (numbers as int when integral, otherwise Decimal)
+
+    Raises:
+        TypeError: For attribute types PillBuddy does not store
+    """
+    (attribute_type, raw), = attribute.items()
+    if attribute_type == 'S':
+        return raw
+    if attribute_type == 'N':
+        if '.' in raw or 'e' in raw or 'E' in raw:
+            return Decimal(raw)
+        return int(raw)
+    if attribute_type == 'BOOL':
+        return raw
+    if attribute_type == 'NULL':
+        return None
+    if attribute_type == 'M':
+        return {k: decode_value(v) for k, v in raw.items()}
+    if attribute_type == 'L':
+        return [decode_value(v) for v in raw]
+    raise TypeError(f"Unsupported DynamoDB attribute type: {attribute_type}")
+
+
+def encode_item(item: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Encode a plain dictionary as a DynamoDB attribute map"""
+    return {k: encode_value(v) for k, v in item.items()}
+
+
+def decode_item(item: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Decode a DynamoDB attribute map into a plain dictionary"""
+    return {k: decode_value(v) for k, v in item.items()}
+
+
+class KeyTemplate:
+    """
+    Precompiled key encoder for a table's key schema
+
+    Args:
+        key_schema: Attribute name -> key type ('S' or 'N')
+    """
+
+    def __init__(self, key_schema: Dict[str, str]) -> None:
+        self.fields = tuple(key_schema.items())
+
+    def encode(self, key: Dict[str, Any]) -> Dict[str, Dict[str, str]]:
+        """
+        Encode a key without type inference
+
+        Args:
+            key: Plain key dictionary (e.g. {'device_id': 'esp32_001', 'slot': 1})
+
+        Returns:
+            DynamoDB key attribute map
+        """
+        return {
+            name: {key_type: key[name] if key_type == 'S' else str(key[name])}
+            for name, key_type in self.fields
+        }
+
+
+class FastTable:
+    """
+    Resource-compatible table facade over the low-level client
+
+    Supports get_item, put_item, update_item, delete_item, query and scan with
+    the same keyword arguments and response shape as boto3's Table resource
+    (string expressions only).
+
+    Args:
+        client: boto3 low-level DynamoDB client
+        table_name: DynamoDB table name
+        key_schema: Attribute name -> key type ('S' or 'N')
+    """
+
+    def __init__(self, client: Any, table_name: str, key_schema: Dict[str, str]) -> None:
+        self.client = client
+        self.table_name = table_name
+        self.key_template = KeyTemplate(key_schema)
+
+    def get_item(self, **kwargs) -> Dict[str, Any]:
+        return self._call(self.client.get_item, kwargs)
+
+    def put_item(self, **kwargs) -> Dict[str, Any]:
+        return self._call(self.client.put_item, kwargs)
+
+    def update_item(self, **kwargs) -> Dict[str, Any]:
+        return self._call(self.client.update_item, kwargs)
+
+    def delete_item(self, **kwargs) -> Dict[str, Any]:
+        return self._call(self.client.delete_item, kwargs)
+
+    def query(self, **kwargs) -> Dict[str, Any]:
+        return self._call(self.client.query, kwargs)
+
+    def scan(self, **kwargs) -> Dict[str, Any]:
+        return self._call(self.client.scan, kwargs)
+
+    def _call(self, operation: Any, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        params = {'TableName': self.table_name}
+        for name, value in kwargs.items():
+            if name == 'Key':
+                params[name] = self.key_template.encode(value)
+            elif name in _ENCODED_MAP_PARAMS:
+                params[name] = encode_item(value)
+            else:
+                params[name] = value
+
+        return decode_response(operation(**params))
+
+
+def decode_response(response: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Decode the attribute maps in a single-table response in place
+
+    Args:
+        response: Low-level client response
+
+    Returns:
+        The same response with plain Python 'Item', 'Items', 'Attributes'
+        and 'LastEvaluatedKey'
+    """
+    if 'Item' in response:
+        response['Item'] = decode_item(response['Item'])
+    if 'Items' in response:
+        response['Items'] = [decode_item(item) for item in response['Items']]
+    if 'Attributes' in response:
+        response['Attributes'] = decode_item(response['Attributes'])
+    if 'LastEvaluatedKey' in response:
+        response['LastEvaluatedKey'] = decode_item(response['LastEvaluatedKey'])
+    return response
+
+
+class FastDynamoDB:
+    """
+    Entry point replacing boto3.resource('dynamodb')
+
+    Args:
+        client: boto3 low-level DynamoDB client
+    """
+
+    def __init__(self, client: Any) -> None:
+        self.client = client
+        self.key_templates: Dict[str, KeyTemplate] = {}
+
+    def table(self, table_name: str, key_schema: Dict[str, str]) -> FastTable:
+        """
+        Create a table facade and register its key template for batch calls
+
+        Args:
+            table_name: DynamoDB table name
+            key_schema: Attribute name -> key type ('S' or 'N')
+        """
+        table = FastTable(self.client, table_name, key_schema)
+        self.key_templates[table_name] = table.key_template
+        return table
+
+    def batch_get_item(self, RequestItems: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        BatchGetItem with plain keys in and plain items out
+
+        Args:
+            RequestItems: Table name -> {'Keys': [plain keys], ...}
+
+        Returns:
+            Response with decoded 'Responses' and plain 'UnprocessedKeys'
+        """
+        request_items = {}
+        for table_name, table_request in RequestItems.items():
+            encode_key = self._key_encoder(table_name)
+            encoded_request = dict(table_request)
+            encoded_request['Keys'] = [encode_key(key) for key in table_request['Keys']]
+            request_items[table_name] = encoded_request
+
+        response = self.client.batch_get_item(RequestItems=request_items)
+
+        response['Responses'] = {
+            table_name: [decode_item(item) for item in items]
+            for table_name, items in response.get('Responses', {}).items()
+        }
+        unprocessed = {}
+        for table_name, table_request in (response.get('UnprocessedKeys') or {}).items():
+            decoded_request = dict(table_request)
+            decoded_request['Keys'] = [decode_item(key) for key in table_request['Keys']]
+            unprocessed[table_name] = decoded_request
+        response['UnprocessedKeys'] = unprocessed
+        return response
+
+    def _key_encoder(self, table_name: str) -> Any:
+        key_template: Optional[KeyTemplate] = self.key_templates.get(table_name)
+        return key_template.encode if key_template else encode_item
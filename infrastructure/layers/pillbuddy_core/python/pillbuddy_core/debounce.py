@@ -0,0 +1,109 @@
+"""
+Server-side debounce for flapping slot sensors
+
+A bottle wobbling in its holder reports quick removed/returned pairs. Every
+transition that arrives within DEBOUNCE_WINDOW_MS of the slot's last
+accepted one is a bounce:
+
+    - a removal is recorded but not counted: the slot shows the bottle out
+      and the timeout reminder can fire, but there is no pill decrement, no
+      dose and no notification
+    - a return that repeats the accepted state is a no-op
+    - a return that changes the state is always applied, so a bottle put
+      back never stays marked as out (which would trigger a timeout reminder)
+
+The removal that starts a wobble is accepted before anyone can know it is
+one, so a return within the window of it (is_wobble) refunds its pill and
+dose. A wobble therefore costs nothing, and the re-lift in between is not a
+second dose.
+
+Written transitions, bounces included, are remembered per container in
+SlotDebouncer so most bounces are known before the device state update.
+Events for one device can land on different containers (or a cold one), so
+the update is also conditioned on the stored slots.N.last_state_change
+(debounce_condition); a failed condition marks the event as a bounce, and
+it is written again without the condition.
+"""
+
+import os
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+DEFAULT_DEBOUNCE_WINDOW_MS = 2000
+DEFAULT_MAX_SLOTS = 16384
+
+
+def debounce_window_from_env() -> int:
+    """Debounce window from DEBOUNCE_WINDOW_MS (0 disables debouncing)"""
+    return int(os.environ.get('DEBOUNCE_WINDOW_MS', str(DEFAULT_DEBOUNCE_WINDOW_MS)))
+
+
+def is_bounce(accepted_in_holder: bool, accepted_at: int, in_holder: bool, timestamp: int, window_ms: int) -> bool:
+    """Whether a transition is a bounce of the slot's last accepted one"""
+    if timestamp - accepted_at >= window_ms:
+        return False
+    return not in_holder or accepted_in_holder
+
+
+def debounce_condition(in_holder: bool, suffix: str = '') -> str:
+    """
+    ConditionExpression for the device state update that rejects bounces
+
+    Uses #slot for the slot number and :in_holder / :debounce_before
+    (timestamp - window) as values. Updates covering several slots give
+    each one its own placeholders with suffix (#slot2, :in_holder2, ...).
+    """
+    condition = (f'attribute_not_exists(slots.#slot{suffix}.last_state_change) '
+                 f'OR slots.#slot{suffix}.last_state_change <= :debounce_before{suffix}')
+    if in_holder:
+        condition += f' OR slots.#slot{suffix}.in_holder <> :in_holder{suffix}'
+    return condition
+
+
+class SlotDebouncer:
+    """
+    Last accepted transition per (device, slot), kept in container memory
+
+    Args:
+        window_ms: Debounce window; 0 disables debouncing
+        max_slots: Slots remembered before the least recently used are dropped
+    """
+
+    def __init__(self, window_ms: int = DEFAULT_DEBOUNCE_WINDOW_MS, max_slots: int = DEFAULT_MAX_SLOTS) -> None:
+        self.window_ms = window_ms
+        self.max_slots = max_slots
+        self.debounced = 0
+        # (device_id, slot) -> (in_holder, timestamp)
+        self._accepted: 'OrderedDict[Tuple[str, int], Tuple[bool, int]]' = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_ms > 0
+
+    def is_bounce(self, device_id: str, slot: int, in_holder: bool, timestamp: int) -> bool:
+        """Whether the event bounces off a transition this container accepted"""
+        accepted = self._accepted.get((device_id, slot))
+        if not self.enabled or accepted is None or timestamp < accepted[1]:
+            # Older events are not bounces; the state update rejects them as stale
+            return False
+        return is_bounce(accepted[0], accepted[1], in_holder, timestamp, self.window_ms)
+
+    def is_wobble(self, removed_at: Optional[int], returned_at: int) -> bool:
+        """Whether a return comes within the window of the removal it follows"""
+        return self.enabled and removed_at is not None and 0 <= returned_at - removed_at < self.window_ms
+
+    def accept(self, device_id: str, slot: int, in_holder: bool, timestamp: int) -> None:
+        """Remember an applied transition"""
+        if not self.enabled:
+            return
+        key = (device_id, slot)
+        self._accepted[key] = (in_holder, timestamp)
+        self._accepted.move_to_end(key)
+        while len(self._accepted) > self.max_slots:
+            self._accepted.popitem(last=False)
+
+    def condition_values(self, in_holder: bool, timestamp: int, suffix: str = '') -> Optional[Dict[str, object]]:
+        """ExpressionAttributeValues for debounce_condition(), or None when disabled"""
+        if not self.enabled:
+            return None
+        return {f':in_holder{suffix}': in_holder, f':debounce_before{suffix}': timestamp - self.window_ms}
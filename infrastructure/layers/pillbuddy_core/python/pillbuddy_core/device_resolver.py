@@ -0,0 +1,159 @@
+"""
+PillBuddy User-to-Device Resolution
+
+Maps an Alexa userId to the PillBuddy device(s) linked to that account.
+Lookups go through a warm-container LRU cache so repeated voice requests
+from the same household cost no DynamoDB read.
+
+Cache behaviour:
+    - Positive entries (user has linked devices) live for POSITIVE_TTL_SECONDS
+    - Negative entries (no mapping) live for NEGATIVE_TTL_SECONDS, so unlinked
+      users don't pay for a lookup on every turn either
+    - link_device() writes the mapping and invalidates the cached entry, so
+      the linking container sees the new device immediately. Other warm
+      containers pick it up once their entry expires.
+
+Mapping table item format:
+    {
+        'user_id': str,           # Alexa userId (partition key)
+        'device_ids': [str, ...], # Linked devices, primary first
+        'linked_at': int          # Unix timestamp in milliseconds
+    }
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+from .instrumentation import timed
+
+# Cache defaults
+DEFAULT_MAX_ENTRIES = 1024
+POSITIVE_TTL_SECONDS = 300
+NEGATIVE_TTL_SECONDS = 60
+
+
+class DeviceResolver:
+    """
+    Resolves Alexa userIds to device_ids with an LRU + TTL cache
+
+    Args:
+        table: DynamoDB Table for the user-device mapping, or None to disable lookups
+        max_entries: Maximum number of cached users
+        positive_ttl: Seconds to cache a found mapping
+        negative_ttl: Seconds to cache a missing mapping
+    """
+
+    def __init__(self,
+                 table: Any,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 positive_ttl: float = POSITIVE_TTL_SECONDS,
+                 negative_ttl: float = NEGATIVE_TTL_SECONDS) -> None:
+        self.table = table
+        self.max_entries = max_entries
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        # user_id -> (expires_at, device_ids or None)
+        self._cache: 'OrderedDict[str, Tuple[float, Optional[Tuple[str, ...]]]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def resolve_device_ids(self, user_id: str) -> List[str]:
+        """
+        Get all devices linked to a user
+
+        Args:
+            user_id: Alexa userId
+
+        Returns:
+            List of linked device_ids (primary first), empty if none are linked
+        """
+        if self.table is None or not user_id:
+            return []
+
+        now = time.monotonic()
+        entry = self._cache.get(user_id)
+        if entry is not None:
+            expires_at, device_ids = entry
+            if expires_at > now:
+                self._cache.move_to_end(user_id)
+                self.hits += 1
+                return list(device_ids or ())
+            del self._cache[user_id]
+
+        self.misses += 1
+        device_ids = self._load(user_id)
+        self._store(user_id, device_ids, now)
+        return list(device_ids or ())
+
+    def resolve_device_id(self, user_id: str, default: str) -> str:
+        """
+        Get the primary device for a user
+
+        Args:
+            user_id: Alexa userId
+            default: Value returned when no device is linked
+
+        Returns:
+            Primary linked device_id, or default
+        """
+        device_ids = self.resolve_device_ids(user_id)
+        return device_ids[0] if device_ids else default
+
+    def link_device(self, user_id: str, device_id: str) -> List[str]:
+        """
+        Link a device to a user and invalidate the cached mapping
+
+        The device is appended to the user's list if not already present.
+
+        Args:
+            user_id: Alexa userId
+            device_id: Device identifier to link
+
+        Returns:
+            Updated list of linked device_ids
+        """
+        device_ids = self.resolve_device_ids(user_id)
+        if device_id not in device_ids:
+            device_ids.append(device_id)
+
+        with timed('dynamodb'):
+            self.table.put_item(Item={
+                'user_id': user_id,
+                'device_ids': device_ids,
+                'linked_at': int(time.time() * 1000)
+            })
+
+        self.invalidate(user_id)
+        return device_ids
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        """
+        Drop a cached mapping, or the whole cache when user_id is None
+        """
+        if user_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(user_id, None)
+
+    def _load(self, user_id: str) -> Optional[Tuple[str, ...]]:
+        try:
+            with timed('dynamodb'):
+                response = self.table.get_item(
+                    Key={'user_id': user_id},
+                    ProjectionExpression='device_ids'
+                )
+        except Exception as e:
+            # Don't cache failures - the next request should retry the lookup
+            print(f"Error resolving devices for user: {str(e)}")
+            raise
+
+        device_ids = response.get('Item', {}).get('device_ids')
+        return tuple(device_ids) if device_ids else None
+
+    def _store(self, user_id: str, device_ids: Optional[Tuple[str, ...]], now: float) -> None:
+        ttl = self.positive_ttl if device_ids else self.negative_ttl
+        self._cache[user_id] = (now + ttl, device_ids)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
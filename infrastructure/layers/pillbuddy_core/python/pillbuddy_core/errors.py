@@ -0,0 +1,37 @@
+"""
+Error logging and HTTP-style error responses
+
+Device-facing handlers return {'statusCode', 'body'} dictionaries; these
+helpers keep the shape and log format identical across functions.
+"""
+
+import json
+from typing import Any, Dict
+
+
+def log_error(action: str, error: Exception) -> None:
+    """
+    Log a failed operation in the shared format
+
+    Args:
+        action: What was being done (e.g. 'updating device state')
+        error: The exception raised
+    """
+    print(f"Error {action}: {str(error)}")
+
+
+def error_response(status_code: int, message: str) -> Dict[str, Any]:
+    """
+    Build an error response
+
+    Args:
+        status_code: HTTP-style status code
+        message: Error message for the body
+
+    Returns:
+        {'statusCode': status_code, 'body': '{"error": message}'}
+    """
+    return {
+        'statusCode': status_code,
+        'body': json.dumps({'error': message})
+    }
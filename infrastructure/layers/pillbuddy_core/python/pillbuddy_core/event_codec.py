@@ -0,0 +1,124 @@
+"""
+Compact binary encoding for device events
+
+Instead of JSON on pillbuddy/events/{device_id}, a device on a constrained
+link can publish a fixed 15-byte little-endian struct to
+pillbuddy/events/{device_id}/bin:
+
+    offset  size  field
+    0       1     kind: 1 slot_state_changed, 2 slot_snapshot,
+                  3 slot_states_changed
+    1       1     slot (1-3), or changed_mask for slot_states_changed
+    2       1     in_holder (0/1), or in_holder_mask for mask events
+    3       4     sequence (uint32, 0 = none)
+    7       8     ts_ms (uint64 epoch milliseconds, 0 = none)
+
+A state change is 15 bytes against about 60 for the JSON payload.
+
+IoT SQL cannot look inside a binary payload, so the binary rule
+(iot_rule_sql.binary_rule_sql) only adds device_id and received_ms and
+forwards the payload base64-encoded. decode_forwarded_event() turns that
+into exactly the event the JSON rule projects, and raises ValueError for
+anything the JSON rule's WHERE clause would have dropped.
+"""
+
+import base64
+import struct
+from typing import Any, Dict
+
+EVENT_STRUCT = struct.Struct('<BBBIQ')
+
+KINDS = {1: 'slot_state_changed', 2: 'slot_snapshot', 3: 'slot_states_changed'}
+KIND_CODES = {event_type: kind for kind, event_type in KINDS.items()}
+
+SLOT_COUNT = 3
+MAX_MASK = (1 << SLOT_COUNT) - 1
+
+# Same threshold as the JSON rule (iot_rule_sql.MIN_DEVICE_TS_MS): anything
+# lower is an uptime counter, not epoch milliseconds
+MIN_DEVICE_TS_MS = 1600000000000
+
+
+def encode_event(payload: Dict[str, Any]) -> bytes:
+    """
+    Binary form of a device payload, as the firmware builds it
+
+    Args:
+        payload: Raw device payload (event_type plus slot/in_holder or masks,
+                 optional sequence and ts_ms)
+    """
+    event_type = payload['event_type']
+    if event_type == 'slot_state_changed':
+        first, second = payload['slot'], 1 if payload['in_holder'] else 0
+    else:
+        first, second = payload.get('changed_mask', 0), payload['in_holder_mask']
+    return EVENT_STRUCT.pack(KIND_CODES[event_type], first, second,
+                             payload.get('sequence', 0), payload.get('ts_ms', 0))
+
+
+def decode_event(data: bytes, device_id: str, received_ms: int) -> Dict[str, Any]:
+    """
+    Decode a binary payload into the event the JSON rule would project
+
+    Args:
+        data: Binary payload
+        device_id: Device identifier (from the topic)
+        received_ms: Broker receive time in milliseconds
+
+    Returns:
+        Event for the IoT Event Processor
+
+    Raises:
+        ValueError: If the payload is malformed or out of range
+    """
+    if len(data) != EVENT_STRUCT.size:
+        raise ValueError(f"Binary event must be {EVENT_STRUCT.size} bytes, got {len(data)}")
+    kind, first, second, sequence, ts_ms = EVENT_STRUCT.unpack(data)
+    event_type = KINDS.get(kind)
+    if event_type is None:
+        raise ValueError(f"Unknown binary event kind: {kind}")
+
+    event: Dict[str, Any] = {'device_id': device_id, 'event_type': event_type}
+    if event_type == 'slot_state_changed':
+        if not 1 <= first <= SLOT_COUNT or second > 1:
+            raise ValueError(f"Invalid slot state: slot {first}, in_holder {second}")
+        in_holder = second == 1
+        event.update({
+            'slot': first,
+            'in_holder': in_holder,
+            'state': 'in_holder' if in_holder else 'not_in_holder',
+            'sensor_level': second
+        })
+    else:
+        if second > MAX_MASK or (event_type == 'slot_states_changed' and not 1 <= first <= MAX_MASK):
+            raise ValueError(f"Invalid slot masks: changed {first}, in_holder {second}")
+        if event_type == 'slot_states_changed':
+            event['changed_mask'] = first
+        event['in_holder_mask'] = second
+
+    event['sequence'] = sequence
+    event['ts_ms'] = ts_ms if ts_ms > MIN_DEVICE_TS_MS else received_ms
+    event['received_ms'] = received_ms
+    return event
+
+
+def is_forwarded_binary(event: Dict[str, Any]) -> bool:
+    """Whether an event is a binary payload forwarded by the binary rule"""
+    return 'payload_b64' in event
+
+
+def decode_forwarded_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Decode an event forwarded by the binary rule
+
+    Args:
+        event: {'device_id', 'payload_b64', 'received_ms'}
+
+    Raises:
+        ValueError: If the payload is malformed or out of range
+    """
+    try:
+        data = base64.b64decode(event['payload_b64'], validate=True)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Binary event is not base64: {e}")
+    return decode_event(data, event['device_id'], event['received_ms'])
@@ -0,0 +1,260 @@
+"""
+PillBuddy Latency Instrumentation
+
+Keeps per-intent latency histograms in container memory and periodically
+flushes p50/p95/p99 values as CloudWatch Embedded Metric Format (EMF) log
+lines. EMF is written to stdout, so flushing adds no network call to the
+voice turn.
+
+Usage:
+    with track_request('SetupSlotIntent'):
+        with timed('dynamodb'):
+            table.put_item(...)
+
+Each histogram is keyed by (label, stage). The label is the intent or
+request type being dispatched; the stage is 'total' for end-to-end time
+or the name passed to timed() ('dynamodb', 'iot', 'render').
+
+Environment Variables:
+    METRICS_NAMESPACE: CloudWatch namespace for flushed metrics (default PillBuddy)
+    METRICS_FLUSH_INTERVAL_SECONDS: Minimum seconds between flushes (default 60)
+"""
+
+import json
+import math
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'PillBuddy')
+METRICS_FLUSH_INTERVAL_SECONDS = float(os.environ.get('METRICS_FLUSH_INTERVAL_SECONDS', '60'))
+
+# Percentiles reported on every flush
+PERCENTILES = (50, 95, 99)
+
+# Log-scale bucket growth factor: each bucket is 5% wider than the previous,
+# which bounds the percentile error to ~2.5% regardless of magnitude
+BUCKET_GROWTH = 1.05
+_LOG_GROWTH = math.log(BUCKET_GROWTH)
+
+# Values below this are recorded in the zero bucket
+MIN_TRACKED_MS = 0.01
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram with bounded memory
+
+    Values are stored as counts per bucket, so memory stays constant no
+    matter how many invocations the container serves.
+    """
+
+    def __init__(self) -> None:
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def record(self, value_ms: float) -> None:
+        """
+        Record a single latency sample
+
+        Args:
+            value_ms: Elapsed time in milliseconds
+        """
+        index = self._bucket_index(value_ms)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value_ms
+        self.min = value_ms if self.min is None else min(self.min, value_ms)
+        self.max = value_ms if self.max is None else max(self.max, value_ms)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """
+        Estimate a percentile from the bucket counts
+
+        Args:
+            pct: Percentile in the range 0-100
+
+        Returns:
+            Estimated value in milliseconds, or None if no samples were recorded
+        """
+        if self.count == 0:
+            return None
+
+        rank = max(1, math.ceil(self.count * pct / 100.0))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                # Clamp to observed extremes so small samples stay exact at the edges
+                return min(max(self._bucket_value(index), self.min), self.max)
+
+        return self.max
+
+    @staticmethod
+    def _bucket_index(value_ms: float) -> int:
+        if value_ms < MIN_TRACKED_MS:
+            return -1
+        return int(math.log(value_ms / MIN_TRACKED_MS) / _LOG_GROWTH)
+
+    @staticmethod
+    def _bucket_value(index: int) -> float:
+        if index < 0:
+            return 0.0
+        # Geometric midpoint of the bucket
+        return MIN_TRACKED_MS * (BUCKET_GROWTH ** (index + 0.5))
+
+
+# In-container histogram registry, keyed by (label, stage)
+_histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+
+# Label of the request currently being dispatched
+_current_label = 'unknown'
+
+_last_flush = time.monotonic()
+
+# Extra EMF record builders called on every flush: (service, timestamp) -> records
+_metric_sources: List[Callable[[str, int], List[Dict[str, Any]]]] = []
+
+
+def record(label: str, stage: str, value_ms: float) -> None:
+    """
+    Record a latency sample for a label and stage
+
+    Args:
+        label: Intent name or request type
+        stage: 'total' or a dependency name such as 'dynamodb'
+        value_ms: Elapsed time in milliseconds
+    """
+    key = (label, stage)
+    histogram = _histograms.get(key)
+    if histogram is None:
+        histogram = _histograms[key] = LatencyHistogram()
+    histogram.record(value_ms)
+
+
+def get_histogram(label: str, stage: str) -> Optional[LatencyHistogram]:
+    """
+    Get the histogram for a label and stage, if any samples were recorded
+    """
+    return _histograms.get((label, stage))
+
+
+@contextmanager
+def track_request(label: str) -> Iterator[None]:
+    """
+    Time a whole request and attribute nested timed() blocks to it
+
+    Args:
+        label: Intent name or request type
+    """
+    global _current_label
+    previous_label = _current_label
+    _current_label = label
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(label, 'total', (time.perf_counter() - start) * 1000)
+        _current_label = previous_label
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """
+    Time a block and record it against the current request label
+
+    Args:
+        stage: Dependency or phase name ('dynamodb', 'iot', 'render')
+    """
+    label = _current_label
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(label, stage, (time.perf_counter() - start) * 1000)
+
+
+def build_metric_records(service: str) -> List[Dict]:
+    """
+    Build one EMF record per histogram
+
+    Args:
+        service: Service dimension value (e.g. 'AlexaHandler')
+
+    Returns:
+        List of EMF-formatted dictionaries
+    """
+    timestamp = int(time.time() * 1000)
+    records = []
+
+    for (label, stage), histogram in sorted(_histograms.items()):
+        if histogram.count == 0:
+            continue
+
+        metrics = [{'Name': f'p{pct}', 'Unit': 'Milliseconds'} for pct in PERCENTILES]
+        metrics.append({'Name': 'count', 'Unit': 'Count'})
+
+        record_item = {
+            '_aws': {
+                'Timestamp': timestamp,
+                'CloudWatchMetrics': [{
+                    'Namespace': METRICS_NAMESPACE,
+                    'Dimensions': [['Service', 'Label', 'Stage']],
+                    'Metrics': metrics
+                }]
+            },
+            'Service': service,
+            'Label': label,
+            'Stage': stage,
+            'count': histogram.count
+        }
+        for pct in PERCENTILES:
+            record_item[f'p{pct}'] = round(histogram.percentile(pct), 3)
+
+        records.append(record_item)
+
+    return records
+
+
+def register_metric_source(source: Callable[[str, int], List[Dict[str, Any]]]) -> None:
+    """
+    Emit another component's EMF records on every flush
+
+    Args:
+        source: Called with (service, timestamp_ms); returns EMF records and
+                resets whatever it counts
+    """
+    if source not in _metric_sources:
+        _metric_sources.append(source)
+
+
+def flush_metrics(service: str, force: bool = False) -> int:
+    """
+    Emit percentile metrics and reset histograms if the flush interval elapsed
+
+    Args:
+        service: Service dimension value (e.g. 'AlexaHandler')
+        force: Flush regardless of the interval
+
+    Returns:
+        Number of metric records emitted
+    """
+    global _last_flush
+    now = time.monotonic()
+    if not force and now - _last_flush < METRICS_FLUSH_INTERVAL_SECONDS:
+        return 0
+
+    records = build_metric_records(service)
+    timestamp = int(time.time() * 1000)
+    for source in _metric_sources:
+        records.extend(source(service, timestamp))
+    for record_item in records:
+        print(json.dumps(record_item))
+
+    _histograms.clear()
+    _last_flush = now
+    return len(records)
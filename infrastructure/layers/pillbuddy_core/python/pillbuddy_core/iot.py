@@ -0,0 +1,203 @@
+"""
+Device command publishing
+
+ESP32 devices subscribe to pillbuddy/cmd/{device_id} and expect
+{"action": "turn_on" | "turn_off", "slot": 1-3}.
+
+Several LED changes for one device go out as a single message instead:
+
+    {"action": "set_leds", "on_mask": 1, "off_mask": 6}
+
+Bit N-1 of on_mask turns slot N's LED on, bit N-1 of off_mask turns it off;
+slots in neither mask are left alone. LedCommandBuffer collects an
+invocation's LED changes and turns them into one message per device.
+
+A command may also carry "trace", the round-trip latency stamps of the
+event that caused it (see round_trip.py); devices ignore it.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from .timeutil import now_ms
+
+COMMAND_TOPIC = 'pillbuddy/cmd/{device_id}'
+LED_ACTIONS = ('turn_on', 'turn_off')
+
+DEFAULT_LED_RETRY_MAX_AGE_MS = 5000
+DEFAULT_LED_MAX_DEVICES = 1024
+
+
+def publish_command(iot_client: Any, device_id: str, payload: Dict[str, Any]) -> None:
+    """
+    Publish a command payload to a device
+
+    Raises:
+        ClientError: If the publish fails - callers decide whether it is fatal
+    """
+    iot_client.publish(
+        topic=COMMAND_TOPIC.format(device_id=device_id),
+        qos=1,
+        payload=json.dumps(payload)
+    )
+
+
+def publish_slot_command(iot_client: Any, device_id: str, slot: int, action: str) -> Dict[str, Any]:
+    """
+    Publish a slot LED command to a device
+
+    Args:
+        iot_client: boto3 'iot-data' client
+        device_id: Device identifier
+        slot: Slot number (1-3)
+        action: 'turn_on' or 'turn_off'
+
+    Returns:
+        The published payload
+
+    Raises:
+        ClientError: If the publish fails - callers decide whether it is fatal
+    """
+    payload = {
+        'action': action,
+        'slot': slot
+    }
+
+    publish_command(iot_client, device_id, payload)
+    return payload
+
+
+def led_command_payload(on_mask: int, off_mask: int) -> Dict[str, Any]:
+    """
+    Command payload for a set of LED changes
+
+    A single change keeps the per-slot format, which every firmware version
+    understands; several changes use set_leds.
+    """
+    changed = on_mask | off_mask
+    if changed and not changed & (changed - 1):
+        return {'action': 'turn_on' if on_mask else 'turn_off', 'slot': changed.bit_length()}
+    return {'action': 'set_leds', 'on_mask': on_mask, 'off_mask': off_mask}
+
+
+def led_changes(payload: Dict[str, Any]) -> Dict[int, str]:
+    """Slot -> action of an LED command payload (either format)"""
+    if payload['action'] in LED_ACTIONS:
+        return {payload['slot']: payload['action']}
+    changes = {}
+    for action, mask in (('turn_on', payload['on_mask']), ('turn_off', payload['off_mask'])):
+        for slot in range(1, mask.bit_length() + 1):
+            if mask >> (slot - 1) & 1:
+                changes[slot] = action
+    return changes
+
+
+class LedCommandBuffer:
+    """
+    Pending LED changes per device, merged into one command each
+
+    A later change for the same slot replaces the earlier one, so a slot
+    turned on and then off within an invocation is only sent off. A merged
+    command keeps the first trace added for its device, the change that has
+    waited longest.
+
+    A command that could not be published can be put back with requeue()
+    and goes out with the next drain, under any newer changes for its
+    slots. The next drain is the container's next invocation, by which time
+    another container or the setup flow may have set the LED since, so a
+    requeued change is dropped once it is older than max_age_ms, both when
+    it is put back and when it is drained.
+
+    Args:
+        max_age_ms: Longest a change is kept for retry after first being queued
+        max_devices: Devices with pending changes before requeued commands are dropped
+    """
+
+    def __init__(self, max_age_ms: int = DEFAULT_LED_RETRY_MAX_AGE_MS,
+                 max_devices: int = DEFAULT_LED_MAX_DEVICES) -> None:
+        self.max_age_ms = max_age_ms
+        self.max_devices = max_devices
+        # device_id -> {slot: action}, in the order devices were first added
+        self._pending: Dict[str, Dict[int, str]] = {}
+        self._traces: Dict[str, List[int]] = {}
+        # device_id -> when its first new (not requeued) change was queued
+        self._queued: Dict[str, int] = {}
+        # device_id -> {slot: when first queued} for requeued changes
+        self._retries: Dict[str, Dict[int, int]] = {}
+        self.merged = 0
+        self.expired = 0
+
+    def add(self, device_id: str, slot: int, action: str, trace: Optional[List[int]] = None,
+            queued_ms: Optional[int] = None) -> None:
+        """Queue an LED change ('turn_on' or 'turn_off') for a slot"""
+        if action not in LED_ACTIONS:
+            raise ValueError(f"Unknown LED action: {action}")
+        slots = self._pending.setdefault(device_id, {})
+        if slots:
+            self.merged += 1
+        slots[slot] = action
+        self._retries.get(device_id, {}).pop(slot, None)
+        if trace is not None:
+            self._traces.setdefault(device_id, trace)
+        self._queued.setdefault(device_id, now_ms() if queued_ms is None else queued_ms)
+
+    def requeue(self, device_id: str, payload: Dict[str, Any], queued_ms: int) -> bool:
+        """
+        Put back a drained command that could not be published
+
+        Returns:
+            False if the command was dropped (too old, or the buffer is full)
+        """
+        if now_ms() - queued_ms > self.max_age_ms:
+            return False
+        if device_id not in self._pending and len(self._pending) >= self.max_devices:
+            return False
+        slots = self._pending.setdefault(device_id, {})
+        retries = self._retries.setdefault(device_id, {})
+        for slot, action in led_changes(payload).items():
+            if slot not in slots:
+                slots[slot] = action
+                retries[slot] = queued_ms
+        if 'trace' in payload:
+            self._traces[device_id] = payload['trace']
+        return True
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def drain(self) -> List[Tuple[str, Dict[str, Any], int]]:
+        """
+        (device_id, payload, queued_ms) for every device with pending
+        changes; resets the buffer
+
+        Requeued changes older than max_age_ms are dropped and counted in
+        expired.
+        """
+        now = now_ms()
+        commands = []
+        self.expired = 0
+        for device_id, slots in self._pending.items():
+            retries = self._retries.get(device_id, {})
+            for slot, queued_ms in list(retries.items()):
+                if now - queued_ms > self.max_age_ms:
+                    del slots[slot]
+                    del retries[slot]
+                    self.expired += 1
+            if not slots:
+                continue
+            masks = {action: 0 for action in LED_ACTIONS}
+            for slot, action in slots.items():
+                masks[action] |= 1 << (slot - 1)
+            payload = led_command_payload(masks['turn_on'], masks['turn_off'])
+            if device_id in self._traces:
+                payload['trace'] = self._traces[device_id]
+            queued = list(retries.values())
+            if device_id in self._queued:
+                queued.append(self._queued[device_id])
+            commands.append((device_id, payload, min(queued)))
+        self._pending = {}
+        self._traces = {}
+        self._queued = {}
+        self._retries = {}
+        self.merged = 0
+        return commands
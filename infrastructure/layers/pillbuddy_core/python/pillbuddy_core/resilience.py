@@ -0,0 +1,220 @@
+"""
+Retry policy and circuit breakers for outbound calls
+
+LED commands and phone calls are side effects of an event, not part of
+it: when IoT Core or Lambda browns out, the event should still finish
+quickly. Their clients are created without botocore retries
+(make_client(..., max_attempts=1)) and called through a RetryPolicy
+instead:
+
+    - Retryable errors (throttling, 5xx, connection and read timeouts) are
+      retried up to max_attempts times with capped full-jitter backoff, so
+      a container fleet does not retry in lockstep
+    - Every dependency has a CircuitBreaker. After failure_threshold
+      retryable failures in a row it opens and calls fail fast with
+      CircuitOpenError instead of waiting out timeouts; after
+      reset_timeout_ms one trial call is let through (half-open), and its
+      outcome closes or reopens the breaker
+
+Errors that are not retryable (validation, access denied) are raised at
+once; the dependency answered, so they count as a success for the
+breaker. Retries, short-circuited calls and breaker openings are counted
+per container and emitted as EMF records on every flush.
+"""
+
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .instrumentation import METRICS_NAMESPACE, register_metric_source
+from .timeutil import now_ms
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BASE_DELAY_MS = 50
+DEFAULT_MAX_DELAY_MS = 400
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT_MS = 30000
+
+RETRYABLE_CODES = frozenset({
+    'Throttling', 'ThrottlingException', 'ThrottledException', 'TooManyRequestsException',
+    'ProvisionedThroughputExceededException', 'RequestLimitExceeded', 'ServiceUnavailable', 'ServiceUnavailableException',
+    'InternalFailure', 'InternalServerError', 'InternalFailureException', 'RequestTimeout',
+    'RequestTimeoutException',
+})
+
+
+def _connection_errors() -> tuple:
+    try:
+        from botocore.exceptions import ConnectionError, HTTPClientError
+    except ImportError:  # botocore is optional for local runs
+        return ()
+    return (ConnectionError, HTTPClientError)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed call is worth retrying (throttling, 5xx, connection or read timeout)"""
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        code = response.get('Error', {}).get('Code', '')
+        status = response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0)
+        return code in RETRYABLE_CODES or status == 429 or status >= 500
+    return isinstance(error, _connection_errors())
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit breaker is open"""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        super().__init__(f"Circuit breaker for {name} is open")
+
+
+class ResilienceMetrics:
+    """Retry, short-circuit and breaker-open counts since the last flush"""
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.retries = 0
+        self.short_circuited = 0
+        self.breaker_opens = 0
+
+
+resilience_metrics = ResilienceMetrics()
+
+
+def build_resilience_metric_records(service: str, timestamp: int) -> List[Dict[str, Any]]:
+    """One EMF record with the retry and breaker counts, reset after each build"""
+    counts = {
+        'outbound_retries': resilience_metrics.retries,
+        'short_circuited_calls': resilience_metrics.short_circuited,
+        'breaker_opens': resilience_metrics.breaker_opens
+    }
+    resilience_metrics.reset()
+    if not any(counts.values()):
+        return []
+    record = {
+        '_aws': {
+            'Timestamp': timestamp,
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [['Service']],
+                'Metrics': [{'Name': name, 'Unit': 'Count'} for name in counts]
+            }]
+        },
+        'Service': service
+    }
+    record.update(counts)
+    return [record]
+
+
+register_metric_source(build_resilience_metric_records)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one dependency, per container
+
+    Args:
+        name: Dependency name, for logs and CircuitOpenError
+        failure_threshold: Retryable failures in a row that open the breaker
+        reset_timeout_ms: How long the breaker stays open before a trial call
+        clock: Millisecond clock (tests pass their own)
+    """
+
+    def __init__(self, name: str, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout_ms: int = DEFAULT_RESET_TIMEOUT_MS,
+                 clock: Callable[[], int] = now_ms) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_ms = reset_timeout_ms
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead; moves an expired open breaker to half-open"""
+        if self.state == OPEN and self.clock() - self.opened_at >= self.reset_timeout_ms:
+            self.state = HALF_OPEN
+            return True
+        return self.state == CLOSED
+
+    def record_success(self) -> None:
+        self.state = CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                resilience_metrics.breaker_opens += 1
+                print(f"Circuit breaker for {self.name} opened after {self.failures} failures")
+            self.state = OPEN
+            self.opened_at = self.clock()
+
+
+class RetryPolicy:
+    """
+    Capped full-jitter exponential backoff
+
+    The delay before retry n (1-based) is uniform in
+    [0, min(max_delay_ms, base_delay_ms * 2 ** (n - 1))].
+
+    Args:
+        max_attempts: Calls including the first
+        base_delay_ms: Backoff cap for the first retry
+        max_delay_ms: Backoff cap for every retry
+        sleep: Sleeps for a number of seconds (tests pass their own)
+        rand: Returns a float in [0, 1) (tests pass their own)
+    """
+
+    def __init__(self, max_attempts: int = DEFAULT_MAX_ATTEMPTS, base_delay_ms: int = DEFAULT_BASE_DELAY_MS,
+                 max_delay_ms: int = DEFAULT_MAX_DELAY_MS, sleep: Callable[[float], None] = time.sleep,
+                 rand: Callable[[], float] = random.random) -> None:
+        self.max_attempts = max_attempts
+        self.base_delay_ms = base_delay_ms
+        self.max_delay_ms = max_delay_ms
+        self.sleep = sleep
+        self.rand = rand
+
+    def delay_ms(self, retry: int) -> float:
+        """Backoff before retry number retry (1-based)"""
+        return self.rand() * min(self.max_delay_ms, self.base_delay_ms * 2 ** (retry - 1))
+
+    def call(self, func: Callable[..., Any], *args: Any,
+             breaker: Optional[CircuitBreaker] = None, **kwargs: Any) -> Any:
+        """
+        Call func, retrying retryable errors
+
+        Raises:
+            CircuitOpenError: If the breaker is open, before or between attempts
+            Exception: The last error, once attempts run out or it is not retryable
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            if breaker is not None and not breaker.allow():
+                resilience_metrics.short_circuited += 1
+                raise CircuitOpenError(breaker.name)
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e):
+                    # The dependency answered, so it is up
+                    if breaker is not None:
+                        breaker.record_success()
+                    raise
+                if breaker is not None:
+                    breaker.record_failure()
+                if attempt == self.max_attempts:
+                    raise
+                resilience_metrics.retries += 1
+                self.sleep(self.delay_ms(attempt) / 1000)
+                continue
+            if breaker is not None:
+                breaker.record_success()
+            return result
@@ -0,0 +1,90 @@
+"""
+Device-to-cloud-to-device round-trip latency
+
+Measures how long a user waits between returning a bottle and the command
+that turns its LED off. Each accepted bottle return carries a trace of
+epoch-millisecond stamps through the IoT Event Processor into the LED
+command payload (as "trace", in TRACE_FIELDS order):
+
+    ts_ms: device time of the transition (the broker's receive time when
+        the device sends no epoch timestamp)
+    received_ms: IoT Core receive time (timestamp() in the rule)
+    lambda_ms: the processor started on the event
+    commit_ms: the prescription update was committed to DynamoDB
+
+When the command is published, the gaps between consecutive stamps are
+recorded as HOPS, plus the total. Each hop goes into a latency histogram
+(label LABEL, stage = hop name, flushed as EMF with the other
+instrumentation) and one JSON log line per command, which
+analytics/feedback_latency.py turns into distributions.
+"""
+
+import json
+from typing import Any, Dict, List, Optional
+
+from .instrumentation import record
+
+LABEL = 'LedFeedback'
+LOG_KEY = 'led_round_trip'
+
+TRACE_FIELDS = ('ts_ms', 'received_ms', 'lambda_ms', 'commit_ms')
+
+# (hop, from stamp, to stamp); published_ms is taken after the IoT publish
+HOPS = (
+    ('device_to_iot', 'ts_ms', 'received_ms'),
+    ('iot_to_lambda', 'received_ms', 'lambda_ms'),
+    ('lambda_to_commit', 'lambda_ms', 'commit_ms'),
+    ('commit_to_publish', 'commit_ms', 'published_ms'),
+    ('total', 'ts_ms', 'published_ms'),
+)
+
+
+def start_trace(event: Dict[str, Any]) -> Optional[List[int]]:
+    """
+    Trace stamps of an event, without commit_ms
+
+    Args:
+        event: Device event as projected by the IoT Rule, with lambda_ms
+               added by the processor
+
+    Returns:
+        [ts_ms, received_ms, lambda_ms], or None if the event has no broker
+        or processor stamps (direct test invocations)
+    """
+    stamps = [event.get(field) for field in TRACE_FIELDS[:-1]]
+    if not all(isinstance(stamp, int) for stamp in stamps):
+        return None
+    return stamps
+
+
+def hop_latencies(trace: List[int], published_ms: int) -> Dict[str, int]:
+    """
+    Milliseconds per hop for a complete trace
+
+    device_to_iot is left out when the device sent no timestamp of its own
+    (ts_ms equals received_ms), since it was never measured.
+    """
+    stamps = dict(zip(TRACE_FIELDS, trace), published_ms=published_ms)
+    latencies = {hop: stamps[end] - stamps[start] for hop, start, end in HOPS}
+    if stamps['ts_ms'] == stamps['received_ms']:
+        del latencies['device_to_iot']
+    return latencies
+
+
+def record_round_trip(device_id: str, trace: List[int], published_ms: int) -> Dict[str, int]:
+    """
+    Record the hops of a published LED command and log them
+
+    Args:
+        device_id: Device the command was published to
+        trace: Trace from the command payload
+        published_ms: Time the publish returned
+
+    Returns:
+        Milliseconds per hop
+    """
+    latencies = hop_latencies(trace, published_ms)
+    for hop, value_ms in latencies.items():
+        record(LABEL, hop, max(value_ms, 0))
+    print(json.dumps({LOG_KEY: dict(latencies, device_id=device_id)}))
+    return latencies
@@ -0,0 +1,256 @@
+"""
+Sequence tracking for devices that number their events
+
+When a device sends sequence numbers, a gap means an event was lost or is
+running late, and a repeated number means a redelivery. The Devices item
+keeps:
+
+    last_sequence: highest sequence applied
+    missing_sequences: sequences skipped by a gap and not seen since (the
+        newest MAX_TRACKED_MISSING)
+    sequence_gaps: number of gaps seen
+
+The device state update is conditioned on the event being the next
+sequence, the common case (sequence_update). When that fails, the stored
+item returned with the failure (ReturnValuesOnConditionCheckFailure) says
+where the event falls (classify_sequence): past a gap, filling an earlier
+gap (late) or already processed (duplicate), and the update is retried in
+that shape. Nothing is read up front.
+
+ReorderBuffer puts each device's events in a batch back in sequence order
+before they are processed, so an event overtaken in flight (e.g. by a
+queue redelivery) is applied in order instead of showing up as a gap and a
+late event. Direct invocations carry one event and pass through unordered.
+
+Gaps, missing, late and reordered events are counted per container and
+emitted as EMF records on every flush; per-device detail is on the Devices
+item and in the logs.
+"""
+
+import heapq
+import os
+from typing import Any, Dict, List, Tuple
+
+from .instrumentation import METRICS_NAMESPACE, register_metric_source
+
+NEXT = 'next'
+GAP = 'gap'
+LATE = 'late'
+DUPLICATE = 'duplicate'
+
+MAX_TRACKED_MISSING = 32
+DEFAULT_REORDER_WINDOW_MS = 2000
+DEFAULT_REORDER_MAX_EVENTS = 64
+
+
+def reorder_window_from_env() -> int:
+    """Reorder window from REORDER_WINDOW_MS (0 disables reordering)"""
+    return int(os.environ.get('REORDER_WINDOW_MS', str(DEFAULT_REORDER_WINDOW_MS)))
+
+
+def classify_sequence(stored: Dict[str, Any], sequence: int) -> str:
+    """
+    Where a sequence falls against a device's stored sequence state
+
+    Args:
+        stored: Devices item (only last_sequence and missing_sequences are used)
+        sequence: Event sequence number (> 0)
+
+    Returns:
+        NEXT, GAP, LATE or DUPLICATE
+    """
+    last_sequence = stored.get('last_sequence')
+    if last_sequence is None or sequence == last_sequence + 1:
+        return NEXT
+    if sequence > last_sequence:
+        return GAP
+    if sequence in stored.get('missing_sequences', []):
+        return LATE
+    return DUPLICATE
+
+
+def sequence_update(kind: str, sequence: int,
+                    stored: Dict[str, Any]) -> Tuple[List[str], List[str], Dict[str, Any]]:
+    """
+    SET assignments, conditions and values for an event's sequence
+
+    Args:
+        kind: NEXT, GAP or LATE (see classify_sequence)
+        sequence: Event sequence number
+        stored: Devices item the kind was classified against ({} for NEXT)
+
+    Returns:
+        (assignments, conditions, ExpressionAttributeValues)
+    """
+    if kind == NEXT:
+        return (
+            ['last_sequence = :sequence'],
+            ['(attribute_not_exists(last_sequence) OR last_sequence = :previous_sequence)'],
+            {':sequence': sequence, ':previous_sequence': sequence - 1}
+        )
+
+    # Both shapes rewrite missing_sequences, so they only apply to the list they were computed from
+    missing = list(stored.get('missing_sequences', []))
+    if 'missing_sequences' in stored:
+        conditions = ['missing_sequences = :stored_missing']
+        values = {':stored_missing': missing}
+    else:
+        conditions = ['attribute_not_exists(missing_sequences)']
+        values = {}
+
+    if kind == GAP:
+        last_sequence = stored['last_sequence']
+        skipped = range(max(last_sequence + 1, sequence - MAX_TRACKED_MISSING), sequence)
+        conditions.append('last_sequence = :stored_sequence')
+        values.update({
+            ':sequence': sequence,
+            ':stored_sequence': last_sequence,
+            ':missing': (missing + list(skipped))[-MAX_TRACKED_MISSING:],
+            ':zero': 0,
+            ':one': 1
+        })
+        return (
+            ['last_sequence = :sequence', 'missing_sequences = :missing',
+             'sequence_gaps = if_not_exists(sequence_gaps, :zero) + :one'],
+            conditions,
+            values
+        )
+
+    if kind == LATE:
+        values[':missing'] = [missing_sequence for missing_sequence in missing if missing_sequence != sequence]
+        return ['missing_sequences = :missing'], conditions, values
+
+    raise ValueError(f"No update for {kind} sequences")
+
+
+class SequenceMetrics:
+    """Gap, missing, late and reordered event counts since the last flush"""
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.gaps = 0
+        self.missing = 0
+        self.late = 0
+        self.reordered = 0
+
+    def record(self, kind: str, stored: Dict[str, Any], sequence: int) -> int:
+        """
+        Count an applied sequence
+
+        Returns:
+            Number of events missing before it (0 unless kind is GAP)
+        """
+        if kind == GAP:
+            missing = sequence - stored['last_sequence'] - 1
+            self.gaps += 1
+            self.missing += missing
+            return missing
+        if kind == LATE:
+            self.late += 1
+        return 0
+
+
+sequence_metrics = SequenceMetrics()
+
+
+def build_sequence_metric_records(service: str, timestamp: int) -> List[Dict[str, Any]]:
+    """One EMF record with the sequence counts, reset after each build"""
+    counts = {
+        'sequence_gaps': sequence_metrics.gaps,
+        'missing_events': sequence_metrics.missing,
+        'late_events': sequence_metrics.late,
+        'reordered_events': sequence_metrics.reordered
+    }
+    sequence_metrics.reset()
+    if not any(counts.values()):
+        return []
+    record = {
+        '_aws': {
+            'Timestamp': timestamp,
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [['Service']],
+                'Metrics': [{'Name': name, 'Unit': 'Count'} for name in counts]
+            }]
+        },
+        'Service': service
+    }
+    record.update(counts)
+    return [record]
+
+
+register_metric_source(build_sequence_metric_records)
+
+
+class ReorderBuffer:
+    """
+    Bounded per-device reorder buffer for a batch of events
+
+    Events are added in arrival order and released per device in sequence
+    order. A held event is released as soon as the sequence before it has
+    been released, when the device holds more than max_events, or when an
+    event of the device arrives more than window_ms after it; flush()
+    releases the rest. Events without a sequence are released straight
+    away, after everything the device holds.
+
+    Args:
+        window_ms: Longest an event waits for earlier sequences; 0 disables
+                   reordering
+        max_events: Events held per device before the lowest is released
+    """
+
+    def __init__(self, window_ms: int = DEFAULT_REORDER_WINDOW_MS,
+                 max_events: int = DEFAULT_REORDER_MAX_EVENTS) -> None:
+        self.window_ms = window_ms
+        self.max_events = max_events
+        self.reordered = 0
+        # device_id -> heap of (sequence, arrival, received_ms, item)
+        self._held: Dict[str, List[Tuple[int, int, int, Any]]] = {}
+        # device_id -> (last released sequence, latest released arrival)
+        self._released: Dict[str, Tuple[int, int]] = {}
+        self._arrivals = 0
+
+    def add(self, device_id: str, sequence: int, received_ms: int, item: Any) -> List[Any]:
+        """Add an event; returns the events now ready, in processing order"""
+        arrival = self._arrivals
+        self._arrivals += 1
+        if self.window_ms <= 0 or not sequence or sequence < 0:
+            return self._release(device_id, everything=True) + [self._pass(device_id, 0, arrival, item)]
+
+        heapq.heappush(self._held.setdefault(device_id, []), (sequence, arrival, received_ms, item))
+        return self._release(device_id, newest_received_ms=received_ms)
+
+    def flush(self) -> List[Any]:
+        """Release every held event"""
+        released = []
+        for device_id in list(self._held):
+            released.extend(self._release(device_id, everything=True))
+        return released
+
+    def _release(self, device_id: str, everything: bool = False, newest_received_ms: int = 0) -> List[Any]:
+        heap = self._held.get(device_id)
+        released = []
+        while heap:
+            sequence, arrival, received_ms, item = heap[0]
+            last_sequence = self._released.get(device_id, (None, -1))[0]
+            if not (everything
+                    or (last_sequence is not None and sequence <= last_sequence + 1)
+                    or len(heap) > self.max_events
+                    or received_ms < newest_received_ms - self.window_ms):
+                break
+            heapq.heappop(heap)
+            released.append(self._pass(device_id, sequence, arrival, item))
+        if not heap:
+            self._held.pop(device_id, None)
+        return released
+
+    def _pass(self, device_id: str, sequence: int, arrival: int, item: Any) -> Any:
+        last_sequence, latest_arrival = self._released.get(device_id, (None, -1))
+        if arrival < latest_arrival:
+            self.reordered += 1
+        if sequence:
+            last_sequence = sequence if last_sequence is None else max(last_sequence, sequence)
+        self._released[device_id] = (last_sequence, max(arrival, latest_arrival))
+        return item
@@ -0,0 +1,16 @@
+"""
+Millisecond timestamps
+
+PillBuddy stores every timestamp as Unix epoch milliseconds (the ESP32
+ts_ms format), so all handlers take the current time from here.
+"""
+
+import time
+
+MINUTE_MS = 60 * 1000
+DAY_MS = 24 * 60 * MINUTE_MS
+
+
+def now_ms() -> int:
+    """Current Unix time in milliseconds"""
+    return int(time.time() * 1000)
@@ -0,0 +1,214 @@
+"""
+Unit tests for the PillBuddy read-through / write-through cache tier
+"""
+
+import unittest
+from unittest.mock import MagicMock, patch
+from decimal import Decimal
+import sys
+import os
+
+# Add the layer's python/ directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python'))
+
+from pillbuddy_core import cache as cache_module
+from pillbuddy_core.cache import MemoryCache, RedisCache, CachedTable, cache_from_env, build_cache_metric_records
+from pillbuddy_core.ddb_client import FastTable, PRESCRIPTIONS_KEY_SCHEMA
+
+PRESCRIPTION = {
+    'device_id': 'esp32_001',
+    'slot': 1,
+    'prescription_name': 'Aspirin',
+    'pill_count': 30,
+    'dose_mg': Decimal('2.5'),
+    'removal_timestamp': None
+}
+KEY = {'device_id': 'esp32_001', 'slot': 1}
+
+
+class FakeRedis:
+    """Minimal Redis-protocol client keeping values as bytes, like redis-py"""
+    
+    def __init__(self):
+        self.values = {}
+        self.ttls = {}
+    
+    def get(self, key):
+        return self.values.get(key)
+    
+    def set(self, key, value, px=None):
+        self.values[key] = value.encode('utf-8')
+        self.ttls[key] = px
+    
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+class TestMemoryCache(unittest.TestCase):
+    """Test cases for the in-container backend"""
+    
+    def test_entries_expire(self):
+        """Test that entries are dropped after their TTL"""
+        cache = MemoryCache()
+        with patch('pillbuddy_core.cache.timeutil.now_ms', return_value=1000):
+            cache.set('k', 'v', 5)
+            self.assertEqual(cache.get('k'), 'v')
+        with patch('pillbuddy_core.cache.timeutil.now_ms', return_value=6001):
+            self.assertIsNone(cache.get('k'))
+    
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first"""
+        cache = MemoryCache(max_entries=2)
+        cache.set('a', '1', 60)
+        cache.set('b', '2', 60)
+        cache.get('a')
+        cache.set('c', '3', 60)
+        
+        self.assertEqual(cache.get('a'), '1')
+        self.assertIsNone(cache.get('b'))
+
+
+class TestCachedTable(unittest.TestCase):
+    """Test cases for CachedTable over a mocked low-level client"""
+    
+    def setUp(self):
+        self.client = MagicMock()
+        # Fresh response per call - FastTable decodes responses in place
+        self.client.get_item.side_effect = lambda **kwargs: {'Item': {
+            'device_id': {'S': 'esp32_001'}, 'slot': {'N': '1'}, 'pill_count': {'N': '30'}
+        }}
+        self.table = CachedTable(FastTable(self.client, 'Prescriptions', PRESCRIPTIONS_KEY_SCHEMA), MemoryCache(), 30)
+    
+    def test_read_through(self):
+        """Test that the second read is served from the cache"""
+        first = self.table.get_item(Key=KEY)
+        second = self.table.get_item(Key=KEY)
+        
+        self.assertEqual(first['Item'], second['Item'])
+        self.client.get_item.assert_called_once()
+        self.assertEqual((self.table.hits, self.table.misses), (1, 1))
+    
+    def test_missing_items_are_not_cached(self):
+        """Test that a missing item is read from DynamoDB every time"""
+        self.client.get_item.side_effect = lambda **kwargs: {}
+        
+        self.table.get_item(Key=KEY)
+        self.table.get_item(Key=KEY)
+        
+        self.assertEqual(self.client.get_item.call_count, 2)
+    
+    def test_consistent_and_projected_reads_bypass(self):
+        """Test that consistent and projected reads always reach DynamoDB"""
+        self.table.get_item(Key=KEY)
+        self.table.get_item(Key=KEY, ConsistentRead=True)
+        self.table.get_item(Key=KEY, ProjectionExpression='pill_count')
+        
+        self.assertEqual(self.client.get_item.call_count, 3)
+    
+    def test_put_writes_through(self):
+        """Test that put_item stores the written item, including Decimals"""
+        self.table.put_item(Item=PRESCRIPTION)
+        
+        self.assertEqual(self.table.get_item(Key=KEY)['Item'], PRESCRIPTION)
+        self.client.get_item.assert_not_called()
+    
+    def test_memory_backend_keeps_items(self):
+        """Test that the memory backend serves the stored item without re-encoding it"""
+        self.table.put_item(Item=PRESCRIPTION)
+        
+        with patch('pillbuddy_core.cache.decode_item') as decode, patch('pillbuddy_core.cache.encode_item') as encode:
+            self.assertIs(self.table.get_item(Key=KEY)['Item'], PRESCRIPTION)
+        decode.assert_not_called()
+        encode.assert_not_called()
+    
+    def test_update_refreshes_with_all_new(self):
+        """Test that update_item caches ALL_NEW and keeps the caller's response shape"""
+        self.client.update_item.return_value = {'Attributes': {
+            'device_id': {'S': 'esp32_001'}, 'slot': {'N': '1'}, 'pill_count': {'N': '29'}
+        }}
+        
+        response = self.table.update_item(
+            Key=KEY,
+            UpdateExpression='SET pill_count = :count',
+            ExpressionAttributeValues={':count': 29}
+        )
+        
+        self.assertNotIn('Attributes', response)
+        self.assertEqual(self.client.update_item.call_args[1]['ReturnValues'], 'ALL_NEW')
+        self.assertEqual(self.table.get_item(Key=KEY)['Item']['pill_count'], 29)
+        self.client.get_item.assert_not_called()
+    
+    def test_failed_write_keeps_cache(self):
+        """Test that a failed write neither stores nor invalidates"""
+        self.table.put_item(Item=PRESCRIPTION)
+        self.client.update_item.side_effect = Exception('ConditionalCheckFailedException')
+        
+        with self.assertRaises(Exception):
+            self.table.update_item(Key=KEY, UpdateExpression='SET pill_count = :count',
+                                   ExpressionAttributeValues={':count': 0})
+        
+        self.assertEqual(self.table.get_item(Key=KEY)['Item']['pill_count'], 30)
+    
+    def test_delete_invalidates(self):
+        """Test that delete_item drops the cached item"""
+        self.table.put_item(Item=PRESCRIPTION)
+        self.table.delete_item(Key=KEY)
+        self.table.get_item(Key=KEY)
+        
+        self.client.get_item.assert_called_once()
+    
+    def test_backend_errors_degrade_to_dynamodb(self):
+        """Test that an unhealthy cache falls back to DynamoDB"""
+        backend = MagicMock()
+        backend.get.side_effect = ConnectionError('cache down')
+        backend.set.side_effect = ConnectionError('cache down')
+        table = CachedTable(FastTable(self.client, 'Prescriptions', PRESCRIPTIONS_KEY_SCHEMA), backend, 30)
+        
+        with patch('builtins.print'):
+            response = table.get_item(Key=KEY)
+        
+        self.assertEqual(response['Item']['pill_count'], 30)
+    
+    def test_redis_backend(self):
+        """Test the Redis-protocol backend round trip and millisecond TTL"""
+        redis_client = FakeRedis()
+        table = CachedTable(FastTable(self.client, 'Prescriptions', PRESCRIPTIONS_KEY_SCHEMA), RedisCache(redis_client), 15)
+        
+        table.put_item(Item=PRESCRIPTION)
+        
+        self.assertEqual(table.get_item(Key=KEY)['Item'], PRESCRIPTION)
+        self.assertEqual(redis_client.ttls['Prescriptions|esp32_001|1'], 15000)
+
+
+class TestCacheConfiguration(unittest.TestCase):
+    """Test cases for backend selection and hit-ratio metrics"""
+    
+    def test_backend_from_env(self):
+        """Test CACHE_BACKEND selection"""
+        with patch.dict(os.environ, {'CACHE_BACKEND': 'memory'}):
+            self.assertIsInstance(cache_from_env(), MemoryCache)
+        with patch.dict(os.environ, {'CACHE_BACKEND': 'none'}):
+            self.assertIsNone(cache_from_env())
+        with patch.dict(os.environ, {'CACHE_BACKEND': 'dax'}):
+            self.assertIsNone(cache_from_env())
+        with patch.dict(os.environ, {'CACHE_BACKEND': 'memcached'}):
+            with self.assertRaises(ValueError):
+                cache_from_env()
+    
+    def test_hit_ratio_records(self):
+        """Test EMF hit-ratio records and counter reset"""
+        for table in list(cache_module._cached_tables):
+            table.hits = table.misses = 0
+        table = CachedTable(FastTable(MagicMock(), 'HitRatioTable', PRESCRIPTIONS_KEY_SCHEMA), MemoryCache(), 30)
+        table.hits, table.misses = 3, 1
+        
+        records = build_cache_metric_records('IoTEventProcessor', 0)
+        
+        record = next(r for r in records if r['Table'] == 'HitRatioTable')
+        self.assertEqual(record['cache_hit_ratio'], 0.75)
+        self.assertEqual(record['_aws']['CloudWatchMetrics'][0]['Dimensions'], [['Service', 'Table']])
+        self.assertEqual((table.hits, table.misses), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
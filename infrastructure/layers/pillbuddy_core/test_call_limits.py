@@ -0,0 +1,220 @@
+"""
+Unit tests for the PillBuddy phone call limits
+"""
+
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+
+# Add the layer's python/ directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python'))
+
+from pillbuddy_core.call_limits import (
+    COOLDOWN, RATE_LIMITED, CONCURRENCY, CallLimiter, build_call_metric_records, call_metrics, refill
+)
+from pillbuddy_core.timeutil import MINUTE_MS
+
+START_MS = 1792310400000
+
+
+class ConditionFailed(Exception):
+    def __init__(self, item=None):
+        self.response = {'Error': {'Code': 'ConditionalCheckFailedException'}}
+        if item is not None:
+            self.response['Item'] = item
+        super().__init__('The conditional request failed')
+
+
+class TestRefill(unittest.TestCase):
+    """Test cases for refill()"""
+
+    def test_whole_tokens_keep_partial_progress(self):
+        """Test that refilled_ms only advances by whole intervals"""
+        self.assertEqual(refill(0, 0, 25, 3, 10), (2, 20))
+
+    def test_full_bucket_restarts_refill_clock(self):
+        """Test that a bucket caps at its size"""
+        self.assertEqual(refill(1, 0, 100, 3, 10), (3, 100))
+
+    def test_clock_behind_refill_time(self):
+        """Test that an earlier clock earns nothing"""
+        self.assertEqual(refill(1, 50, 40, 3, 10), (1, 50))
+
+
+class TestInMemoryLimits(unittest.TestCase):
+    """CallLimiter without a table"""
+
+    def setUp(self):
+        self.now = START_MS
+        patcher = patch('pillbuddy_core.call_limits.now_ms', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        call_metrics.reset()
+        self.addCleanup(call_metrics.reset)
+        self.limiter = CallLimiter(bucket_size=2, token_interval_ms=10 * MINUTE_MS, cooldown_ms=5 * MINUTE_MS,
+                                   max_outstanding=2, lease_ms=MINUTE_MS)
+
+    def test_cooldown_per_slot(self):
+        """Test that a slot is called once per cooldown and other slots are not held up"""
+        self.assertIsNone(self.limiter.acquire('esp32_001', 2))
+        self.assertEqual(self.limiter.acquire('esp32_001', 2), COOLDOWN)
+        self.assertIsNone(self.limiter.acquire('esp32_001', 3))
+
+        self.now += 5 * MINUTE_MS - 1
+        self.assertEqual(self.limiter.acquire('esp32_001', 2), COOLDOWN)
+        self.now += 5 * MINUTE_MS + 1
+        self.assertIsNone(self.limiter.acquire('esp32_001', 2))
+
+    def test_token_bucket_per_device(self):
+        """Test that a device runs out of calls and earns one back per interval"""
+        self.assertIsNone(self.limiter.acquire('esp32_001', 1))
+        self.assertIsNone(self.limiter.acquire('esp32_001', 2))
+        self.now += 2 * MINUTE_MS
+        self.assertEqual(self.limiter.acquire('esp32_001', 3), RATE_LIMITED)
+
+        self.now += 8 * MINUTE_MS
+        self.assertIsNone(self.limiter.acquire('esp32_001', 3))
+
+    def test_concurrency_cap(self):
+        """Test that calls in progress are capped until their leases expire or are released"""
+        self.assertIsNone(self.limiter.acquire('esp32_001', 1))
+        self.assertIsNone(self.limiter.acquire('esp32_002', 1))
+        self.assertEqual(self.limiter.acquire('esp32_003', 1), CONCURRENCY)
+
+        self.limiter.release('esp32_002', 1)
+        self.assertIsNone(self.limiter.acquire('esp32_003', 1))
+        self.assertEqual(self.limiter.acquire('esp32_004', 1), CONCURRENCY)
+
+        self.now += MINUTE_MS
+        self.assertIsNone(self.limiter.acquire('esp32_004', 1))
+
+    def test_failed_call_is_refunded(self):
+        """Test that releasing a charged call gives back its token and cooldown"""
+        self.assertIsNone(self.limiter.acquire('esp32_001', 1))
+        self.assertIsNone(self.limiter.acquire('esp32_001', 2))
+        self.limiter.release('esp32_001', 2)
+
+        self.assertIsNone(self.limiter.acquire('esp32_001', 2))
+        self.assertEqual(self.limiter.acquire('esp32_001', 3), RATE_LIMITED)
+
+    def test_metrics_count_outcomes(self):
+        """Test that placed and refused calls are emitted, then reset"""
+        self.limiter.acquire('esp32_001', 1)
+        self.limiter.acquire('esp32_001', 1)
+
+        record, = build_call_metric_records('IoTEventProcessor', 0)
+        self.assertEqual(record['phone_calls'], 1)
+        self.assertEqual(record['calls_in_cooldown'], 1)
+        self.assertEqual(build_call_metric_records('IoTEventProcessor', 0), [])
+
+
+class TestTableAuthority(unittest.TestCase):
+    """CallLimiter against the CallLimits table"""
+
+    def setUp(self):
+        self.now = START_MS
+        patcher = patch('pillbuddy_core.call_limits.now_ms', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(call_metrics.reset)
+        self.table = MagicMock()
+        self.limiter = CallLimiter(self.table, bucket_size=3, token_interval_ms=10 * MINUTE_MS,
+                                   cooldown_ms=5 * MINUTE_MS, max_outstanding=4, lease_ms=MINUTE_MS)
+
+    def device_updates(self):
+        return [kwargs for _, kwargs in self.table.update_item.call_args_list
+                if kwargs['Key']['limit_key'].startswith('device#')]
+
+    def test_first_call_takes_lease_and_charges_device(self):
+        """Test one lease update and one device update conditioned on a new bucket"""
+        self.assertIsNone(self.limiter.acquire('esp32_001', 2))
+
+        lease, device = [kwargs for _, kwargs in self.table.update_item.call_args_list]
+        self.assertTrue(lease['Key']['limit_key'].startswith('lease#'))
+        self.assertEqual(device['Key'], {'limit_key': 'device#esp32_001'})
+        self.assertIn('attribute_not_exists(#refilled)', device['ConditionExpression'])
+        self.assertEqual(device['ExpressionAttributeNames']['#last_call'], 'slot_2_last_call')
+        self.assertEqual(device['ExpressionAttributeValues'][':tokens'], 2)
+
+    def test_cooldown_from_another_container(self):
+        """Test that a stored call for the slot refuses the call and frees the lease"""
+        stored = {'limit_key': 'device#esp32_001', 'tokens': 2, 'refilled_ms': self.now - MINUTE_MS,
+                  'slot_2_last_call': self.now - MINUTE_MS}
+        self.table.update_item.side_effect = lambda **kwargs: (
+            None if kwargs['Key']['limit_key'].startswith('lease#') else self._fail(stored))
+
+        self.assertEqual(self.limiter.acquire('esp32_001', 2), COOLDOWN)
+        self.table.delete_item.assert_called_once()
+
+        # The ledger now refuses without a request
+        self.table.reset_mock()
+        self.assertEqual(self.limiter.acquire('esp32_001', 2), COOLDOWN)
+        self.table.update_item.assert_not_called()
+
+    def test_retries_against_stored_bucket(self):
+        """Test that a bucket changed by another container is charged from its stored level"""
+        stored = {'limit_key': 'device#esp32_001', 'tokens': 1, 'refilled_ms': self.now - MINUTE_MS}
+        failures = [stored]
+        self.table.update_item.side_effect = lambda **kwargs: (
+            self._fail(failures.pop()) if kwargs['Key']['limit_key'].startswith('device#') and failures else None)
+
+        self.assertIsNone(self.limiter.acquire('esp32_001', 2))
+        retry = self.device_updates()[-1]
+        self.assertEqual(retry['ExpressionAttributeValues'][':seen_tokens'], 1)
+        self.assertEqual(retry['ExpressionAttributeValues'][':tokens'], 0)
+
+    def test_release_refunds_device(self):
+        """Test that a released call restores the stored token and clears the slot's cooldown"""
+        self.assertIsNone(self.limiter.acquire('esp32_001', 2))
+        self.limiter.release('esp32_001', 2)
+
+        refund = self.device_updates()[-1]
+        self.assertEqual(refund['UpdateExpression'], 'SET #tokens = #tokens + :one REMOVE #last_call')
+        self.assertEqual(refund['ExpressionAttributeNames']['#last_call'], 'slot_2_last_call')
+        self.assertEqual(refund['ExpressionAttributeValues'][':last_call'], self.now)
+        self.table.delete_item.assert_called_once()
+
+    def test_refused_call_is_not_refunded(self):
+        """Test that a call refused by the table only gives back its lease"""
+        stored = {'limit_key': 'device#esp32_001', 'tokens': 2, 'refilled_ms': self.now - MINUTE_MS,
+                  'slot_2_last_call': self.now - MINUTE_MS}
+        self.table.update_item.side_effect = lambda **kwargs: (
+            None if kwargs['Key']['limit_key'].startswith('lease#') else self._fail(stored))
+
+        self.assertEqual(self.limiter.acquire('esp32_001', 2), COOLDOWN)
+        self.limiter.release('esp32_001', 2)
+
+        self.assertEqual(len(self.device_updates()), 1)
+
+    def test_taken_leases_are_skipped(self):
+        """Test that leases held elsewhere are remembered until they expire"""
+        held = {'expires_ms': self.now + MINUTE_MS}
+        self.table.update_item.side_effect = lambda **kwargs: (
+            self._fail(held) if kwargs['Key']['limit_key'].startswith('lease#') else None)
+
+        self.assertEqual(self.limiter.acquire('esp32_001', 2), CONCURRENCY)
+        self.assertEqual(self.table.update_item.call_count, 4)
+
+        self.table.reset_mock()
+        self.assertEqual(self.limiter.acquire('esp32_002', 2), CONCURRENCY)
+        self.table.update_item.assert_not_called()
+
+    def test_unreachable_table_falls_back_to_memory(self):
+        """Test that a table error lets the in-memory limits decide"""
+        self.table.update_item.side_effect = Exception('Could not connect to the endpoint URL')
+
+        with patch('builtins.print'):
+            self.assertIsNone(self.limiter.acquire('esp32_001', 2))
+            self.assertEqual(self.limiter.acquire('esp32_001', 2), COOLDOWN)
+
+    def _fail(self, item):
+        raise ConditionFailed({name: self._encode(value) for name, value in item.items()})
+
+    @staticmethod
+    def _encode(value):
+        return {'S': value} if isinstance(value, str) else {'N': str(value)}
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+"""
+Unit tests for the PillBuddy core client, IoT, error and time helpers
+"""
+
+import unittest
+from unittest.mock import MagicMock, patch
+import json
+import sys
+import os
+
+# Add the layer's python/ directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python'))
+
+from pillbuddy_core import clients, timeutil
+from pillbuddy_core.errors import error_response, log_error
+from pillbuddy_core.iot import LedCommandBuffer, led_command_payload, publish_slot_command
+
+
+class TestMakeClient(unittest.TestCase):
+    """Test cases for make_client()"""
+    
+    def test_shared_configuration(self):
+        """Test that clients get the tuned timeouts, retries and keep-alive"""
+        fake_boto3 = MagicMock()
+        
+        with patch.dict(sys.modules, {'boto3': fake_boto3}):
+            client = clients.make_client('dynamodb')
+        
+        self.assertIs(client, fake_boto3.client.return_value)
+        fake_boto3.client.assert_called_once_with('dynamodb', config=fake_boto3.session.Config.return_value)
+        config_kwargs = fake_boto3.session.Config.call_args.kwargs
+        self.assertEqual(config_kwargs['retries'], {'mode': 'standard', 'max_attempts': clients.MAX_ATTEMPTS})
+        self.assertTrue(config_kwargs['tcp_keepalive'])
+
+
+class TestPublishSlotCommand(unittest.TestCase):
+    """Test cases for publish_slot_command()"""
+    
+    def test_topic_and_payload(self):
+        """Test the device command topic and payload format"""
+        iot_client = MagicMock()
+        
+        payload = publish_slot_command(iot_client, 'esp32_001', 2, 'turn_on')
+        
+        self.assertEqual(payload, {'action': 'turn_on', 'slot': 2})
+        iot_client.publish.assert_called_once_with(
+            topic='pillbuddy/cmd/esp32_001',
+            qos=1,
+            payload=json.dumps({'action': 'turn_on', 'slot': 2})
+        )
+
+
+class TestLedCommandBuffer(unittest.TestCase):
+    """Test cases for LedCommandBuffer"""
+    
+    def test_one_command_per_device(self):
+        """Test that LED changes merge per device and the last change of a slot wins"""
+        buffer = LedCommandBuffer()
+        buffer.add('esp32_001', 1, 'turn_off', queued_ms=1000)
+        buffer.add('esp32_002', 2, 'turn_on', queued_ms=1500)
+        buffer.add('esp32_001', 3, 'turn_off', queued_ms=2000)
+        buffer.add('esp32_001', 1, 'turn_on', queued_ms=2000)
+        
+        self.assertEqual(buffer.merged, 2)
+        self.assertEqual(buffer.drain(), [
+            ('esp32_001', {'action': 'set_leds', 'on_mask': 0b001, 'off_mask': 0b100}, 1000),
+            ('esp32_002', {'action': 'turn_on', 'slot': 2}, 1500),
+        ])
+        self.assertEqual((len(buffer), buffer.merged), (0, 0))
+        with self.assertRaises(ValueError):
+            buffer.add('esp32_001', 1, 'blink')
+    
+    def test_requeue_under_newer_changes(self):
+        """Test that a failed command goes out again, newer changes win and old ones are dropped"""
+        buffer = LedCommandBuffer(max_age_ms=60000)
+        now = timeutil.now_ms()
+        buffer.add('esp32_001', 1, 'turn_on')
+        
+        self.assertTrue(buffer.requeue('esp32_001', {'action': 'set_leds', 'on_mask': 0, 'off_mask': 0b011,
+                                                     'trace': [1, 2, 3, 4]}, now - 1000))
+        self.assertFalse(buffer.requeue('esp32_002', {'action': 'turn_off', 'slot': 1}, now - 120000))
+        self.assertEqual(buffer.drain(), [
+            ('esp32_001', {'action': 'set_leds', 'on_mask': 0b001, 'off_mask': 0b010, 'trace': [1, 2, 3, 4]},
+             now - 1000),
+        ])
+    
+    def test_requeued_changes_expire_before_drain(self):
+        """Test that a requeued change held past max_age_ms is not sent over a newer LED state"""
+        buffer = LedCommandBuffer(max_age_ms=5000)
+        with patch('pillbuddy_core.iot.now_ms', return_value=10000):
+            self.assertTrue(buffer.requeue('esp32_001', {'action': 'set_leds', 'on_mask': 0, 'off_mask': 0b011},
+                                           9000))
+            self.assertTrue(buffer.requeue('esp32_002', {'action': 'turn_off', 'slot': 1}, 9000))
+        with patch('pillbuddy_core.iot.now_ms', return_value=15000):
+            buffer.add('esp32_001', 2, 'turn_on')
+            commands = buffer.drain()
+        
+        self.assertEqual(commands, [('esp32_001', {'action': 'turn_on', 'slot': 2}, 15000)])
+        self.assertEqual(buffer.expired, 2)
+    
+    def test_single_change_keeps_slot_format(self):
+        """Test that one change is sent in the per-slot format"""
+        self.assertEqual(led_command_payload(0, 0b100), {'action': 'turn_off', 'slot': 3})
+        self.assertEqual(led_command_payload(0b011, 0), {'action': 'set_leds', 'on_mask': 3, 'off_mask': 0})
+
+
+class TestErrorsAndTime(unittest.TestCase):
+    """Test cases for error helpers and timestamps"""
+    
+    def test_error_response(self):
+        """Test the HTTP-style error response shape"""
+        response = error_response(400, 'Invalid slot number')
+        
+        self.assertEqual(response['statusCode'], 400)
+        self.assertEqual(json.loads(response['body']), {'error': 'Invalid slot number'})
+    
+    @patch('builtins.print')
+    def test_log_error(self, mock_print):
+        """Test the shared error log format"""
+        log_error('updating device state', ValueError('boom'))
+        
+        mock_print.assert_called_once_with('Error updating device state: boom')
+    
+    @patch('pillbuddy_core.timeutil.time.time', return_value=1704067200.1234)
+    def test_now_ms(self, _):
+        """Test that timestamps are integer milliseconds"""
+        self.assertEqual(timeutil.now_ms(), 1704067200123)
+
+
+if __name__ == '__main__':
+    unittest.main()
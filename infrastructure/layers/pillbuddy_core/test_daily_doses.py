@@ -0,0 +1,133 @@
+"""
+Unit tests for the PillBuddy daily dose aggregates
+"""
+
+import unittest
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Add the layer's python/ directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python'))
+
+from pillbuddy_core.daily_doses import day_key, record_dose, undo_dose, dosed_slots, DAILY_DOSES_TTL_DAYS
+
+# 2026-10-18 23:30:00 UTC
+LATE_EVENING_MS = 1792366200000
+
+
+class ConditionFailed(Exception):
+    response = {'Error': {'Code': 'ConditionalCheckFailedException'}}
+
+
+class TestDayKey(unittest.TestCase):
+    """Test cases for day_key()"""
+
+    def test_utc_day(self):
+        """Test the UTC calendar day"""
+        self.assertEqual(day_key(LATE_EVENING_MS), '2026-10-18')
+
+    def test_offset_moves_day_boundary(self):
+        """Test that a positive offset rolls late evening into the next day"""
+        self.assertEqual(day_key(LATE_EVENING_MS, utc_offset_minutes=60), '2026-10-19')
+        self.assertEqual(day_key(LATE_EVENING_MS, utc_offset_minutes=-300), '2026-10-18')
+
+
+class TestRecordDose(unittest.TestCase):
+    """Test cases for record_dose()"""
+
+    def test_update_targets_slot_counters(self):
+        """Test the key, slot attribute names and duplicate guard"""
+        table = MagicMock()
+
+        self.assertTrue(record_dose(table, 'esp32_001', 2, LATE_EVENING_MS, 'Aspirin', utc_offset_minutes=60))
+
+        kwargs = table.update_item.call_args.kwargs
+        self.assertEqual(kwargs['Key'], {'device_id': 'esp32_001', 'day': '2026-10-19'})
+        self.assertEqual(kwargs['ExpressionAttributeNames']['#doses'], 'slot_2_doses')
+        self.assertEqual(kwargs['ExpressionAttributeNames']['#last'], 'slot_2_last_removal')
+        self.assertIn('#last < :timestamp', kwargs['ConditionExpression'])
+        self.assertEqual(kwargs['ExpressionAttributeValues'][':name'], 'Aspirin')
+        # Expires DAILY_DOSES_TTL_DAYS after the end of the local day
+        self.assertEqual(kwargs['ExpressionAttributeValues'][':ttl'],
+                         (LATE_EVENING_MS + 30 * 60000 + 23 * 3600000) // 1000 + DAILY_DOSES_TTL_DAYS * 86400)
+
+    def test_duplicate_is_not_counted(self):
+        """Test that a failed duplicate check reports False instead of raising"""
+        table = MagicMock()
+        table.update_item.side_effect = ConditionFailed()
+
+        self.assertFalse(record_dose(table, 'esp32_001', 1, LATE_EVENING_MS))
+
+    def test_other_errors_raise(self):
+        """Test that other failures propagate"""
+        table = MagicMock()
+        table.update_item.side_effect = RuntimeError('throttled')
+
+        with self.assertRaises(RuntimeError):
+            record_dose(table, 'esp32_001', 1, LATE_EVENING_MS)
+
+
+class TestUndoDose(unittest.TestCase):
+    """Test cases for undo_dose()"""
+
+    def test_only_dose_takes_its_times(self):
+        """Test that undoing the slot's only dose of the day removes its removal times"""
+        table = MagicMock()
+
+        self.assertTrue(undo_dose(table, 'esp32_001', 2, LATE_EVENING_MS, utc_offset_minutes=60))
+
+        kwargs = table.update_item.call_args.kwargs
+        self.assertEqual(kwargs['Key'], {'device_id': 'esp32_001', 'day': '2026-10-19'})
+        self.assertIn('REMOVE #first, #last', kwargs['UpdateExpression'])
+        self.assertEqual(kwargs['ExpressionAttributeNames'], {
+            '#doses': 'slot_2_doses', '#first': 'slot_2_first_removal', '#last': 'slot_2_last_removal'
+        })
+        self.assertIn('#doses = :one', kwargs['ConditionExpression'])
+
+    def test_only_the_last_removal_is_undone(self):
+        """Test the decrement and its guard on the slot's last recorded removal"""
+        table = MagicMock()
+        table.update_item.side_effect = [ConditionFailed(), None]
+
+        self.assertTrue(undo_dose(table, 'esp32_001', 2, LATE_EVENING_MS))
+
+        kwargs = table.update_item.call_args.kwargs
+        self.assertEqual(kwargs['UpdateExpression'], 'ADD #doses :minus_one')
+        self.assertEqual(kwargs['ExpressionAttributeNames'], {'#doses': 'slot_2_doses', '#last': 'slot_2_last_removal'})
+        self.assertIn('#last = :timestamp', kwargs['ConditionExpression'])
+
+        table.update_item.side_effect = ConditionFailed()
+        self.assertFalse(undo_dose(table, 'esp32_001', 2, LATE_EVENING_MS))
+
+
+class TestDosedSlots(unittest.TestCase):
+    """Test cases for dosed_slots()"""
+
+    def test_slots_with_doses(self):
+        """Test that only slots with doses are listed, in slot order"""
+        item = {
+            'device_id': 'esp32_001',
+            'day': '2026-10-18',
+            'slot_3_doses': 1,
+            'slot_3_first_removal': 5,
+            'slot_3_last_removal': 5,
+            'slot_1_doses': 2,
+            'slot_1_first_removal': 1,
+            'slot_1_last_removal': 3,
+            'slot_1_name': 'Aspirin',
+            'slot_2_doses': 0
+        }
+
+        self.assertEqual(dosed_slots(item), [
+            (1, {'doses': 2, 'first_removal': 1, 'last_removal': 3, 'name': 'Aspirin'}),
+            (3, {'doses': 1, 'first_removal': 5, 'last_removal': 5, 'name': None})
+        ])
+
+    def test_missing_item(self):
+        """Test that no item means no doses"""
+        self.assertEqual(dosed_slots(None), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
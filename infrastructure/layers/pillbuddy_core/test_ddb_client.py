@@ -0,0 +1,154 @@
+"""
+Unit tests for the PillBuddy DynamoDB fast path
+"""
+
+import unittest
+from unittest.mock import MagicMock
+from decimal import Decimal
+import sys
+import os
+
+# Add the layer's python/ directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python'))
+
+from pillbuddy_core.ddb_client import (
+    encode_value, decode_value, encode_item, decode_item, KeyTemplate, FastDynamoDB,
+    PRESCRIPTIONS_KEY_SCHEMA, DEVICES_KEY_SCHEMA
+)
+
+
+class TestAttributeCodec(unittest.TestCase):
+    """Test cases for encode_value() / decode_value()"""
+    
+    def test_scalar_encoding(self):
+        """Test encoding of the scalar types PillBuddy stores"""
+        self.assertEqual(encode_value('Aspirin'), {'S': 'Aspirin'})
+        self.assertEqual(encode_value(30), {'N': '30'})
+        self.assertEqual(encode_value(True), {'BOOL': True})
+        self.assertEqual(encode_value(False), {'BOOL': False})
+        self.assertEqual(encode_value(None), {'NULL': True})
+        self.assertEqual(encode_value(Decimal('1.5')), {'N': '1.5'})
+    
+    def test_prescription_round_trip(self):
+        """Test that a prescription item survives encode/decode unchanged"""
+        item = {
+            'device_id': 'esp32_001',
+            'slot': 1,
+            'prescription_name': 'Aspirin',
+            'pill_count': 30,
+            'has_refills': False,
+            'removal_timestamp': None,
+            'updated_at': 1700000000000
+        }
+        
+        self.assertEqual(decode_item(encode_item(item)), item)
+    
+    def test_nested_slots_round_trip(self):
+        """Test that the device 'slots' map and lists survive encode/decode"""
+        item = {
+            'slots': {'1': {'in_holder': True, 'last_state_change': 1700000000000}},
+            'device_ids': ['esp32_001', 'esp32_002']
+        }
+        
+        encoded = encode_item(item)
+        
+        self.assertEqual(encoded['slots']['M']['1']['M']['in_holder'], {'BOOL': True})
+        self.assertEqual(decode_item(encoded), item)
+    
+    def test_numbers_decode_to_int_when_integral(self):
+        """Test that integral numbers decode to int and others to Decimal"""
+        self.assertIs(type(decode_value({'N': '42'})), int)
+        self.assertEqual(decode_value({'N': '0.25'}), Decimal('0.25'))
+        self.assertEqual(decode_value({'N': '1E+3'}), Decimal('1E+3'))
+    
+    def test_unsupported_types_raise(self):
+        """Test that types outside the PillBuddy codec are rejected"""
+        with self.assertRaises(TypeError):
+            encode_value({'a', 'b'})
+        with self.assertRaises(TypeError):
+            decode_value({'B': b'abc'})
+
+
+class TestFastTable(unittest.TestCase):
+    """Test cases for FastTable and FastDynamoDB"""
+    
+    def setUp(self):
+        self.client = MagicMock()
+        self.dynamodb = FastDynamoDB(self.client)
+        self.prescriptions = self.dynamodb.table('prescriptions', PRESCRIPTIONS_KEY_SCHEMA)
+    
+    def test_key_template_encodes_without_inference(self):
+        """Test that keys are encoded from the precompiled schema"""
+        template = KeyTemplate(PRESCRIPTIONS_KEY_SCHEMA)
+        
+        self.assertEqual(
+            template.encode({'device_id': 'esp32_001', 'slot': 2}),
+            {'device_id': {'S': 'esp32_001'}, 'slot': {'N': '2'}}
+        )
+    
+    def test_get_item_resource_compatible(self):
+        """Test that get_item takes plain keys and returns a plain Item"""
+        self.client.get_item.return_value = {
+            'Item': {'device_id': {'S': 'esp32_001'}, 'slot': {'N': '1'}, 'pill_count': {'N': '9'}}
+        }
+        
+        response = self.prescriptions.get_item(Key={'device_id': 'esp32_001', 'slot': 1})
+        
+        self.assertEqual(response['Item'], {'device_id': 'esp32_001', 'slot': 1, 'pill_count': 9})
+        self.client.get_item.assert_called_once_with(
+            TableName='prescriptions',
+            Key={'device_id': {'S': 'esp32_001'}, 'slot': {'N': '1'}}
+        )
+    
+    def test_update_item_encodes_values(self):
+        """Test that update_item passes expressions through and encodes values"""
+        self.client.update_item.return_value = {}
+        
+        self.prescriptions.update_item(
+            Key={'device_id': 'esp32_001', 'slot': 1},
+            UpdateExpression='SET removal_timestamp = :null, updated_at = :timestamp',
+            ExpressionAttributeValues={':null': None, ':timestamp': 1700000000000}
+        )
+        
+        params = self.client.update_item.call_args[1]
+        self.assertEqual(params['UpdateExpression'], 'SET removal_timestamp = :null, updated_at = :timestamp')
+        self.assertEqual(params['ExpressionAttributeValues'], {':null': {'NULL': True}, ':timestamp': {'N': '1700000000000'}})
+    
+    def test_query_decodes_items_and_last_key(self):
+        """Test that query responses decode Items and LastEvaluatedKey"""
+        self.client.query.return_value = {
+            'Items': [{'device_id': {'S': 'esp32_001'}, 'slot': {'N': '3'}}],
+            'Count': 1,
+            'LastEvaluatedKey': {'device_id': {'S': 'esp32_001'}, 'slot': {'N': '3'}}
+        }
+        
+        response = self.prescriptions.query(
+            KeyConditionExpression='device_id = :device_id',
+            ExpressionAttributeValues={':device_id': 'esp32_001'}
+        )
+        
+        self.assertEqual(response['Items'], [{'device_id': 'esp32_001', 'slot': 3}])
+        self.assertEqual(response['LastEvaluatedKey'], {'device_id': 'esp32_001', 'slot': 3})
+        self.assertEqual(response['Count'], 1)
+    
+    def test_batch_get_item_round_trip(self):
+        """Test that batch_get_item encodes keys and decodes responses and unprocessed keys"""
+        self.dynamodb.table('devices', DEVICES_KEY_SCHEMA)
+        self.client.batch_get_item.return_value = {
+            'Responses': {'devices': [{'device_id': {'S': 'esp32_001'}, 'online': {'BOOL': True}}]},
+            'UnprocessedKeys': {'prescriptions': {'Keys': [{'device_id': {'S': 'esp32_001'}, 'slot': {'N': '1'}}]}}
+        }
+        
+        response = self.dynamodb.batch_get_item(RequestItems={
+            'devices': {'Keys': [{'device_id': 'esp32_001'}]},
+            'prescriptions': {'Keys': [{'device_id': 'esp32_001', 'slot': 1}]}
+        })
+        
+        request_items = self.client.batch_get_item.call_args[1]['RequestItems']
+        self.assertEqual(request_items['prescriptions']['Keys'], [{'device_id': {'S': 'esp32_001'}, 'slot': {'N': '1'}}])
+        self.assertEqual(response['Responses']['devices'], [{'device_id': 'esp32_001', 'online': True}])
+        self.assertEqual(response['UnprocessedKeys']['prescriptions']['Keys'], [{'device_id': 'esp32_001', 'slot': 1}])
+
+
+if __name__ == '__main__':
+    unittest.main()
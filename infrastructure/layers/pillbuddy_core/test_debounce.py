@@ -0,0 +1,99 @@
+"""
+Unit tests for the PillBuddy sensor debounce
+"""
+
+import unittest
+import sys
+import os
+
+# Add the layer's python/ directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python'))
+
+from pillbuddy_core.debounce import SlotDebouncer, is_bounce, debounce_condition
+
+
+class TestIsBounce(unittest.TestCase):
+    """Test cases for is_bounce()"""
+
+    def test_removal_within_window(self):
+        """Test that any removal inside the window is a bounce"""
+        self.assertTrue(is_bounce(True, 1000, False, 2500, 2000))
+        self.assertTrue(is_bounce(False, 1000, False, 2500, 2000))
+        self.assertFalse(is_bounce(True, 1000, False, 3000, 2000))
+
+    def test_return_only_bounces_when_repeated(self):
+        """Test that a return changing the state is always applied"""
+        self.assertFalse(is_bounce(False, 1000, True, 1500, 2000))
+        self.assertTrue(is_bounce(True, 1000, True, 1500, 2000))
+
+
+class TestSlotDebouncer(unittest.TestCase):
+    """Test cases for SlotDebouncer"""
+
+    def test_wobble_collapses(self):
+        """Test removed/returned/removed/returned within a wobble"""
+        debouncer = SlotDebouncer(window_ms=2000)
+        applied = []
+        for in_holder, timestamp in ((False, 0), (True, 600), (False, 900), (True, 40000)):
+            if not debouncer.is_bounce('esp32_001', 1, in_holder, timestamp):
+                debouncer.accept('esp32_001', 1, in_holder, timestamp)
+                applied.append((in_holder, timestamp))
+
+        self.assertEqual(applied, [(False, 0), (True, 600), (True, 40000)])
+
+    def test_slots_are_independent(self):
+        """Test that the window is per device and slot"""
+        debouncer = SlotDebouncer(window_ms=2000)
+        debouncer.accept('esp32_001', 1, False, 0)
+
+        self.assertFalse(debouncer.is_bounce('esp32_001', 2, False, 100))
+        self.assertFalse(debouncer.is_bounce('esp32_002', 1, False, 100))
+
+    def test_disabled(self):
+        """Test that a zero window never debounces or adds a condition"""
+        debouncer = SlotDebouncer(window_ms=0)
+        debouncer.accept('esp32_001', 1, False, 0)
+
+        self.assertFalse(debouncer.is_bounce('esp32_001', 1, False, 0))
+        self.assertIsNone(debouncer.condition_values(False, 0))
+        self.assertFalse(debouncer.is_wobble(0, 100))
+
+    def test_wobble_is_a_return_within_the_window(self):
+        """Test that only a return inside the window after the removal is a wobble"""
+        debouncer = SlotDebouncer(window_ms=2000)
+
+        self.assertTrue(debouncer.is_wobble(1000, 2999))
+        self.assertFalse(debouncer.is_wobble(1000, 3000))
+        self.assertFalse(debouncer.is_wobble(1000, 900))
+        self.assertFalse(debouncer.is_wobble(None, 1000))
+
+    def test_bounded_memory(self):
+        """Test that the least recently accepted slots are forgotten"""
+        debouncer = SlotDebouncer(window_ms=2000, max_slots=2)
+        for device in range(3):
+            debouncer.accept(f"esp32_{device:03d}", 1, False, 0)
+
+        self.assertFalse(debouncer.is_bounce('esp32_000', 1, False, 100))
+        self.assertTrue(debouncer.is_bounce('esp32_002', 1, False, 100))
+
+
+class TestDebounceCondition(unittest.TestCase):
+    """Test cases for the conditional-write backstop"""
+
+    def test_condition_by_direction(self):
+        """Test that only returns may change state inside the window"""
+        self.assertNotIn('in_holder', debounce_condition(False))
+        self.assertIn('slots.#slot.in_holder <> :in_holder', debounce_condition(True))
+        self.assertEqual(SlotDebouncer(2000).condition_values(True, 5000),
+                         {':in_holder': True, ':debounce_before': 3000})
+
+    def test_per_slot_placeholders(self):
+        """Test that a multi-slot update gets separate placeholders per slot"""
+        self.assertIn('slots.#slot2.in_holder <> :in_holder2', debounce_condition(True, '2'))
+        self.assertIn('<= :debounce_before2', debounce_condition(False, '2'))
+        self.assertEqual(SlotDebouncer(2000).condition_values(False, 5000, '3'),
+                         {':in_holder3': False, ':debounce_before3': 3000})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+"""
+Unit tests for PillBuddy user-to-device resolution
+"""
+
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+
+# Add the layer's python/ directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python'))
+
+from pillbuddy_core.device_resolver import DeviceResolver
+
+
+class TestDeviceResolver(unittest.TestCase):
+    """Test cases for DeviceResolver"""
+    
+    def setUp(self):
+        self.table = MagicMock()
+        self.table.get_item.return_value = {
+            'Item': {'user_id': 'amzn1.user', 'device_ids': ['esp32_001', 'esp32_002']}
+        }
+        self.resolver = DeviceResolver(self.table)
+    
+    def test_resolves_primary_device(self):
+        """Test that the first linked device is the primary device"""
+        self.assertEqual(self.resolver.resolve_device_id('amzn1.user', default='x'), 'esp32_001')
+        self.assertEqual(self.resolver.resolve_device_ids('amzn1.user'), ['esp32_001', 'esp32_002'])
+    
+    def test_warm_lookup_is_cached(self):
+        """Test that repeated lookups don't hit DynamoDB"""
+        for _ in range(5):
+            self.resolver.resolve_device_id('amzn1.user', default='x')
+        
+        self.table.get_item.assert_called_once()
+        self.assertEqual(self.resolver.hits, 4)
+        self.assertEqual(self.resolver.misses, 1)
+    
+    def test_negative_result_is_cached(self):
+        """Test that users without a mapping are cached and fall back to default"""
+        self.table.get_item.return_value = {}
+        
+        self.assertEqual(self.resolver.resolve_device_id('unlinked', default='unlinked'), 'unlinked')
+        self.assertEqual(self.resolver.resolve_device_id('unlinked', default='unlinked'), 'unlinked')
+        
+        self.table.get_item.assert_called_once()
+    
+    def test_expired_entry_is_reloaded(self):
+        """Test that entries are reloaded after their TTL"""
+        with patch('pillbuddy_core.device_resolver.time.monotonic', return_value=1000.0):
+            self.resolver.resolve_device_ids('amzn1.user')
+        with patch('pillbuddy_core.device_resolver.time.monotonic', return_value=1000.0 + self.resolver.positive_ttl + 1):
+            self.resolver.resolve_device_ids('amzn1.user')
+        
+        self.assertEqual(self.table.get_item.call_count, 2)
+    
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted at capacity"""
+        resolver = DeviceResolver(self.table, max_entries=2)
+        resolver.resolve_device_ids('a')
+        resolver.resolve_device_ids('b')
+        resolver.resolve_device_ids('a')
+        resolver.resolve_device_ids('c')
+        
+        self.assertIn('a', resolver._cache)
+        self.assertNotIn('b', resolver._cache)
+        self.assertIn('c', resolver._cache)
+    
+    def test_link_device_invalidates_negative_entry(self):
+        """Test that linking a device replaces a cached negative result"""
+        self.table.get_item.return_value = {}
+        self.assertEqual(self.resolver.resolve_device_ids('new_user'), [])
+        
+        self.resolver.link_device('new_user', 'esp32_009')
+        self.table.get_item.return_value = {'Item': {'device_ids': ['esp32_009']}}
+        
+        self.assertEqual(self.resolver.resolve_device_id('new_user', default='x'), 'esp32_009')
+        put_item = self.table.put_item.call_args[1]['Item']
+        self.assertEqual(put_item['device_ids'], ['esp32_009'])
+    
+    def test_lookup_errors_are_not_cached(self):
+        """Test that a failed lookup is retried on the next request"""
+        self.table.get_item.side_effect = [Exception('throttled'), {'Item': {'device_ids': ['esp32_001']}}]
+        
+        with self.assertRaises(Exception):
+            self.resolver.resolve_device_ids('amzn1.user')
+        self.assertEqual(self.resolver.resolve_device_ids('amzn1.user'), ['esp32_001'])
+    
+    def test_disabled_without_table(self):
+        """Test that no table means no mapping"""
+        resolver = DeviceResolver(None)
+        
+        self.assertEqual(resolver.resolve_device_id('amzn1.user', default='amzn1.user'), 'amzn1.user')
+
+
+if __name__ == '__main__':
+    unittest.main()
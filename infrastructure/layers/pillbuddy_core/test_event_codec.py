@@ -0,0 +1,88 @@
+"""
+Unit tests for the PillBuddy binary event encoding
+"""
+
+import unittest
+import base64
+import sys
+import os
+
+# Add the layer's python/ directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python'))
+
+from pillbuddy_core.event_codec import (
+    EVENT_STRUCT, decode_event, decode_forwarded_event, encode_event, is_forwarded_binary
+)
+
+RECEIVED_MS = 1792281600000
+
+
+class TestDecodeEvent(unittest.TestCase):
+    """Test cases for encode_event() and decode_event()"""
+
+    def test_state_change_round_trip(self):
+        """Test that a decoded state change has the JSON rule's shape"""
+        data = encode_event({'event_type': 'slot_state_changed', 'slot': 2, 'in_holder': False,
+                             'sequence': 7, 'ts_ms': RECEIVED_MS - 500})
+
+        self.assertEqual(len(data), EVENT_STRUCT.size)
+        self.assertEqual(decode_event(data, 'esp32_001', RECEIVED_MS), {
+            'device_id': 'esp32_001',
+            'event_type': 'slot_state_changed',
+            'slot': 2,
+            'in_holder': False,
+            'state': 'not_in_holder',
+            'sensor_level': 0,
+            'sequence': 7,
+            'ts_ms': RECEIVED_MS - 500,
+            'received_ms': RECEIVED_MS
+        })
+
+    def test_mask_events(self):
+        """Test that snapshots carry no changed_mask and uptime timestamps are replaced"""
+        swap = decode_event(encode_event({'event_type': 'slot_states_changed', 'changed_mask': 3,
+                                          'in_holder_mask': 2, 'ts_ms': 123456}), 'esp32_001', RECEIVED_MS)
+        snapshot = decode_event(encode_event({'event_type': 'slot_snapshot', 'in_holder_mask': 5}),
+                                'esp32_001', RECEIVED_MS)
+
+        self.assertEqual((swap['changed_mask'], swap['in_holder_mask'], swap['ts_ms']), (3, 2, RECEIVED_MS))
+        self.assertNotIn('changed_mask', snapshot)
+        self.assertEqual((snapshot['in_holder_mask'], snapshot['sequence']), (5, 0))
+
+    def test_invalid_payloads(self):
+        """Test that anything the JSON rule would drop raises ValueError"""
+        invalid = [
+            b'',
+            EVENT_STRUCT.pack(1, 1, 1, 0, 0) + b'\x00',
+            EVENT_STRUCT.pack(9, 1, 1, 0, 0),
+            EVENT_STRUCT.pack(1, 0, 1, 0, 0),
+            EVENT_STRUCT.pack(1, 4, 1, 0, 0),
+            EVENT_STRUCT.pack(1, 1, 2, 0, 0),
+            EVENT_STRUCT.pack(2, 0, 8, 0, 0),
+            EVENT_STRUCT.pack(3, 0, 1, 0, 0),
+            EVENT_STRUCT.pack(3, 8, 1, 0, 0),
+        ]
+
+        for data in invalid:
+            with self.assertRaises(ValueError, msg=data):
+                decode_event(data, 'esp32_001', RECEIVED_MS)
+
+
+class TestForwardedEvent(unittest.TestCase):
+    """Test cases for events forwarded by the binary rule"""
+
+    def test_decode_forwarded(self):
+        """Test base64 payloads and rejection of non-base64 ones"""
+        data = encode_event({'event_type': 'slot_state_changed', 'slot': 1, 'in_holder': True})
+        forwarded = {'device_id': 'esp32_001', 'payload_b64': base64.b64encode(data).decode(),
+                     'received_ms': RECEIVED_MS}
+
+        self.assertTrue(is_forwarded_binary(forwarded))
+        self.assertFalse(is_forwarded_binary({'device_id': 'esp32_001', 'event_type': 'slot_snapshot'}))
+        self.assertEqual(decode_forwarded_event(forwarded)['slot'], 1)
+        with self.assertRaises(ValueError):
+            decode_forwarded_event(dict(forwarded, payload_b64='not base64!'))
+
+
+if __name__ == '__main__':
+    unittest.main()
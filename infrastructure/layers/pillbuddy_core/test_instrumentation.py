@@ -0,0 +1,106 @@
+"""
+Unit tests for PillBuddy latency instrumentation
+"""
+
+import unittest
+import sys
+import os
+
+# Add the layer's python/ directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python'))
+
+from pillbuddy_core import instrumentation
+from pillbuddy_core.instrumentation import LatencyHistogram, track_request, timed, build_metric_records, flush_metrics
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    """Test cases for LatencyHistogram"""
+    
+    def test_empty_histogram_has_no_percentiles(self):
+        """Test that percentile returns None when nothing was recorded"""
+        self.assertIsNone(LatencyHistogram().percentile(50))
+    
+    def test_percentiles_within_bucket_error(self):
+        """Test that percentiles are accurate to within the bucket width"""
+        histogram = LatencyHistogram()
+        for value in range(1, 1001):
+            histogram.record(float(value))
+        
+        self.assertEqual(histogram.count, 1000)
+        self.assertAlmostEqual(histogram.percentile(50), 500, delta=500 * 0.05)
+        self.assertAlmostEqual(histogram.percentile(95), 950, delta=950 * 0.05)
+        self.assertAlmostEqual(histogram.percentile(99), 990, delta=990 * 0.05)
+    
+    def test_single_sample_is_exact(self):
+        """Test that a single sample is reported exactly via min/max clamping"""
+        histogram = LatencyHistogram()
+        histogram.record(42.0)
+        
+        self.assertEqual(histogram.percentile(50), 42.0)
+        self.assertEqual(histogram.percentile(99), 42.0)
+    
+    def test_zero_latency_sample(self):
+        """Test that sub-resolution samples land in the zero bucket"""
+        histogram = LatencyHistogram()
+        histogram.record(0.0)
+        
+        self.assertEqual(histogram.percentile(50), 0.0)
+
+
+class TestRequestTracking(unittest.TestCase):
+    """Test cases for track_request() and timed()"""
+    
+    def setUp(self):
+        instrumentation._histograms.clear()
+    
+    def test_stages_attributed_to_current_label(self):
+        """Test that nested timed() blocks are recorded under the request label"""
+        with track_request('SetupSlotIntent'):
+            with timed('dynamodb'):
+                pass
+            with timed('iot'):
+                pass
+        
+        self.assertEqual(instrumentation.get_histogram('SetupSlotIntent', 'total').count, 1)
+        self.assertEqual(instrumentation.get_histogram('SetupSlotIntent', 'dynamodb').count, 1)
+        self.assertEqual(instrumentation.get_histogram('SetupSlotIntent', 'iot').count, 1)
+        self.assertIsNone(instrumentation.get_histogram('QueryStatusIntent', 'total'))
+    
+    def test_total_recorded_when_handler_raises(self):
+        """Test that end-to-end time is recorded even if the handler fails"""
+        with self.assertRaises(ValueError):
+            with track_request('QueryStatusIntent'):
+                raise ValueError('boom')
+        
+        self.assertEqual(instrumentation.get_histogram('QueryStatusIntent', 'total').count, 1)
+    
+    def test_build_metric_records_emf_format(self):
+        """Test that flushed records follow the Embedded Metric Format"""
+        instrumentation.record('QueryStatusIntent', 'total', 12.0)
+        
+        records = build_metric_records('AlexaHandler')
+        
+        self.assertEqual(len(records), 1)
+        record = records[0]
+        self.assertEqual(record['Service'], 'AlexaHandler')
+        self.assertEqual(record['Label'], 'QueryStatusIntent')
+        self.assertEqual(record['Stage'], 'total')
+        self.assertEqual(record['p50'], 12.0)
+        self.assertEqual(record['count'], 1)
+        metric_names = [m['Name'] for m in record['_aws']['CloudWatchMetrics'][0]['Metrics']]
+        self.assertEqual(metric_names, ['p50', 'p95', 'p99', 'count'])
+    
+    def test_flush_respects_interval_and_resets(self):
+        """Test that flush is rate limited and clears histograms when it runs"""
+        instrumentation.record('QueryStatusIntent', 'total', 5.0)
+        instrumentation._last_flush = float('inf')
+        
+        self.assertEqual(flush_metrics('AlexaHandler'), 0)
+        self.assertIsNotNone(instrumentation.get_histogram('QueryStatusIntent', 'total'))
+        
+        self.assertEqual(flush_metrics('AlexaHandler', force=True), 1)
+        self.assertIsNone(instrumentation.get_histogram('QueryStatusIntent', 'total'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+"""
+Unit tests for the PillBuddy retry policy and circuit breaker
+"""
+
+import unittest
+import contextlib
+import io
+import sys
+import os
+
+# Add the layer's python/ directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python'))
+
+from pillbuddy_core.resilience import (
+    CLOSED, OPEN, HALF_OPEN, CircuitBreaker, CircuitOpenError, RetryPolicy,
+    build_resilience_metric_records, is_retryable, resilience_metrics
+)
+
+
+class ServiceError(Exception):
+    """Exception shaped like botocore's ClientError"""
+
+    def __init__(self, code, status=400):
+        self.response = {'Error': {'Code': code}, 'ResponseMetadata': {'HTTPStatusCode': status}}
+        super().__init__(code)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class FlakyCall:
+    """Fails with the given errors, then returns 'ok'"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+class TestRetryPolicy(unittest.TestCase):
+    """Test cases for RetryPolicy"""
+
+    def setUp(self):
+        self.sleeps = []
+        self.policy = RetryPolicy(max_attempts=3, base_delay_ms=100, max_delay_ms=150,
+                                  sleep=self.sleeps.append, rand=lambda: 0.5)
+        resilience_metrics.reset()
+
+    def test_retries_with_capped_jitter(self):
+        """Test that retryable errors are retried after jittered, capped delays"""
+        call = FlakyCall(ServiceError('ThrottlingException'), ServiceError('InternalError', 503))
+
+        self.assertEqual(self.policy.call(call), 'ok')
+        self.assertEqual(call.calls, 3)
+        self.assertEqual(self.sleeps, [0.05, 0.075])
+        self.assertEqual(resilience_metrics.retries, 2)
+
+    def test_gives_up(self):
+        """Test that the last error is raised once attempts run out, and others at once"""
+        with self.assertRaises(ServiceError):
+            self.policy.call(FlakyCall(*[ServiceError('ServiceUnavailableException')] * 3))
+
+        call = FlakyCall(ServiceError('ValidationException'))
+        with self.assertRaises(ServiceError):
+            self.policy.call(call)
+        self.assertEqual(call.calls, 1)
+
+    def test_is_retryable(self):
+        """Test throttling, 5xx and 429 against client errors"""
+        self.assertTrue(is_retryable(ServiceError('Throttling')))
+        self.assertTrue(is_retryable(ServiceError('ProvisionedThroughputExceededException')))
+        self.assertTrue(is_retryable(ServiceError('Anything', 502)))
+        self.assertTrue(is_retryable(ServiceError('Anything', 429)))
+        self.assertFalse(is_retryable(ServiceError('AccessDeniedException', 403)))
+        self.assertFalse(is_retryable(ValueError('bad payload')))
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test cases for CircuitBreaker"""
+
+    def setUp(self):
+        self.clock = Clock()
+        self.breaker = CircuitBreaker('iot-data', failure_threshold=2, reset_timeout_ms=1000, clock=self.clock)
+        self.policy = RetryPolicy(max_attempts=1, sleep=lambda seconds: None)
+        resilience_metrics.reset()
+
+    def fail(self):
+        with self.assertRaises(ServiceError):
+            self.policy.call(FlakyCall(ServiceError('ServiceUnavailableException')), breaker=self.breaker)
+
+    def test_opens_and_fails_fast(self):
+        """Test that consecutive failures open the breaker and calls are not made while open"""
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.fail()
+            self.fail()
+        self.assertEqual(self.breaker.state, OPEN)
+
+        call = FlakyCall()
+        with self.assertRaises(CircuitOpenError):
+            self.policy.call(call, breaker=self.breaker)
+        self.assertEqual(call.calls, 0)
+
+        [record] = build_resilience_metric_records('IoTEventProcessor', 1000)
+        self.assertEqual((record['breaker_opens'], record['short_circuited_calls']), (1, 1))
+
+    def test_half_open_trial(self):
+        """Test that after the reset timeout one trial call closes or reopens the breaker"""
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.fail()
+            self.fail()
+            self.clock.now = 1000
+            self.fail()
+        self.assertEqual(self.breaker.state, OPEN)
+
+        self.clock.now = 2000
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual((self.breaker.state, self.breaker.failures), (CLOSED, 0))
+
+    def test_success_resets_failures(self):
+        """Test that only failures in a row count"""
+        self.fail()
+        self.policy.call(FlakyCall(), breaker=self.breaker)
+        self.fail()
+        self.assertEqual(self.breaker.state, CLOSED)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+"""
+Unit tests for the PillBuddy round-trip latency trace
+"""
+
+import unittest
+import contextlib
+import io
+import json
+import sys
+import os
+
+# Add the layer's python/ directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python'))
+
+from pillbuddy_core import instrumentation
+from pillbuddy_core.round_trip import LABEL, LOG_KEY, hop_latencies, record_round_trip, start_trace
+
+RECEIVED_MS = 1792281600000
+
+
+class TestRoundTrip(unittest.TestCase):
+    """Test cases for the trace stamps and hop latencies"""
+
+    def test_start_trace(self):
+        """Test that a trace needs the broker and processor stamps"""
+        event = {'ts_ms': RECEIVED_MS - 150, 'received_ms': RECEIVED_MS, 'lambda_ms': RECEIVED_MS + 40}
+
+        self.assertEqual(start_trace(event), [RECEIVED_MS - 150, RECEIVED_MS, RECEIVED_MS + 40])
+        self.assertIsNone(start_trace({'ts_ms': RECEIVED_MS, 'lambda_ms': RECEIVED_MS}))
+
+    def test_hops(self):
+        """Test the per-hop gaps and that an unmeasured device hop is left out"""
+        trace = [RECEIVED_MS - 150, RECEIVED_MS, RECEIVED_MS + 40, RECEIVED_MS + 55]
+
+        self.assertEqual(hop_latencies(trace, RECEIVED_MS + 75), {
+            'device_to_iot': 150, 'iot_to_lambda': 40, 'lambda_to_commit': 15,
+            'commit_to_publish': 20, 'total': 225
+        })
+        self.assertNotIn('device_to_iot', hop_latencies([RECEIVED_MS] + trace[1:], RECEIVED_MS + 75))
+
+    def test_record_round_trip(self):
+        """Test that every hop is recorded in a histogram and logged once"""
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            record_round_trip('esp32_001', [RECEIVED_MS, RECEIVED_MS, RECEIVED_MS + 40, RECEIVED_MS + 55],
+                              RECEIVED_MS + 75)
+
+        logged = json.loads(output.getvalue())[LOG_KEY]
+        self.assertEqual((logged['device_id'], logged['total']), ('esp32_001', 75))
+        self.assertEqual(instrumentation.get_histogram(LABEL, 'iot_to_lambda').max, 40)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+"""
+Unit tests for the PillBuddy sequence tracking and reorder buffer
+"""
+
+import unittest
+import sys
+import os
+
+# Add the layer's python/ directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python'))
+
+from pillbuddy_core.sequencing import (
+    NEXT, GAP, LATE, DUPLICATE, MAX_TRACKED_MISSING, ReorderBuffer, SequenceMetrics,
+    build_sequence_metric_records, classify_sequence, sequence_metrics, sequence_update
+)
+
+
+class TestClassifySequence(unittest.TestCase):
+    """Test cases for classify_sequence()"""
+
+    def test_kinds(self):
+        """Test next, gap, late and duplicate sequences"""
+        stored = {'last_sequence': 10, 'missing_sequences': [7]}
+
+        self.assertEqual(classify_sequence({}, 1), NEXT)
+        self.assertEqual(classify_sequence(stored, 11), NEXT)
+        self.assertEqual(classify_sequence(stored, 14), GAP)
+        self.assertEqual(classify_sequence(stored, 7), LATE)
+        self.assertEqual(classify_sequence(stored, 10), DUPLICATE)
+        self.assertEqual(classify_sequence(stored, 8), DUPLICATE)
+
+
+class TestSequenceUpdate(unittest.TestCase):
+    """Test cases for sequence_update()"""
+
+    def test_next_expects_previous_sequence(self):
+        """Test that the common case needs no stored state"""
+        assignments, conditions, values = sequence_update(NEXT, 5, {})
+
+        self.assertEqual(assignments, ['last_sequence = :sequence'])
+        self.assertIn('last_sequence = :previous_sequence', conditions[0])
+        self.assertEqual(values, {':sequence': 5, ':previous_sequence': 4})
+
+    def test_gap_records_missing_sequences(self):
+        """Test that a gap adds the skipped sequences and counts the gap"""
+        assignments, conditions, values = sequence_update(GAP, 6, {'last_sequence': 3})
+
+        self.assertIn('sequence_gaps = if_not_exists(sequence_gaps, :zero) + :one', assignments)
+        self.assertIn('attribute_not_exists(missing_sequences)', conditions)
+        self.assertEqual(values[':missing'], [4, 5])
+        self.assertEqual(values[':stored_sequence'], 3)
+
+    def test_missing_list_is_bounded(self):
+        """Test that a long outage keeps only the newest missing sequences"""
+        _, conditions, values = sequence_update(GAP, 1000, {'last_sequence': 1, 'missing_sequences': [0]})
+
+        self.assertEqual(len(values[':missing']), MAX_TRACKED_MISSING)
+        self.assertEqual(values[':missing'][-1], 999)
+        self.assertIn('missing_sequences = :stored_missing', conditions)
+
+    def test_late_closes_gap(self):
+        """Test that a late sequence is removed from the missing list"""
+        assignments, _, values = sequence_update(LATE, 4, {'last_sequence': 6, 'missing_sequences': [4, 5]})
+
+        self.assertEqual(assignments, ['missing_sequences = :missing'])
+        self.assertEqual(values[':missing'], [5])
+
+    def test_duplicate_has_no_update(self):
+        """Test that duplicates are never written"""
+        with self.assertRaises(ValueError):
+            sequence_update(DUPLICATE, 4, {'last_sequence': 6})
+
+
+class TestSequenceMetrics(unittest.TestCase):
+    """Test cases for the sequence counters"""
+
+    def test_record_and_emit(self):
+        """Test gap sizes, late events and the reset after each EMF build"""
+        metrics = SequenceMetrics()
+        self.assertEqual(metrics.record(GAP, {'last_sequence': 3}, 6), 2)
+        self.assertEqual(metrics.record(LATE, {}, 4), 0)
+        self.assertEqual((metrics.gaps, metrics.missing, metrics.late), (1, 2, 1))
+
+        sequence_metrics.reset()
+        sequence_metrics.record(GAP, {'last_sequence': 1}, 3)
+        [record] = build_sequence_metric_records('IoTEventProcessor', 1000)
+        self.assertEqual(record['sequence_gaps'], 1)
+        self.assertEqual(record['missing_events'], 1)
+        self.assertEqual(build_sequence_metric_records('IoTEventProcessor', 2000), [])
+
+
+class TestReorderBuffer(unittest.TestCase):
+    """Test cases for ReorderBuffer"""
+
+    def test_releases_in_sequence_order(self):
+        """Test that an overtaken event is applied before its successors"""
+        buffer = ReorderBuffer(window_ms=2000)
+        released = []
+        for sequence in (1, 3, 2, 4):
+            released += buffer.add('esp32_001', sequence, 1000, sequence)
+        released += buffer.flush()
+
+        self.assertEqual(released, [1, 2, 3, 4])
+        self.assertEqual(buffer.reordered, 1)
+
+    def test_contiguous_events_are_not_held(self):
+        """Test that once a run is released, the next sequence passes straight through"""
+        buffer = ReorderBuffer(window_ms=2000)
+        buffer.add('esp32_001', 1, 1000, 1)
+        buffer.flush()
+
+        self.assertEqual(buffer.add('esp32_001', 2, 1000, 2), [2])
+
+    def test_devices_are_independent(self):
+        """Test that each device is ordered separately"""
+        buffer = ReorderBuffer(window_ms=2000)
+        for device_id, sequence in (('a', 2), ('b', 9), ('a', 1), ('b', 8)):
+            buffer.add(device_id, sequence, 1000, (device_id, sequence))
+
+        released = buffer.flush()
+        self.assertEqual([item for item in released if item[0] == 'a'], [('a', 1), ('a', 2)])
+        self.assertEqual([item for item in released if item[0] == 'b'], [('b', 8), ('b', 9)])
+
+    def test_bounded_by_size_and_window(self):
+        """Test that events are released when the device holds too many or waited too long"""
+        buffer = ReorderBuffer(window_ms=2000, max_events=2)
+        self.assertEqual(buffer.add('esp32_001', 5, 1000, 5), [])
+        self.assertEqual(buffer.add('esp32_001', 7, 1000, 7), [])
+        self.assertEqual(buffer.add('esp32_001', 9, 1000, 9), [5])
+
+        waiting = ReorderBuffer(window_ms=2000)
+        waiting.add('esp32_001', 5, 1000, 5)
+        self.assertEqual(waiting.add('esp32_001', 9, 3500, 9), [5])
+
+    def test_unsequenced_and_disabled(self):
+        """Test that events without a sequence, or with reordering off, keep arrival order"""
+        buffer = ReorderBuffer(window_ms=2000)
+        buffer.add('esp32_001', 3, 1000, 3)
+        self.assertEqual(buffer.add('esp32_001', 0, 1000, 'unsequenced'), [3, 'unsequenced'])
+
+        disabled = ReorderBuffer(window_ms=0)
+        self.assertEqual(disabled.add('esp32_001', 3, 1000, 3), [3])
+        self.assertEqual(disabled.add('esp32_001', 2, 1000, 2), [2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,641 @@
+#!/usr/bin/env python3
+"""
+PillBuddy Fleet Load-Test Harness
+
+Drives all three lambdas (IoT Event Processor, Timeout Checker, Alexa
+Handler) with a simulated fleet, against the in-memory AWS stand-ins in
+stand_ins.py. No AWS account or network access is needed.
+
+Workload model:
+    - Event payloads are built from the fixtures in
+      lambda/iot_event_processor/test_events.json, passed through the IoT
+      rule's projection (iot_rule_sql.apply_event_rule)
+    - Each device takes `doses_per_day` doses around fixed dose times
+      (08:00, 20:00, ...) with normally distributed jitter. Every dose removes
+      and returns each configured slot in turn
+    - Bottles stay out for a log-normal duration (median ~40 s). A fraction
+      are forgotten for 11-30 minutes, which triggers timeout reminders, and
+      a fraction flap (a quick returned/removed pair from a wobbling bottle)
+    - The Timeout Checker runs every 5 virtual minutes
+    - Each device's user asks Alexa for status `queries_per_day` times
+    - With --ota-reboot the whole fleet reboots within a few minutes of
+      03:00 each day, each device sending its startup slot snapshot
+
+Events are replayed in virtual-time order, as fast as the handlers run.
+Handler latency is in-process CPU time. --call-latency-ms adds a fixed
+per-AWS-call network cost so results approximate deployed latency.
+
+With --ingestion sqs, device events go through a queue instead of invoking
+the processor directly, and QueueConsumer delivers them in batches the way
+the SQS event source mapping does. --throttle-wcu caps every table's writes
+per virtual second to compare how each path copes with throttling.
+
+Usage:
+    cd infrastructure
+    python loadtest/fleet_harness.py --devices 1000 --days 1 [--json]
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import math
+import os
+import random
+import sys
+import time
+import types
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_ROOT = os.path.join(HERE, '..', 'lambda')
+
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+from stand_ins import LocalAWS, ClientError  # noqa: E402
+from iot_rule_sql import apply_event_rule  # noqa: E402
+from pillbuddy_core import timeutil  # noqa: E402
+
+# Table names match PillBuddyStack
+TABLE_NAMES = {
+    'DEVICES_TABLE': 'PillBuddy_Devices',
+    'PRESCRIPTIONS_TABLE': 'PillBuddy_Prescriptions',
+    'EVENTS_TABLE': 'PillBuddy_Events',
+    'USER_DEVICES_TABLE': 'PillBuddy_UserDevices',
+    'DAILY_DOSES_TABLE': 'PillBuddy_DailyDoses',
+    'CALL_LIMITS_TABLE': 'PillBuddy_CallLimits',
+}
+
+LAMBDA_ENVIRONMENT = dict(
+    TABLE_NAMES,
+    IOT_ENDPOINT='local-iot-endpoint',
+    CALL_USER_LAMBDA_ARN='arn:aws:lambda:us-east-1:000000000000:function:callUser',
+    METRICS_FLUSH_INTERVAL_SECONDS='3600',
+)
+
+EVENT_QUEUE_URL = 'https://sqs.us-east-1.amazonaws.com/000000000000/PillBuddy_Events'
+EVENT_DEAD_LETTER_URL = 'https://sqs.us-east-1.amazonaws.com/000000000000/PillBuddy_EventDeadLetters'
+
+DAY_MS = 24 * 60 * 60 * 1000
+MINUTE_MS = 60 * 1000
+SWEEP_INTERVAL_MS = 5 * MINUTE_MS
+
+# Virtual start time: midnight UTC, 2024-01-01
+START_MS = 1704067200000
+
+
+class VirtualClock:
+    """Replacement for the `time` module used by pillbuddy_core.timeutil, driven by the harness"""
+
+    def __init__(self) -> None:
+        self.now_ms = START_MS
+
+    def time(self) -> float:
+        return self.now_ms / 1000
+
+    def sleep(self, seconds: float) -> None:
+        self.now_ms += int(seconds * 1000)
+
+    def __getattr__(self, name: str) -> Any:
+        # perf_counter, monotonic, etc. stay real
+        return getattr(time, name)
+
+
+@contextlib.contextmanager
+def virtual_time(clock: VirtualClock) -> Iterator[None]:
+    """Point pillbuddy_core.timeutil, where handlers read the time, at a virtual clock"""
+    real_time = timeutil.time
+    timeutil.time = clock
+    try:
+        yield
+    finally:
+        timeutil.time = real_time
+
+
+class LambdaContext:
+    """Minimal Lambda context object"""
+
+    def __init__(self, function_name: str, timeout_ms: int = 30000) -> None:
+        self.function_name = function_name
+        self.timeout_ms = timeout_ms
+        self.aws_request_id = 'local'
+
+    def get_remaining_time_in_millis(self) -> int:
+        return self.timeout_ms
+
+
+def load_lambda(directory: str, module_name: str, aws: LocalAWS,
+                environment: Optional[Dict[str, str]] = None) -> types.ModuleType:
+    """
+    Import a lambda_function.py with boto3 pointed at the stand-ins
+
+    The module is loaded under a unique name so all three lambdas can live in
+    one process. sys.modules and os.environ are restored afterwards; the
+    lambda keeps the stand-in clients it created at import time.
+
+    Args:
+        directory: Lambda directory under infrastructure/lambda
+        module_name: Unique module name to register
+        aws: Stand-ins to hand out from boto3.client()
+        environment: Extra environment variables on top of LAMBDA_ENVIRONMENT
+
+    Returns:
+        The imported lambda module
+    """
+    path = os.path.abspath(os.path.join(LAMBDA_ROOT, directory))
+    fake_boto3 = types.ModuleType('boto3')
+    fake_boto3.client = aws.client
+    fake_boto3.resource = aws.resource
+    fake_boto3.session = types.SimpleNamespace(Config=lambda **kwargs: kwargs)
+
+    saved_modules = {name: sys.modules.get(name) for name in ('boto3', 'botocore', 'botocore.exceptions')}
+    saved_environ = dict(os.environ)
+    sys.modules['boto3'] = fake_boto3
+    try:
+        import botocore.exceptions  # noqa: F401
+    except ImportError:
+        fake_botocore = types.ModuleType('botocore')
+        fake_exceptions = types.ModuleType('botocore.exceptions')
+        fake_exceptions.ClientError = ClientError
+        fake_botocore.exceptions = fake_exceptions
+        sys.modules['botocore'] = fake_botocore
+        sys.modules['botocore.exceptions'] = fake_exceptions
+
+    os.environ.update(LAMBDA_ENVIRONMENT)
+    os.environ.update(environment or {})
+    sys.path.insert(0, path)
+    try:
+        spec = importlib.util.spec_from_file_location(module_name, os.path.join(path, 'lambda_function.py'))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+        return module
+    finally:
+        sys.path.remove(path)
+        os.environ.clear()
+        os.environ.update(saved_environ)
+        for name, saved in saved_modules.items():
+            if saved is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = saved
+
+
+def load_fixtures() -> Dict[str, Dict[str, Any]]:
+    """Load the raw ESP32 event fixtures, keyed by name"""
+    with open(os.path.join(LAMBDA_ROOT, 'iot_event_processor', 'test_events.json')) as f:
+        fixtures = json.load(f)
+    return {name: event for name, event in fixtures.items() if not name.startswith('_')}
+
+
+def seed_fleet(aws: LocalAWS, devices: int, slots_per_device: int, pill_count: int) -> List[str]:
+    """
+    Create tables and seed devices, prescriptions and user mappings
+
+    Returns:
+        List of device_ids
+    """
+    dynamodb = aws.dynamodb
+    dynamodb.create_table(TABLE_NAMES['DEVICES_TABLE'], 'device_id')
+    dynamodb.create_table(TABLE_NAMES['PRESCRIPTIONS_TABLE'], 'device_id', 'slot')
+    dynamodb.create_table(TABLE_NAMES['EVENTS_TABLE'], 'device_id', 'timestamp')
+    dynamodb.create_table(TABLE_NAMES['USER_DEVICES_TABLE'], 'user_id')
+    dynamodb.create_table(TABLE_NAMES['DAILY_DOSES_TABLE'], 'device_id', 'day')
+    dynamodb.create_table(TABLE_NAMES['CALL_LIMITS_TABLE'], 'limit_key')
+
+    device_ids = []
+    for index in range(devices):
+        device_id = f"pillbuddy-esp32-{index + 1:05d}"
+        device_ids.append(device_id)
+        dynamodb.seed(TABLE_NAMES['DEVICES_TABLE'], {
+            'device_id': device_id,
+            'online': True,
+            'last_seen': START_MS,
+            'created_at': START_MS,
+            'slots': {
+                str(slot): {'in_holder': True, 'last_state_change': START_MS} for slot in (1, 2, 3)
+            }
+        })
+        for slot in range(1, slots_per_device + 1):
+            dynamodb.seed(TABLE_NAMES['PRESCRIPTIONS_TABLE'], {
+                'device_id': device_id,
+                'slot': slot,
+                'prescription_name': f"Medication {slot}",
+                'pill_count': pill_count,
+                'initial_count': pill_count,
+                'has_refills': True,
+                'created_at': START_MS,
+                'updated_at': START_MS,
+                'removal_timestamp': None
+            })
+        dynamodb.seed(TABLE_NAMES['USER_DEVICES_TABLE'], {
+            'user_id': f"amzn1.ask.account.{device_id}",
+            'device_ids': [device_id],
+            'linked_at': START_MS
+        })
+    return device_ids
+
+
+def build_workload(device_ids: List[str], fixtures: Dict[str, Dict[str, Any]], args: argparse.Namespace,
+                   rng: random.Random) -> List[Tuple[int, int, str, Dict[str, Any]]]:
+    """
+    Generate the virtual-time ordered list of (ts_ms, order, kind, payload)
+
+    kind is 'iot' for device events, 'alexa' for voice queries and 'sweep'
+    for Timeout Checker runs.
+    """
+    dose_hours = [8 + i * (12 / max(1, args.doses_per_day - 1)) for i in range(args.doses_per_day)] \
+        if args.doses_per_day > 1 else [8.0]
+    workload = []
+    order = 0
+
+    def add(ts_ms: int, kind: str, payload: Dict[str, Any]) -> None:
+        nonlocal order
+        workload.append((ts_ms, order, kind, payload))
+        order += 1
+
+    def device_event(device_id: str, slot: int, in_holder: bool, ts_ms: int) -> Dict[str, Any]:
+        fixture = fixtures[f"bottle_{'returned' if in_holder else 'removed'}_slot{slot}"]
+        return apply_event_rule(fixture, f"pillbuddy/events/{device_id}", received_ms=ts_ms)
+
+    # Every configured bottle is in its holder at 03:00
+    snapshot = dict(fixtures['startup_snapshot'], in_holder_mask=(1 << args.slots) - 1)
+
+    for device_id in device_ids:
+        for day in range(args.days):
+            if args.ota_reboot:
+                ts = START_MS + day * DAY_MS + 3 * 60 * MINUTE_MS + int(rng.uniform(0, 5) * MINUTE_MS)
+                add(ts, 'iot', apply_event_rule(snapshot, f"pillbuddy/events/{device_id}", received_ms=ts))
+
+            day_start = START_MS + day * DAY_MS
+            for dose_hour in dose_hours:
+                ts = day_start + int(rng.gauss(dose_hour * 60, args.dose_jitter_minutes) * MINUTE_MS)
+                for slot in range(1, args.slots + 1):
+                    ts += int(rng.uniform(5, 30) * 1000)
+                    add(ts, 'iot', device_event(device_id, slot, False, ts))
+
+                    if rng.random() < args.forget_rate:
+                        out_ms = int(rng.uniform(11, 30) * MINUTE_MS)
+                    else:
+                        out_ms = int(min(rng.lognormvariate(math.log(40), 0.6), 600) * 1000)
+
+                    if rng.random() < args.flap_rate:
+                        flap_ts = ts + int(rng.uniform(0.2, 1.5) * 1000)
+                        add(flap_ts, 'iot', device_event(device_id, slot, True, flap_ts))
+                        add(flap_ts + 300, 'iot', device_event(device_id, slot, False, flap_ts + 300))
+
+                    ts += out_ms
+                    add(ts, 'iot', device_event(device_id, slot, True, ts))
+
+            for _ in range(args.queries_per_day):
+                ts = day_start + int(rng.uniform(7, 22) * 60 * MINUTE_MS)
+                add(ts, 'alexa', {
+                    'version': '1.0',
+                    'session': {'user': {'userId': f"amzn1.ask.account.{device_id}"}, 'attributes': {}},
+                    'context': {'System': {'device': {'supportedInterfaces': {}}}},
+                    'request': {'type': 'IntentRequest', 'intent': {'name': 'QueryStatusIntent', 'slots': {}}}
+                })
+
+    for sweep in range(0, args.days * DAY_MS, SWEEP_INTERVAL_MS):
+        add(START_MS + sweep, 'sweep', {'source': 'aws.events', 'detail-type': 'Scheduled Event'})
+
+    workload.sort()
+    return workload
+
+
+class QueueConsumer:
+    """
+    SQS event source mapping in front of the IoT Event Processor
+
+    A batch is delivered as soon as batch_size messages are visible, or when
+    the oldest visible message has waited batch_window_ms. Messages the
+    handler reports in batchItemFailures are left on the queue and come back
+    after the visibility timeout; the rest are deleted. Settings match
+    iot_rule_config.py.
+    """
+
+    def __init__(self, aws: LocalAWS, batch_size: int, batch_window_ms: int,
+                 visibility_timeout_seconds: int = 180, max_receive_count: int = 5) -> None:
+        self.sqs = aws.sqs
+        self.batch_size = batch_size
+        self.batch_window_ms = batch_window_ms
+        self.visibility_timeout_seconds = visibility_timeout_seconds
+        self.sqs.set_redrive_policy(EVENT_QUEUE_URL, EVENT_DEAD_LETTER_URL, max_receive_count)
+        self.batches = 0
+        self.delivered = 0
+        self.retried = 0
+
+    def send(self, event: Dict[str, Any]) -> None:
+        """IoT rule SQS action"""
+        self.sqs.send_message(QueueUrl=EVENT_QUEUE_URL, MessageBody=json.dumps(event))
+
+    def next_delivery_ms(self) -> Optional[int]:
+        """Virtual time of the next batch, or None while the queue is empty"""
+        queued = self.sqs.queues[EVENT_QUEUE_URL]
+        if not queued:
+            return None
+        if len(self.sqs.visible_messages(EVENT_QUEUE_URL)) >= self.batch_size:
+            return self.sqs.clock_ms
+        return min(max(m['VisibleAt'], m['SentTimestamp'] + self.batch_window_ms) for m in queued)
+
+    def receive_batch(self) -> List[Dict[str, Any]]:
+        messages = self.sqs.receive_message(
+            QueueUrl=EVENT_QUEUE_URL,
+            MaxNumberOfMessages=self.batch_size,
+            VisibilityTimeout=self.visibility_timeout_seconds
+        ).get('Messages', [])
+        return [{
+            'messageId': m['MessageId'],
+            'receiptHandle': m['ReceiptHandle'],
+            'body': m['Body'],
+            'attributes': m['Attributes'],
+            'eventSource': 'aws:sqs',
+            'eventSourceARN': 'arn:aws:sqs:us-east-1:000000000000:PillBuddy_Events',
+        } for m in messages]
+
+    def complete(self, records: List[Dict[str, Any]], result: Any) -> None:
+        """Delete the records the handler did not report as failed"""
+        if isinstance(result, dict) and 'batchItemFailures' in result:
+            failed = {failure['itemIdentifier'] for failure in result['batchItemFailures']}
+        else:
+            # Anything but a partial batch response fails the whole batch
+            failed = {record['messageId'] for record in records}
+        for record in records:
+            if record['messageId'] not in failed:
+                self.sqs.delete_message(QueueUrl=EVENT_QUEUE_URL, ReceiptHandle=record['receiptHandle'])
+        self.batches += 1
+        self.delivered += len(records)
+        self.retried += len(failed)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'batches': self.batches,
+            'mean_batch_size': round(self.delivered / self.batches, 2) if self.batches else 0,
+            'retried_messages': self.retried,
+            'dead_lettered': len(self.sqs.queues[EVENT_DEAD_LETTER_URL]),
+        }
+
+
+def is_error(result: Any) -> bool:
+    """Whether a handler result is an error (HTTP-style status, failed batch items or Alexa apology)"""
+    if not isinstance(result, dict):
+        return False
+    if result.get('batchItemFailures'):
+        return True
+    if result.get('statusCode', 200) >= 400:
+        return True
+    speech = result.get('response', {}).get('outputSpeech', {}).get('text', '')
+    return speech.startswith('Sorry')
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(len(ordered) * pct / 100) - 1))
+    return ordered[index]
+
+
+class HandlerStats:
+    """Per-lambda latency and cost accumulator"""
+
+    def __init__(self) -> None:
+        self.latencies_ms: List[float] = []
+        self.dynamodb_calls = 0
+        self.read_units = 0.0
+        self.write_units = 0.0
+        self.errors = 0
+
+    def summary(self, call_latency_ms: float) -> Dict[str, Any]:
+        count = len(self.latencies_ms)
+        return {
+            'invocations': count,
+            'errors': self.errors,
+            'p50_ms': round(percentile(self.latencies_ms, 50), 3),
+            'p99_ms': round(percentile(self.latencies_ms, 99), 3),
+            'dynamodb_calls_per_invocation': round(self.dynamodb_calls / count, 3) if count else 0,
+            'rcu_per_invocation': round(self.read_units / count, 3) if count else 0,
+            'wcu_per_invocation': round(self.write_units / count, 3) if count else 0,
+            'p50_ms_with_network': round(
+                percentile(self.latencies_ms, 50) + call_latency_ms * (self.dynamodb_calls / count if count else 0), 3
+            ),
+        }
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Run the load test and return the report dictionary
+    """
+    rng = random.Random(args.seed)
+    aws = LocalAWS()
+    device_ids = seed_fleet(aws, args.devices, args.slots, args.pill_count)
+
+    environment = {'CACHE_BACKEND': args.cache_backend}
+    processor = load_lambda('iot_event_processor', 'pillbuddy_iot_event_processor', aws, environment)
+    checker = load_lambda('timeout_checker', 'pillbuddy_timeout_checker', aws, environment)
+    alexa = load_lambda('alexa_handler', 'pillbuddy_alexa_handler', aws, environment)
+
+    clock = VirtualClock()
+
+    handlers: Dict[str, Tuple[Callable, Any]] = {
+        'iot': (processor.lambda_handler, LambdaContext('PillBuddy_IoTEventProcessor')),
+        'sweep': (checker.lambda_handler, LambdaContext('PillBuddy_TimeoutChecker')),
+        'alexa': (alexa.lambda_handler, LambdaContext('PillBuddy_AlexaHandler', 10000)),
+    }
+    stats = {kind: HandlerStats() for kind in handlers}
+
+    workload = build_workload(device_ids, load_fixtures(), args, rng)
+    dynamodb = aws.dynamodb
+    if args.throttle_wcu:
+        dynamodb.throttle_limits = {name: {'write': args.throttle_wcu} for name in dynamodb.tables}
+    consumer = None
+    if args.ingestion == 'sqs':
+        consumer = QueueConsumer(aws, args.batch_size, int(args.batch_window_seconds * 1000))
+    sink = io.StringIO()
+
+    def invoke(kind: str, payload: Dict[str, Any], ts_ms: int) -> Any:
+        clock.now_ms = ts_ms
+        dynamodb.clock_ms = ts_ms
+        aws.sqs.clock_ms = ts_ms
+        handler, context = handlers[kind]
+        calls_before = dynamodb.total_calls()
+        consumed_before = dynamodb.total_consumed()
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(sink):
+            result = handler(payload, context)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        consumed_after = dynamodb.total_consumed()
+        handler_stats = stats[kind]
+        handler_stats.latencies_ms.append(elapsed_ms)
+        handler_stats.dynamodb_calls += dynamodb.total_calls() - calls_before
+        handler_stats.read_units += consumed_after['read'] - consumed_before['read']
+        handler_stats.write_units += consumed_after['write'] - consumed_before['write']
+        if is_error(result):
+            handler_stats.errors += 1
+
+        # Drop captured logs so memory stays flat on long runs
+        sink.seek(0)
+        sink.truncate()
+        return result
+
+    def deliver_batches(until_ms: Optional[int]) -> None:
+        """Invoke the processor for every batch due by until_ms (None drains the queue)"""
+        while True:
+            due_ms = consumer.next_delivery_ms()
+            if due_ms is None or (until_ms is not None and due_ms > until_ms):
+                return
+            aws.sqs.clock_ms = max(due_ms, aws.sqs.clock_ms)
+            records = consumer.receive_batch()
+            if records:
+                consumer.complete(records, invoke('iot', {'Records': records}, aws.sqs.clock_ms))
+
+    with virtual_time(clock):
+        wall_start = time.perf_counter()
+        for ts_ms, _, kind, payload in workload:
+            if consumer:
+                deliver_batches(ts_ms)
+                if kind == 'iot':
+                    aws.sqs.clock_ms = ts_ms
+                    consumer.send(payload)
+                    deliver_batches(ts_ms)
+                    continue
+            invoke(kind, payload, ts_ms)
+        if consumer:
+            deliver_batches(None)
+        wall_seconds = time.perf_counter() - wall_start
+
+    invocations = sum(len(handler_stats.latencies_ms) for handler_stats in stats.values())
+    device_events = consumer.delivered if consumer else None
+    report = build_report(args, aws, stats, invocations, wall_seconds, device_events)
+    report['debounced_events'] = processor.debouncer.debounced
+    if consumer:
+        report['ingestion'] = consumer.summary()
+    report['cache_hit_ratio'] = {
+        f"{name}/{table.table_name}": round(table.hit_ratio, 3) if table.hit_ratio is not None else None
+        for name, module in (('iot_event_processor', processor), ('alexa_handler', alexa))
+        for table in (module.devices_table, module.prescriptions_table)
+    }
+    return report
+
+
+def build_report(args: argparse.Namespace, aws: LocalAWS, stats: Dict[str, HandlerStats],
+                 total_invocations: int, wall_seconds: float, device_events: Optional[int] = None) -> Dict[str, Any]:
+    dynamodb = aws.dynamodb
+    peaks: Dict[str, Dict[str, float]] = {}
+    for (table_name, _), consumed in dynamodb.per_second.items():
+        peak = peaks.setdefault(table_name, {'read': 0.0, 'write': 0.0})
+        peak['read'] = max(peak['read'], consumed['read'])
+        peak['write'] = max(peak['write'], consumed['write'])
+
+    if device_events is None:
+        device_events = len(stats['iot'].latencies_ms)
+    return {
+        'config': {
+            'devices': args.devices,
+            'days': args.days,
+            'doses_per_day': args.doses_per_day,
+            'slots': args.slots,
+            'queries_per_day': args.queries_per_day,
+            'cache_backend': args.cache_backend,
+            'ingestion': args.ingestion,
+            'throttle_wcu': args.throttle_wcu,
+            'seed': args.seed,
+        },
+        'invocations': total_invocations,
+        'wall_seconds': round(wall_seconds, 3),
+        'throughput_per_second': round(total_invocations / wall_seconds, 1) if wall_seconds else 0,
+        'handlers': {
+            'iot_event_processor': stats['iot'].summary(args.call_latency_ms),
+            'timeout_checker': stats['sweep'].summary(args.call_latency_ms),
+            'alexa_handler': stats['alexa'].summary(args.call_latency_ms),
+        },
+        'dynamodb': {
+            'calls': dict(dynamodb.calls),
+            'calls_per_device_event': round(stats['iot'].dynamodb_calls / device_events, 3) if device_events else 0,
+            'consumed': {name: dict(units) for name, units in dynamodb.consumed.items()},
+            'peak_per_second': peaks,
+            'throttled': dynamodb.throttled,
+        },
+        'events_logged': len(dynamodb.tables[TABLE_NAMES['EVENTS_TABLE']]),
+        'pills_remaining': sum(item.get('pill_count', 0)
+                               for item in dynamodb.tables[TABLE_NAMES['PRESCRIPTIONS_TABLE']].items()),
+        'iot_publishes': len(aws.iot_data.published),
+        'lambda_invocations': len(aws.lambda_.invocations),
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    config = report['config']
+    print(f"Fleet: {config['devices']} devices x {config['days']} day(s), "
+          f"{config['doses_per_day']} doses/day, {config['slots']} slots, "
+          f"{config['queries_per_day']} voice queries/day")
+    print(f"Invocations: {report['invocations']} in {report['wall_seconds']} s "
+          f"({report['throughput_per_second']}/s)")
+    print()
+    print(f"{'handler':<22}{'count':>8}{'p50 ms':>9}{'p99 ms':>9}{'ddb/inv':>9}{'RCU/inv':>9}{'WCU/inv':>9}")
+    for name, summary in report['handlers'].items():
+        print(f"{name:<22}{summary['invocations']:>8}{summary['p50_ms']:>9.3f}{summary['p99_ms']:>9.3f}"
+              f"{summary['dynamodb_calls_per_invocation']:>9.2f}{summary['rcu_per_invocation']:>9.2f}"
+              f"{summary['wcu_per_invocation']:>9.2f}")
+    print()
+    print(f"DynamoDB calls per device event: {report['dynamodb']['calls_per_device_event']}")
+    print(f"DynamoDB calls by operation: {report['dynamodb']['calls']}")
+    print(f"{'table':<26}{'RCU total':>11}{'WCU total':>11}{'peak RCU/s':>12}{'peak WCU/s':>12}")
+    for table_name, consumed in sorted(report['dynamodb']['consumed'].items()):
+        peak = report['dynamodb']['peak_per_second'].get(table_name, {'read': 0, 'write': 0})
+        print(f"{table_name:<26}{consumed['read']:>11.1f}{consumed['write']:>11.1f}"
+              f"{peak['read']:>12.1f}{peak['write']:>12.1f}")
+    print()
+    print(f"IoT publishes: {report['iot_publishes']}, callUser invocations: {report['lambda_invocations']}")
+    print(f"Cache hit ratio ({config['cache_backend']}): {report['cache_hit_ratio']}")
+    print(f"Events logged: {report['events_logged']}, debounced: {report['debounced_events']}, "
+          f"throttled DynamoDB requests: {report['dynamodb']['throttled']}")
+    print(f"Pills remaining across the fleet: {report['pills_remaining']}")
+    if 'ingestion' in report:
+        print(f"SQS ingestion: {report['ingestion']}")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='PillBuddy fleet load test against local AWS stand-ins')
+    parser.add_argument('--devices', type=int, default=100, help='Number of simulated devices')
+    parser.add_argument('--days', type=int, default=1, help='Virtual days to simulate')
+    parser.add_argument('--doses-per-day', type=int, default=2, help='Dose times per device per day')
+    parser.add_argument('--slots', type=int, default=3, choices=[1, 2, 3], help='Configured slots per device')
+    parser.add_argument('--queries-per-day', type=int, default=1, help='Alexa status queries per device per day')
+    parser.add_argument('--dose-jitter-minutes', type=float, default=20.0, help='Std-dev of dose time jitter')
+    parser.add_argument('--forget-rate', type=float, default=0.02, help='Fraction of bottles left out > 10 minutes')
+    parser.add_argument('--flap-rate', type=float, default=0.05, help='Fraction of removals with a sensor flap')
+    parser.add_argument('--ota-reboot', action='store_true',
+                        help='Reboot the fleet at 03:00 each day (startup slot snapshots)')
+    parser.add_argument('--pill-count', type=int, default=60, help='Initial pills per prescription')
+    parser.add_argument('--call-latency-ms', type=float, default=0.0,
+                        help='Network latency to add per DynamoDB call in the *_with_network figures')
+    parser.add_argument('--cache-backend', choices=['memory', 'none'], default='memory',
+                        help='CACHE_BACKEND for the lambdas')
+    parser.add_argument('--ingestion', choices=['direct', 'sqs'], default='direct',
+                        help='Invoke the processor per event, or in batches from a queue')
+    parser.add_argument('--batch-size', type=int, default=25, help='Queue batch size (--ingestion sqs)')
+    parser.add_argument('--batch-window-seconds', type=float, default=1.0,
+                        help='Longest a queued event waits for a batch to fill (--ingestion sqs)')
+    parser.add_argument('--throttle-wcu', type=float, default=0.0,
+                        help='Per-table write capacity per second; requests beyond it are throttled (0: no limit)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,949 @@
+"""
+Local AWS Stand-ins for PillBuddy Load Testing
+
+In-memory replacements for the low-level boto3 clients the PillBuddy
+lambdas create at import time:
+    - LocalDynamoDB: get/put/update/delete_item, query, scan, batch_get_item
+      and batch_write_item with a DynamoDB expression evaluator,
+      conditional writes and consumed-capacity accounting
+    - LocalIoTData: records publish() calls
+    - LocalLambda: records invoke() calls
+    - LocalCloudWatch: records put_metric_data() calls
+    - LocalS3: in-memory object store (put/get/list/delete objects)
+    - LocalSQS: standard queues with visibility timeouts and a redrive
+      policy (send/receive/delete messages)
+
+Items are stored as plain Python values and encoded/decoded at the API
+boundary with the same codec the lambdas use (ddb_client.py), so handlers
+see exactly the wire format the real client returns.
+
+Capacity accounting follows the DynamoDB rules: reads consume one RCU per
+4 KB (half for eventually consistent reads), writes one WCU per 1 KB of the
+larger of the old and new item. Consumption is bucketed per virtual second
+(see LocalDynamoDB.clock_ms) so peaks can be compared to provisioned capacity.
+"""
+
+import io
+import math
+import os
+import re
+import sys
+from collections import defaultdict
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'layers', 'pillbuddy_core', 'python'))
+
+from pillbuddy_core.ddb_client import encode_value, decode_item, encode_item  # noqa: E402
+
+try:
+    from botocore.exceptions import ClientError
+except ImportError:  # botocore is optional for local runs
+    class ClientError(Exception):
+        """Minimal stand-in for botocore.exceptions.ClientError"""
+
+        def __init__(self, error_response: Dict[str, Any], operation_name: str) -> None:
+            self.response = error_response
+            self.operation_name = operation_name
+            error = error_response.get('Error', {})
+            super().__init__(
+                f"An error occurred ({error.get('Code')}) when calling the "
+                f"{operation_name} operation: {error.get('Message')}"
+            )
+
+
+def client_error(code: str, message: str, operation_name: str) -> ClientError:
+    """Build a ClientError shaped like the ones botocore raises"""
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation_name)
+
+
+# --------------------------------------------------------------------------
+# Expression evaluation
+# --------------------------------------------------------------------------
+
+_MISSING = object()
+_NUMERIC = (int, float, Decimal)
+
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<cmp><>|<=|>=|=|<|>)
+      | (?P<punct>[(),.\[\]+\-])
+      | (?P<number>\d+)
+      | (?P<name>[#:]?[A-Za-z_][A-Za-z0-9_]*)
+    )""", re.VERBOSE)
+
+_KEYWORDS = {'SET', 'REMOVE', 'ADD', 'DELETE', 'AND', 'OR', 'NOT', 'BETWEEN', 'IN'}
+
+
+def _tokenize(expression: str) -> List[Tuple[str, str]]:
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _TOKEN_RE.match(expression, position)
+        if not match or match.end() == position:
+            raise ValueError(f"Invalid expression near: {expression[position:]!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'name' and value.upper() in _KEYWORDS:
+            kind, value = 'keyword', value.upper()
+        tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """
+    Recursive-descent parser for update, condition and key expressions
+
+    Produces small tuples that _Evaluator interprets:
+        ('path', [segments]), ('value', name), ('if_not_exists', path, operand),
+        ('list_append', a, b), ('+', a, b), ('-', a, b),
+        ('cmp', op, a, b), ('between', a, lo, hi), ('in', a, [operands]),
+        ('and', a, b), ('or', a, b), ('not', a), ('func', name, [args])
+    """
+
+    def __init__(self, expression: str, names: Optional[Dict[str, str]]) -> None:
+        self.tokens = _tokenize(expression)
+        self.position = 0
+        self.names = names or {}
+
+    def peek(self) -> Tuple[Optional[str], Optional[str]]:
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None, None
+
+    def take(self, expected_value: Optional[str] = None) -> Tuple[str, str]:
+        kind, value = self.peek()
+        if kind is None or (expected_value is not None and value != expected_value):
+            raise ValueError(f"Expected {expected_value!r}, got {value!r}")
+        self.position += 1
+        return kind, value
+
+    def at_end(self) -> bool:
+        return self.position >= len(self.tokens)
+
+    # Paths and operands
+
+    def path(self) -> Tuple:
+        kind, value = self.take()
+        if kind != 'name' or value.startswith(':'):
+            raise ValueError(f"Expected attribute path, got {value!r}")
+        segments = [self._resolve_name(value)]
+        while True:
+            _, next_value = self.peek()
+            if next_value == '.':
+                self.take('.')
+                segments.append(self._resolve_name(self.take()[1]))
+            elif next_value == '[':
+                self.take('[')
+                segments.append(int(self.take()[1]))
+                self.take(']')
+            else:
+                return ('path', segments)
+
+    def _resolve_name(self, name: str) -> str:
+        if name.startswith('#'):
+            if name not in self.names:
+                raise ValueError(f"Undefined attribute name placeholder {name}")
+            return self.names[name]
+        return name
+
+    def operand(self) -> Tuple:
+        left = self._term()
+        _, value = self.peek()
+        if value in ('+', '-'):
+            self.take()
+            return (value, left, self._term())
+        return left
+
+    def _term(self) -> Tuple:
+        kind, value = self.peek()
+        if kind == 'name' and value.startswith(':'):
+            self.take()
+            return ('value', value)
+        if kind == 'name' and value in ('if_not_exists', 'list_append', 'size'):
+            self.take()
+            self.take('(')
+            first = self.path() if value in ('if_not_exists', 'size') else self.operand()
+            if value == 'size':
+                self.take(')')
+                return ('func', 'size', [first])
+            self.take(',')
+            second = self.operand()
+            self.take(')')
+            return (value, first, second)
+        return self.path()
+
+    # Update expressions
+
+    def update(self) -> Dict[str, List]:
+        clauses = {'SET': [], 'REMOVE': [], 'ADD': [], 'DELETE': []}
+        while not self.at_end():
+            _, clause = self.take()
+            if clause not in clauses:
+                raise ValueError(f"Unknown update clause {clause!r}")
+            while True:
+                target = self.path()
+                if clause == 'SET':
+                    self.take('=')
+                    clauses[clause].append((target, self.operand()))
+                elif clause == 'REMOVE':
+                    clauses[clause].append((target, None))
+                else:
+                    clauses[clause].append((target, self._term()))
+                if self.peek()[1] == ',':
+                    self.take(',')
+                    continue
+                break
+        return clauses
+
+    # Condition expressions
+
+    def condition(self) -> Tuple:
+        node = self._and()
+        while self.peek()[1] == 'OR':
+            self.take()
+            node = ('or', node, self._and())
+        return node
+
+    def _and(self) -> Tuple:
+        node = self._not()
+        while self.peek()[1] == 'AND':
+            self.take()
+            node = ('and', node, self._not())
+        return node
+
+    def _not(self) -> Tuple:
+        if self.peek()[1] == 'NOT':
+            self.take()
+            return ('not', self._not())
+        return self._primary()
+
+    def _primary(self) -> Tuple:
+        kind, value = self.peek()
+        if value == '(':
+            self.take('(')
+            node = self.condition()
+            self.take(')')
+            return node
+        if kind == 'name' and value in ('attribute_exists', 'attribute_not_exists', 'begins_with', 'contains'):
+            self.take()
+            self.take('(')
+            args = [self.path()]
+            while self.peek()[1] == ',':
+                self.take(',')
+                args.append(self.operand())
+            self.take(')')
+            return ('func', value, args)
+
+        left = self.operand()
+        kind, value = self.peek()
+        if value == 'BETWEEN':
+            self.take()
+            low = self.operand()
+            self.take('AND')
+            return ('between', left, low, self.operand())
+        if value == 'IN':
+            self.take()
+            self.take('(')
+            options = [self.operand()]
+            while self.peek()[1] == ',':
+                self.take(',')
+                options.append(self.operand())
+            self.take(')')
+            return ('in', left, options)
+        if kind == 'cmp':
+            self.take()
+            return ('cmp', value, left, self.operand())
+        raise ValueError(f"Expected comparison, got {value!r}")
+
+
+def _get_path(item: Any, segments: List) -> Any:
+    current = item
+    for segment in segments:
+        if isinstance(segment, int):
+            if not isinstance(current, list) or segment >= len(current):
+                return _MISSING
+            current = current[segment]
+        else:
+            if not isinstance(current, dict) or segment not in current:
+                return _MISSING
+            current = current[segment]
+    return current
+
+
+def _set_path(item: Dict, segments: List, value: Any) -> None:
+    parent = _get_path(item, segments[:-1]) if len(segments) > 1 else item
+    if parent is _MISSING or not isinstance(parent, (dict, list)):
+        raise ValueError("The document path provided in the update expression is invalid for update")
+    last = segments[-1]
+    if isinstance(parent, list):
+        if last < len(parent):
+            parent[last] = value
+        else:
+            parent.append(value)
+    else:
+        parent[last] = value
+
+
+def _remove_path(item: Dict, segments: List) -> None:
+    parent = _get_path(item, segments[:-1]) if len(segments) > 1 else item
+    if isinstance(parent, dict):
+        parent.pop(segments[-1], None)
+    elif isinstance(parent, list) and segments[-1] < len(parent):
+        parent.pop(segments[-1])
+
+
+class _Evaluator:
+    """Evaluates parsed expressions against a plain Python item"""
+
+    def __init__(self, values: Optional[Dict[str, Any]]) -> None:
+        self.values = values or {}
+
+    def operand(self, item: Dict, node: Tuple) -> Any:
+        kind = node[0]
+        if kind == 'value':
+            if node[1] not in self.values:
+                raise ValueError(f"Undefined attribute value placeholder {node[1]}")
+            return self.values[node[1]]
+        if kind == 'path':
+            return _get_path(item, node[1])
+        if kind == 'if_not_exists':
+            existing = _get_path(item, node[1][1])
+            return self.operand(item, node[2]) if existing is _MISSING else existing
+        if kind == 'list_append':
+            return list(self.operand(item, node[1])) + list(self.operand(item, node[2]))
+        if kind in ('+', '-'):
+            left, right = self.operand(item, node[1]), self.operand(item, node[2])
+            if left is _MISSING or right is _MISSING:
+                raise ValueError("An operand in the update expression has an incorrect data type")
+            return left + right if kind == '+' else left - right
+        if kind == 'func' and node[1] == 'size':
+            value = self.operand(item, node[2][0])
+            return _MISSING if value is _MISSING else len(value)
+        raise ValueError(f"Unsupported operand {kind}")
+
+    def condition(self, item: Dict, node: Tuple) -> bool:
+        kind = node[0]
+        if kind == 'and':
+            return self.condition(item, node[1]) and self.condition(item, node[2])
+        if kind == 'or':
+            return self.condition(item, node[1]) or self.condition(item, node[2])
+        if kind == 'not':
+            return not self.condition(item, node[1])
+        if kind == 'func':
+            name, args = node[1], node[2]
+            value = self.operand(item, args[0])
+            if name == 'attribute_exists':
+                return value is not _MISSING
+            if name == 'attribute_not_exists':
+                return value is _MISSING
+            if value is _MISSING:
+                return False
+            other = self.operand(item, args[1])
+            if name == 'begins_with':
+                return isinstance(value, str) and value.startswith(other)
+            return other in value
+        if kind == 'between':
+            value, low, high = (self.operand(item, n) for n in node[1:])
+            return _MISSING not in (value, low, high) and _comparable(value, low) and low <= value <= high
+        if kind == 'in':
+            value = self.operand(item, node[1])
+            return value is not _MISSING and any(value == self.operand(item, n) for n in node[2])
+        if kind == 'cmp':
+            left, right = self.operand(item, node[2]), self.operand(item, node[3])
+            op = node[1]
+            if left is _MISSING or right is _MISSING:
+                return op == '<>' and not (left is _MISSING and right is _MISSING)
+            if op == '=':
+                return left == right
+            if op == '<>':
+                return left != right
+            if not _comparable(left, right):
+                return False
+            return {'<': left < right, '<=': left <= right, '>': left > right, '>=': left >= right}[op]
+        raise ValueError(f"Unsupported condition {kind}")
+
+    def update(self, item: Dict, clauses: Dict[str, List]) -> None:
+        # Evaluate all SET operands against the original item, as DynamoDB does
+        assignments = [(target, self.operand(item, operand)) for target, operand in clauses['SET']]
+        for target, value in assignments:
+            _set_path(item, target[1], value)
+        for target, _ in clauses['REMOVE']:
+            _remove_path(item, target[1])
+        for target, operand in clauses['ADD']:
+            increment = self.operand(item, operand)
+            existing = _get_path(item, target[1])
+            _set_path(item, target[1], increment if existing is _MISSING else existing + increment)
+
+
+def _comparable(left: Any, right: Any) -> bool:
+    if isinstance(left, bool) or isinstance(right, bool):
+        return False
+    if isinstance(left, str) and isinstance(right, str):
+        return True
+    return isinstance(left, _NUMERIC) and isinstance(right, _NUMERIC)
+
+
+def _decode_values(values: Optional[Dict[str, Dict]]) -> Dict[str, Any]:
+    return decode_item(values) if values else {}
+
+
+# --------------------------------------------------------------------------
+# Capacity accounting
+# --------------------------------------------------------------------------
+
+def _attribute_size(value: Dict[str, Any]) -> int:
+    (kind, raw), = value.items()
+    if kind == 'S':
+        return len(raw.encode('utf-8'))
+    if kind == 'N':
+        return (len(raw.lstrip('-').replace('.', '')) + 1) // 2 + 1
+    if kind in ('BOOL', 'NULL'):
+        return 1
+    if kind == 'M':
+        return 3 + sum(len(k.encode('utf-8')) + _attribute_size(v) + 1 for k, v in raw.items())
+    if kind == 'L':
+        return 3 + sum(_attribute_size(v) + 1 for v in raw)
+    return len(str(raw))
+
+
+def item_size(item: Optional[Dict[str, Any]]) -> int:
+    """
+    Approximate DynamoDB item size in bytes (attribute names + values)
+    """
+    if not item:
+        return 0
+    return sum(len(name.encode('utf-8')) + _attribute_size(encode_value(value)) for name, value in item.items())
+
+
+def read_units(size_bytes: int, consistent: bool = False) -> float:
+    units = max(1, math.ceil(size_bytes / 4096))
+    return float(units) if consistent else units / 2
+
+
+def write_units(size_bytes: int) -> float:
+    return float(max(1, math.ceil(size_bytes / 1024)))
+
+
+# --------------------------------------------------------------------------
+# Service stand-ins
+# --------------------------------------------------------------------------
+
+class LocalTable:
+    """In-memory table keyed by (partition key, sort key)"""
+
+    def __init__(self, name: str, partition_key: str, sort_key: Optional[str] = None) -> None:
+        self.name = name
+        self.partition_key = partition_key
+        self.sort_key = sort_key
+        # partition value -> sort value (or None) -> item
+        self.partitions: Dict[Any, Dict[Any, Dict[str, Any]]] = defaultdict(dict)
+
+    def key_of(self, item: Dict[str, Any]) -> Tuple[Any, Any]:
+        if self.partition_key not in item or (self.sort_key and self.sort_key not in item):
+            raise ValueError("The provided key element does not match the schema")
+        return item[self.partition_key], item.get(self.sort_key) if self.sort_key else None
+
+    def get(self, key: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        partition, sort = self.key_of(key)
+        return self.partitions.get(partition, {}).get(sort)
+
+    def put(self, item: Dict[str, Any]) -> None:
+        partition, sort = self.key_of(item)
+        self.partitions[partition][sort] = item
+
+    def delete(self, key: Dict[str, Any]) -> None:
+        partition, sort = self.key_of(key)
+        self.partitions.get(partition, {}).pop(sort, None)
+
+    def items(self) -> List[Dict[str, Any]]:
+        return [item for partition in self.partitions.values() for item in partition.values()]
+
+    def __len__(self) -> int:
+        return sum(len(partition) for partition in self.partitions.values())
+
+
+class LocalDynamoDB:
+    """
+    In-memory stand-in for boto3.client('dynamodb')
+
+    Attributes:
+        calls: Operation name -> call count
+        consumed: Table name -> {'read': RCU, 'write': WCU}
+        per_second: (table name, virtual second) -> {'read': RCU, 'write': WCU}
+        clock_ms: Virtual time used to bucket consumption; set by the harness
+        throttle_limits: Optional table name -> {'read': RCU/s, 'write': WCU/s};
+            requests beyond the limit in a virtual second raise
+            ProvisionedThroughputExceededException
+    """
+
+    def __init__(self) -> None:
+        self.tables: Dict[str, LocalTable] = {}
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.consumed: Dict[str, Dict[str, float]] = defaultdict(lambda: {'read': 0.0, 'write': 0.0})
+        self.per_second: Dict[Tuple[str, int], Dict[str, float]] = defaultdict(lambda: {'read': 0.0, 'write': 0.0})
+        self.clock_ms = 0
+        self.throttle_limits: Dict[str, Dict[str, float]] = {}
+        self.throttled = 0
+        self._parsed: Dict[Tuple, Any] = {}
+
+    def create_table(self, name: str, partition_key: str, sort_key: Optional[str] = None) -> LocalTable:
+        table = LocalTable(name, partition_key, sort_key)
+        self.tables[name] = table
+        return table
+
+    def seed(self, table_name: str, item: Dict[str, Any]) -> None:
+        """Insert a plain item without consuming capacity"""
+        self._table(table_name, 'Seed').put(dict(item))
+
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def total_consumed(self) -> Dict[str, float]:
+        return {
+            'read': sum(c['read'] for c in self.consumed.values()),
+            'write': sum(c['write'] for c in self.consumed.values()),
+        }
+
+    # Operations
+
+    def get_item(self, TableName: str, Key: Dict, ConsistentRead: bool = False,
+                 ProjectionExpression: Optional[str] = None,
+                 ExpressionAttributeNames: Optional[Dict[str, str]] = None, **kwargs) -> Dict:
+        table = self._begin('GetItem', TableName)
+        item = table.get(decode_item(Key))
+        self._consume(TableName, 'read', read_units(item_size(item), ConsistentRead), 'GetItem')
+        response = {}
+        if item is not None:
+            response['Item'] = encode_item(self._project(item, ProjectionExpression, ExpressionAttributeNames))
+        return response
+
+    def put_item(self, TableName: str, Item: Dict, ConditionExpression: Optional[str] = None,
+                 ExpressionAttributeNames: Optional[Dict[str, str]] = None,
+                 ExpressionAttributeValues: Optional[Dict] = None, **kwargs) -> Dict:
+        table = self._begin('PutItem', TableName)
+        new_item = decode_item(Item)
+        existing = table.get(new_item)
+        self._consume(TableName, 'write', write_units(max(item_size(existing), item_size(new_item))), 'PutItem')
+        self._check_condition('PutItem', existing, ConditionExpression,
+                              ExpressionAttributeNames, ExpressionAttributeValues)
+        table.put(new_item)
+        return {}
+
+    def update_item(self, TableName: str, Key: Dict, UpdateExpression: str,
+                    ConditionExpression: Optional[str] = None,
+                    ExpressionAttributeNames: Optional[Dict[str, str]] = None,
+                    ExpressionAttributeValues: Optional[Dict] = None,
+                    ReturnValues: str = 'NONE', **kwargs) -> Dict:
+        table = self._begin('UpdateItem', TableName)
+        key = decode_item(Key)
+        existing = table.get(key)
+        self._check_condition('UpdateItem', existing, ConditionExpression,
+                              ExpressionAttributeNames, ExpressionAttributeValues,
+                              units=write_units(item_size(existing)), table_name=TableName,
+                              return_old=kwargs.get('ReturnValuesOnConditionCheckFailure') == 'ALL_OLD')
+
+        updated = _deep_copy(existing) if existing is not None else dict(key)
+        clauses = self._parse('update', UpdateExpression, ExpressionAttributeNames)
+        try:
+            _Evaluator(_decode_values(ExpressionAttributeValues)).update(updated, clauses)
+        except ValueError as e:
+            raise client_error('ValidationException', str(e), 'UpdateItem')
+
+        self._consume(TableName, 'write', write_units(max(item_size(existing), item_size(updated))), 'UpdateItem')
+        table.put(updated)
+
+        if ReturnValues == 'ALL_NEW':
+            return {'Attributes': encode_item(updated)}
+        if ReturnValues == 'ALL_OLD' and existing is not None:
+            return {'Attributes': encode_item(existing)}
+        return {}
+
+    def delete_item(self, TableName: str, Key: Dict, ConditionExpression: Optional[str] = None,
+                    ExpressionAttributeNames: Optional[Dict[str, str]] = None,
+                    ExpressionAttributeValues: Optional[Dict] = None, **kwargs) -> Dict:
+        table = self._begin('DeleteItem', TableName)
+        key = decode_item(Key)
+        existing = table.get(key)
+        self._consume(TableName, 'write', write_units(item_size(existing)), 'DeleteItem')
+        self._check_condition('DeleteItem', existing, ConditionExpression,
+                              ExpressionAttributeNames, ExpressionAttributeValues)
+        table.delete(key)
+        return {}
+
+    def query(self, TableName: str, KeyConditionExpression: str,
+              ExpressionAttributeValues: Optional[Dict] = None,
+              ExpressionAttributeNames: Optional[Dict[str, str]] = None,
+              FilterExpression: Optional[str] = None, ProjectionExpression: Optional[str] = None,
+              ScanIndexForward: bool = True, Limit: Optional[int] = None,
+              ExclusiveStartKey: Optional[Dict] = None, ConsistentRead: bool = False,
+              Select: Optional[str] = None, **kwargs) -> Dict:
+        table = self._begin('Query', TableName)
+        values = _decode_values(ExpressionAttributeValues)
+        key_condition = self._parse('condition', KeyConditionExpression, ExpressionAttributeNames)
+        partition = self._partition_value(key_condition, table, values)
+        evaluator = _Evaluator(values)
+
+        candidates = sorted(
+            table.partitions.get(partition, {}).items(),
+            key=lambda entry: (entry[0] is not None, entry[0]),
+            reverse=not ScanIndexForward
+        )
+        matched = [item for _, item in candidates if evaluator.condition(item, key_condition)]
+        return self._page('Query', table, matched, values, FilterExpression, ProjectionExpression,
+                          ExpressionAttributeNames, Limit, ExclusiveStartKey, ConsistentRead, Select)
+
+    def scan(self, TableName: str, FilterExpression: Optional[str] = None,
+             ExpressionAttributeValues: Optional[Dict] = None,
+             ExpressionAttributeNames: Optional[Dict[str, str]] = None,
+             ProjectionExpression: Optional[str] = None, Limit: Optional[int] = None,
+             ExclusiveStartKey: Optional[Dict] = None, ConsistentRead: bool = False,
+             Select: Optional[str] = None, **kwargs) -> Dict:
+        table = self._begin('Scan', TableName)
+        return self._page('Scan', table, table.items(), _decode_values(ExpressionAttributeValues),
+                          FilterExpression, ProjectionExpression, ExpressionAttributeNames, Limit,
+                          ExclusiveStartKey, ConsistentRead, Select)
+
+    def batch_get_item(self, RequestItems: Dict[str, Dict], **kwargs) -> Dict:
+        self.calls['BatchGetItem'] += 1
+        responses = {}
+        for table_name, request in RequestItems.items():
+            table = self._table(table_name, 'BatchGetItem')
+            consistent = request.get('ConsistentRead', False)
+            found = []
+            for key in request['Keys']:
+                item = table.get(decode_item(key))
+                self._consume(table_name, 'read', read_units(item_size(item), consistent), 'BatchGetItem')
+                if item is not None:
+                    found.append(encode_item(self._project(
+                        item, request.get('ProjectionExpression'), request.get('ExpressionAttributeNames')
+                    )))
+            responses[table_name] = found
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+    def batch_write_item(self, RequestItems: Dict[str, List[Dict]], **kwargs) -> Dict:
+        self.calls['BatchWriteItem'] += 1
+        for table_name, requests in RequestItems.items():
+            table = self._table(table_name, 'BatchWriteItem')
+            for request in requests:
+                if 'PutRequest' in request:
+                    item = decode_item(request['PutRequest']['Item'])
+                    existing = table.get(item)
+                    self._consume(table_name, 'write',
+                                  write_units(max(item_size(existing), item_size(item))), 'BatchWriteItem')
+                    table.put(item)
+                else:
+                    key = decode_item(request['DeleteRequest']['Key'])
+                    self._consume(table_name, 'write', write_units(item_size(table.get(key))), 'BatchWriteItem')
+                    table.delete(key)
+        return {'UnprocessedItems': {}}
+
+    # Internals
+
+    def _begin(self, operation: str, table_name: str) -> LocalTable:
+        self.calls[operation] += 1
+        return self._table(table_name, operation)
+
+    def _table(self, table_name: str, operation: str) -> LocalTable:
+        if table_name not in self.tables:
+            raise client_error('ResourceNotFoundException', f"Requested resource not found: {table_name}", operation)
+        return self.tables[table_name]
+
+    def _consume(self, table_name: str, kind: str, units: float, operation: str) -> None:
+        second = self.clock_ms // 1000
+        bucket = self.per_second[(table_name, second)]
+        limit = self.throttle_limits.get(table_name, {}).get(kind)
+        if limit is not None and bucket[kind] + units > limit:
+            self.throttled += 1
+            raise client_error('ProvisionedThroughputExceededException',
+                               f"Throughput exceeds the provisioned {kind} capacity for {table_name}", operation)
+        bucket[kind] += units
+        self.consumed[table_name][kind] += units
+
+    def _parse(self, kind: str, expression: str, names: Optional[Dict[str, str]]) -> Any:
+        cache_key = (kind, expression, tuple(sorted((names or {}).items())))
+        parsed = self._parsed.get(cache_key)
+        if parsed is None:
+            try:
+                parser = _Parser(expression, names)
+                parsed = parser.update() if kind == 'update' else parser.condition()
+                if not parser.at_end():
+                    raise ValueError(f"Unexpected trailing tokens in: {expression}")
+            except ValueError as e:
+                raise client_error('ValidationException', f"Invalid {kind} expression: {e}", kind)
+            self._parsed[cache_key] = parsed
+        return parsed
+
+    def _check_condition(self, operation: str, existing: Optional[Dict], expression: Optional[str],
+                         names: Optional[Dict[str, str]], values: Optional[Dict],
+                         units: float = 0.0, table_name: Optional[str] = None,
+                         return_old: bool = False) -> None:
+        if not expression:
+            return
+        condition = self._parse('condition', expression, names)
+        if not _Evaluator(_decode_values(values)).condition(existing or {}, condition):
+            if units and table_name:
+                # Failed conditional writes still consume write capacity
+                self._consume(table_name, 'write', units, operation)
+            response = {'Error': {'Code': 'ConditionalCheckFailedException',
+                                  'Message': 'The conditional request failed'}}
+            if return_old and existing is not None:
+                # ReturnValuesOnConditionCheckFailure=ALL_OLD
+                response['Item'] = encode_item(existing)
+            raise ClientError(response, operation)
+
+    def _partition_value(self, condition: Tuple, table: LocalTable, values: Dict[str, Any]) -> Any:
+        stack = [condition]
+        while stack:
+            node = stack.pop()
+            if node[0] == 'and':
+                stack.extend(node[1:])
+            elif node[0] == 'cmp' and node[1] == '=' and node[2] == ('path', [table.partition_key]):
+                return values[node[3][1]]
+        raise client_error('ValidationException', 'Query condition missed key schema element', 'Query')
+
+    def _page(self, operation: str, table: LocalTable, items: List[Dict], values: Dict[str, Any],
+              filter_expression: Optional[str], projection: Optional[str],
+              names: Optional[Dict[str, str]], limit: Optional[int], start_key: Optional[Dict],
+              consistent: bool, select: Optional[str]) -> Dict:
+        if start_key:
+            start = table.key_of(decode_item(start_key))
+            keys = [table.key_of(item) for item in items]
+            items = items[keys.index(start) + 1:] if start in keys else items
+
+        last_key = None
+        if limit is not None and len(items) > limit:
+            items = items[:limit]
+            last = items[-1]
+            last_key = {table.partition_key: last[table.partition_key]}
+            if table.sort_key:
+                last_key[table.sort_key] = last[table.sort_key]
+
+        self._consume(table.name, 'read', read_units(sum(item_size(i) for i in items), consistent), operation)
+
+        scanned = len(items)
+        if filter_expression:
+            condition = self._parse('condition', filter_expression, names)
+            evaluator = _Evaluator(values)
+            items = [item for item in items if evaluator.condition(item, condition)]
+
+        response = {'Count': len(items), 'ScannedCount': scanned}
+        if select != 'COUNT':
+            response['Items'] = [encode_item(self._project(item, projection, names)) for item in items]
+        if last_key is not None:
+            response['LastEvaluatedKey'] = encode_item(last_key)
+        return response
+
+    def _project(self, item: Dict, projection: Optional[str], names: Optional[Dict[str, str]]) -> Dict:
+        if not projection:
+            return item
+        projected = {}
+        for attribute in projection.split(','):
+            attribute = attribute.strip().split('.')[0]
+            attribute = (names or {}).get(attribute, attribute)
+            if attribute in item:
+                projected[attribute] = item[attribute]
+        return projected
+
+
+def _deep_copy(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _deep_copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_deep_copy(v) for v in value]
+    return value
+
+
+class LocalIoTData:
+    """Stand-in for boto3.client('iot-data') that records publishes"""
+
+    def __init__(self) -> None:
+        self.published: List[Dict[str, Any]] = []
+        self.fail_next = 0
+
+    def publish(self, topic: str, qos: int = 0, payload: Any = b'', **kwargs) -> Dict:
+        if self.fail_next:
+            self.fail_next -= 1
+            raise client_error('ServiceUnavailableException', 'IoT Data unavailable', 'Publish')
+        self.published.append({'topic': topic, 'qos': qos, 'payload': payload})
+        return {}
+
+
+class LocalLambda:
+    """Stand-in for boto3.client('lambda') that records invocations"""
+
+    def __init__(self) -> None:
+        self.invocations: List[Dict[str, Any]] = []
+
+    def invoke(self, FunctionName: str, InvocationType: str = 'RequestResponse',
+               Payload: Any = b'', **kwargs) -> Dict:
+        self.invocations.append({
+            'FunctionName': FunctionName,
+            'InvocationType': InvocationType,
+            'Payload': Payload
+        })
+        return {'StatusCode': 202 if InvocationType == 'Event' else 200}
+
+
+class LocalCloudWatch:
+    """Stand-in for boto3.client('cloudwatch') that records metric data"""
+
+    def __init__(self) -> None:
+        self.metric_data: List[Dict[str, Any]] = []
+
+    def put_metric_data(self, Namespace: str, MetricData: List[Dict], **kwargs) -> Dict:
+        self.metric_data.append({'Namespace': Namespace, 'MetricData': MetricData})
+        return {}
+
+
+class LocalS3:
+    """Stand-in for boto3.client('s3') holding objects in memory"""
+
+    def __init__(self) -> None:
+        self.objects: Dict[Tuple[str, str], bytes] = {}
+
+    def put_object(self, Bucket: str, Key: str, Body: Any = b'', **kwargs) -> Dict:
+        self.objects[(Bucket, Key)] = Body.encode('utf-8') if isinstance(Body, str) else bytes(Body)
+        return {}
+
+    def get_object(self, Bucket: str, Key: str, **kwargs) -> Dict:
+        if (Bucket, Key) not in self.objects:
+            raise client_error('NoSuchKey', 'The specified key does not exist.', 'GetObject')
+        return {'Body': io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def delete_object(self, Bucket: str, Key: str, **kwargs) -> Dict:
+        self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = '', ContinuationToken: Optional[str] = None,
+                        MaxKeys: int = 1000, **kwargs) -> Dict:
+        keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+        if ContinuationToken:
+            keys = [key for key in keys if key > ContinuationToken]
+        page = keys[:MaxKeys]
+        response = {
+            'Contents': [{'Key': key, 'Size': len(self.objects[(Bucket, key)])} for key in page],
+            'KeyCount': len(page),
+            'IsTruncated': len(keys) > MaxKeys
+        }
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = page[-1]
+        return response
+
+
+class LocalSQS:
+    """
+    Stand-in for boto3.client('sqs') with standard-queue semantics
+
+    Received messages stay invisible for the visibility timeout and come
+    back unless deleted. A message received max_receive_count times is moved
+    to the dead-letter queue instead (see set_redrive_policy).
+
+    Attributes:
+        clock_ms: Virtual time; set by the harness
+    """
+
+    def __init__(self) -> None:
+        self.queues: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self.redrive: Dict[str, Tuple[str, int]] = {}
+        self.clock_ms = 0
+        self._next_id = 0
+
+    def set_redrive_policy(self, queue_url: str, dead_letter_url: str, max_receive_count: int) -> None:
+        self.redrive[queue_url] = (dead_letter_url, max_receive_count)
+
+    def send_message(self, QueueUrl: str, MessageBody: str, **kwargs) -> Dict:
+        self._next_id += 1
+        message_id = f"msg-{self._next_id:08d}"
+        self.queues[QueueUrl].append({
+            'MessageId': message_id,
+            'Body': MessageBody,
+            'SentTimestamp': self.clock_ms,
+            'ReceiveCount': 0,
+            'VisibleAt': self.clock_ms,
+        })
+        return {'MessageId': message_id}
+
+    def receive_message(self, QueueUrl: str, MaxNumberOfMessages: int = 1, VisibilityTimeout: int = 30,
+                        **kwargs) -> Dict:
+        received = []
+        for message in list(self.queues[QueueUrl]):
+            if len(received) == MaxNumberOfMessages:
+                break
+            if message['VisibleAt'] > self.clock_ms:
+                continue
+            dead_letter_url, max_receive_count = self.redrive.get(QueueUrl, (None, 0))
+            if dead_letter_url and message['ReceiveCount'] >= max_receive_count:
+                self.queues[QueueUrl].remove(message)
+                self.queues[dead_letter_url].append(dict(message, ReceiveCount=0, VisibleAt=self.clock_ms))
+                continue
+            message['ReceiveCount'] += 1
+            message['VisibleAt'] = self.clock_ms + VisibilityTimeout * 1000
+            received.append({
+                'MessageId': message['MessageId'],
+                'ReceiptHandle': f"{message['MessageId']}/{message['ReceiveCount']}",
+                'Body': message['Body'],
+                'Attributes': {
+                    'ApproximateReceiveCount': str(message['ReceiveCount']),
+                    'SentTimestamp': str(message['SentTimestamp']),
+                },
+            })
+        return {'Messages': received} if received else {}
+
+    def delete_message(self, QueueUrl: str, ReceiptHandle: str, **kwargs) -> Dict:
+        message_id = ReceiptHandle.split('/')[0]
+        self.queues[QueueUrl] = [m for m in self.queues[QueueUrl] if m['MessageId'] != message_id]
+        return {}
+
+    def visible_messages(self, queue_url: str) -> List[Dict[str, Any]]:
+        """Messages a receive would return now, oldest first (not part of the boto3 API)"""
+        return [m for m in self.queues[queue_url] if m['VisibleAt'] <= self.clock_ms]
+
+
+class _UnusedClient:
+    """Stand-in for clients a lambda creates but the harness never exercises"""
+
+    def __init__(self, service_name: str) -> None:
+        self.service_name = service_name
+        self.calls: List[Tuple[str, Dict]] = []
+
+    def __getattr__(self, operation: str) -> Any:
+        def record(**kwargs: Any) -> Dict:
+            self.calls.append((operation, kwargs))
+            return {}
+        return record
+
+
+class LocalAWS:
+    """
+    Bundle of stand-ins exposed through a boto3-compatible client() factory
+    """
+
+    def __init__(self) -> None:
+        self.dynamodb = LocalDynamoDB()
+        self.iot_data = LocalIoTData()
+        self.lambda_ = LocalLambda()
+        self.cloudwatch = LocalCloudWatch()
+        self.s3 = LocalS3()
+        self.sqs = LocalSQS()
+        self.other: Dict[str, _UnusedClient] = {}
+
+    def client(self, service_name: str, *args: Any, **kwargs: Any) -> Any:
+        if service_name == 'dynamodb':
+            return self.dynamodb
+        if service_name == 'iot-data':
+            return self.iot_data
+        if service_name == 'lambda':
+            return self.lambda_
+        if service_name == 'cloudwatch':
+            return self.cloudwatch
+        if service_name == 's3':
+            return self.s3
+        if service_name == 'sqs':
+            return self.sqs
+        return self.other.setdefault(service_name, _UnusedClient(service_name))
+
+    def resource(self, service_name: str, *args: Any, **kwargs: Any) -> Any:
+        raise NotImplementedError("PillBuddy lambdas use low-level clients only (see ddb_client.py)")
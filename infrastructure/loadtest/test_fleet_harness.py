@@ -0,0 +1,142 @@
+"""
+Smoke tests for the PillBuddy fleet load-test harness and AWS stand-ins
+"""
+
+import unittest
+import contextlib
+import io
+import sys
+import os
+
+# Add this directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stand_ins import LocalDynamoDB, ClientError
+from pillbuddy_core.ddb_client import encode_item, decode_item
+import fleet_harness
+import stand_ins
+
+
+class TestLocalDynamoDB(unittest.TestCase):
+    """Test cases for the in-memory DynamoDB stand-in"""
+    
+    def setUp(self):
+        self.dynamodb = LocalDynamoDB()
+        self.dynamodb.create_table('Devices', 'device_id')
+        self.dynamodb.seed('Devices', {
+            'device_id': 'esp32_001',
+            'slots': {'1': {'in_holder': True, 'last_state_change': 1}},
+            'pill_count': 5
+        })
+        self.key = encode_item({'device_id': 'esp32_001'})
+    
+    def _item(self):
+        return decode_item(self.dynamodb.get_item(TableName='Devices', Key=self.key)['Item'])
+    
+    def test_nested_set_and_arithmetic(self):
+        """Test SET on nested map paths, arithmetic and if_not_exists"""
+        self.dynamodb.update_item(
+            TableName='Devices',
+            Key=self.key,
+            UpdateExpression='SET slots.#slot.in_holder = :in_holder, pill_count = pill_count - :one, '
+                             'doses = if_not_exists(doses, :zero) + :one',
+            ExpressionAttributeNames={'#slot': '1'},
+            ExpressionAttributeValues=encode_item({':in_holder': False, ':one': 1, ':zero': 0})
+        )
+        
+        item = self._item()
+        self.assertFalse(item['slots']['1']['in_holder'])
+        self.assertEqual(item['pill_count'], 4)
+        self.assertEqual(item['doses'], 1)
+    
+    def test_invalid_nested_path_is_rejected(self):
+        """Test that SET on a missing parent map fails like DynamoDB does"""
+        with self.assertRaises(ClientError) as raised:
+            self.dynamodb.update_item(
+                TableName='Devices',
+                Key=self.key,
+                UpdateExpression='SET missing.#slot = :v',
+                ExpressionAttributeNames={'#slot': '1'},
+                ExpressionAttributeValues=encode_item({':v': 1})
+            )
+        self.assertEqual(raised.exception.response['Error']['Code'], 'ValidationException')
+    
+    def test_conditional_write_failure(self):
+        """Test that a failed condition raises and leaves the item unchanged"""
+        with self.assertRaises(ClientError) as raised:
+            self.dynamodb.update_item(
+                TableName='Devices',
+                Key=self.key,
+                UpdateExpression='SET pill_count = :v',
+                ConditionExpression='attribute_not_exists(device_id) OR pill_count > :v',
+                ExpressionAttributeValues=encode_item({':v': 10})
+            )
+        self.assertEqual(raised.exception.response['Error']['Code'], 'ConditionalCheckFailedException')
+        self.assertEqual(self._item()['pill_count'], 5)
+    
+    def test_capacity_accounting(self):
+        """Test that eventually consistent reads cost half an RCU and writes one WCU"""
+        self._item()
+        self.dynamodb.put_item(TableName='Devices', Item=encode_item({'device_id': 'esp32_002'}))
+        
+        self.assertEqual(self.dynamodb.consumed['Devices'], {'read': 0.5, 'write': 1.0})
+        self.assertEqual(self.dynamodb.calls['GetItem'], 1)
+    
+    def test_throttling(self):
+        """Test that per-second limits raise ProvisionedThroughputExceededException"""
+        self.dynamodb.throttle_limits['Devices'] = {'read': 1.0}
+        self._item()
+        self._item()
+        
+        with self.assertRaises(ClientError) as raised:
+            self._item()
+        self.assertEqual(raised.exception.response['Error']['Code'], 'ProvisionedThroughputExceededException')
+
+
+class TestQueueIngestion(unittest.TestCase):
+    """Harness runs with queued ingestion"""
+    
+    def test_throttled_events_are_retried_not_lost(self):
+        """Test that throttling drops events on the direct path and only delays them through the queue"""
+        # No sensor flaps: whether a flap's re-lift is a bounce depends on the
+        # order its events arrive in, which redelivery changes
+        base = ['--devices', '20', '--days', '1', '--seed', '3', '--queries-per-day', '0', '--flap-rate', '0']
+        with contextlib.redirect_stdout(io.StringIO()):
+            unthrottled = fleet_harness.run(fleet_harness.parse_args(base))
+            direct = fleet_harness.run(fleet_harness.parse_args(base + ['--throttle-wcu', '1']))
+            queued = fleet_harness.run(fleet_harness.parse_args(
+                base + ['--throttle-wcu', '1', '--ingestion', 'sqs', '--batch-size', '10']
+            ))
+        
+        self.assertGreater(direct['dynamodb']['throttled'], 0)
+        self.assertLess(direct['events_logged'], unthrottled['events_logged'])
+        self.assertGreater(direct['pills_remaining'], unthrottled['pills_remaining'])
+        
+        self.assertGreater(queued['ingestion']['retried_messages'], 0)
+        self.assertEqual(queued['ingestion']['dead_lettered'], 0)
+        self.assertEqual(queued['events_logged'], unthrottled['events_logged'])
+        self.assertEqual(queued['pills_remaining'], unthrottled['pills_remaining'])
+
+
+class TestFleetHarness(unittest.TestCase):
+    """End-to-end smoke test across all three lambdas"""
+    
+    def test_small_fleet_run(self):
+        """Test that a small fleet drives every lambda without errors"""
+        args = fleet_harness.parse_args(['--devices', '5', '--days', '1', '--seed', '7'])
+        
+        report = fleet_harness.run(args)
+        
+        handlers = report['handlers']
+        self.assertGreater(handlers['iot_event_processor']['invocations'], 5 * 2 * 3 * 2 - 1)
+        self.assertEqual(handlers['alexa_handler']['invocations'], 5)
+        self.assertEqual(handlers['timeout_checker']['invocations'], 24 * 12)
+        for summary in handlers.values():
+            self.assertEqual(summary['errors'], 0)
+        self.assertGreater(report['dynamodb']['calls_per_device_event'], 0)
+        self.assertGreater(report['dynamodb']['consumed']['PillBuddy_Events']['write'], 0)
+        self.assertGreater(report['iot_publishes'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,20 +12,40 @@ from aws_cdk import (
 )
 from constructs import Construct
 
+from capacity_model import (
+    plan_from_context,
+    DEVICES as DEVICES_PLAN,
+    PRESCRIPTIONS as PRESCRIPTIONS_PLAN,
+    EVENTS as EVENTS_PLAN,
+    USER_DEVICES as USER_DEVICES_PLAN,
+    DAILY_DOSES as DAILY_DOSES_PLAN,
+)
+
+# Tests, local build artifacts and caches are not shipped in function or layer zips
+LAMBDA_ASSET_EXCLUDES = ["test_*.py", "*.zip", "**/__pycache__", "*.pyc"]
+
 
 class PillBuddyStack(Stack):
     """
     CDK Stack for PillBuddy Backend Infrastructure
     
-    Creates three DynamoDB tables:
+    Creates four DynamoDB tables:
     1. Devices - Stores device connection status and slot states
     2. Prescriptions - Stores prescription data for each device slot
     3. Events - Stores time-series events from ESP32 devices
+    4. UserDevices - Maps Alexa userIds to linked device_ids
+
+    Table capacity comes from the fleet profile in CDK context (see
+    capacity_model.py): each table gets either on-demand billing or
+    provisioned capacity with target-tracking autoscaling.
     """
 
     def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
+        # Capacity plan derived from fleet size and dose frequency
+        self.capacity_plan = plan_from_context(self.node.try_get_context)
+
         # Table 1: Devices Table
         self.devices_table = dynamodb.Table(
             self,
@@ -35,11 +55,10 @@ class PillBuddyStack(Stack):
                 name="device_id",
                 type=dynamodb.AttributeType.STRING
             ),
-            billing_mode=dynamodb.BillingMode.PROVISIONED,
-            read_capacity=5,
-            write_capacity=5,
             removal_policy=RemovalPolicy.DESTROY,  # For hackathon - use RETAIN in production
+            **self._capacity_props(DEVICES_PLAN),
         )
+        self._add_autoscaling(self.devices_table, DEVICES_PLAN)
 
         # Table 2: Prescriptions Table
         self.prescriptions_table = dynamodb.Table(
@@ -54,11 +73,10 @@ class PillBuddyStack(Stack):
                 name="slot",
                 type=dynamodb.AttributeType.NUMBER
             ),
-            billing_mode=dynamodb.BillingMode.PROVISIONED,
-            read_capacity=5,
-            write_capacity=5,
             removal_policy=RemovalPolicy.DESTROY,  # For hackathon - use RETAIN in production
+            **self._capacity_props(PRESCRIPTIONS_PLAN),
         )
+        self._add_autoscaling(self.prescriptions_table, PRESCRIPTIONS_PLAN)
 
         # Table 3: Events Table with TTL
         self.events_table = dynamodb.Table(
@@ -73,11 +91,60 @@ class PillBuddyStack(Stack):
                 name="timestamp",
                 type=dynamodb.AttributeType.NUMBER
             ),
-            billing_mode=dynamodb.BillingMode.PROVISIONED,
-            read_capacity=5,
-            write_capacity=10,  # Higher write capacity for event logging
             time_to_live_attribute="ttl",  # Enable TTL for auto-deletion after 30 days
             removal_policy=RemovalPolicy.DESTROY,  # For hackathon - use RETAIN in production
+            **self._capacity_props(EVENTS_PLAN),
+        )
+        self._add_autoscaling(self.events_table, EVENTS_PLAN)
+
+        # Table 4: User-to-device mapping for account-linked households
+        self.user_devices_table = dynamodb.Table(
+            self,
+            "UserDevicesTable",
+            table_name="PillBuddy_UserDevices",
+            partition_key=dynamodb.Attribute(
+                name="user_id",
+                type=dynamodb.AttributeType.STRING
+            ),
+            removal_policy=RemovalPolicy.DESTROY,  # For hackathon - use RETAIN in production
+            **self._capacity_props(USER_DEVICES_PLAN),
+        )
+        self._add_autoscaling(self.user_devices_table, USER_DEVICES_PLAN)
+
+        # Table 5: Per-device daily dose counters, maintained by the IoT Event Processor
+        self.daily_doses_table = dynamodb.Table(
+            self,
+            "DailyDosesTable",
+            table_name="PillBuddy_DailyDoses",
+            partition_key=dynamodb.Attribute(
+                name="device_id",
+                type=dynamodb.AttributeType.STRING
+            ),
+            sort_key=dynamodb.Attribute(
+                name="day",
+                type=dynamodb.AttributeType.STRING
+            ),
+            time_to_live_attribute="ttl",
+            removal_policy=RemovalPolicy.DESTROY,  # For hackathon - use RETAIN in production
+            **self._capacity_props(DAILY_DOSES_PLAN),
+        )
+        self._add_autoscaling(self.daily_doses_table, DAILY_DOSES_PLAN)
+
+        # Table 6: Phone call rate limits shared by IoT Event Processor containers
+        # (see pillbuddy_core/call_limits.py). Only empty-slot insertions write to
+        # it, rarely and in bursts, so it is always on-demand and kept out of the
+        # capacity model.
+        self.call_limits_table = dynamodb.Table(
+            self,
+            "CallLimitsTable",
+            table_name="PillBuddy_CallLimits",
+            partition_key=dynamodb.Attribute(
+                name="limit_key",
+                type=dynamodb.AttributeType.STRING
+            ),
+            time_to_live_attribute="ttl",
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=RemovalPolicy.DESTROY,  # For hackathon - use RETAIN in production
         )
 
         # Export table names for use by Lambda functions
@@ -93,6 +160,14 @@ class PillBuddyStack(Stack):
             self.events_table.table_name,
             name="PillBuddyEventsTableName"
         )
+        self.export_value(
+            self.user_devices_table.table_name,
+            name="PillBuddyUserDevicesTableName"
+        )
+        self.export_value(
+            self.daily_doses_table.table_name,
+            name="PillBuddyDailyDosesTableName"
+        )
 
         # IoT Thing Type for PillBuddy devices
         # Note: CDK L2 constructs for IoT Thing Types are limited, using CfnThingType
@@ -145,6 +220,17 @@ class PillBuddyStack(Stack):
             description="Role for IoT Rule to invoke Lambda function"
         )
 
+        # Shared core package for every handler, deployed once as a layer
+        # (see layers/pillbuddy_core/python/pillbuddy_core/__init__.py)
+        self.core_layer = lambda_.LayerVersion(
+            self,
+            "PillBuddyCoreLayer",
+            layer_version_name="PillBuddyCore",
+            code=lambda_.Code.from_asset("layers/pillbuddy_core", exclude=LAMBDA_ASSET_EXCLUDES),
+            compatible_runtimes=[lambda_.Runtime.PYTHON_3_11],
+            description="PillBuddy core: tuned AWS clients, DynamoDB data access, caches and instrumentation"
+        )
+
         # Alexa Skill Handler Lambda Function
         # Create Lambda execution role
         alexa_lambda_role = iam.Role(
@@ -162,6 +248,8 @@ class PillBuddyStack(Stack):
         # Grant DynamoDB permissions
         self.devices_table.grant_read_write_data(alexa_lambda_role)
         self.prescriptions_table.grant_read_write_data(alexa_lambda_role)
+        self.user_devices_table.grant_read_write_data(alexa_lambda_role)
+        self.daily_doses_table.grant_read_data(alexa_lambda_role)
 
         # Grant IoT publish permissions
         alexa_lambda_role.add_to_policy(
@@ -175,6 +263,21 @@ class PillBuddyStack(Stack):
         # To get your IoT endpoint, run: aws iot describe-endpoint --endpoint-type iot:Data-ATS
         iot_endpoint = self.node.try_get_context("iot_endpoint") or "REPLACE_WITH_IOT_ENDPOINT"
 
+        # Cache tier in front of Devices and Prescriptions (see pillbuddy_core/cache.py).
+        # Redis and DAX clusters are provisioned separately and passed in by context.
+        cache_environment = {
+            "CACHE_BACKEND": self.node.try_get_context("cache_backend") or "memory",
+            "CACHE_TTL_SECONDS": str(self.node.try_get_context("cache_ttl_seconds") or 30),
+        }
+        for context_key, env_name in (("cache_redis_url", "CACHE_REDIS_URL"), ("dax_endpoint", "DAX_ENDPOINT")):
+            if self.node.try_get_context(context_key):
+                cache_environment[env_name] = self.node.try_get_context(context_key)
+
+        # Local day for the daily dose counters; both handlers must agree on it
+        dose_day_environment = {
+            "DOSE_DAY_UTC_OFFSET_MINUTES": str(self.node.try_get_context("dose_day_utc_offset_minutes") or 0),
+        }
+
         # Create Alexa Handler Lambda function
         self.alexa_handler = lambda_.Function(
             self,
@@ -182,13 +285,18 @@ class PillBuddyStack(Stack):
             function_name="PillBuddy_AlexaHandler",
             runtime=lambda_.Runtime.PYTHON_3_11,
             handler="lambda_function.lambda_handler",
-            code=lambda_.Code.from_asset("lambda/alexa_handler"),
+            code=lambda_.Code.from_asset("lambda/alexa_handler", exclude=LAMBDA_ASSET_EXCLUDES),
+            layers=[self.core_layer],
             timeout=Duration.seconds(10),
             memory_size=256,
             environment={
                 "DEVICES_TABLE": self.devices_table.table_name,
                 "PRESCRIPTIONS_TABLE": self.prescriptions_table.table_name,
-                "IOT_ENDPOINT": iot_endpoint
+                "USER_DEVICES_TABLE": self.user_devices_table.table_name,
+                "DAILY_DOSES_TABLE": self.daily_doses_table.table_name,
+                **dose_day_environment,
+                "IOT_ENDPOINT": iot_endpoint,
+                **cache_environment
             },
             role=alexa_lambda_role,
             description="Alexa Skill Handler for PillBuddy voice commands"
@@ -228,6 +336,22 @@ class PillBuddyStack(Stack):
         self.devices_table.grant_read_write_data(iot_lambda_role)
         self.prescriptions_table.grant_read_write_data(iot_lambda_role)
         self.events_table.grant_read_write_data(iot_lambda_role)
+        self.daily_doses_table.grant_read_write_data(iot_lambda_role)
+        self.call_limits_table.grant_read_write_data(iot_lambda_role)
+
+        # DAX cache backend: both handlers reach the tables through the cluster
+        dax_cluster_arn = self.node.try_get_context("dax_cluster_arn")
+        if dax_cluster_arn:
+            for role in (alexa_lambda_role, iot_lambda_role):
+                role.add_to_policy(
+                    iam.PolicyStatement(
+                        actions=[
+                            "dax:GetItem", "dax:BatchGetItem", "dax:Query", "dax:Scan",
+                            "dax:PutItem", "dax:UpdateItem", "dax:DeleteItem", "dax:BatchWriteItem"
+                        ],
+                        resources=[dax_cluster_arn]
+                    )
+                )
 
         # Grant IoT publish permissions
         iot_lambda_role.add_to_policy(
@@ -248,6 +372,17 @@ class PillBuddyStack(Stack):
             )
         )
 
+        # Sensor flap debounce window (see pillbuddy_core/debounce.py); 0 disables it
+        debounce_window_ms = self.node.try_get_context("debounce_window_ms")
+        if debounce_window_ms is None:
+            debounce_window_ms = 2000
+
+        # How long a queued event waits for earlier sequences of its device
+        # (see pillbuddy_core/sequencing.py); 0 disables reordering
+        reorder_window_ms = self.node.try_get_context("reorder_window_ms")
+        if reorder_window_ms is None:
+            reorder_window_ms = 2000
+
         # Create IoT Event Processor Lambda function
         self.iot_event_processor = lambda_.Function(
             self,
@@ -255,7 +390,8 @@ class PillBuddyStack(Stack):
             function_name="PillBuddy_IoTEventProcessor",
             runtime=lambda_.Runtime.PYTHON_3_11,
             handler="lambda_function.lambda_handler",
-            code=lambda_.Code.from_asset("lambda/iot_event_processor"),
+            code=lambda_.Code.from_asset("lambda/iot_event_processor", exclude=LAMBDA_ASSET_EXCLUDES),
+            layers=[self.core_layer],
             timeout=Duration.seconds(30),
             memory_size=256,
             environment={
@@ -263,7 +399,13 @@ class PillBuddyStack(Stack):
                 "PRESCRIPTIONS_TABLE": self.prescriptions_table.table_name,
                 "EVENTS_TABLE": self.events_table.table_name,
                 "IOT_ENDPOINT": iot_endpoint,
-                "CALL_USER_LAMBDA_ARN": call_user_lambda_arn
+                "CALL_USER_LAMBDA_ARN": call_user_lambda_arn,
+                "DAILY_DOSES_TABLE": self.daily_doses_table.table_name,
+                "CALL_LIMITS_TABLE": self.call_limits_table.table_name,
+                "DEBOUNCE_WINDOW_MS": str(debounce_window_ms),
+                "REORDER_WINDOW_MS": str(reorder_window_ms),
+                **dose_day_environment,
+                **cache_environment
             },
             role=iot_lambda_role,
             description="IoT Event Processor for PillBuddy ESP32 device events"
@@ -275,17 +417,24 @@ class PillBuddyStack(Stack):
             name="PillBuddyIoTEventProcessorArn"
         )
 
-        # Create IoT Rule to forward device events to Lambda
-        from iot_rule_config import create_iot_event_rule
-        self.iot_rule = create_iot_event_rule(self, self.iot_event_processor, self.iot_rule_role)
+        # Create IoT Rules to forward device events to Lambda
+        from iot_rule_config import create_iot_event_rules
+        self.iot_rules = create_iot_event_rules(
+            self,
+            self.iot_event_processor,
+            self.iot_rule_role,
+            ingestion=self.node.try_get_context("event_ingestion") or "direct",
+            batch_size=int(self.node.try_get_context("event_batch_size") or 25),
+            batch_window_seconds=int(self.node.try_get_context("event_batch_window_seconds") or 1)
+        )
 
         # IoT Rule will be created when Lambda function is added in task 5
         # See infrastructure/iot_rule_config.py for the rule configuration
         # The rule forwards messages from 'pillbuddy/events/+' to the IoT Event Processor Lambda
         # 
         # To complete in task 5:
-        # from infrastructure.iot_rule_config import create_iot_event_rule
-        # self.iot_rule = create_iot_event_rule(self, iot_event_processor_lambda, self.iot_rule_role)
+        # from infrastructure.iot_rule_config import create_iot_event_rules
+        # self.iot_rules = create_iot_event_rules(self, iot_event_processor_lambda, self.iot_rule_role)
         
         # Export IoT resources for use by Lambda functions and documentation
         self.export_value(
@@ -297,3 +446,42 @@ class PillBuddyStack(Stack):
             name="PillBuddyThingTypeName"
         )
 
+    def _capacity_props(self, plan_key: str) -> dict:
+        """
+        Billing mode and initial capacity for a table from the capacity plan
+
+        Args:
+            plan_key: Table key in capacity_model (e.g. 'DevicesTable')
+        """
+        plan = self.capacity_plan[plan_key]
+        if plan['billing'] == 'on_demand':
+            return {'billing_mode': dynamodb.BillingMode.PAY_PER_REQUEST}
+        return {
+            'billing_mode': dynamodb.BillingMode.PROVISIONED,
+            'read_capacity': plan['read_capacity'][0],
+            'write_capacity': plan['write_capacity'][0],
+        }
+
+    def _add_autoscaling(self, table: dynamodb.Table, plan_key: str) -> None:
+        """
+        Attach target-tracking autoscaling to a provisioned table
+
+        Args:
+            table: Table created with _capacity_props()
+            plan_key: Table key in capacity_model (e.g. 'DevicesTable')
+        """
+        plan = self.capacity_plan[plan_key]
+        if plan['billing'] != 'provisioned':
+            return
+
+        read_min, read_max = plan['read_capacity']
+        table.auto_scale_read_capacity(
+            min_capacity=read_min,
+            max_capacity=read_max
+        ).scale_on_utilization(target_utilization_percent=plan['target_utilization'])
+
+        write_min, write_max = plan['write_capacity']
+        table.auto_scale_write_capacity(
+            min_capacity=write_min,
+            max_capacity=write_max
+        ).scale_on_utilization(target_utilization_percent=plan['target_utilization'])
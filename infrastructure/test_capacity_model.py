@@ -0,0 +1,208 @@
+"""
+Unit tests for the PillBuddy DynamoDB capacity model
+"""
+
+import unittest
+import sys
+import os
+
+# Add this directory and the load-test harness to path for imports
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, 'loadtest'))
+
+from capacity_model import (
+    FleetProfile, bottle_event_units, bounce_event_units, voice_query_units, sweep_units,
+    estimate_load, plan_capacity, plan_from_context,
+    DEVICES, PRESCRIPTIONS, EVENTS, USER_DEVICES, DAILY_DOSES
+)
+
+
+def total(units, kind):
+    return sum(table_units[kind] for table_units in units.values())
+
+
+class TestAccessPatterns(unittest.TestCase):
+    """Per-operation units should match what the handlers actually consume"""
+
+    @classmethod
+    def setUpClass(cls):
+        import fleet_harness
+        # The model is the uncached worst case: every read reaches DynamoDB
+        args = fleet_harness.parse_args(['--devices', '5', '--days', '1', '--seed', '7', '--cache-backend', 'none',
+                                         '--flap-rate', '0'])
+        cls.report = fleet_harness.run(args)
+        cls.profile = FleetProfile(devices=5, slots_per_device=3)
+
+    def test_bottle_event_matches_processor(self):
+        """Test bottle event units against the measured IoT Event Processor cost"""
+        measured = self.report['handlers']['iot_event_processor']
+        units = bottle_event_units(self.profile)
+
+        self.assertAlmostEqual(total(units, 'read'), measured['rcu_per_invocation'])
+        self.assertAlmostEqual(total(units, 'write'), measured['wcu_per_invocation'])
+
+    def test_bounce_matches_debounced_event(self):
+        """Test bounce units against a re-removal the processor debounces"""
+        import contextlib
+        import io
+        import fleet_harness
+        import stand_ins
+        aws = stand_ins.LocalAWS()
+        device_id = fleet_harness.seed_fleet(aws, 1, 1, 30)[0]
+        processor = fleet_harness.load_lambda('iot_event_processor', 'capacity_test_iot_event_processor', aws,
+                                              {'CACHE_BACKEND': 'none'})
+        event = {'device_id': device_id, 'event_type': 'slot_state_changed', 'slot': 1}
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            processor.lambda_handler(dict(event, in_holder=False, ts_ms=fleet_harness.START_MS + 60000), None)
+            processor.lambda_handler(dict(event, in_holder=True, ts_ms=fleet_harness.START_MS + 60500), None)
+            before = aws.dynamodb.total_consumed()
+            processor.lambda_handler(dict(event, in_holder=False, ts_ms=fleet_harness.START_MS + 60800), None)
+        after = aws.dynamodb.total_consumed()
+
+        units = bounce_event_units(self.profile)
+        self.assertEqual(processor.debouncer.debounced, 1)
+        self.assertEqual(after['read'] - before['read'], total(units, 'read'))
+        self.assertEqual(after['write'] - before['write'], total(units, 'write'))
+
+    def test_voice_query_matches_alexa_handler(self):
+        """Test voice query units against the measured Alexa handler cost"""
+        measured = self.report['handlers']['alexa_handler']
+        units = voice_query_units(self.profile)
+
+        # Every harness user queries once per day, so every mapping lookup is a miss
+        expected = total(units, 'read') - units[USER_DEVICES]['read'] + 0.5
+        self.assertAlmostEqual(expected, measured['rcu_per_invocation'])
+        self.assertEqual(total(units, 'write'), measured['wcu_per_invocation'])
+
+    def test_sweep_matches_timeout_checker(self):
+        """Test sweep units against the measured Timeout Checker cost"""
+        measured = self.report['handlers']['timeout_checker']
+
+        self.assertAlmostEqual(total(sweep_units(self.profile), 'read'), measured['rcu_per_invocation'])
+
+    def test_sequenced_events_cost_the_same(self):
+        """Test that a sequenced removal and return cost two bottle events, with no dedupe read"""
+        import contextlib
+        import io
+        import fleet_harness
+        import stand_ins
+        aws = stand_ins.LocalAWS()
+        device_id = fleet_harness.seed_fleet(aws, 1, 1, 30)[0]
+        processor = fleet_harness.load_lambda('iot_event_processor', 'capacity_test_sequenced_processor', aws,
+                                              {'CACHE_BACKEND': 'none'})
+        event = {'device_id': device_id, 'event_type': 'slot_state_changed', 'slot': 1}
+
+        def send(sequence):
+            processor.lambda_handler(dict(event, in_holder=sequence % 2 == 0, sequence=sequence,
+                                          ts_ms=fleet_harness.START_MS + sequence * 60000), None)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            # Measure once the device has a stored sequence to follow
+            send(1)
+            send(2)
+            before = aws.dynamodb.total_consumed()
+            send(3)
+            send(4)
+        after = aws.dynamodb.total_consumed()
+
+        units = bottle_event_units(self.profile)
+        self.assertEqual(units[DEVICES], {'read': 0.0, 'write': 1.0})
+        self.assertEqual(after['read'] - before['read'], 2 * total(units, 'read'))
+        self.assertEqual(after['write'] - before['write'], 2 * total(units, 'write'))
+
+    def test_sweep_cost_grows_with_table_size(self):
+        """Test that the scan is charged per 4 KB of the whole table"""
+        small = sweep_units(FleetProfile(devices=5))[PRESCRIPTIONS]['read']
+        large = sweep_units(FleetProfile(devices=10000))[PRESCRIPTIONS]['read']
+
+        self.assertEqual(small, 0.5)
+        self.assertGreater(large, 800)
+
+
+class TestEstimateLoad(unittest.TestCase):
+    """Test cases for fleet load estimation"""
+
+    def test_dose_window_sets_peak(self):
+        """Test that the dose peak is the fleet's events over the dose window"""
+        profile = FleetProfile(devices=1000, slots_per_device=3, doses_per_day=2,
+                               dose_window_minutes=30, sweep_interval_minutes=0)
+
+        load = estimate_load(profile)
+
+        # 1000 devices x 3 slots x (removal + return) in 1800 s, 1 WCU each
+        self.assertAlmostEqual(load[EVENTS]['write_peak'], 6000 / 1800)
+        self.assertAlmostEqual(load[EVENTS]['write_avg'], 6000 * 2 / 86400)
+
+    def test_no_doses_no_event_writes(self):
+        """Test a fleet with no doses has no event write load"""
+        load = estimate_load(FleetProfile(devices=100, doses_per_day=0))
+
+        self.assertEqual(load[EVENTS]['write_peak'], 0)
+
+
+class TestPlanCapacity(unittest.TestCase):
+    """Test cases for billing mode and autoscaling planning"""
+
+    def test_spiky_fleet_goes_on_demand(self):
+        """Test that a narrow dose window selects on-demand in auto mode"""
+        plans = plan_capacity(FleetProfile(devices=5000, dose_window_minutes=15))
+
+        self.assertEqual(plans[EVENTS]['billing'], 'on_demand')
+        self.assertNotIn('write_capacity', plans[EVENTS])
+
+    def test_steady_fleet_gets_autoscaling(self):
+        """Test that a spread-out load gets provisioned capacity with bounds"""
+        plans = plan_capacity(FleetProfile(devices=20000, dose_window_minutes=600), target_utilization=70)
+
+        plan = plans[EVENTS]
+        self.assertEqual(plan['billing'], 'provisioned')
+        write_min, write_max = plan['write_capacity']
+        self.assertGreaterEqual(write_min, 1)
+        self.assertGreaterEqual(write_max * 0.7, plan['load']['write_peak'])
+        self.assertEqual(plan['target_utilization'], 70)
+
+    def test_forced_provisioned_covers_peak(self):
+        """Test that forced provisioned mode scales up to the dose peak"""
+        plans = plan_capacity(FleetProfile(devices=5000), mode='provisioned')
+
+        for plan in plans.values():
+            self.assertEqual(plan['billing'], 'provisioned')
+            self.assertGreaterEqual(plan['write_capacity'][1] * 0.7, plan['load']['write_peak'])
+            self.assertGreaterEqual(plan['read_capacity'][1] * 0.7, plan['load']['read_peak'])
+
+    def test_invalid_mode(self):
+        """Test that an unknown capacity mode is rejected"""
+        with self.assertRaises(ValueError):
+            plan_capacity(FleetProfile(), mode='burst')
+        with self.assertRaises(ValueError):
+            plan_capacity(FleetProfile(), target_utilization=99)
+
+    def test_plan_from_context(self):
+        """Test that CDK context strings are parsed into a plan"""
+        context = {
+            'fleet_devices': '20000',
+            'fleet_dose_window_minutes': '600',
+            'capacity_mode': 'on-demand'
+        }
+
+        plans = plan_from_context(context.get)
+
+        self.assertEqual(set(plans), {DEVICES, PRESCRIPTIONS, EVENTS, USER_DEVICES, DAILY_DOSES})
+        self.assertTrue(all(plan['billing'] == 'on_demand' for plan in plans.values()))
+        self.assertEqual(plans[EVENTS]['load'], {
+            key: round(value, 4)
+            for key, value in estimate_load(FleetProfile(devices=20000, dose_window_minutes=600))[EVENTS].items()
+        })
+
+    def test_defaults_from_empty_context(self):
+        """Test that an empty context uses the default fleet profile"""
+        profile = FleetProfile.from_context({}.get)
+
+        self.assertEqual(profile.devices, 100)
+        self.assertEqual(profile.flap_rate, 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
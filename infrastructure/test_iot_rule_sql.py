@@ -0,0 +1,152 @@
+"""
+Unit tests for the PillBuddy IoT rule SQL
+"""
+
+import unittest
+import json
+import sys
+import os
+
+# Add this directory to path for imports
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from iot_rule_sql import (
+    event_rule_sql, mask_rule_sql, binary_rule_sql, apply_event_rule, apply_binary_rule,
+    EVENT_TOPIC_FILTER, BINARY_TOPIC_FILTER
+)
+
+TOPIC = 'pillbuddy/events/esp32_001'
+RECEIVED_MS = 1792281600000
+
+
+class TestEventRuleSql(unittest.TestCase):
+    """Test cases for the rule statement"""
+
+    def test_projects_device_id_and_server_time(self):
+        """Test that device_id comes from the topic and timestamps from the broker"""
+        sql = event_rule_sql()
+
+        self.assertIn('topic(3) AS device_id', sql)
+        self.assertIn('timestamp() AS received_ms', sql)
+        self.assertIn(f"FROM '{EVENT_TOPIC_FILTER}' WHERE ", sql)
+
+    def test_filters_at_the_broker(self):
+        """Test the WHERE clause covers event type, slot and in_holder"""
+        where = event_rule_sql().split(' WHERE ', 1)[1]
+
+        self.assertIn("event_type = 'slot_state_changed'", where)
+        self.assertIn('(slot = 1 OR slot = 2 OR slot = 3)', where)
+        self.assertIn('(in_holder = true OR in_holder = false)', where)
+
+    def test_mask_rule(self):
+        """Test that the mask rule shares the topic projection and checks the mask ranges"""
+        sql = mask_rule_sql()
+        where = sql.split(' WHERE ', 1)[1]
+
+        self.assertIn('topic(3) AS device_id', sql)
+        self.assertIn("(event_type = 'slot_snapshot' AND in_holder_mask >= 0 AND in_holder_mask <= 7)", where)
+        self.assertIn("(event_type = 'slot_states_changed' AND changed_mask >= 1 AND changed_mask <= 7 "
+                      "AND in_holder_mask >= 0 AND in_holder_mask <= 7)", where)
+
+
+class TestApplyEventRule(unittest.TestCase):
+    """Test cases for the Python equivalent of the rule"""
+
+    def test_raw_firmware_fixtures(self):
+        """Test that every raw ESP32 fixture becomes a complete event"""
+        with open(os.path.join(HERE, 'lambda', 'iot_event_processor', 'test_events.json')) as f:
+            fixtures = {name: event for name, event in json.load(f).items() if not name.startswith('_')}
+
+        for name, payload in fixtures.items():
+            event = apply_event_rule(payload, TOPIC, RECEIVED_MS)
+            self.assertIsNotNone(event, name)
+            self.assertEqual(event['device_id'], 'esp32_001')
+            self.assertEqual(event['ts_ms'], RECEIVED_MS)
+            self.assertEqual(event['sequence'], 0)
+            if 'in_holder_mask' in payload:
+                self.assertEqual(event['in_holder_mask'], payload['in_holder_mask'])
+                self.assertEqual(event.get('changed_mask'), payload.get('changed_mask'))
+                continue
+            self.assertEqual(event['state'], 'in_holder' if payload['in_holder'] else 'not_in_holder')
+
+    def test_normalizes_fields(self):
+        """Test slot cast, derived sensor level and device timestamps"""
+        event = apply_event_rule({'event_type': 'slot_state_changed', 'slot': 2.0, 'in_holder': False,
+                                  'sequence': 7, 'ts_ms': RECEIVED_MS - 500}, TOPIC, RECEIVED_MS)
+
+        self.assertEqual(event['slot'], 2)
+        self.assertIsInstance(event['slot'], int)
+        self.assertEqual(event['sensor_level'], 0)
+        self.assertEqual(event['sequence'], 7)
+        self.assertEqual(event['ts_ms'], RECEIVED_MS - 500)
+        self.assertEqual(event['received_ms'], RECEIVED_MS)
+
+    def test_multi_slot_event(self):
+        """Test that a multi-slot transition keeps both masks and its sequence"""
+        event = apply_event_rule({'event_type': 'slot_states_changed', 'changed_mask': 3, 'in_holder_mask': 2,
+                                  'sequence': 9}, TOPIC, RECEIVED_MS)
+
+        self.assertEqual(event, {
+            'device_id': 'esp32_001',
+            'event_type': 'slot_states_changed',
+            'changed_mask': 3,
+            'in_holder_mask': 2,
+            'sequence': 9,
+            'ts_ms': RECEIVED_MS,
+            'received_ms': RECEIVED_MS,
+        })
+
+    def test_uptime_timestamp_replaced(self):
+        """Test that a device uptime counter is not used as the event time"""
+        event = apply_event_rule({'event_type': 'slot_state_changed', 'slot': 1, 'in_holder': True,
+                                  'ts_ms': 123456}, TOPIC, RECEIVED_MS)
+
+        self.assertEqual(event['ts_ms'], RECEIVED_MS)
+
+    def test_invalid_messages_filtered(self):
+        """Test that junk never reaches the Lambda"""
+        valid = {'event_type': 'slot_state_changed', 'slot': 1, 'in_holder': True}
+        invalid = [
+            dict(valid, event_type='reboot'),
+            dict(valid, slot=0),
+            dict(valid, slot=4),
+            dict(valid, slot='1'),
+            dict(valid, slot=True),
+            dict(valid, in_holder='true'),
+            {'event_type': 'slot_snapshot', 'in_holder_mask': 8},
+            {'event_type': 'slot_snapshot', 'in_holder_mask': '7'},
+            {'event_type': 'slot_snapshot'},
+            {'event_type': 'slot_states_changed', 'changed_mask': 0, 'in_holder_mask': 0},
+            {'event_type': 'slot_states_changed', 'changed_mask': 8, 'in_holder_mask': 0},
+            {'event_type': 'slot_states_changed', 'in_holder_mask': 3},
+            {'event_type': 'slot_state_changed', 'slot': 1},
+            ['not', 'an', 'object'],
+            None,
+        ]
+
+        for payload in invalid:
+            self.assertIsNone(apply_event_rule(payload, TOPIC, RECEIVED_MS), payload)
+
+
+class TestBinaryRule(unittest.TestCase):
+    """Test cases for the binary event rule"""
+
+    def test_forwards_payload_base64(self):
+        """Test that the binary rule only adds the topic device_id and broker time"""
+        sql = binary_rule_sql()
+
+        self.assertIn('topic(3) AS device_id', sql)
+        self.assertIn("encode(*, 'base64') AS payload_b64", sql)
+        self.assertIn(f"FROM '{BINARY_TOPIC_FILTER}'", sql)
+        self.assertEqual(apply_binary_rule(b'\x01\x02', TOPIC + '/bin', RECEIVED_MS),
+                         {'device_id': 'esp32_001', 'payload_b64': 'AQI=', 'received_ms': RECEIVED_MS})
+
+    def test_topics_do_not_overlap(self):
+        """Test that binary messages never reach the JSON rules"""
+        self.assertEqual(EVENT_TOPIC_FILTER.count('/'), 2)
+        self.assertEqual(BINARY_TOPIC_FILTER, EVENT_TOPIC_FILTER + '/bin')
+
+
+if __name__ == '__main__':
+    unittest.main()
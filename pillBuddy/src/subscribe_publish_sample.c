@@ -40,6 +40,7 @@ static const char *TAG = "pillbuddy";
 #define WIFI_CONNECTED_BIT BIT0
 #define MQTT_READY_BIT BIT1
 #define ENABLE_STARTUP_SLOT_STATE_PUBLISH 1 /* Set to 0 to disable startup slot-state events. */
+#define ENABLE_BINARY_EVENTS 0 /* Set to 1 to publish 15-byte binary events to <event topic>/bin instead of JSON. */
 
 #define TOPIC_BUF_LEN 128
 #define MQTT_CMD_PAYLOAD_BUF_LEN 160
@@ -66,6 +67,14 @@ static const char *TAG = "pillbuddy";
 #define MQTT_LOOP_BACKOFF_MS 25
 #define SENSOR_QUEUE_WAIT_MS 50
 #define QUEUE_SEND_TIMEOUT_MS 100
+#define SLOT_EVENT_COALESCE_MS 200 /* Other slots changing this soon after share one message. */
+
+/* Binary event layout (little-endian): kind, slot or changed_mask, in_holder or
+ * in_holder_mask, uint32 sequence, uint64 ts_ms. See pillbuddy_core/event_codec.py. */
+#define BINARY_EVENT_LEN 15
+#define BINARY_KIND_STATE_CHANGED 1
+#define BINARY_KIND_SNAPSHOT 2
+#define BINARY_KIND_STATES_CHANGED 3
 
 typedef struct {
     uint8_t slot_idx; /* 0..2 */
@@ -85,6 +94,7 @@ static AWS_IoT_Client s_mqtt_client;
 static bool s_mqtt_initialized = false;
 
 static char s_event_topic[TOPIC_BUF_LEN];
+static char s_event_bin_topic[TOPIC_BUF_LEN];
 static char s_cmd_topic[TOPIC_BUF_LEN];
 
 static const gpio_num_t s_switch_gpios[SLOT_COUNT] = {
@@ -341,6 +351,23 @@ static bool parse_led_command(const char *json, int *slot_one_based, bool *turn_
     return true;
 }
 
+static bool parse_led_masks_command(const char *json, int *on_mask, int *off_mask) {
+    char action[24];
+    const int all_slots = (1 << SLOT_COUNT) - 1;
+
+    /* Several LEDs in one message: bit i of on_mask/off_mask = slot i+1 */
+    if (!parse_json_string_field(json, "action", action, sizeof(action)) || strcmp(action, "set_leds") != 0) {
+        return false;
+    }
+    if (!parse_json_int_field(json, "on_mask", on_mask) || !parse_json_int_field(json, "off_mask", off_mask)) {
+        return false;
+    }
+    if (*on_mask < 0 || *on_mask > all_slots || *off_mask < 0 || *off_mask > all_slots || (*on_mask & *off_mask) != 0) {
+        return false;
+    }
+    return true;
+}
+
 static bool mqtt_lock(TickType_t wait_ticks) {
     return (xSemaphoreTake(s_mqtt_mutex, wait_ticks) == pdTRUE);
 }
@@ -351,6 +378,7 @@ static void mqtt_unlock(void) {
 
 static IoT_Error_t mqtt_subscribe_command_topic(void);
 static IoT_Error_t publish_slot_event(const slot_state_event_t *evt);
+static IoT_Error_t publish_slot_states_event(unsigned int changed_mask, unsigned int in_holder_mask);
 
 static void mqtt_disconnect_handler(AWS_IoT_Client *pClient, void *data) {
     IOT_UNUSED(pClient);
@@ -364,6 +392,9 @@ static void mqtt_command_callback(AWS_IoT_Client *pClient, char *topicName, uint
     char payload[MQTT_CMD_PAYLOAD_BUF_LEN];
     int slot = 0;
     bool turn_on = false;
+    int on_mask = 0;
+    int off_mask = 0;
+    int i;
 
     IOT_UNUSED(pClient);
     IOT_UNUSED(pData);
@@ -381,6 +412,16 @@ static void mqtt_command_callback(AWS_IoT_Client *pClient, char *topicName, uint
 
     ESP_LOGI(TAG, "CMD topic=%.*s payload=%s", topicNameLen, topicName, payload);
 
+    if (parse_led_masks_command(payload, &on_mask, &off_mask)) {
+        for (i = 0; i < SLOT_COUNT; i++) {
+            if ((on_mask | off_mask) & (1 << i)) {
+                led_set((uint8_t)i, (on_mask & (1 << i)) != 0);
+            }
+        }
+        ESP_LOGI(TAG, "Command applied: on_mask=0x%x off_mask=0x%x", on_mask, off_mask);
+        return;
+    }
+
     if (!parse_led_command(payload, &slot, &turn_on)) {
         ESP_LOGW(TAG, "Invalid command payload: %s", payload);
         return;
@@ -392,8 +433,9 @@ static void mqtt_command_callback(AWS_IoT_Client *pClient, char *topicName, uint
 
 static void build_topics(void) {
     snprintf(s_event_topic, sizeof(s_event_topic), "%s/%s", CONFIG_PILL_EVENT_TOPIC_BASE, CONFIG_PILL_DEVICE_ID);
+    snprintf(s_event_bin_topic, sizeof(s_event_bin_topic), "%s/bin", s_event_topic);
     snprintf(s_cmd_topic, sizeof(s_cmd_topic), "%s/%s", CONFIG_PILL_COMMAND_TOPIC_BASE, CONFIG_PILL_DEVICE_ID);
-    ESP_LOGI(TAG, "Event topic: %s", s_event_topic);
+    ESP_LOGI(TAG, "Event topic: %s", ENABLE_BINARY_EVENTS ? s_event_bin_topic : s_event_topic);
     ESP_LOGI(TAG, "Command topic: %s", s_cmd_topic);
 }
 
@@ -515,23 +557,63 @@ static IoT_Error_t mqtt_subscribe_command_topic(void) {
                                   NULL);
 }
 
+#if ENABLE_BINARY_EVENTS
+static IoT_Error_t publish_binary_event(uint8_t kind, uint8_t first, uint8_t second) {
+    uint8_t payload[BINARY_EVENT_LEN] = {0};
+    IoT_Publish_Message_Params paramsQOS1 = {0};
+
+    /* Sequence and ts_ms stay 0: the device has neither a counter nor wall-clock time yet */
+    payload[0] = kind;
+    payload[1] = first;
+    payload[2] = second;
+
+    paramsQOS1.qos = QOS1;
+    paramsQOS1.payload = payload;
+    paramsQOS1.payloadLen = sizeof(payload);
+    paramsQOS1.isRetained = 0;
+
+    return aws_iot_mqtt_publish(&s_mqtt_client, s_event_bin_topic, (uint16_t)strlen(s_event_bin_topic), &paramsQOS1);
+}
+#endif
+
 static IoT_Error_t publish_startup_slot_states_locked(void) {
 #if ENABLE_STARTUP_SLOT_STATE_PUBLISH
+    unsigned int in_holder_mask = 0;
     int i;
-    for (i = 0; i < SLOT_COUNT; i++) {
-        slot_state_event_t evt = {
-            .slot = (uint8_t)(i + 1),
-            .in_holder = level_to_in_holder(gpio_get_level(s_switch_gpios[i])),
-        };
 
-        IoT_Error_t rc = publish_slot_event(&evt);
-        if (rc != SUCCESS) {
-            ESP_LOGW(TAG, "Startup slot-state publish failed slot=%d rc=%d", i + 1, rc);
-            return rc;
+    /* One slot_snapshot message for all slots: bit i set = slot i+1 in holder */
+    for (i = 0; i < SLOT_COUNT; i++) {
+        if (level_to_in_holder(gpio_get_level(s_switch_gpios[i]))) {
+            in_holder_mask |= (1u << i);
         }
     }
 
-    ESP_LOGI(TAG, "Published startup slot states for all %d slots", SLOT_COUNT);
+#if ENABLE_BINARY_EVENTS
+    IoT_Error_t rc = publish_binary_event(BINARY_KIND_SNAPSHOT, 0, (uint8_t)in_holder_mask);
+#else
+    char payload[MQTT_EVENT_PAYLOAD_BUF_LEN];
+    IoT_Publish_Message_Params paramsQOS1 = {0};
+    int len = snprintf(payload,
+                       sizeof(payload),
+                       "{\"event_type\":\"slot_snapshot\",\"in_holder_mask\":%u}",
+                       in_holder_mask);
+    if (len <= 0 || len >= (int)sizeof(payload)) {
+        return FAILURE;
+    }
+
+    paramsQOS1.qos = QOS1;
+    paramsQOS1.payload = payload;
+    paramsQOS1.payloadLen = (size_t)len;
+    paramsQOS1.isRetained = 0;
+
+    IoT_Error_t rc = aws_iot_mqtt_publish(&s_mqtt_client, s_event_topic, (uint16_t)strlen(s_event_topic), &paramsQOS1);
+#endif
+    if (rc != SUCCESS) {
+        ESP_LOGW(TAG, "Startup slot snapshot publish failed rc=%d", rc);
+        return rc;
+    }
+
+    ESP_LOGI(TAG, "Published startup slot snapshot for all %d slots (mask=0x%x)", SLOT_COUNT, in_holder_mask);
     return SUCCESS;
 #else
     return SUCCESS;
@@ -733,6 +815,9 @@ static void sensor_task(void *param) {
 }
 
 static IoT_Error_t publish_slot_event(const slot_state_event_t *evt) {
+#if ENABLE_BINARY_EVENTS
+    return publish_binary_event(BINARY_KIND_STATE_CHANGED, evt->slot, evt->in_holder ? 1 : 0);
+#else
     char payload[MQTT_EVENT_PAYLOAD_BUF_LEN];
     IoT_Publish_Message_Params paramsQOS1 = {0};
 
@@ -751,40 +836,105 @@ static IoT_Error_t publish_slot_event(const slot_state_event_t *evt) {
     paramsQOS1.isRetained = 0;
 
     return aws_iot_mqtt_publish(&s_mqtt_client, s_event_topic, (uint16_t)strlen(s_event_topic), &paramsQOS1);
+#endif
+}
+
+static IoT_Error_t publish_slot_states_event(unsigned int changed_mask, unsigned int in_holder_mask) {
+#if ENABLE_BINARY_EVENTS
+    return publish_binary_event(BINARY_KIND_STATES_CHANGED, (uint8_t)changed_mask, (uint8_t)in_holder_mask);
+#else
+    char payload[MQTT_EVENT_PAYLOAD_BUF_LEN];
+    IoT_Publish_Message_Params paramsQOS1 = {0};
+
+    /* One message for several slots: bit i set = slot i+1 changed / in holder */
+    int len = snprintf(payload,
+                       sizeof(payload),
+                       "{\"event_type\":\"slot_states_changed\",\"changed_mask\":%u,\"in_holder_mask\":%u}",
+                       changed_mask,
+                       in_holder_mask);
+    if (len <= 0 || len >= (int)sizeof(payload)) {
+        return FAILURE;
+    }
+
+    paramsQOS1.qos = QOS1;
+    paramsQOS1.payload = payload;
+    paramsQOS1.payloadLen = (size_t)len;
+    paramsQOS1.isRetained = 0;
+
+    return aws_iot_mqtt_publish(&s_mqtt_client, s_event_topic, (uint16_t)strlen(s_event_topic), &paramsQOS1);
+#endif
+}
+
+static void requeue_slot_events(const slot_state_event_t *events, int count) {
+    int i;
+
+    /* Back to the front of the queue, last first, so they are sent next and in order */
+    for (i = count - 1; i >= 0; i--) {
+        if (xQueueSendToFront(s_publish_queue, &events[i], 0) != pdTRUE) {
+            ESP_LOGW(TAG, "Publish queue full, dropping slot event for slot=%u", (unsigned int)events[i].slot);
+        }
+    }
 }
 
 static void publisher_task(void *param) {
-    slot_state_event_t evt;
+    slot_state_event_t events[SLOT_COUNT];
+    slot_state_event_t next;
 
     IOT_UNUSED(param);
 
     while (1) {
-        if (xQueueReceive(s_publish_queue, &evt, portMAX_DELAY) != pdTRUE) {
+        if (xQueueReceive(s_publish_queue, &events[0], portMAX_DELAY) != pdTRUE) {
             continue;
         }
 
         xEventGroupWaitBits(s_event_group, MQTT_READY_BIT, false, true, portMAX_DELAY);
 
+        /* Fold changes of other slots (e.g. two bottles swapped) into one message.
+         * A lone change is sent at once; only once another one is already queued
+         * (a burst) does the task wait up to SLOT_EVENT_COALESCE_MS for the rest.
+         * A second change of a slot already in the message stays queued, so no
+         * removal is ever lost. */
+        int count = 1;
+        unsigned int changed_mask = 1u << (events[0].slot - 1);
+        unsigned int in_holder_mask = events[0].in_holder ? changed_mask : 0;
+        TickType_t wait_ticks = 0;
+        while (count < SLOT_COUNT && xQueuePeek(s_publish_queue, &next, wait_ticks) == pdTRUE &&
+               !(changed_mask & (1u << (next.slot - 1)))) {
+            xQueueReceive(s_publish_queue, &events[count++], 0);
+            changed_mask |= 1u << (next.slot - 1);
+            if (next.in_holder) {
+                in_holder_mask |= 1u << (next.slot - 1);
+            }
+            wait_ticks = pdMS_TO_TICKS(SLOT_EVENT_COALESCE_MS);
+        }
+
+        /* Events taken off the queue go back on it if they are not sent */
         if (!mqtt_lock(pdMS_TO_TICKS(MQTT_MUTEX_TIMEOUT_MS))) {
-            ESP_LOGW(TAG, "MQTT lock timeout, dropping publish (mqtt_task likely busy in yield/connect)");
+            ESP_LOGW(TAG, "MQTT lock timeout, requeueing publish (mqtt_task likely busy in yield/connect)");
+            requeue_slot_events(events, count);
             continue;
         }
 
-        IoT_Error_t rc = publish_slot_event(&evt);
+        IoT_Error_t rc = (count == 1) ? publish_slot_event(&events[0])
+                                      : publish_slot_states_event(changed_mask, in_holder_mask);
         mqtt_unlock();
 
         if (rc == MQTT_REQUEST_TIMEOUT_ERROR) {
-            ESP_LOGW(TAG, "QOS1 publish ACK timeout for slot=%u", (unsigned int)evt.slot);
+            /* The broker may have it without the ACK arriving. Events carry no
+             * sequence or timestamp, so a republish would be stamped anew on
+             * arrival and counted twice; it is not requeued. */
+            ESP_LOGW(TAG, "QOS1 publish ACK timeout for changed=0x%x", changed_mask);
             continue;
         }
         if (rc != SUCCESS) {
-            ESP_LOGW(TAG, "Publish failed rc=%d; waiting for reconnect", rc);
+            ESP_LOGW(TAG, "Publish failed rc=%d; requeueing and waiting for reconnect", rc);
+            requeue_slot_events(events, count);
             xEventGroupClearBits(s_event_group, MQTT_READY_BIT);
             vTaskDelay(pdMS_TO_TICKS(MQTT_PUBLISH_FAIL_DELAY_MS));
             continue;
         }
 
-        ESP_LOGI(TAG, "Event sent: slot=%u in_holder=%s", (unsigned int)evt.slot, evt.in_holder ? "true" : "false");
+        ESP_LOGI(TAG, "Event sent: changed=0x%x in_holder=0x%x", changed_mask, in_holder_mask);
     }
 }
 